@@ -6,8 +6,25 @@
 import os
 import re
 import html
-from imap_tools import MailBox, AND
+from datetime import date, timedelta
+from imap_tools import MailBox, MailBoxUnencrypted, AND, OR
 from PDFClassifier import classify_pdf_content
+import record_replay
+import metrics
+import mail_actions
+import invoice_ledger
+from run_journal import STAGE_DOWNLOADED, STAGE_CLASSIFIED, STAGE_DISCARDED
+from config_loader import DEFAULT_MAILBOX_NAME
+
+# ================= 配置常量 =================
+# BODYSTRUCTURE 中可能是 PDF 附件的部分：application/pdf、application/octet-stream
+# （部分邮件客户端发送 PDF 时使用），或文件名以 .pdf 结尾；匹配不到的邮件不下载
+PDF_BODYSTRUCTURE_PATTERN = re.compile(rb'"application"\s+"(?:pdf|x-pdf|octet-stream)"|\.pdf\b', re.IGNORECASE)
+# ===========================================
+
+# UID FETCH 响应中一封邮件的开头："<序号> ("
+_FETCH_START_PATTERN = re.compile(rb'^\d+ \(')
+_FETCH_UID_PATTERN = re.compile(rb'UID (\d+)')
 
 
 def detect_supplier_type(subject, body):
@@ -31,187 +48,578 @@ def detect_supplier_type(subject, body):
     return "OTHER"
 
 
-def download_and_process_attachments(username, password, save_root_dir):
+def extract_order_no(email_subject):
     """
-    从 QQ 邮箱下载未读邮件的 PDF 附件，并根据内容分类处理
+    从邮件标题中提取 Order No
     
     参数:
-        username (str): QQ 邮箱账号
-        password (str): QQ 邮箱授权码（不是登录密码）
+        email_subject (str|None): 邮件标题
+        
+    返回:
+        str: 提取到的 Order No，找不到返回空字符串
+    """
+    order_pattern = r"ORDER NO\s*([A-Za-z0-9]+)"
+    order_match = re.search(order_pattern, email_subject or "", re.IGNORECASE)
+    if order_match:
+        return order_match.group(1)
+    return ""
+
+
+def extract_booking_no(email_body):
+    """
+    从邮件正文中提取 Booking No
+    
+    参数:
+        email_body (str): 邮件正文（文本或 HTML）
+        
+    返回:
+        str: 提取到的订舱号（大写），找不到返回空字符串
+    """
+    # 预处理邮件正文：
+    # 1. 解码 HTML 实体（如 &nbsp; -> 空格）
+    email_body_cleaned = html.unescape(email_body)
+    # 2. 移除 Unicode 替换字符和其他不可见/特殊字符（如 U+FFFD）
+    #    这些字符可能出现在订舱号前面导致正则匹配失败
+    email_body_cleaned = re.sub(r'[\ufffd\u200b\u200c\u200d\ufeff]', '', email_body_cleaned)
+    # 3. 将各种 Unicode 空格字符统一替换为普通空格
+    email_body_cleaned = re.sub(r'[\xa0\u2002\u2003\u2009\u200a]', ' ', email_body_cleaned)
+    # 匹配 "ORDER nbr : xxx" 或 "Booking No : xxx" 或 "Order No : xxx"
+    # 改进：1. 要求冒号/点/等号分隔符 2. 订舱号至少5个字符 3. 排除关键词本身
+    booking_patterns = [
+        # 格式1: ORDER nbr : XXXX 或 Booking No : XXXX（有明确分隔符）
+        r"(?:ORDER|Booking)\s*(?:nbr|No|Ref|#)\s*[:\.=]\s*([A-Za-z0-9\-\/]{5,})",
+        # 格式2: ORDER : XXXX 或 Booking : XXXX（没有 nbr/No）
+        r"(?:ORDER|Booking)\s*[:\.=]\s*([A-Za-z0-9\-\/]{5,})",
+        # 格式3: ORDER nbr XXXX（有 nbr/No 但无冒号，订舱号必须以字母开头+数字）
+        r"(?:ORDER|Booking)\s+(?:nbr|No|Ref|#)\s+([A-Z]{2,}[A-Z0-9\-]{4,})",
+        # 格式4: ORDER XXXX（直接跟订舱号，无分隔符，订舱号必须以字母开头+数字）
+        r"(?:ORDER|Booking)\s+([A-Z]{2,}[A-Z0-9\-]{4,})",
+    ]
+    
+    for pattern in booking_patterns:
+        booking_match = re.search(pattern, email_body_cleaned, re.IGNORECASE)
+        if booking_match:
+            potential_booking_no = booking_match.group(1).strip().upper()
+            # 排除关键词本身
+            if potential_booking_no not in ['NBR', 'NO', 'REF', 'ORDER', 'BOOKING']:
+                return potential_booking_no
+    return ""
+
+
+def connect_mailbox(host='imap.qq.com', port=993, use_ssl=True):
+    """
+    创建 IMAP 连接（尚未登录）
+    
+    参数:
+        host (str): IMAP 服务器地址
+        port (int): 端口
+        use_ssl (bool): 是否使用 SSL（本地测试服务器可关闭）
+        
+    返回:
+        BaseMailBox: imap_tools 邮箱对象（录制 / 回放模式下为对应的包装对象）
+    """
+    if use_ssl:
+        return record_replay.wrap_mailbox(lambda: MailBox(host, port))
+    return record_replay.wrap_mailbox(lambda: MailBoxUnencrypted(host, port))
+
+
+def _email_id_prefix(mailbox_name, folder):
+    """
+    邮件标识前缀：UID 只在同一邮箱的同一文件夹内唯一，其他邮箱 / 文件夹的邮件标识加上前缀
+    （默认邮箱的收件箱不加前缀，与原有的运行日志兼容）
+    """
+    if (mailbox_name or DEFAULT_MAILBOX_NAME) == DEFAULT_MAILBOX_NAME and folder.upper() == 'INBOX':
+        return ""
+    return f"{mailbox_name or DEFAULT_MAILBOX_NAME}/{folder}:"
+
+
+def build_search_criteria(imap_config=None, today=None):
+    """
+    组合服务器端搜索条件：未读 AND 最近 N 天 AND (任一发件人) AND (任一标题关键词)
+    
+    参数:
+        imap_config (dict, optional): 邮箱配置（config_loader.get_mailbox_configs() 的一项），
+            使用 search_since_days、search_from、search_subject
+        today (date, optional): 计算 SINCE 日期的基准日，默认今天
+        
+    返回:
+        tuple: (imap_tools 搜索条件, 字符集)；条件包含非 ASCII 字符时字符集为 UTF-8
+    """
+    imap_config = imap_config or {}
+    conditions = []
+    if imap_config.get('search_from'):
+        conditions.append(OR(from_=list(imap_config['search_from'])))
+    if imap_config.get('search_subject'):
+        conditions.append(OR(subject=list(imap_config['search_subject'])))
+    keywords = {'seen': False}
+    since_days = imap_config.get('search_since_days') or 0
+    if since_days:
+        keywords['date_gte'] = (today or date.today()) - timedelta(days=since_days)
+    criteria = AND(*conditions, **keywords)
+    charset = 'US-ASCII' if str(criteria).isascii() else 'UTF-8'
+    return criteria, charset
+
+
+def _parse_bodystructures(fetch_data):
+    """
+    解析 UID FETCH (BODYSTRUCTURE) 的响应
+    
+    返回:
+        dict: {UID: BODYSTRUCTURE 字节}（文件名等以字面量返回的部分已拼接在内）
+    """
+    chunks = []
+    for item in fetch_data:
+        if item is None:
+            continue
+        head = item[0] if isinstance(item, tuple) else item
+        part = b"".join(item) if isinstance(item, tuple) else item
+        if _FETCH_START_PATTERN.match(head) or not chunks:
+            chunks.append(part)
+        else:
+            chunks[-1] += part
+    
+    structures = {}
+    for chunk in chunks:
+        uid_match = _FETCH_UID_PATTERN.search(chunk)
+        if uid_match:
+            structures[uid_match.group(1).decode()] = chunk
+    return structures
+
+
+def prescreen_pdf_uids(mailbox, uids):
+    """
+    用一条 UID FETCH (BODYSTRUCTURE) 命令检查邮件结构，排除不含 PDF 附件的邮件（不下载正文）
+    
+    参数:
+        mailbox: 已登录并选中文件夹的 imap_tools 邮箱对象
+        uids (list): 候选邮件 UID 列表
+        
+    返回:
+        tuple: (需要下载的 UID 列表, 不含 PDF 的 UID 列表)；
+            服务器没有返回某封邮件的结构时保留该邮件
+    """
+    if not uids:
+        return [], []
+    status, data = mailbox.client.uid('FETCH', ','.join(uids), '(BODYSTRUCTURE)')
+    if status != 'OK':
+        return list(uids), []
+    structures = _parse_bodystructures(data)
+    keep, skipped = [], []
+    for uid in uids:
+        structure = structures.get(uid)
+        if structure is None or PDF_BODYSTRUCTURE_PATTERN.search(structure):
+            keep.append(uid)
+        else:
+            skipped.append(uid)
+    return keep, skipped
+
+
+def fetch_candidate_emails(mailbox, imap_config=None, label="", known_uids=None):
+    """
+    在服务器端搜索当前文件夹中需要处理的邮件并下载
+    
+    - 搜索条件由 build_search_criteria() 组合，在服务器上完成筛选
+    - prescreen_pdf 开启时先检查 BODYSTRUCTURE，不含 PDF 的邮件不下载，
+      并用一条 UID STORE 命令标记为已读
+    - 下载时不标记为已读（BODY.PEEK），处理完成后由 mail_actions 按处理结果批量回写
+    
+    参数:
+        mailbox: 已登录并选中文件夹的邮箱对象
+        imap_config (dict, optional): 邮箱配置
+        label (str): 输出前缀（多个邮箱时为 "[名称] "）
+        known_uids (set, optional): 不需要再下载的 UID（已记录在运行日志中）
+        
+    返回:
+        tuple: (生成器：imap_tools MailMessage, 符合搜索条件但在 known_uids 中、因此没有下载的 UID 列表)
+    """
+    imap_config = imap_config or {}
+    # fetch_bulk > 0 时每条 FETCH 命令下载多封邮件，减少网络往返（[PERFORMANCE] imap_fetch_bulk）
+    bulk = imap_config.get('fetch_bulk') or False
+    criteria, charset = build_search_criteria(imap_config)
+    if record_replay.current_mode() == record_replay.MODE_REPLAY:
+        # 回放模式不连接邮箱，直接返回录制的邮件
+        return mailbox.fetch(criteria, charset, bulk=bulk, mark_seen=False), []
+    
+    uids = mailbox.uids(criteria, charset)
+    print(f"{label}服务器端搜索 {criteria}: {len(uids)} 封邮件")
+    metrics.inc("emails_matched", len(uids))
+    skipped_known = [uid for uid in uids if uid in (known_uids or ())]
+    if skipped_known:
+        print(f"{label}⏭ {len(skipped_known)} 封邮件已在今天的运行日志中（由续跑处理），不再下载")
+        uids = [uid for uid in uids if uid not in known_uids]
+    if uids and imap_config.get('prescreen_pdf', True):
+        uids, skipped = prescreen_pdf_uids(mailbox, uids)
+        if skipped:
+            mailbox.client.uid('STORE', mail_actions.compress_uids(skipped), '+FLAGS.SILENT', '(\\Seen)')
+            metrics.inc("emails_prescreened_out", len(skipped))
+            print(f"{label}⏭ 已跳过 {len(skipped)} 封不含 PDF 附件的邮件（未下载，已标记为已读）")
+    if not uids:
+        return iter(()), skipped_known
+    return mailbox.fetch(uid_list=uids, bulk=bulk, mark_seen=False), skipped_known
+
+
+def _save_attachment(save_root_dir, filename, payload):
+    """
+    保存附件（文件已存在时添加序号；以独占方式创建文件，多个邮箱同时下载同名附件时不会互相覆盖）
+
+    返回:
+        str: 实际保存的文件路径
+    """
+    name, ext = os.path.splitext(os.path.join(save_root_dir, filename))
+    file_path = f"{name}{ext}"
+    counter = 1
+    while True:
+        try:
+            with open(file_path, 'xb') as f:
+                f.write(payload)
+            return file_path
+        except FileExistsError:
+            file_path = f"{name}_{counter}{ext}"
+            counter += 1
+
+
+def iter_downloaded_emails(username, password, save_root_dir, journal=None, imap_config=None, stats=None,
+                           actions=None, content_index=None):
+    """
+    逐封下载邮箱未读邮件的 PDF 附件（生成器，不做分类）
+    
+    每下载完一封邮件立即返回，调用方可以在下载下一封邮件的同时处理已返回的邮件
+    
+    参数:
+        username (str): 邮箱账号
+        password (str): 邮箱授权码（不是登录密码）
         save_root_dir (str): 保存附件的根目录路径
+        journal (RunJournal, optional): 运行日志，传入时记录邮件信息和每个附件的下载阶段
+        imap_config (dict, optional): 服务器配置（config_loader.get_mailbox_configs() 的一项），默认 QQ 邮箱；
+            可包含 name（邮箱名称）、folders（要下载的文件夹）、fetch_bulk（每条 FETCH 命令下载的邮件数）
+            和服务器端搜索条件（见 build_search_criteria / fetch_candidate_emails）
+        stats (dict, optional): 下载统计，累加 "emails"、"attachments"、"bytes"
+        actions (MailActions, optional): 处理结果回写；传入时登记运行日志中已有的邮件和没有 PDF 附件的邮件
+        content_index (AttachmentIndex, optional): 附件内容索引；传入时按 SHA-256 识别重复的附件
+            （回复 / 转发邮件中再次附上的同一个 PDF），重复的附件不保存，只记录为对第一份附件的引用
         
     返回:
-        list: 邮件列表，每个元素是一个字典，代表一封邮件，包含：
-            - "subject": 邮件标题
-            - "body": 邮件正文
-            - "booking_no": 提取到的订舱号（从邮件正文中提取）
-            - "supplier_type": 供应商类型（"SRTS" 或 "OTHER"）
-            - "attachments": 这封邮件下的有效附件列表，每个附件包含：
-                - "type": 文件类型（"INVOICE"、"BL" 或 "UNKNOWN"）
-                - "path": 文件保存路径
-            注意：如果一封邮件里没有有效附件（都被分类为 IGNORE 或没附件），
-            则不会把这封邮件加入返回列表。
+        生成器，每次返回一封包含 PDF 附件的邮件字典，字段与
+        download_and_process_attachments 相同，另外包含：
+            - "imap": 邮件在邮箱中的位置 {"mailbox": 邮箱名称, "folder": 文件夹, "uid": UID}
+            - "duplicates": 与已下载的附件内容相同、未保存的附件
+              [{"att_id", "filename", "content_hash", "duplicate_of": 第一份附件的索引记录}, ...]
+        附件额外包含：
+            - "att_id": 附件标识（用于运行日志）
+            - "type": None（尚未分类，需调用 classify_email_attachments）
+            - "content_hash": 附件内容 SHA-256
+        所有 PDF 附件都是重复附件的邮件不返回（传入 actions 时按处理成功回写）
             
     异常:
-        如果连接邮箱失败，会打印错误信息并返回空列表
+        连接、登录或下载出错时打印提示后重新抛出（由调用方决定如何处理）
     """
     # 确保保存目录存在
     if not os.path.exists(save_root_dir):
-        os.makedirs(save_root_dir)
+        os.makedirs(save_root_dir, exist_ok=True)
         print(f"已创建保存目录: {save_root_dir}")
     
-    # 存储邮件列表（以邮件为单位分组）
-    email_list = []
+    imap_config = imap_config or {}
+    stats = stats if stats is not None else {}
+    for key in ('emails', 'attachments', 'bytes'):
+        stats.setdefault(key, 0)
+    mailbox_name = imap_config.get('name') or DEFAULT_MAILBOX_NAME
+    label = f"[{mailbox_name}] " if mailbox_name != DEFAULT_MAILBOX_NAME else ""
     
     try:
-        # 连接到 QQ 邮箱 IMAP 服务器
-        print(f"正在连接到 QQ 邮箱: {username}")
-        with MailBox('imap.qq.com').login(username, password) as mailbox:
-            print("连接成功！")
-            
-            # 获取所有未读邮件
-            print("正在获取未读邮件...")
-            unseen_emails = mailbox.fetch(AND(seen=False))
+        # 连接到 IMAP 服务器（默认 QQ 邮箱）
+        host = imap_config.get('host', 'imap.qq.com')
+        print(f"{label}正在连接到邮箱 {host}: {username}")
+        mailbox = connect_mailbox(host, imap_config.get('port', 993), imap_config.get('ssl', True))
+        with mailbox.login(username, password) as mailbox:
+            print(f"{label}连接成功！")
             
             email_count = 0
             attachment_count = 0
             
-            # 遍历每封未读邮件
-            for email in unseen_emails:
-                email_count += 1
-                email_subject = email.subject
-                email_body = email.text or email.html or ""  # 获取邮件正文（优先文本，其次HTML）
-                print(f"\n处理邮件 {email_count}: {email_subject}")
-                
-                # 从邮件标题中提取 Order No
-                order_no = ""
-                order_pattern = r"ORDER NO\s*([A-Za-z0-9]+)"
-                order_match = re.search(order_pattern, email_subject, re.IGNORECASE)
-                if order_match:
-                    order_no = order_match.group(1)
-                    print(f"  提取到 Order No: {order_no}")
+            for folder_index, folder in enumerate(imap_config.get('folders') or ['INBOX']):
+                # 登录后默认选中收件箱，其他文件夹需要切换
+                if folder_index > 0 or folder.upper() != 'INBOX':
+                    mailbox.folder.set(folder)
+                id_prefix = _email_id_prefix(mailbox_name, folder)
                 
-                # 从邮件正文中提取 Booking No
-                booking_no = ""
-                # 预处理邮件正文：
-                # 1. 解码 HTML 实体（如 &nbsp; -> 空格）
-                email_body_cleaned = html.unescape(email_body)
-                # 2. 移除 Unicode 替换字符和其他不可见/特殊字符（如 U+FFFD）
-                #    这些字符可能出现在订舱号前面导致正则匹配失败
-                email_body_cleaned = re.sub(r'[\ufffd\u200b\u200c\u200d\ufeff]', '', email_body_cleaned)
-                # 3. 将各种 Unicode 空格字符统一替换为普通空格
-                email_body_cleaned = re.sub(r'[\xa0\u2002\u2003\u2009\u200a]', ' ', email_body_cleaned)
-                # 匹配 "ORDER nbr : xxx" 或 "Booking No : xxx" 或 "Order No : xxx"
-                # 改进：1. 要求冒号/点/等号分隔符 2. 订舱号至少5个字符 3. 排除关键词本身
-                booking_patterns = [
-                    # 格式1: ORDER nbr : XXXX 或 Booking No : XXXX（有明确分隔符）
-                    r"(?:ORDER|Booking)\s*(?:nbr|No|Ref|#)\s*[:\.=]\s*([A-Za-z0-9\-\/]{5,})",
-                    # 格式2: ORDER : XXXX 或 Booking : XXXX（没有 nbr/No）
-                    r"(?:ORDER|Booking)\s*[:\.=]\s*([A-Za-z0-9\-\/]{5,})",
-                    # 格式3: ORDER nbr XXXX（有 nbr/No 但无冒号，订舱号必须以字母开头+数字）
-                    r"(?:ORDER|Booking)\s+(?:nbr|No|Ref|#)\s+([A-Z]{2,}[A-Z0-9\-]{4,})",
-                    # 格式4: ORDER XXXX（直接跟订舱号，无分隔符，订舱号必须以字母开头+数字）
-                    r"(?:ORDER|Booking)\s+([A-Z]{2,}[A-Z0-9\-]{4,})",
-                ]
+                # 今天的运行日志中已有的邮件（例如上次运行中断、尚未回写处理结果）不再下载
+                known_uids = set()
+                if journal is not None:
+                    known_uids = {email_id[len(id_prefix):] for email_id in list(journal.emails)
+                                  if email_id.startswith(id_prefix) and email_id[len(id_prefix):].isdigit()}
                 
-                for pattern in booking_patterns:
-                    booking_match = re.search(pattern, email_body_cleaned, re.IGNORECASE)
-                    if booking_match:
-                        potential_booking_no = booking_match.group(1).strip().upper()
-                        # 排除关键词本身
-                        if potential_booking_no not in ['NBR', 'NO', 'REF', 'ORDER', 'BOOKING']:
-                            booking_no = potential_booking_no
-                            print(f"  提取到 Booking No: {booking_no}")
-                            break
+                # 获取符合搜索条件的未读邮件（服务器端筛选，不含 PDF 的邮件不下载）
+                print(f"{label}正在获取未读邮件（{folder}）...")
+                unseen_emails, skipped_known = fetch_candidate_emails(mailbox, imap_config, label, known_uids)
+                if actions is not None:
+                    # 仍在原文件夹中未读：处理结果尚未回写，运行结束时按运行日志回写
+                    for uid in skipped_known:
+                        actions.register(mailbox_name, folder, uid, f"{id_prefix}{uid}")
                 
-                # 存储当前邮件的有效附件
-                valid_attachments = []
-                
-                # 遍历每封邮件的每个附件
-                for attachment in email.attachments:
-                    attachment_filename = attachment.filename
+                # 遍历每封未读邮件（记录每封邮件的下载耗时）
+                for email in metrics.timed_iter("imap_fetch", unseen_emails):
+                    email_count += 1
+                    stats['emails'] += 1
+                    stats['bytes'] += email.size_rfc822
+                    metrics.inc("emails_downloaded")
+                    metrics.inc("bytes_downloaded", email.size_rfc822)
+                    email_subject = email.subject
+                    email_body = email.text or email.html or ""  # 获取邮件正文（优先文本，其次HTML）
+                    print(f"\n{label}处理邮件 {email_count}: {email_subject}")
                     
-                    # 跳过包含 "bank detail" 或 "bank_detail" 的文件（忽略大小写）
-                    if "bank detail" in attachment_filename.lower() or "bank_detail" in attachment_filename.lower():
-                        print(f"  ⏭ 已跳过 Bank Detail 文件: {attachment_filename}")
-                        continue
+                    # 从邮件标题中提取 Order No
+                    order_no = extract_order_no(email_subject)
+                    if order_no:
+                        print(f"  提取到 Order No: {order_no}")
                     
-                    # 只处理 PDF 文件（忽略大小写）
-                    if attachment_filename.lower().endswith('.pdf'):
-                        attachment_count += 1
-                        print(f"  发现 PDF 附件: {attachment_filename}")
-                        
-                        # 构建保存路径
-                        file_path = os.path.join(save_root_dir, attachment_filename)
+                    # 从邮件正文中提取 Booking No
+                    booking_no = extract_booking_no(email_body)
+                    if booking_no:
+                        print(f"  提取到 Booking No: {booking_no}")
+                    
+                    # 检测供应商类型
+                    supplier_type = detect_supplier_type(email_subject, email_body)
+                    
+                    # 记录邮件信息（断点续跑时用于还原邮件分组）
+                    email_id = f"{id_prefix}{email.uid or email_count}"
+                    imap_location = {"mailbox": mailbox_name, "folder": folder, "uid": email.uid}
+                    if journal is not None:
+                        journal.record_email(email_id, email_subject, booking_no, supplier_type, imap=imap_location)
+                    
+                    # 存储当前邮件已下载的附件和重复的附件
+                    downloaded_attachments = []
+                    duplicate_attachments = []
+                    
+                    # 遍历每封邮件的每个附件
+                    for attachment_index, attachment in enumerate(email.attachments):
+                        attachment_filename = attachment.filename
+                        att_id = f"{email_id}#{attachment_index}"
                         
-                        # 如果文件已存在，添加序号避免覆盖
-                        counter = 1
-                        original_path = file_path
-                        while os.path.exists(file_path):
-                            name, ext = os.path.splitext(original_path)
-                            file_path = f"{name}_{counter}{ext}"
-                            counter += 1
+                        # 跳过包含 "bank detail" 或 "bank_detail" 的文件（忽略大小写）
+                        if "bank detail" in attachment_filename.lower() or "bank_detail" in attachment_filename.lower():
+                            print(f"  ⏭ 已跳过 Bank Detail 文件: {attachment_filename}")
+                            continue
                         
-                        try:
-                            # 下载附件
-                            print(f"  正在下载到: {file_path}")
-                            with open(file_path, 'wb') as f:
-                                f.write(attachment.payload)
+                        # 只处理 PDF 文件（忽略大小写）
+                        if attachment_filename.lower().endswith('.pdf'):
+                            attachment_count += 1
+                            stats['attachments'] += 1
+                            print(f"  发现 PDF 附件: {attachment_filename}")
                             
-                            # 立即调用分类器识别文件类型
-                            print(f"  正在分类文件...")
-                            file_type = classify_pdf_content(file_path)
-                            print(f"  分类结果: {file_type}")
-                            
-                            # 根据分类结果处理文件
-                            if file_type == "IGNORE":
-                                # 删除垃圾文件
-                                os.remove(file_path)
-                                print(f"  ✓ 已删除垃圾文件: {attachment_filename}")
-                            else:
-                                # 保留文件，添加到当前邮件的有效附件列表
-                                attachment_info = {
-                                    "type": file_type,
-                                    "path": file_path
-                                }
-                                valid_attachments.append(attachment_info)
-                                print(f"  ✓ 已保留文件: {attachment_filename} (类型: {file_type})")
+                            file_path = ""
+                            claimed = None
+                            try:
+                                payload = attachment.payload
+                                content_hash = invoice_ledger.bytes_sha256(payload)
+                                original = None
+                                if content_index is not None:
+                                    original = content_index.claim(content_hash, {
+                                        "file_name": attachment_filename, "email_id": email_id, "att_id": att_id})
+                                    claimed = content_hash if original is None else None
+                                if original is not None:
+                                    # 同一个 PDF 已下载过：不保存、不分类、不提取，只记录引用
+                                    print(f"  ⏭ 与已下载的附件内容相同，不再处理"
+                                          f"（原附件: {invoice_ledger.describe_attachment(original)}）")
+                                    metrics.inc("duplicate_attachments")
+                                    if journal is not None:
+                                        journal.record_attachment(att_id, STAGE_DISCARDED, email_id=email_id,
+                                                                  filename=attachment_filename,
+                                                                  content_hash=content_hash,
+                                                                  reason="duplicate_attachment",
+                                                                  duplicate_of=original.get('att_id', ''))
+                                    duplicate_attachments.append({
+                                        "att_id": att_id,
+                                        "filename": attachment_filename,
+                                        "content_hash": content_hash,
+                                        "duplicate_of": original
+                                    })
+                                    continue
                                 
-                        except Exception as e:
-                            print(f"  ✗ 处理附件时出错 {attachment_filename}: {str(e)}")
-                            # 如果下载失败，尝试删除可能已创建的文件
-                            if os.path.exists(file_path):
-                                try:
-                                    os.remove(file_path)
-                                except:
-                                    pass
-                
-                # 如果当前邮件有有效附件，则添加到邮件列表
-                if valid_attachments:
-                    # 检测供应商类型
-                    supplier_type = detect_supplier_type(email_subject, email_body)
+                                # 下载附件（文件已存在时添加序号避免覆盖）
+                                file_path = _save_attachment(save_root_dir, attachment_filename, payload)
+                                print(f"  已下载到: {file_path}")
+                                metrics.inc("attachments_downloaded")
+                                metrics.inc("attachment_bytes", len(payload))
+                                if journal is not None:
+                                    journal.record_attachment(att_id, STAGE_DOWNLOADED, email_id=email_id,
+                                                              path=file_path, filename=attachment_filename,
+                                                              content_hash=content_hash)
+                                downloaded_attachments.append({
+                                    "att_id": att_id,
+                                    "type": None,
+                                    "path": file_path,
+                                    "content_hash": content_hash
+                                })
+                            except Exception as e:
+                                print(f"  ✗ 处理附件时出错 {attachment_filename}: {str(e)}")
+                                if claimed:
+                                    # 保存失败：之后内容相同的附件照常保存
+                                    content_index.release(claimed)
+                                # 如果下载失败，尝试删除可能已创建的文件
+                                if file_path and os.path.exists(file_path):
+                                    try:
+                                        os.remove(file_path)
+                                    except:
+                                        pass
+                    
+                    if not downloaded_attachments and duplicate_attachments:
+                        print(f"  - 邮件中的 PDF 附件都已下载过，已跳过")
+                        if actions is not None and email.uid:
+                            actions.resolve(mailbox_name, folder, email.uid, mail_actions.OUTCOME_PROCESSED)
+                        continue
+                    if not downloaded_attachments:
+                        print(f"  - 邮件无 PDF 附件，已跳过")
+                        if actions is not None and email.uid:
+                            actions.ignore(mailbox_name, folder, email.uid)
+                        continue
                     
-                    email_info = {
+                    yield {
+                        "email_id": email_id,
+                        "imap": imap_location,
                         "subject": email_subject,
                         "body": email_body,
                         "booking_no": booking_no,
                         "supplier_type": supplier_type,
-                        "attachments": valid_attachments
+                        "attachments": downloaded_attachments,
+                        "duplicates": duplicate_attachments
                     }
-                    email_list.append(email_info)
-                    print(f"  ✓ 邮件已添加到结果列表（包含 {len(valid_attachments)} 个有效附件，供应商类型: {supplier_type}）")
-                else:
-                    print(f"  - 邮件无有效附件，已跳过")
             
-            print(f"\n处理完成！共处理 {email_count} 封邮件，{attachment_count} 个 PDF 附件")
-            print(f"有效邮件数量: {len(email_list)}")
+            print(f"\n{label}下载完成！共处理 {email_count} 封邮件，{attachment_count} 个 PDF 附件")
             
     except Exception as e:
-        print(f"错误：连接或处理邮箱时出错: {str(e)}")
+        print(f"{label}错误：连接或处理邮箱时出错: {str(e)}")
         print("提示：请确保：")
-        print("  1. QQ 邮箱已开启 IMAP 服务")
+        print("  1. 邮箱已开启 IMAP 服务")
         print("  2. 使用的是授权码（不是登录密码）")
         print("  3. 网络连接正常")
+        raise
+
+
+def classify_email_attachments(email_info, journal=None):
+    """
+    对一封邮件中尚未分类的附件进行分类，删除垃圾文件
     
-    return email_list
+    已有类型的附件（例如续跑时从运行日志还原的附件）保持不变
+    
+    参数:
+        email_info (dict): iter_downloaded_emails 返回的邮件字典
+        journal (RunJournal, optional): 运行日志，传入时记录分类阶段
+        
+    返回:
+        dict|None: 只保留有效附件的邮件字典；没有有效附件时返回 None
+    """
+    valid_attachments = []
+    for attachment_info in email_info['attachments']:
+        if attachment_info.get('type') is not None:
+            valid_attachments.append(attachment_info)
+            continue
+        
+        file_path = attachment_info['path']
+        attachment_filename = os.path.basename(file_path)
+        att_id = attachment_info.get('att_id')
+        
+        if not os.path.exists(file_path):
+            print(f"  ⚠ 附件已不存在，跳过: {file_path}")
+            if journal is not None and att_id:
+                journal.record_attachment(att_id, STAGE_DISCARDED, reason="missing")
+            continue
+        
+        try:
+            # 调用分类器识别文件类型
+            print(f"  正在分类文件: {attachment_filename}")
+            file_type = classify_pdf_content(file_path)
+            print(f"  分类结果: {file_type}")
+            
+            # 根据分类结果处理文件
+            if file_type == "IGNORE":
+                # 删除垃圾文件
+                os.remove(file_path)
+                print(f"  ✓ 已删除垃圾文件: {attachment_filename}")
+                if journal is not None and att_id:
+                    journal.record_attachment(att_id, STAGE_DISCARDED, type=file_type)
+            else:
+                if journal is not None and att_id:
+                    journal.record_attachment(att_id, STAGE_CLASSIFIED, type=file_type)
+                # 保留文件，添加到当前邮件的有效附件列表
+                attachment_info["type"] = file_type
+                valid_attachments.append(attachment_info)
+                print(f"  ✓ 已保留文件: {attachment_filename} (类型: {file_type})")
+                
+        except Exception as e:
+            print(f"  ✗ 处理附件时出错 {attachment_filename}: {str(e)}")
+            if os.path.exists(file_path):
+                try:
+                    os.remove(file_path)
+                except:
+                    pass
+            if journal is not None and att_id:
+                journal.record_attachment(att_id, STAGE_DISCARDED, reason=str(e))
+    
+    if not valid_attachments:
+        print(f"  - 邮件无有效附件，已跳过: {email_info.get('subject')}")
+        return None
+    
+    email_info['attachments'] = valid_attachments
+    return email_info
+
 
+@metrics.timed("download_and_process_attachments")
+def download_and_process_attachments(username, password, save_root_dir, journal=None, imap_config=None):
+    """
+    从 QQ 邮箱下载未读邮件的 PDF 附件，并根据内容分类处理
+    
+    参数:
+        username (str): QQ 邮箱账号
+        password (str): QQ 邮箱授权码（不是登录密码）
+        save_root_dir (str): 保存附件的根目录路径
+        journal (RunJournal, optional): 运行日志，传入时记录每个附件的下载和分类阶段，用于断点续跑
+        imap_config (dict, optional): IMAP 服务器配置，默认 QQ 邮箱
+        
+    返回:
+        list: 邮件列表，每个元素是一个字典，代表一封邮件，包含：
+            - "email_id": 邮件标识（IMAP UID）
+            - "subject": 邮件标题
+            - "body": 邮件正文
+            - "booking_no": 提取到的订舱号（从邮件正文中提取）
+            - "supplier_type": 供应商类型（"SRTS" 或 "OTHER"）
+            - "attachments": 这封邮件下的有效附件列表，每个附件包含：
+                - "att_id": 附件标识
+                - "type": 文件类型（"INVOICE"、"BL" 或 "UNKNOWN"）
+                - "path": 文件保存路径
+            注意：如果一封邮件里没有有效附件（都被分类为 IGNORE 或没附件），
+            则不会把这封邮件加入返回列表。
+            
+    异常:
+        如果连接邮箱失败，会打印错误信息并返回已下载的邮件（连接失败时为空列表）
+    """
+    # 存储邮件列表（以邮件为单位分组）
+    email_list = []
+    # 下载时不标记为已读；这里没有后续的处理结果，下载完成后统一标记为已读（与原来的行为一致）
+    actions = mail_actions.MailActions()
+    
+    try:
+        for email_info in iter_downloaded_emails(username, password, save_root_dir, journal, imap_config,
+                                                 actions=actions):
+            actions.resolve_email(email_info, mail_actions.OUTCOME_IGNORED)
+            email_info = classify_email_attachments(email_info, journal)
+            if email_info is not None:
+                email_list.append(email_info)
+                print(f"  ✓ 邮件已添加到结果列表（包含 {len(email_info['attachments'])} 个有效附件，供应商类型: {email_info['supplier_type']}）")
+    except Exception:
+        # 错误信息已由 iter_downloaded_emails 打印，返回已下载的邮件
+        pass
+    
+    imap_config = imap_config or {}
+    actions.apply([{
+        'name': imap_config.get('name') or DEFAULT_MAILBOX_NAME,
+        'user': username,
+        'password': password,
+        'host': imap_config.get('host', 'imap.qq.com'),
+        'port': imap_config.get('port', 993),
+        'ssl': imap_config.get('ssl', True),
+        'processed_folder': '',
+        'review_folder': '',
+    }])
+    
+    print(f"有效邮件数量: {len(email_list)}")
+    return email_list
@@ -3,10 +3,40 @@ PDF 文件分类器模块
 用于识别 PDF 文件的类型（发票、提单等）
 """
 
-import pdfplumber
 import os
+import re
+import logging
+import metrics
+import pdf_text
+from app_logging import get_logger
 
+logger = get_logger(__name__)
 
+# ================= 关键词库 =================
+# 发票标题词
+INVOICE_KEYWORDS = ["INVOICE", "DEBIT NOTE", "TAX RECEIPT", "PAYMENT REQUEST", "CREDIT NOTE"]
+# 提单标题词 (注意：不要用 HBL 这种短词作为正文关键词，容易误判，要用全称)
+BL_KEYWORDS = ["BILL OF LADING", "WAYBILL", "TELEX RELEASE", "CARGO RECEIPT"]
+# 算钱特征词 (发票通常会有这些，提单通常没有)
+MONEY_KEYWORDS = ["TOTAL", "AMOUNT DUE", "GRAND TOTAL", "BALANCE", "SUBTOTAL"]
+# 垃圾文件特征词（银行信息）
+IGNORE_KEYWORDS = ["BANK DETAILS"]
+
+# 发票页面打分（只把有表头或费用明细的页面发送给 AI，见 score_invoice_page）
+TERMS_KEYWORDS = ["TERMS AND CONDITIONS", "CONDITIONS OF CARRIAGE", "STANDARD TRADING CONDITIONS",
+                  "GENERAL CONDITIONS"]
+GRAND_TOTAL_KEYWORDS = ["GRAND TOTAL", "TOTAL AMOUNT DUE", "AMOUNT DUE", "TOTAL DUE", "BALANCE DUE"]
+CURRENCY_PATTERN = re.compile(r"\b(?:USD|EUR|CNY|RMB|HKD|GBP|JPY|SGD|AUD|NZD|CAD|VND|THB|MYR|INR|KRW|TWD|AED)\b")
+AMOUNT_PATTERN = re.compile(r"(?<![\d.])\d[\d,]*\.\d{2}(?!\d)")
+PAGE_TITLE_CHARS = 500           # 标题词只在页面开头的这么多字符内查找
+INVOICE_PAGE_MIN_SCORE = 2       # 达到此分数的页面视为发票内容页
+GRAND_TOTAL_TAIL_LINES = 8       # 总计关键词需要在页面最后这么多行内（第一页顶部的汇总框不算）
+GRAND_TOTAL_MIN_AMOUNTS = 2      # 总计页至少有这么多个金额（费用明细 + 总计）
+CONTINUATION_MIN_AMOUNTS = 2     # 紧接在保留页面之后、至少有这么多个金额的页面视为费用明细续页
+# ===========================================
+
+
+@metrics.timed("classify_pdf")
 def classify_pdf_content(file_path):
     """
     根据 PDF 文件内容识别文件类型
@@ -27,49 +57,34 @@ def classify_pdf_content(file_path):
         3. 有金额特征词 -> 判定为发票；无金额特征词 -> 判定为提单
             
     异常:
-        如果文件无法打开或读取，会返回 "UNKNOWN" 并打印错误信息
+        如果文件无法打开或读取，会返回 "UNKNOWN" 并记录错误日志
     """
-    pdf_file = None
     try:
-        # 打开 PDF 文件
-        pdf_file = pdfplumber.open(file_path)
-        
-        # 检查是否有页面
-        if len(pdf_file.pages) == 0:
-            return "UNKNOWN"
+        # 读取第一页的文本内容（扫描件按 [OCR] 设置识别，见 pdf_text）
+        pages = pdf_text.read_pages(file_path, max_pages=1)
         
-        # 读取第一页的文本内容
-        first_page = pdf_file.pages[0]
-        text_content = first_page.extract_text()
-        
-        # 如果无法提取文本，返回 UNKNOWN
-        if text_content is None:
+        # 没有页面或无法提取文本，返回 UNKNOWN
+        if not pages or not pages[0]:
             return "UNKNOWN"
+        text_content = pages[0]
         
-        # 【调试信息】打印前100个字符（去除换行符）
-        debug_text = text_content.replace('\n', ' ').replace('\r', ' ').strip()[:100]
-        print(f"[DEBUG文本]: {debug_text}")
+        # 【调试信息】记录前100个字符（去除换行符），仅在开启 DEBUG 日志时处理文本
+        if logger.isEnabledFor(logging.DEBUG):
+            debug_text = text_content.replace('\n', ' ').replace('\r', ' ').strip()[:100]
+            logger.debug("[DEBUG文本]: %s", debug_text)
         
         # 将文本转换为大写，便于不区分大小写的匹配
         text_upper = text_content.upper()
         filename_upper = os.path.basename(file_path).upper()
         
         # 判断是否为垃圾文件：包含 "BANK DETAILS"（优先判断，防止误判为其他类型）
-        if "BANK DETAILS" in text_upper:
+        if any(kw in text_upper for kw in IGNORE_KEYWORDS):
             return "IGNORE"
         
-        # 1. 定义关键词库
-        # 发票标题词
-        invoice_keywords = ["INVOICE", "DEBIT NOTE", "TAX RECEIPT", "PAYMENT REQUEST", "CREDIT NOTE"]
-        # 提单标题词 (注意：不要用 HBL 这种短词作为正文关键词，容易误判，要用全称)
-        bl_keywords = ["BILL OF LADING", "WAYBILL", "TELEX RELEASE", "CARGO RECEIPT"]
-        # 算钱特征词 (发票通常会有这些，提单通常没有)
-        money_keywords = ["TOTAL", "AMOUNT DUE", "GRAND TOTAL", "BALANCE", "SUBTOTAL"]
-        
-        # 2. 状态检测
-        is_invoice = any(kw in text_upper for kw in invoice_keywords)
-        is_bl = any(kw in text_upper for kw in bl_keywords)
-        has_money = any(kw in text_upper for kw in money_keywords)
+        # 1. 状态检测（关键词库见模块开头）
+        is_invoice = any(kw in text_upper for kw in INVOICE_KEYWORDS)
+        is_bl = any(kw in text_upper for kw in BL_KEYWORDS)
+        has_money = any(kw in text_upper for kw in MONEY_KEYWORDS)
         
         # 3. 优先基于文件名的强力辅助判决 (文件名往往最准)
         if "HBL" in filename_upper and "INVOICE" not in filename_upper:
@@ -84,7 +99,7 @@ def classify_pdf_content(file_path):
             # 如果是，说明这是一个真正的提单文件，而不是发票中引用了提单号
             first_500_chars = text_upper[:500]
             if "BILL OF LADING" in first_500_chars:
-                print(f"[DEBUG分类]: 检测到 BILL OF LADING 在文件开头，判定为 BL")
+                logger.debug("[DEBUG分类]: 检测到 BILL OF LADING 在文件开头，判定为 BL: %s", file_path)
                 return "BL"  # 标题是 Bill of Lading -> 认为是提单
             
             if has_money:
@@ -103,14 +118,60 @@ def classify_pdf_content(file_path):
         
     except Exception as e:
         # 处理文件打开或读取异常
-        print(f"错误：无法读取 PDF 文件 {file_path}: {str(e)}")
+        logger.error("错误：无法读取 PDF 文件 %s: %s", file_path, e)
         return "UNKNOWN"
+
+
+def score_invoice_page(text):
+    """
+    判断发票 PDF 的一页是否包含需要提取的内容（表头或费用明细）
+    
+    参数:
+        text (str): 页面文本
         
-    finally:
-        # 确保文件流被关闭
-        if pdf_file is not None:
-            try:
-                pdf_file.close()
-            except Exception as e:
-                print(f"警告：关闭 PDF 文件时出错 {file_path}: {str(e)}")
+    返回:
+        tuple: (score, is_grand_total)
+            - score (int): 页面得分，达到 INVOICE_PAGE_MIN_SCORE 视为发票内容页
+            - is_grand_total (bool): 页面底部是总计金额（发票的最后一页，之后通常是条款、银行信息或提单副本）：
+              总计关键词在最后 GRAND_TOTAL_TAIL_LINES 行内，上面至少有一行费用明细，且页面至少有 GRAND_TOTAL_MIN_AMOUNTS 个金额
+            
+    打分规则:
+        +2 页面开头有发票标题词；+1 有算钱特征词；+1 有币种代码；+1 有两个及以上金额
+        -2 页面开头是条款、提单标题（且没有算钱特征词）或银行信息
+    """
+    text_upper = (text or "").upper()
+    title = text_upper[:PAGE_TITLE_CHARS]
+    has_money = any(kw in text_upper for kw in MONEY_KEYWORDS)
+    amounts = AMOUNT_PATTERN.findall(text_upper)
+    
+    score = 0
+    if any(kw in title for kw in INVOICE_KEYWORDS):
+        score += 2
+    if has_money:
+        score += 1
+    if CURRENCY_PATTERN.search(text_upper):
+        score += 1
+    if len(amounts) >= 2:
+        score += 1
+    if any(kw in title for kw in TERMS_KEYWORDS + IGNORE_KEYWORDS):
+        score -= 2
+    if not has_money and any(kw in title for kw in BL_KEYWORDS):
+        score -= 2
+    
+    is_grand_total = len(amounts) >= GRAND_TOTAL_MIN_AMOUNTS and _has_bottom_total(text_upper)
+    return score, is_grand_total
+
+
+def _has_bottom_total(text_upper):
+    """总计关键词在页面最后几行内，且在它上面有费用明细行（有金额、没有算钱特征词的行）"""
+    lines = [line for line in text_upper.splitlines() if line.strip()]
+    for index in range(len(lines) - 1, max(len(lines) - GRAND_TOTAL_TAIL_LINES, 0) - 1, -1):
+        if any(kw in lines[index] for kw in GRAND_TOTAL_KEYWORDS):
+            return any(AMOUNT_PATTERN.search(line) and not any(kw in line for kw in MONEY_KEYWORDS)
+                       for line in lines[:index])
+    return False
+
 
+def count_amounts(text):
+    """页面中的金额个数（判断费用明细续页）"""
+    return len(AMOUNT_PATTERN.findall(text or ""))
@@ -0,0 +1,206 @@
+"""
+日志模块
+基于标准库 logging 的分级日志：调试信息使用 DEBUG 级别，未开启时几乎没有开销
+（使用 logger.debug("... %s", value) 的惰性格式化，不拼接字符串）
+
+输出:
+    - 控制台：写入当前的 sys.stdout（GUI / 命令行重定向后同样生效），text 或 json 格式
+    - 文件（可选）：按大小轮转的日志文件，默认记录 DEBUG 及以上
+    - GUI：只接收 INFO 及以上，避免大量调试信息拖慢界面
+
+用法:
+    from app_logging import get_logger
+    logger = get_logger(__name__)
+    logger.debug("港口匹配成功: [%s] -> [%s]", port_name, code)
+
+    app_logging.setup_logging(level="INFO", log_format="json", log_file="logs/invoiceauto.log")
+"""
+
+import os
+import sys
+import json
+import logging
+import threading
+import logging.handlers
+from datetime import datetime
+
+# ================= 配置常量 =================
+ROOT_LOGGER_NAME = "invoiceauto"
+DEFAULT_LEVEL = "INFO"
+DEFAULT_FILE_LEVEL = "DEBUG"
+DEFAULT_MAX_BYTES = 5 * 1024 * 1024
+DEFAULT_BACKUP_COUNT = 5
+
+TEXT_FORMAT = "%(message)s"        # 控制台 / GUI：与原来的 print 输出一致
+FILE_FORMAT = "%(asctime)s [%(levelname)s] %(threadName)s %(name)s: %(message)s"
+# ===========================================
+
+_SETUP_LOCK = threading.Lock()
+_configured = False
+
+# LogRecord 自带的属性（JSON 输出时不作为附加字段）
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """每条日志输出一个 JSON 对象：ts、level、logger、msg，以及 extra={...} 传入的字段"""
+
+    def format(self, record):
+        data = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="seconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                data[key] = value
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class ConsoleHandler(logging.StreamHandler):
+    """
+    控制台输出
+
+    未指定 stream 时在每次输出时读取 sys.stdout，
+    因此 GUI 的 TextRedirector、benchmark 的 redirect_stdout 等重定向依然有效
+    """
+
+    def __init__(self, stream=None):
+        super().__init__(stream)
+        self._fixed_stream = stream
+
+    @property
+    def stream(self):
+        return self._fixed_stream if self._fixed_stream is not None else sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        self._fixed_stream = value
+
+
+class GuiLogHandler(logging.Handler):
+    """
+    GUI 日志输出（默认只接收 INFO 及以上）
+
+    参数:
+        sink (callable): 接收文本的函数，例如 TextRedirector.write（线程安全，只入队）
+    """
+
+    def __init__(self, sink, level=logging.INFO):
+        super().__init__(level)
+        self.sink = sink
+
+    def emit(self, record):
+        try:
+            self.sink(self.format(record) + "\n")
+        except Exception:
+            self.handleError(record)
+
+
+def _parse_level(level, default):
+    """日志级别：支持 "DEBUG" 等名称或整数"""
+    if level is None or level == "":
+        level = default
+    if isinstance(level, int):
+        return level
+    value = logging.getLevelName(str(level).strip().upper())
+    if not isinstance(value, int):
+        raise ValueError(f"无效的日志级别: {level}（可选 DEBUG / INFO / WARNING / ERROR）")
+    return value
+
+
+def _make_formatter(log_format, fmt):
+    return JsonFormatter() if log_format == "json" else logging.Formatter(fmt)
+
+
+def get_logger(name=None):
+    """
+    获取模块日志对象（统一挂在 invoiceauto 下，未调用 setup_logging 时按默认配置输出到控制台）
+
+    参数:
+        name (str): 模块名，通常传 __name__
+    """
+    _ensure_default()
+    if not name or name == ROOT_LOGGER_NAME:
+        return logging.getLogger(ROOT_LOGGER_NAME)
+    return logging.getLogger(f"{ROOT_LOGGER_NAME}.{name}")
+
+
+def _ensure_default():
+    """第一次使用时安装默认的控制台输出（INFO，保持与原 print 输出相同的效果）"""
+    global _configured
+    if _configured:
+        return
+    with _SETUP_LOCK:
+        if _configured:
+            return
+        root = logging.getLogger(ROOT_LOGGER_NAME)
+        handler = ConsoleHandler()
+        handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+        root.addHandler(handler)
+        root.setLevel(logging.INFO)
+        root.propagate = False
+        _configured = True
+
+
+def setup_logging(level=DEFAULT_LEVEL, log_format="text", log_file=None, file_level=DEFAULT_FILE_LEVEL,
+                  max_bytes=DEFAULT_MAX_BYTES, backup_count=DEFAULT_BACKUP_COUNT,
+                  console=True, stream=None, gui_sink=None):
+    """
+    配置日志输出（替换之前的配置，可重复调用）
+
+    参数:
+        level (str|int): 控制台日志级别
+        log_format (str): "text" 或 "json"（控制台和文件共用）
+        log_file (str): 日志文件路径（为空表示不写文件）
+        file_level (str|int): 文件日志级别
+        max_bytes (int): 单个日志文件的最大字节数，超过后轮转
+        backup_count (int): 保留的历史日志文件数
+        console (bool): 是否输出到控制台
+        stream: 控制台输出流（默认每次输出时使用当前的 sys.stdout）
+        gui_sink (callable): GUI 日志接收函数（只接收 INFO 及以上）
+
+    返回:
+        logging.Logger: invoiceauto 根日志对象
+
+    异常:
+        ValueError: 日志级别或格式无效
+    """
+    global _configured
+    if log_format not in ("text", "json"):
+        raise ValueError(f"无效的日志格式: {log_format}（可选 text / json）")
+
+    handlers = []
+    if console:
+        handler = ConsoleHandler(stream)
+        handler.setLevel(_parse_level(level, DEFAULT_LEVEL))
+        handler.setFormatter(_make_formatter(log_format, TEXT_FORMAT))
+        handlers.append(handler)
+    if log_file:
+        log_dir = os.path.dirname(os.path.abspath(log_file))
+        os.makedirs(log_dir, exist_ok=True)
+        handler = logging.handlers.RotatingFileHandler(log_file, maxBytes=max_bytes,
+                                                       backupCount=backup_count, encoding="utf-8")
+        handler.setLevel(_parse_level(file_level, DEFAULT_FILE_LEVEL))
+        handler.setFormatter(_make_formatter(log_format, FILE_FORMAT))
+        handlers.append(handler)
+    if gui_sink is not None:
+        handler = GuiLogHandler(gui_sink)
+        handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+        handlers.append(handler)
+
+    root = logging.getLogger(ROOT_LOGGER_NAME)
+    with _SETUP_LOCK:
+        for old in list(root.handlers):
+            root.removeHandler(old)
+            old.close()
+        for handler in handlers:
+            root.addHandler(handler)
+        # 根日志级别取各输出中最低的级别：都不需要 DEBUG 时 logger.debug 直接返回
+        root.setLevel(min((h.level for h in handlers), default=logging.WARNING))
+        root.propagate = False
+        _configured = True
+    return root
@@ -0,0 +1,163 @@
+"""
+归档目录管理模块
+Invoice附件 / BL附件 目录的文件名索引：每个目录只在第一次使用时列出一次，
+之后在内存中分配不重复的文件名（name.pdf, name_1.pdf, name_2.pdf ...），
+不再对每个候选文件名逐个调用 os.path.exists（在网络共享盘上每次检查都是一次网络往返）
+
+- 移动使用 os.replace（同一个磁盘上只是重命名）；跨磁盘时改用 shutil.move
+- 与目录中已有文件内容完全相同（先比较大小，再比较 SHA-256）的文件不再重复保存，直接使用已有的文件
+- 索引只在本程序写入期间有效：每次运行开始时调用 reset()，重新读取目录
+
+用法:
+    archive_manager.reset()
+    directory = archive_manager.archive_dir(invoice_dir)
+    result = directory.move_in(temp_path, "invoice SRSE202508-00631.pdf", content_hash)
+    results = directory.move_many([(temp_path, "BL HBL000001.pdf", None), ...])
+"""
+
+import os
+import errno
+import shutil
+import threading
+
+from invoice_ledger import file_sha256
+
+
+class ArchiveDirectory:
+    """
+    单个归档目录的文件名和内容索引（线程安全）
+
+    参数:
+        path (str): 归档目录路径（不存在时自动创建）
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._names = None          # 小写文件名 -> 文件名（Windows 文件名不区分大小写）
+        self._sizes = {}            # 文件大小 -> [文件名, ...]
+        self._hashes = {}           # 文件名 -> SHA-256（需要比较时才计算）
+        self._next_suffix = {}      # 小写文件名 -> 下一个尝试的序号
+        self._lock = threading.RLock()
+
+    def _load(self):
+        """列出目录（每个目录只列出一次）"""
+        if self._names is not None:
+            return
+        os.makedirs(self.path, exist_ok=True)
+        self._names = {}
+        with os.scandir(self.path) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    self._add(entry.name, entry.stat().st_size)
+
+    def _add(self, file_name, size, content_hash=None):
+        self._names[file_name.lower()] = file_name
+        self._sizes.setdefault(size, []).append(file_name)
+        if content_hash:
+            self._hashes[file_name] = content_hash
+
+    def _hash_of(self, file_name):
+        if file_name not in self._hashes:
+            self._hashes[file_name] = file_sha256(os.path.join(self.path, file_name))
+        return self._hashes[file_name]
+
+    def _find_identical(self, source_path, content_hash):
+        """目录中与 source_path 内容完全相同的文件名（没有时返回 None）"""
+        candidates = self._sizes.get(os.path.getsize(source_path))
+        if not candidates:
+            return None
+        content_hash = content_hash or file_sha256(source_path)
+        for file_name in candidates:
+            try:
+                if self._hash_of(file_name) == content_hash:
+                    return file_name
+            except OSError:
+                # 文件已被外部删除或无法读取，不作为重复文件
+                continue
+        return None
+
+    def _reserve_name(self, file_name):
+        """分配目录中不重复的文件名（只查内存索引）"""
+        key = file_name.lower()
+        if key not in self._names:
+            return file_name
+        stem, ext = os.path.splitext(file_name)
+        counter = self._next_suffix.get(key, 1)
+        while f"{stem}_{counter}{ext}".lower() in self._names:
+            counter += 1
+        self._next_suffix[key] = counter + 1
+        return f"{stem}_{counter}{ext}"
+
+    def move_in(self, source_path, file_name, content_hash=None):
+        """
+        将文件移动到归档目录（文件名已存在时添加序号；内容相同的文件已存在时不再保存）
+
+        参数:
+            source_path (str): 源文件路径（通常在 Temp 中）
+            file_name (str): 期望的文件名
+            content_hash (str, optional): 源文件 SHA-256（已知时传入，避免重复计算）
+
+        返回:
+            dict: {"path": 归档后的文件路径, "duplicate": 是否与已有文件内容相同（源文件已删除）}
+
+        异常:
+            OSError: 移动失败（源文件保持不变）
+        """
+        with self._lock:
+            self._load()
+            size = os.path.getsize(source_path)
+            identical = self._find_identical(source_path, content_hash)
+            if identical is not None:
+                os.remove(source_path)
+                return {"path": os.path.join(self.path, identical), "duplicate": True}
+
+            target_name = self._reserve_name(file_name)
+            target_path = os.path.join(self.path, target_name)
+            try:
+                os.replace(source_path, target_path)
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    raise
+                # 跨磁盘（例如 Temp 在本地、归档目录在网络盘）：复制后删除
+                shutil.move(source_path, target_path)
+            self._add(target_name, size, content_hash)
+            return {"path": target_path, "duplicate": False}
+
+    def move_many(self, moves):
+        """
+        批量移动文件到归档目录（同一个目录只加锁、列出一次）
+
+        参数:
+            moves (list): [(source_path, file_name, content_hash), ...]
+
+        返回:
+            list: 与 moves 顺序对应的结果，每项为 move_in() 的返回值，
+                  移动失败时为 {"path": None, "duplicate": False, "error": 错误信息}
+        """
+        results = []
+        with self._lock:
+            for source_path, file_name, content_hash in moves:
+                try:
+                    results.append(self.move_in(source_path, file_name, content_hash))
+                except OSError as e:
+                    results.append({"path": None, "duplicate": False, "error": str(e)})
+        return results
+
+
+_DIRECTORIES = {}
+_DIRECTORIES_LOCK = threading.Lock()
+
+
+def archive_dir(path):
+    """获取归档目录的索引（同一个目录共用一个索引）"""
+    key = os.path.normcase(os.path.abspath(path))
+    with _DIRECTORIES_LOCK:
+        if key not in _DIRECTORIES:
+            _DIRECTORIES[key] = ArchiveDirectory(path)
+        return _DIRECTORIES[key]
+
+
+def reset():
+    """清空所有目录索引（每次运行开始时调用，之后重新读取目录，包含人工在两次运行之间做的修改）"""
+    with _DIRECTORIES_LOCK:
+        _DIRECTORIES.clear()
@@ -0,0 +1 @@
+"""基准测试工具（不随程序发布）"""
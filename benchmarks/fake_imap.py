@@ -0,0 +1,494 @@
+"""
+本地 IMAP 服务器（基准测试用）
+实现 imap_tools 下载未读邮件所需的 IMAP4rev1 子集（明文连接，不需要 SSL）：
+    CAPABILITY / LOGIN / SELECT / EXAMINE / UNSELECT / NOOP / LOGOUT / IDLE / CREATE
+    UID SEARCH / UID FETCH（含 BODYSTRUCTURE）/ UID STORE / UID COPY / UID MOVE / UID EXPUNGE
+
+用法:
+    server = FakeIMAPServer(messages)       # messages: 原始邮件字节列表
+    server.start()
+    ... 使用 127.0.0.1:server.port 连接 ...
+    server.stop()
+"""
+
+import re
+import time
+import select
+import threading
+import socketserver
+from email import message_from_bytes, policy
+from email.message import EmailMessage
+from email.header import decode_header, make_header
+from email.utils import parsedate_to_datetime, format_datetime
+from datetime import datetime, timedelta
+
+# ================= 配置常量 =================
+DEFAULT_FOLDER = "INBOX"
+CAPABILITIES = "IMAP4rev1 UIDPLUS IDLE MOVE"
+IDLE_CHECK_INTERVAL = 0.2     # IDLE 期间检查新邮件 / 客户端 DONE 的间隔（秒）
+# ===========================================
+
+_TOKEN_PATTERN = re.compile(rb'"((?:[^"\\]|\\.)*)"|(\()|(\))|([^\s()"]+)')
+_IMAP_MONTHS = ["JAN", "FEB", "MAR", "APR", "MAY", "JUN", "JUL", "AUG", "SEP", "OCT", "NOV", "DEC"]
+
+
+def _tokenize(data):
+    """将命令参数拆分为字符串 / 括号列表（嵌套列表表示括号）"""
+    stack = [[]]
+    for quoted, open_paren, close_paren, atom in _TOKEN_PATTERN.findall(data):
+        if open_paren:
+            stack.append([])
+        elif close_paren:
+            if len(stack) > 1:
+                group = stack.pop()
+                stack[-1].append(group)
+        elif atom:
+            stack[-1].append(atom.decode("utf-8", errors="replace"))
+        else:
+            stack[-1].append(re.sub(r'\\(.)', r'\1', quoted.decode("utf-8", errors="replace")))
+    while len(stack) > 1:
+        group = stack.pop()
+        stack[-1].append(group)
+    return stack[0]
+
+
+def _parse_uid_set(text, all_uids):
+    """解析 UID 集合（例如 "1,3:5,9:*"）"""
+    max_uid = max(all_uids) if all_uids else 0
+    result = set()
+    for part in text.split(","):
+        if ":" in part:
+            start, end = part.split(":", 1)
+            start = max_uid if start == "*" else int(start)
+            end = max_uid if end == "*" else int(end)
+            if start > end:
+                start, end = end, start
+            result.update(uid for uid in all_uids if start <= uid <= end)
+        elif part == "*":
+            if max_uid:
+                result.add(max_uid)
+        elif part.isdigit():
+            if int(part) in all_uids:
+                result.add(int(part))
+    return sorted(result)
+
+
+def build_raw_email(subject, body, attachments, sender="billing@example.com", date=None):
+    """
+    组装一封带 PDF 附件的原始邮件
+
+    参数:
+        subject (str): 邮件标题
+        body (str): 邮件正文
+        attachments (list): [(文件名, PDF 字节), ...]
+        sender (str): 发件人
+        date (datetime, optional): 发送时间，默认当前时间
+
+    返回:
+        bytes: RFC 822 邮件字节（CRLF 换行）
+    """
+    message = EmailMessage()
+    message["From"] = sender
+    message["To"] = "invoice@example.com"
+    message["Subject"] = subject
+    message["Date"] = format_datetime((date or datetime.now()).astimezone())
+    message.set_content(body)
+    for filename, payload in attachments:
+        message.add_attachment(payload, maintype="application", subtype="pdf", filename=filename)
+    return message.as_bytes(policy=policy.SMTP)
+
+
+def seed_messages(shipments, sender_domain="example.com"):
+    """
+    将 synthetic_pdfs.generate_shipment() 生成的货物组装为邮件（每票一封，含发票 + 提单）
+
+    返回:
+        list: 原始邮件字节列表
+    """
+    messages = []
+    now = datetime.now()
+    for index, shipment in enumerate(shipments):
+        fields = shipment["fields"]
+        supplier = "SRTS " if shipment["layout"] == "SRTS" else ""
+        subject = f"{supplier}Invoice {fields['InvoiceNo']} ORDER NO {fields['OriginalFileNo'].replace('-', '')}"
+        body = f"Dear customer,\n\nPlease find attached invoice.\nBooking No: BK{index:07d}\n\nRegards"
+        messages.append(build_raw_email(
+            subject, body,
+            [(f"{fields['InvoiceNo']}.pdf", shipment["invoice_pdf"]),
+             (f"HBL {fields['HBL']}.pdf", shipment["bl_pdf"])],
+            sender=f"billing@{sender_domain}",
+            date=now - timedelta(minutes=len(shipments) - index),
+        ))
+    return messages
+
+
+def _quote(value):
+    return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def _bodystructure(part):
+    """生成简化的 BODYSTRUCTURE（类型、参数、编码、大小和附件文件名）"""
+    if part.is_multipart():
+        children = "".join(_bodystructure(child) for child in part.iter_parts())
+        return f"({children} {_quote(part.get_content_subtype())})"
+    params = " ".join(f"{_quote(key)} {_quote(value)}" for key, value in part.get_params()[1:]) \
+        if part.get_params() else ""
+    filename = part.get_filename()
+    disposition = f"({_quote('attachment')} ({_quote('filename')} {_quote(filename)}))" if filename else "NIL"
+    size = len(part.get_payload(decode=False) or "")
+    encoding = part.get("Content-Transfer-Encoding", "7bit")
+    return (f"({_quote(part.get_content_maintype())} {_quote(part.get_content_subtype())} "
+            f"({params or 'NIL'}) NIL NIL {_quote(encoding)} {size} NIL {disposition} NIL)")
+
+
+class _Message:
+    """服务器中保存的一封邮件"""
+
+    def __init__(self, uid, raw, flags=None):
+        self.uid = uid
+        self.raw = raw
+        self.flags = set(flags or [])
+        self.headers = message_from_bytes(raw.split(b"\r\n\r\n", 1)[0] + b"\r\n\r\n")
+
+    def header(self, name):
+        return str(make_header(decode_header(str(self.headers.get(name, "")))))
+
+    def bodystructure(self):
+        return _bodystructure(message_from_bytes(self.raw, policy=policy.default))
+
+    def date(self):
+        try:
+            return parsedate_to_datetime(self.header("Date")).date()
+        except (TypeError, ValueError):
+            return None
+
+
+class MailStore:
+    """
+    邮件存储（按文件夹保存，线程安全）
+
+    参数:
+        messages (list): INBOX 中的原始邮件字节列表（全部为未读）
+    """
+
+    def __init__(self, messages=None):
+        self.folders = {DEFAULT_FOLDER: {}}
+        self.next_uid = 1
+        self.lock = threading.Lock()
+        for raw in messages or []:
+            self.add(raw)
+
+    def add(self, raw, folder=DEFAULT_FOLDER, flags=None):
+        """添加一封邮件，返回 UID"""
+        with self.lock:
+            uid = self.next_uid
+            self.next_uid += 1
+            self.folders.setdefault(folder, {})[uid] = _Message(uid, raw, flags)
+            return uid
+
+    def unseen_count(self, folder=DEFAULT_FOLDER):
+        with self.lock:
+            return sum(1 for msg in self.folders.get(folder, {}).values() if "\\Seen" not in msg.flags)
+
+
+def _match(message, criteria):
+    """
+    计算搜索条件（支持 ALL / SEEN / UNSEEN / FROM / SUBJECT / SINCE / BEFORE / NOT / OR / 括号）
+
+    参数:
+        message (_Message): 邮件
+        criteria (list): _tokenize() 的结果
+
+    返回:
+        bool: 是否匹配（不支持的条件视为匹配）
+    """
+    tokens = list(criteria)
+
+    def _next():
+        token = tokens.pop(0)
+        if isinstance(token, list):
+            return _match(message, token)
+        key = token.upper()
+        if key == "NOT":
+            return not _next()
+        if key == "OR":
+            left = _next()
+            right = _next()
+            return left or right
+        if key == "SEEN":
+            return "\\Seen" in message.flags
+        if key == "UNSEEN":
+            return "\\Seen" not in message.flags
+        if key in ("FROM", "SUBJECT", "TO"):
+            value = tokens.pop(0)
+            return value.lower() in message.header(key.capitalize()).lower()
+        if key in ("SINCE", "BEFORE", "ON"):
+            value = tokens.pop(0)
+            day, month, year = value.split("-")
+            target = time.strptime(f"{day}-{_IMAP_MONTHS.index(month.upper()) + 1}-{year}", "%d-%m-%Y")
+            message_date = message.date()
+            if message_date is None:
+                return True
+            target_tuple = (target.tm_year, target.tm_mon, target.tm_mday)
+            current = (message_date.year, message_date.month, message_date.day)
+            if key == "SINCE":
+                return current >= target_tuple
+            if key == "BEFORE":
+                return current < target_tuple
+            return current == target_tuple
+        return True
+
+    result = True
+    while tokens:
+        result = _next() and result
+    return result
+
+
+class _IMAPHandler(socketserver.StreamRequestHandler):
+    """单个客户端连接"""
+
+    def setup(self):
+        super().setup()
+        self.folder = None
+
+    def _send(self, data):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self.wfile.write(data)
+        self.wfile.flush()
+
+    def handle(self):
+        self._send("* OK FakeIMAP ready\r\n")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            line = line.rstrip(b"\r\n")
+            if not line:
+                continue
+            parts = line.split(b" ", 2)
+            tag = parts[0].decode()
+            command = parts[1].decode().upper() if len(parts) > 1 else ""
+            args = parts[2] if len(parts) > 2 else b""
+            if command != "UID":
+                self.server.record_command(command)
+            # 每条命令模拟一次网络往返
+            self.server.simulate_latency()
+            try:
+                if not self.dispatch(tag, command, args):
+                    return
+            except Exception as e:
+                self._send(f"{tag} BAD {e}\r\n")
+
+    def dispatch(self, tag, command, args):
+        """处理一条命令，返回 False 时关闭连接"""
+        store = self.server.store
+        if command == "CAPABILITY":
+            self._send(f"* CAPABILITY {self.server.capabilities}\r\n{tag} OK CAPABILITY completed\r\n")
+        elif command == "LOGIN":
+            self._send(f"{tag} OK LOGIN completed\r\n")
+        elif command in ("SELECT", "EXAMINE"):
+            folder = _tokenize(args)[0]
+            if folder not in store.folders:
+                self._send(f"{tag} NO Mailbox does not exist\r\n")
+                return True
+            self.folder = folder
+            count = len(store.folders[folder])
+            self._send(f"* {count} EXISTS\r\n* 0 RECENT\r\n* FLAGS (\\Seen \\Deleted)\r\n"
+                       f"* OK [UIDNEXT {store.next_uid}]\r\n{tag} OK [READ-WRITE] {command} completed\r\n")
+        elif command == "CREATE":
+            folder = _tokenize(args)[0]
+            with store.lock:
+                store.folders.setdefault(folder, {})
+            self._send(f"{tag} OK CREATE completed\r\n")
+        elif command == "UNSELECT":
+            self.folder = None
+            self._send(f"{tag} OK UNSELECT completed\r\n")
+        elif command == "NOOP":
+            self._send(f"{tag} OK NOOP completed\r\n")
+        elif command == "IDLE":
+            return self._idle(tag)
+        elif command == "LOGOUT":
+            self._send(f"* BYE logging out\r\n{tag} OK LOGOUT completed\r\n")
+            return False
+        elif command == "UID":
+            sub_parts = args.split(b" ", 1)
+            sub_command = sub_parts[0].decode().upper()
+            sub_args = sub_parts[1] if len(sub_parts) > 1 else b""
+            self.server.record_command(f"UID {sub_command}")
+            handler = getattr(self, f"_uid_{sub_command.lower()}", None)
+            if handler is None or self.folder is None:
+                self._send(f"{tag} BAD unsupported command\r\n")
+            else:
+                handler(tag, sub_args)
+        else:
+            self._send(f"{tag} BAD unsupported command {command}\r\n")
+        return True
+
+    def _idle(self, tag):
+        """IDLE：有新邮件时推送 "* N EXISTS"，收到 DONE 后结束（服务器停止时直接断开连接）"""
+        if self.folder is None:
+            self._send(f"{tag} BAD no mailbox selected\r\n")
+            return True
+        self._send("+ idling\r\n")
+        known = len(self._messages())
+        while not self.server.closing.is_set():
+            readable, _, _ = select.select([self.connection], [], [], IDLE_CHECK_INTERVAL)
+            if readable:
+                line = self.rfile.readline()
+                if not line:
+                    return False
+                if line.strip().upper() == b"DONE":
+                    self._send(f"{tag} OK IDLE terminated\r\n")
+                    return True
+                self._send(f"{tag} BAD expected DONE\r\n")
+                return True
+            with self.server.store.lock:
+                count = len(self._messages())
+            if count > known:
+                self._send(f"* {count} EXISTS\r\n")
+            known = count
+        return False
+
+    def _messages(self):
+        return self.server.store.folders.get(self.folder, {})
+
+    def _uid_search(self, tag, args):
+        tokens = _tokenize(args)
+        if tokens and str(tokens[0]).upper() == "CHARSET":
+            tokens = tokens[2:]
+        with self.server.store.lock:
+            uids = [uid for uid, msg in sorted(self._messages().items()) if _match(msg, tokens)]
+        self._send(f"* SEARCH {' '.join(str(uid) for uid in uids)}".rstrip() + f"\r\n{tag} OK SEARCH completed\r\n")
+
+    def _uid_fetch(self, tag, args):
+        uid_text, _, items = args.partition(b" ")
+        items = items.decode().upper()
+        with self.server.store.lock:
+            messages = self._messages()
+            all_uids = sorted(messages)
+            uids = _parse_uid_set(uid_text.decode(), set(all_uids))
+            for uid in uids:
+                msg = messages[uid]
+                seq = all_uids.index(uid) + 1
+                if "BODY[]" in items and ".PEEK" not in items:
+                    msg.flags.add("\\Seen")
+                fields = [f"UID {uid}", f"FLAGS ({' '.join(sorted(msg.flags))})", f"RFC822.SIZE {len(msg.raw)}"]
+                if "BODYSTRUCTURE" in items:
+                    fields.append(f"BODYSTRUCTURE {msg.bodystructure()}")
+                if "BODY.PEEK[HEADER]" in items or "BODY[HEADER]" in items:
+                    body = msg.raw.split(b"\r\n\r\n", 1)[0] + b"\r\n\r\n"
+                    literal_name = "BODY[HEADER]"
+                elif "BODY[]" in items or "BODY.PEEK[]" in items or "RFC822" in items.replace("RFC822.SIZE", ""):
+                    body = msg.raw
+                    literal_name = "BODY[]"
+                else:
+                    body = None
+                if body is None:
+                    self._send(f"* {seq} FETCH ({' '.join(fields)})\r\n")
+                else:
+                    self.server.bytes_sent += len(body)
+                    self._send(f"* {seq} FETCH ({' '.join(fields)} {literal_name} {{{len(body)}}}\r\n".encode() +
+                               body + b")\r\n")
+        self._send(f"{tag} OK FETCH completed\r\n")
+
+    def _transfer(self, tag, args, command, remove):
+        """UID COPY / UID MOVE：复制到目标文件夹（分配新 UID），MOVE 同时从当前文件夹删除"""
+        uid_text, _, target = args.partition(b" ")
+        target = _tokenize(target)[0]
+        store = self.server.store
+        with store.lock:
+            if target not in store.folders:
+                self._send(f"{tag} NO [TRYCREATE] Mailbox does not exist\r\n")
+                return
+            messages = self._messages()
+            for uid in _parse_uid_set(uid_text.decode(), set(messages)):
+                msg = messages.pop(uid) if remove else messages[uid]
+                new_uid = store.next_uid
+                store.next_uid += 1
+                store.folders[target][new_uid] = _Message(new_uid, msg.raw, msg.flags - {"\\Deleted"})
+        self._send(f"{tag} OK {command} completed\r\n")
+
+    def _uid_copy(self, tag, args):
+        self._transfer(tag, args, "COPY", remove=False)
+
+    def _uid_move(self, tag, args):
+        if "MOVE" not in self.server.capabilities.split():
+            self._send(f"{tag} BAD unsupported command\r\n")
+            return
+        self._transfer(tag, args, "MOVE", remove=True)
+
+    def _uid_expunge(self, tag, args):
+        with self.server.store.lock:
+            messages = self._messages()
+            for uid in _parse_uid_set(args.decode(), set(messages)):
+                if "\\Deleted" in messages[uid].flags:
+                    del messages[uid]
+        self._send(f"{tag} OK EXPUNGE completed\r\n")
+
+    def _uid_store(self, tag, args):
+        uid_text, mode, flags = args.decode().split(" ", 2)
+        flag_set = set(flags.strip("()").split())
+        with self.server.store.lock:
+            messages = self._messages()
+            for uid in _parse_uid_set(uid_text, set(messages)):
+                if mode.upper().startswith("+"):
+                    messages[uid].flags |= flag_set
+                elif mode.upper().startswith("-"):
+                    messages[uid].flags -= flag_set
+                else:
+                    messages[uid].flags = set(flag_set)
+        self._send(f"{tag} OK STORE completed\r\n")
+
+
+class FakeIMAPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    """
+    本地 IMAP 服务器（在后台线程中运行）
+
+    参数:
+        messages (list): INBOX 中的原始邮件字节列表
+        latency (float): 每次响应前的延迟（秒），模拟网络往返时间
+        capabilities (str): CAPABILITY 响应（例如去掉 MOVE 以测试不支持 MOVE 的服务器）
+        host (str): 监听地址
+        port (int): 监听端口（0 表示自动分配）
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, messages=None, latency=0.0, host="127.0.0.1", port=0, capabilities=CAPABILITIES):
+        super().__init__((host, port), _IMAPHandler)
+        self.store = MailStore(messages)
+        self.latency = latency
+        self.capabilities = capabilities
+        self.command_counts = {}
+        self.bytes_sent = 0
+        self._counts_lock = threading.Lock()
+        self._thread = None
+        self.closing = threading.Event()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def simulate_latency(self):
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+    def record_command(self, command):
+        with self._counts_lock:
+            self.command_counts[command] = self.command_counts.get(command, 0) + 1
+
+    def start(self):
+        """在后台线程中开始监听"""
+        self._thread = threading.Thread(target=self.serve_forever, name="fake-imap", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """停止监听（同时断开正在 IDLE 的连接）"""
+        self.closing.set()
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
@@ -0,0 +1,446 @@
+"""
+离线端到端基准测试
+使用合成 PDF、本地 IMAP 服务器和本地 AI 接口桩运行完整流程（pipeline.run_pipeline），
+不连接真实邮箱、不产生 API 费用
+
+用法（在项目根目录运行）:
+    python -m benchmarks.run_benchmark --emails 50
+    python -m benchmarks.run_benchmark --emails 200 --llm-latency 2.0 --llm-error-rate 0.05
+    python -m benchmarks.run_benchmark --save-baseline v1         # 保存为基线
+    python -m benchmarks.run_benchmark --compare v1               # 与基线对比
+    python -m benchmarks.run_benchmark --replay fixtures/day1     # 回放录制的真实数据
+
+输出:
+    - 各阶段耗时（调用次数、累计、平均、最大）、总耗时、吞吐量、峰值内存
+    - benchmarks/results/<时间>.json（每次运行的完整结果）
+    - benchmarks/baselines/<名称>.json（--save-baseline 时）
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import contextlib
+from datetime import datetime
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(BENCHMARK_DIR)
+if PROJECT_DIR not in sys.path:
+    sys.path.insert(0, PROJECT_DIR)
+
+import config_loader
+import metrics
+import record_replay
+from benchmarks.synthetic_pdfs import generate_shipment
+from benchmarks.fake_imap import FakeIMAPServer, seed_messages
+from benchmarks.stub_llm import StubLLMServer
+
+# ================= 配置常量 =================
+RESULTS_DIR = os.path.join(BENCHMARK_DIR, "results")
+BASELINES_DIR = os.path.join(BENCHMARK_DIR, "baselines")
+
+STAGES = ["download", "classify", "extract", "archive", "report"]
+
+# 对比基线时，变化超过此比例的指标标记为回退/提升
+REGRESSION_THRESHOLD = 0.10
+# ===========================================
+
+
+class StageTimer:
+    """
+    记录各阶段的调用次数和耗时（线程安全）
+
+    通过包装 pipeline / EmailHandler 中的阶段函数计时，不修改流程本身
+    """
+
+    def __init__(self):
+        self.stats = {}
+        self.first_report_at = None
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds):
+        with self._lock:
+            stat = self.stats.setdefault(stage, {"calls": 0, "total": 0.0, "max": 0.0})
+            stat["calls"] += 1
+            stat["total"] += seconds
+            stat["max"] = max(stat["max"], seconds)
+
+    def wrap(self, stage, func):
+        """包装普通函数"""
+        def _timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.add(stage, time.perf_counter() - start)
+        return _timed
+
+    def wrap_generator(self, stage, func):
+        """包装生成器函数（只统计生成器内部的耗时，不包括调用方处理每个元素的时间）"""
+        def _timed(*args, **kwargs):
+            iterator = func(*args, **kwargs)
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    self.add(stage, time.perf_counter() - start)
+                    return
+                self.add(stage, time.perf_counter() - start)
+                yield item
+        return _timed
+
+    def summary(self):
+        """返回各阶段统计（秒，保留 4 位小数）"""
+        with self._lock:
+            return {
+                stage: {
+                    "calls": stat["calls"],
+                    "total": round(stat["total"], 4),
+                    "mean": round(stat["total"] / stat["calls"], 4) if stat["calls"] else 0.0,
+                    "max": round(stat["max"], 4),
+                }
+                for stage, stat in self.stats.items()
+            }
+
+
+@contextlib.contextmanager
+def instrument_pipeline(timer, start_time):
+    """
+    在 with 块内为流程各阶段计时，退出时恢复原函数
+
+    参数:
+        timer (StageTimer): 计时器
+        start_time (float): 运行开始时间（time.perf_counter），用于计算第一批数据写入 info.xlsx 的时间
+    """
+    import pipeline
+    import EmailHandler
+
+    originals = [
+        (EmailHandler, "iter_downloaded_emails"),
+        (EmailHandler, "classify_email_attachments"),
+        (pipeline, "extract_email_invoices"),
+        (pipeline, "archive_email"),
+        (pipeline, "write_info_excel"),
+    ]
+    saved = [(module, name, getattr(module, name)) for module, name in originals]
+
+    write_info_excel = timer.wrap("report", pipeline.write_info_excel)
+
+    def _write_info_excel(*args, **kwargs):
+        if timer.first_report_at is None:
+            timer.first_report_at = time.perf_counter() - start_time
+        return write_info_excel(*args, **kwargs)
+
+    EmailHandler.iter_downloaded_emails = timer.wrap_generator("download", EmailHandler.iter_downloaded_emails)
+    EmailHandler.classify_email_attachments = timer.wrap("classify", EmailHandler.classify_email_attachments)
+    pipeline.extract_email_invoices = timer.wrap("extract", pipeline.extract_email_invoices)
+    pipeline.archive_email = timer.wrap("archive", pipeline.archive_email)
+    pipeline.write_info_excel = _write_info_excel
+    try:
+        yield
+    finally:
+        for module, name, func in saved:
+            setattr(module, name, func)
+
+
+def peak_rss_mb():
+    """
+    当前进程的峰值常驻内存（MB）
+
+    Linux/macOS 使用 resource 模块；Windows 需要安装 psutil，否则返回 None
+    """
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS 单位为字节，Linux 为 KB
+        return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+    except ImportError:
+        pass
+    try:
+        import psutil
+        memory = psutil.Process().memory_info()
+        return round(getattr(memory, "peak_wset", memory.rss) / (1024 * 1024), 1)
+    except ImportError:
+        return None
+
+
+def write_benchmark_config(work_dir, imap_port, api_url):
+    """在工作目录中生成指向本地服务器的 config.ini，返回文件路径"""
+    config_path = os.path.join(work_dir, "config.ini")
+    with open(config_path, "w", encoding="utf-8") as f:
+        f.write("[EMAIL]\n")
+        f.write("mail_user = benchmark@example.com\n")
+        f.write("mail_pass = benchmark\n")
+        f.write("imap_host = 127.0.0.1\n")
+        f.write(f"imap_port = {imap_port}\n")
+        f.write("imap_ssl = false\n\n")
+        f.write("[API]\n")
+        f.write("api_key = benchmark\n")
+        f.write(f"api_url = {api_url}\n")
+    return config_path
+
+
+def run_benchmark(args):
+    """
+    执行一次基准测试
+
+    参数:
+        args (argparse.Namespace): 命令行参数
+
+    返回:
+        dict: 基准测试结果
+    """
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="invoiceauto_bench_")
+    os.makedirs(work_dir, exist_ok=True)
+
+    if args.replay:
+        # 回放录制的真实数据：不启动本地服务器，邮件和 AI 响应由 record_replay 提供
+        fixture_imap_dir = os.path.join(args.replay, record_replay.IMAP_DIR)
+        print(f"回放录制数据: {args.replay}（速度 x{args.replay_speed}）")
+        expected_rows = None
+        total_pages = None
+        corpus_bytes = sum(os.path.getsize(os.path.join(fixture_imap_dir, name))
+                           for name in os.listdir(fixture_imap_dir)
+                           if name.endswith(".eml")) if os.path.isdir(fixture_imap_dir) else 0
+        imap_server = None
+        llm_server = None
+        replay = {"mode": record_replay.MODE_REPLAY, "fixture_dir": args.replay, "speed": args.replay_speed}
+        config_path = write_benchmark_config(work_dir, 993, config_loader.DEFAULT_API_URL)
+    else:
+        print(f"生成合成数据：{args.emails} 封邮件，发票 {args.min_pages}-{args.max_pages} 页 ...")
+        shipments = [generate_shipment(i, seed=args.seed, min_pages=args.min_pages, max_pages=args.max_pages)
+                     for i in range(args.emails)]
+        messages = seed_messages(shipments)
+        expected_rows = sum(len(shipment["charges"]) for shipment in shipments)
+        total_pages = sum(shipment["pages"] for shipment in shipments)
+        corpus_bytes = sum(len(message) for message in messages)
+        del shipments
+
+        imap_server = FakeIMAPServer(messages, latency=args.imap_latency).start()
+        llm_server = StubLLMServer(latency=args.llm_latency, jitter=args.llm_jitter,
+                                   error_rate=args.llm_error_rate, seed=args.seed).start()
+        replay = {"mode": record_replay.MODE_OFF}
+        config_path = write_benchmark_config(work_dir, imap_server.port, llm_server.url)
+
+    old_config_env = os.environ.get(config_loader.CONFIG_PATH_ENV)
+    os.environ[config_loader.CONFIG_PATH_ENV] = config_path
+
+    import pipeline
+
+    stage_workers = {}
+    if args.classify_workers:
+        stage_workers["classify"] = args.classify_workers
+    if args.extract_workers:
+        stage_workers["extract"] = args.extract_workers
+
+    timer = StageTimer()
+    log_path = os.path.join(work_dir, "pipeline.log")
+    print(f"运行流程（日志: {log_path}）...")
+    try:
+        start = time.perf_counter()
+        with open(log_path, "w", encoding="utf-8") as log_file, contextlib.redirect_stdout(log_file), \
+                instrument_pipeline(timer, start):
+            result = pipeline.run_pipeline(os.path.join(work_dir, "output"), stage_workers=stage_workers,
+                                           replay=replay)
+        wall_time = time.perf_counter() - start
+    finally:
+        record_replay.activate(record_replay.MODE_OFF)
+        if imap_server is not None:
+            imap_server.stop()
+        if llm_server is not None:
+            llm_server.stop()
+        if old_config_env is None:
+            os.environ.pop(config_loader.CONFIG_PATH_ENV, None)
+        else:
+            os.environ[config_loader.CONFIG_PATH_ENV] = old_config_env
+
+    invoices = result["email_count"]
+    benchmark = {
+        "name": args.save_baseline or "",
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "params": {
+            "emails": args.emails,
+            "min_pages": args.min_pages,
+            "max_pages": args.max_pages,
+            "seed": args.seed,
+            "imap_latency": args.imap_latency,
+            "llm_latency": args.llm_latency,
+            "llm_jitter": args.llm_jitter,
+            "llm_error_rate": args.llm_error_rate,
+            "replay": args.replay or "",
+            "replay_speed": args.replay_speed,
+            "stage_workers": stage_workers,
+        },
+        "wall_time": round(wall_time, 4),
+        "time_to_first_rows": round(timer.first_report_at, 4) if timer.first_report_at is not None else None,
+        "stages": timer.summary(),
+        "throughput": {
+            "emails_per_sec": round(invoices / wall_time, 3) if wall_time else 0.0,
+            "invoices_per_min": round(invoices * 60 / wall_time, 2) if wall_time else 0.0,
+            "pages_per_sec": round(total_pages / wall_time, 2) if wall_time and total_pages else 0.0,
+            "mb_per_sec": round(corpus_bytes / (1024 * 1024) / wall_time, 3) if wall_time else 0.0,
+        },
+        "peak_rss_mb": peak_rss_mb(),
+        "llm": llm_server.stats() if llm_server is not None else {},
+        "imap": {"commands": dict(imap_server.command_counts), "bytes_sent": imap_server.bytes_sent}
+                if imap_server is not None else {},
+        # 流程内部各环节的详细耗时和计数（与运行目录中的 run_metrics.json 相同）
+        "metrics": metrics.summary(),
+        "result": {
+            "status": result["status"],
+            "email_count": result["email_count"],
+            "extract_count": result["extract_count"],
+            "expected_rows": expected_rows,
+            "error": result["error"],
+        },
+    }
+
+    if not args.keep:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return benchmark
+
+
+def print_report(benchmark):
+    """打印基准测试结果"""
+    print("\n" + "=" * 60)
+    print("基准测试结果")
+    print("=" * 60)
+    result = benchmark["result"]
+    expected = result['expected_rows'] if result['expected_rows'] is not None else "?"
+    print(f"状态: {result['status']}  邮件: {result['email_count']}  "
+          f"费用行: {result['extract_count']}/{expected}")
+    print(f"总耗时: {benchmark['wall_time']:.2f} 秒")
+    if benchmark["time_to_first_rows"] is not None:
+        print(f"首批数据写入 info.xlsx: {benchmark['time_to_first_rows']:.2f} 秒")
+    print(f"\n{'阶段':<10}{'次数':>8}{'累计(秒)':>12}{'平均(秒)':>12}{'最大(秒)':>12}")
+    for stage in STAGES:
+        stat = benchmark["stages"].get(stage)
+        if stat:
+            print(f"{stage:<10}{stat['calls']:>8}{stat['total']:>12.3f}{stat['mean']:>12.4f}{stat['max']:>12.4f}")
+    throughput = benchmark["throughput"]
+    print(f"\n吞吐量: {throughput['emails_per_sec']} 封/秒，{throughput['invoices_per_min']} 张发票/分钟，"
+          f"{throughput['pages_per_sec']} 页/秒")
+    rss = benchmark["peak_rss_mb"]
+    print(f"峰值内存: {rss if rss is not None else '未知（需要 psutil）'} MB")
+    llm = benchmark["llm"]
+    if not llm:
+        return
+    print(f"AI 接口: {llm['requests']} 次请求，{llm['errors']} 次错误，"
+          f"{llm['prompt_tokens'] + llm['completion_tokens']} tokens（估算）")
+
+
+def _flatten_metrics(benchmark):
+    """提取用于对比的指标：{指标名: (值, 越小越好)}"""
+    metrics = {"wall_time": (benchmark["wall_time"], True)}
+    if benchmark.get("time_to_first_rows") is not None:
+        metrics["time_to_first_rows"] = (benchmark["time_to_first_rows"], True)
+    for stage, stat in benchmark["stages"].items():
+        metrics[f"stage.{stage}.total"] = (stat["total"], True)
+    for key, value in benchmark["throughput"].items():
+        metrics[f"throughput.{key}"] = (value, False)
+    if benchmark.get("peak_rss_mb") is not None:
+        metrics["peak_rss_mb"] = (benchmark["peak_rss_mb"], True)
+    return metrics
+
+
+def compare_with_baseline(benchmark, baseline):
+    """
+    打印与基线的对比
+
+    返回:
+        list: 回退的指标名称列表
+    """
+    print("\n" + "=" * 60)
+    print(f"与基线对比: {baseline.get('name') or '(未命名)'}（{baseline.get('timestamp', '')}）")
+    print("=" * 60)
+    if baseline.get("params") != benchmark["params"]:
+        print("⚠ 警告：基线的测试参数与本次不同，对比结果仅供参考")
+
+    current = _flatten_metrics(benchmark)
+    previous = _flatten_metrics(baseline)
+    regressions = []
+    print(f"{'指标':<32}{'基线':>12}{'本次':>12}{'变化':>10}")
+    for name, (value, lower_is_better) in current.items():
+        if name not in previous:
+            continue
+        old_value = previous[name][0]
+        change = (value - old_value) / old_value if old_value else 0.0
+        worse = change > REGRESSION_THRESHOLD if lower_is_better else change < -REGRESSION_THRESHOLD
+        better = change < -REGRESSION_THRESHOLD if lower_is_better else change > REGRESSION_THRESHOLD
+        mark = " ✗" if worse else (" ✓" if better else "")
+        print(f"{name:<32}{old_value:>12.3f}{value:>12.3f}{change:>+9.1%}{mark}")
+        if worse:
+            regressions.append(name)
+    return regressions
+
+
+def save_json(data, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    print(f"✓ 已保存: {path}")
+
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="InvoiceAuto 离线端到端基准测试")
+    parser.add_argument("--emails", type=int, default=20, help="邮件数量（每封 1 张发票 + 1 张提单），默认 20")
+    parser.add_argument("--min-pages", type=int, default=1, help="发票最少页数，默认 1")
+    parser.add_argument("--max-pages", type=int, default=20, help="发票最多页数，默认 20")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子（相同种子生成相同数据），默认 0")
+    parser.add_argument("--imap-latency", type=float, default=0.0, help="IMAP 每条命令的延迟（秒）")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="AI 接口平均延迟（秒），默认 0.5")
+    parser.add_argument("--llm-jitter", type=float, default=0.0, help="AI 接口延迟波动（秒）")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="AI 接口返回 500 的概率（0~1）")
+    parser.add_argument("--classify-workers", type=int, default=None, help="分类阶段线程数")
+    parser.add_argument("--extract-workers", type=int, default=None, help="提取阶段线程数")
+    parser.add_argument("--replay", metavar="DIR", default=None,
+                        help="回放 main.py --record 录制的真实数据（代替合成数据和本地服务器）")
+    parser.add_argument("--replay-speed", type=float, default=0.0,
+                        help="回放速度倍数：0 = 不等待（默认），1 = 按录制时的耗时")
+    parser.add_argument("--work-dir", default=None, help="工作目录（默认使用临时目录）")
+    parser.add_argument("--keep", action="store_true", help="保留工作目录（输出文件和流程日志）")
+    parser.add_argument("--save-baseline", metavar="NAME", default=None,
+                        help="将结果保存为基线 benchmarks/baselines/NAME.json")
+    parser.add_argument("--compare", metavar="NAME", default=None,
+                        help="与基线 benchmarks/baselines/NAME.json 对比，有回退时退出码为 1")
+    args = parser.parse_args(argv)
+    if args.emails <= 0:
+        parser.error("--emails 必须大于 0")
+    if not 1 <= args.min_pages <= args.max_pages:
+        parser.error("页数范围无效：需要 1 <= --min-pages <= --max-pages")
+    if not 0.0 <= args.llm_error_rate <= 1.0:
+        parser.error("--llm-error-rate 必须在 0~1 之间")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    baseline = None
+    if args.compare:
+        baseline_path = os.path.join(BASELINES_DIR, f"{args.compare}.json")
+        if not os.path.exists(baseline_path):
+            print(f"✗ 基线不存在: {baseline_path}")
+            return 2
+        with open(baseline_path, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    benchmark = run_benchmark(args)
+    print_report(benchmark)
+
+    save_json(benchmark, os.path.join(RESULTS_DIR, datetime.now().strftime("%Y%m%d_%H%M%S") + ".json"))
+    if args.save_baseline:
+        save_json(benchmark, os.path.join(BASELINES_DIR, f"{args.save_baseline}.json"))
+
+    if baseline is not None and compare_with_baseline(benchmark, baseline):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+"""
+GUI 启动耗时检查
+在全新的 Python 进程中导入 gui_app（可选：创建窗口并等到窗口显示），
+统计耗时，并检查 pandas / pdfplumber 等重型依赖没有在启动时被导入
+
+用法（在项目根目录运行）:
+    python -m benchmarks.startup_time                  # 只测导入耗时（不需要显示器）
+    python -m benchmarks.startup_time --window         # 测到窗口显示为止（需要显示器）
+    python -m benchmarks.startup_time --runs 5 --target 1.0
+
+退出码:
+    0 - 中位耗时低于目标且没有导入重型依赖
+    1 - 超过目标或启动时导入了重型依赖
+"""
+
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(BENCHMARK_DIR)
+if PROJECT_DIR not in sys.path:
+    sys.path.insert(0, PROJECT_DIR)
+
+import config_loader
+from benchmarks.run_benchmark import write_benchmark_config
+
+# ================= 配置常量 =================
+# 启动时不应导入的模块（应在首次使用或后台预加载时导入）
+HEAVY_MODULES = ["pandas", "pdfplumber", "imap_tools", "requests", "openpyxl"]
+DEFAULT_RUNS = 3
+# ===========================================
+
+# 在子进程中执行的测量代码：输出一行 JSON
+_PROBE = """
+import sys, time, json
+start = time.perf_counter()
+import gui_app
+imported = time.perf_counter() - start
+heavy = [name for name in {heavy!r} if name in sys.modules]
+window = None
+if {window}:
+    import tkinter as tk
+    root = tk.Tk()
+    app = gui_app.InvoiceAutoGUI(root)
+    root.update()
+    window = app.startup_seconds if app.startup_seconds is not None else time.perf_counter() - start
+    root.destroy()
+print(json.dumps({{"import": imported, "window": window, "target": gui_app.STARTUP_TARGET_SECONDS,
+                  "heavy": heavy}}))
+"""
+
+
+def measure_once(window=False, env=None):
+    """
+    在新进程中测量一次
+
+    返回:
+        dict: {"import": 导入耗时, "window": 到窗口显示的耗时（未测量时为 None），
+               "target": gui_app.STARTUP_TARGET_SECONDS, "heavy": 已导入的重型模块}
+    """
+    code = _PROBE.format(window=bool(window), heavy=HEAVY_MODULES)
+    completed = subprocess.run([sys.executable, "-c", code], cwd=PROJECT_DIR, env=env,
+                               capture_output=True, text=True, encoding="utf-8")
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip() or f"子进程退出码 {completed.returncode}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="InvoiceAuto GUI 启动耗时检查")
+    parser.add_argument("--runs", type=int, default=DEFAULT_RUNS, help=f"测量次数（取中位数），默认 {DEFAULT_RUNS}")
+    parser.add_argument("--window", action="store_true", help="测量到窗口显示为止（需要显示器）")
+    parser.add_argument("--target", type=float, default=None,
+                        help="目标耗时（秒），默认使用 gui_app.STARTUP_TARGET_SECONDS")
+    args = parser.parse_args(argv)
+    if args.runs <= 0:
+        parser.error("--runs 必须大于 0")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    # gui_app 导入时会读取配置文件，使用临时配置，不依赖本机的 config.ini
+    work_dir = tempfile.mkdtemp(prefix="invoiceauto_startup_")
+    env = dict(os.environ)
+    env[config_loader.CONFIG_PATH_ENV] = write_benchmark_config(work_dir, 993, config_loader.DEFAULT_API_URL)
+
+    samples = []
+    try:
+        for index in range(args.runs):
+            try:
+                sample = measure_once(args.window, env)
+            except RuntimeError as e:
+                print(f"✗ 第 {index + 1} 次测量失败: {e}")
+                return 1
+            samples.append(sample)
+            window = f"，窗口显示 {sample['window']:.3f} 秒" if sample["window"] is not None else ""
+            print(f"  第 {index + 1} 次: 导入 {sample['import']:.3f} 秒{window}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    key = "window" if args.window else "import"
+    median = statistics.median(sample[key] for sample in samples)
+    target = args.target if args.target is not None else samples[0]["target"]
+    heavy = sorted({name for sample in samples for name in sample["heavy"]})
+
+    failed = False
+    label = "到窗口显示" if args.window else "导入 gui_app"
+    if median > target:
+        print(f"✗ {label}耗时中位数 {median:.3f} 秒，超过目标 {target:.2f} 秒")
+        failed = True
+    else:
+        print(f"✓ {label}耗时中位数 {median:.3f} 秒（目标 {target:.2f} 秒）")
+    if heavy:
+        print(f"✗ 启动时导入了重型依赖: {', '.join(heavy)}（应改为首次使用时导入）")
+        failed = True
+    else:
+        print("✓ 启动时未导入重型依赖")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,185 @@
+"""
+本地 chat/completions 接口桩（基准测试用）
+模拟 DeepSeek 接口：按可配置的延迟和错误率返回发票 JSON，不产生 API 费用
+
+返回内容直接从请求中的【单据内容】解析（synthetic_pdfs 生成的文本格式），
+因此提取结果与合成发票一致，可以核对流程输出
+"""
+
+import re
+import json
+import time
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ================= 配置常量 =================
+CONTENT_MARKER = "【单据内容】:"
+CHARS_PER_TOKEN = 4           # 估算 token 数（usage 字段）
+# ===========================================
+
+# 表头字段：(字段名, 正则)，同时兼容 SRTS 格式和通用格式
+_HEADER_PATTERNS = [
+    ("InvoiceNo", r"(?:INVOICE NO|Invoice Number):\s*(\S+)"),
+    ("OriginalFileNo", r"(?:FILE NO\.|Reference No):\s*(\S+)"),
+    ("DATE", r"(?:^DATE|Invoice Date):\s*(\S+)"),
+    ("Carrier", r"(?:Carrier|Shipping Line):\s*(.+?)\s*$"),
+    ("loadingport", r"(?:Loading port|Port of Loading):\s*(.+?)(?:\s{2,}|\s*Port of Discharge|\s*$)"),
+    ("Destination", r"(?:Destination|Port of Discharge):\s*(.+?)\s*$"),
+    ("Vessel_Voyage", r"(?:Vessel / Voyage|Vessel/Voyage):\s*(.+?)\s*$"),
+    ("ETD", r"(?:ETD|Departure Date):\s*(\S+)"),
+    ("ETADate", r"(?:ETA Date|Arrival Date):\s*(\S+)"),
+    ("OBL", r"(?:OBL|Master B/L No):\s*(\S+)"),
+    ("HBL", r"(?:HBL|House B/L):\s*(\S+)"),
+    ("Receipt", r"(?:Receipt|Place of Receipt):\s*(.+?)\s*$"),
+]
+_CHARGE_PATTERN = re.compile(r"^(.+?)\s+(\d+) X USD\s+([\d.]+)/(.+?)\s+([\d.]+)\s*$", re.MULTILINE)
+_SUPPLIER_PATTERN = re.compile(r"^\s*(.+?)\s*$", re.MULTILINE)
+
+
+def parse_document(text):
+    """
+    从合成发票文本中解析出 invoice_extractor 期望的字段列表
+
+    参数:
+        text (str): 【单据内容】部分的文本
+
+    返回:
+        list: 每行费用一个字典
+    """
+    header = {}
+    for key, pattern in _HEADER_PATTERNS:
+        match = re.search(pattern, text, re.MULTILINE)
+        header[key] = match.group(1).strip() if match else None
+    header["DueDate"] = None
+    supplier = _SUPPLIER_PATTERN.search(text)
+    header["SupplierName"] = supplier.group(1) if supplier else None
+
+    rows = []
+    for description, quantity, unit_price, container_type, amount in _CHARGE_PATTERN.findall(text):
+        row = dict(header)
+        row.update({
+            "OCEANFREIGHT": description.strip(),
+            "XUSD": quantity,
+            "USD": amount,
+            "Currency": "USD",
+            "Unit_Price": unit_price,
+            "Container_Type": container_type.strip(),
+        })
+        rows.append(row)
+    return rows or [header]
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """处理 POST /chat/completions"""
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        stub = self.server
+        fail = stub.next_is_error()
+        time.sleep(stub.sample_latency())
+
+        if fail:
+            stub.record(error=True)
+            self._reply(500, {"error": {"message": "stub: injected server error", "type": "server_error"}})
+            return
+
+        prompt = "".join(message.get("content", "") for message in request.get("messages", []))
+        document = prompt.split(CONTENT_MARKER, 1)[-1]
+        content = json.dumps(parse_document(document), ensure_ascii=False)
+        prompt_tokens = len(prompt) // CHARS_PER_TOKEN
+        completion_tokens = len(content) // CHARS_PER_TOKEN
+        stub.record(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+        self._reply(200, {
+            "id": f"stub-{stub.request_count}",
+            "object": "chat.completion",
+            "model": request.get("model", "deepseek-chat"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                         "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        })
+
+
+class StubLLMServer(ThreadingHTTPServer):
+    """
+    chat/completions 接口桩（在后台线程中运行）
+
+    参数:
+        latency (float): 平均响应延迟（秒）
+        jitter (float): 延迟随机波动幅度（秒，均匀分布 ±jitter）
+        error_rate (float): 返回 HTTP 500 的概率（0~1）
+        seed (int): 随机种子（相同种子的错误序列相同）
+        host (str): 监听地址
+        port (int): 监听端口（0 表示自动分配）
+    """
+
+    daemon_threads = True
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, seed=0, host="127.0.0.1", port=0):
+        super().__init__((host, port), _StubHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.request_count = 0
+        self.error_count = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}/chat/completions"
+
+    def next_is_error(self):
+        with self._lock:
+            return self._rng.random() < self.error_rate
+
+    def sample_latency(self):
+        with self._lock:
+            return max(0.0, self.latency + self._rng.uniform(-self.jitter, self.jitter))
+
+    def record(self, error=False, prompt_tokens=0, completion_tokens=0):
+        with self._lock:
+            self.request_count += 1
+            if error:
+                self.error_count += 1
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+
+    def stats(self):
+        """返回请求统计"""
+        with self._lock:
+            return {
+                "requests": self.request_count,
+                "errors": self.error_count,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+            }
+
+    def start(self):
+        """在后台线程中开始监听"""
+        self._thread = threading.Thread(target=self.serve_forever, name="stub-llm", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """停止监听"""
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
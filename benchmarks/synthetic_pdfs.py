@@ -0,0 +1,277 @@
+"""
+合成 PDF 生成模块（基准测试用）
+生成 SRTS 格式 / 通用格式的发票和提单 PDF，不依赖第三方 PDF 库
+
+生成的 PDF 只包含 Helvetica 文本，pdfplumber 可以正常提取文字，
+PDFClassifier 能按关键词识别为 INVOICE / BL
+"""
+
+import random
+
+# ================= 配置常量 =================
+PAGE_WIDTH = 595           # A4 宽度（pt）
+PAGE_HEIGHT = 842          # A4 高度（pt）
+FONT_SIZE = 10
+LINE_HEIGHT = 14
+LINES_PER_PAGE = 55
+
+LAYOUT_SRTS = "SRTS"
+LAYOUT_GENERIC = "GENERIC"
+
+PORTS = ["SHANGHAI", "NINGBO", "SHENZHEN", "QINGDAO", "LOS ANGELES", "LONG BEACH",
+         "ROTTERDAM", "HAMBURG", "SINGAPORE", "MELBOURNE", "SYDNEY", "AUCKLAND"]
+CARRIERS = ["MSC", "MAERSK", "CMA CGM", "COSCO", "EVERGREEN", "ONE", "HAPAG-LLOYD", "OOCL"]
+CONTAINER_TYPES = ["20' GP", "40' GP", "40' HQ", "45' HQ", "20' RF"]
+CHARGE_ITEMS = ["OCEAN FREIGHT", "BAF", "THC", "DOC FEE", "SEAL FEE", "CUSTOMS CLEARANCE",
+                "TRUCKING", "ISPS", "AMS FILING", "HANDLING CHARGE"]
+GENERIC_SUPPLIERS = ["ACME SHIPPING CO., LTD", "BLUE OCEAN LOGISTICS INC.", "PACIFIC FREIGHT PTY LTD"]
+# ===========================================
+
+
+def _escape(text):
+    """转义 PDF 字符串中的特殊字符"""
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _page_stream(lines):
+    """生成一页的内容流（每行一个文本对象）"""
+    parts = ["BT", f"/F1 {FONT_SIZE} Tf", f"{LINE_HEIGHT} TL", f"40 {PAGE_HEIGHT - 50} Td"]
+    for line in lines:
+        parts.append(f"({_escape(line)}) Tj T*")
+    parts.append("ET")
+    return "\n".join(parts).encode("latin-1", errors="replace")
+
+
+def build_pdf(pages):
+    """
+    将多页文本组装为 PDF 字节
+
+    参数:
+        pages (list): 每页一个字符串列表（每个字符串一行）
+
+    返回:
+        bytes: PDF 文件内容
+    """
+    objects = []
+    page_ids = []
+    # 对象编号：1 目录，2 页面树，3 字体，之后每页 2 个对象（页面、内容流）
+    for index, lines in enumerate(pages):
+        page_id = 4 + index * 2
+        page_ids.append(page_id)
+        stream = _page_stream(lines)
+        objects.append((page_id, (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {page_id + 1} 0 R >>"
+        ).encode("latin-1")))
+        objects.append((page_id + 1, b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream"))
+
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids)
+    objects = [
+        (1, b"<< /Type /Catalog /Pages 2 0 R >>"),
+        (2, f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>".encode("latin-1")),
+        (3, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>"),
+    ] + objects
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for obj_id, body in objects:
+        offsets[obj_id] = len(output)
+        output += b"%d 0 obj\n" % obj_id + body + b"\nendobj\n"
+
+    xref_offset = len(output)
+    output += b"xref\n0 %d\n" % (len(objects) + 1)
+    output += b"0000000000 65535 f \n"
+    for obj_id in range(1, len(objects) + 1):
+        output += b"%010d 00000 n \n" % offsets[obj_id]
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_offset)
+    return bytes(output)
+
+
+def _paginate(header_lines, body_lines, footer_lines):
+    """将表头、明细、合计分页（表头只在第一页，合计在最后一页）"""
+    lines = header_lines + body_lines + footer_lines
+    return [lines[i:i + LINES_PER_PAGE] for i in range(0, len(lines), LINES_PER_PAGE)] or [[]]
+
+
+def make_invoice_fields(rng, index, layout=LAYOUT_SRTS):
+    """
+    随机生成一张发票的表头字段（与 invoice_extractor 提取的字段同名）
+
+    参数:
+        rng (random.Random): 随机数生成器（固定种子保证可复现）
+        index (int): 发票序号（用于生成唯一编号）
+        layout (str): LAYOUT_SRTS 或 LAYOUT_GENERIC
+
+    返回:
+        dict: 表头字段
+    """
+    month = rng.randint(1, 12)
+    day = rng.randint(1, 28)
+    prefix = "S2511SED" if layout == LAYOUT_SRTS else "INV"
+    return {
+        "InvoiceNo": f"{prefix}{index:05d}",
+        "OriginalFileNo": f"SRSE2025{month:02d}-{index:05d}",
+        "DATE": f"2025/{month:02d}/{day:02d}",
+        "Carrier": rng.choice(CARRIERS),
+        "loadingport": rng.choice(PORTS[:4]),
+        "Destination": rng.choice(PORTS[4:]),
+        "Vessel_Voyage": f"{rng.choice(CARRIERS)} VESSEL V. {rng.randint(100, 999)}E",
+        "ETD": f"2025/{month:02d}/{day:02d}",
+        "ETADate": f"2025/{month:02d}/{min(day + 20, 28):02d}",
+        "OBL": f"OBL{rng.randint(10 ** 8, 10 ** 9 - 1)}",
+        "HBL": f"HBL{index:06d}",
+        "Receipt": rng.choice(PORTS[:4]),
+        "DueDate": None,
+        "SupplierName": "SRTS" if layout == LAYOUT_SRTS else rng.choice(GENERIC_SUPPLIERS),
+    }
+
+
+def make_charge_lines(rng, count):
+    """
+    随机生成费用明细
+
+    返回:
+        list: 每行一个字典（OCEANFREIGHT、XUSD、Unit_Price、Container_Type、USD、Currency）
+    """
+    charges = []
+    for _ in range(count):
+        quantity = rng.randint(1, 4)
+        unit_price = round(rng.uniform(20, 3000), 3)
+        charges.append({
+            "OCEANFREIGHT": rng.choice(CHARGE_ITEMS),
+            "XUSD": str(quantity),
+            "Unit_Price": f"{unit_price:.3f}",
+            "Container_Type": rng.choice(CONTAINER_TYPES),
+            "USD": f"{quantity * unit_price:.2f}",
+            "Currency": "USD",
+        })
+    return charges
+
+
+def render_invoice(fields, charges, layout=LAYOUT_SRTS, pages=1):
+    """
+    将发票字段渲染为 PDF
+
+    参数:
+        fields (dict): make_invoice_fields() 返回的表头字段
+        charges (list): make_charge_lines() 返回的费用明细
+        layout (str): LAYOUT_SRTS 或 LAYOUT_GENERIC
+        pages (int): 目标页数（明细不足时用条款页补足）
+
+    返回:
+        bytes: PDF 文件内容
+    """
+    if layout == LAYOUT_SRTS:
+        header = [
+            "SRTS INTERNATIONAL LOGISTICS",
+            "INVOICE",
+            f"INVOICE NO: {fields['InvoiceNo']}",
+            f"FILE NO.: {fields['OriginalFileNo']}",
+            f"DATE: {fields['DATE']}",
+            f"Carrier: {fields['Carrier']}",
+            f"Loading port: {fields['loadingport']}",
+            f"Destination: {fields['Destination']}",
+            f"Vessel / Voyage: {fields['Vessel_Voyage']}",
+            f"ETD: {fields['ETD']}    ETA Date: {fields['ETADate']}",
+            f"OBL: {fields['OBL']}    HBL: {fields['HBL']}",
+            f"Receipt: {fields['Receipt']}",
+            "",
+            "Description                 Qty      Rate                    Amount",
+        ]
+    else:
+        header = [
+            fields['SupplierName'],
+            "DEBIT NOTE",
+            f"Invoice Number: {fields['InvoiceNo']}",
+            f"Reference No: {fields['OriginalFileNo']}",
+            f"Invoice Date: {fields['DATE']}",
+            f"Shipping Line: {fields['Carrier']}",
+            f"Port of Loading: {fields['loadingport']}    Port of Discharge: {fields['Destination']}",
+            f"Vessel/Voyage: {fields['Vessel_Voyage']}",
+            f"Departure Date: {fields['ETD']}    Arrival Date: {fields['ETADate']}",
+            f"Master B/L No: {fields['OBL']}    House B/L: {fields['HBL']}",
+            f"Place of Receipt: {fields['Receipt']}",
+            "",
+            "Item                        Quantity Unit Price              Amount",
+        ]
+
+    body = [
+        f"{charge['OCEANFREIGHT']:<28}{charge['XUSD']} X USD  {charge['Unit_Price']}/{charge['Container_Type']:<10}{charge['USD']:>12}"
+        for charge in charges
+    ]
+    total = sum(float(charge['USD']) for charge in charges)
+    footer = ["", f"GRAND TOTAL USD {total:.2f}", "Payment terms: 30 days", "Thank you for your business."]
+
+    page_lines = _paginate(header, body, footer)
+    # 用条款页补足页数（真实发票常见的附加条款页）
+    clause = 1
+    while len(page_lines) < pages:
+        page_lines.append([f"TERMS AND CONDITIONS - CLAUSE {clause + i}: Carrier liability is limited as per "
+                           f"the applicable bill of lading terms." for i in range(LINES_PER_PAGE // 2)])
+        clause += LINES_PER_PAGE // 2
+    return build_pdf(page_lines)
+
+
+def render_bl(fields, pages=1):
+    """
+    渲染与发票对应的提单 PDF
+
+    参数:
+        fields (dict): 发票表头字段（使用其中的 HBL、港口和船名）
+        pages (int): 页数
+
+    返回:
+        bytes: PDF 文件内容
+    """
+    first_page = [
+        "BILL OF LADING",
+        f"B/L No: {fields['HBL']}",
+        f"Vessel / Voyage: {fields['Vessel_Voyage']}",
+        f"Port of Loading: {fields['loadingport']}",
+        f"Port of Discharge: {fields['Destination']}",
+        "Shipper: SAMPLE EXPORTER CO., LTD",
+        "Consignee: SAMPLE IMPORTER PTY LTD",
+        "Description of goods: FURNITURE PARTS",
+    ]
+    page_lines = [first_page]
+    while len(page_lines) < pages:
+        page_lines.append(["CONTINUATION SHEET - CARGO DETAILS"] +
+                          [f"PACKAGE {i:04d} FURNITURE PARTS 25 KGS" for i in range(LINES_PER_PAGE - 1)])
+    return build_pdf(page_lines)
+
+
+def generate_shipment(index, seed=0, layout=None, min_pages=1, max_pages=20):
+    """
+    生成一票货的发票 + 提单
+
+    参数:
+        index (int): 序号
+        seed (int): 随机种子（相同 seed、index 生成相同内容）
+        layout (str, optional): LAYOUT_SRTS / LAYOUT_GENERIC，默认按序号交替
+        min_pages (int): 发票最少页数
+        max_pages (int): 发票最多页数
+
+    返回:
+        dict: {
+            "layout": 格式,
+            "fields": 表头字段,
+            "charges": 费用明细,
+            "invoice_pdf": 发票 PDF 字节,
+            "bl_pdf": 提单 PDF 字节,
+            "pages": 发票页数,
+        }
+    """
+    rng = random.Random(seed * 1000003 + index)
+    layout = layout or (LAYOUT_SRTS if index % 2 == 0 else LAYOUT_GENERIC)
+    pages = rng.randint(min_pages, max_pages)
+    fields = make_invoice_fields(rng, index, layout)
+    # 明细行数随页数增加（多页发票通常明细更多）
+    charges = make_charge_lines(rng, rng.randint(1, 6) + pages * 2)
+    return {
+        "layout": layout,
+        "fields": fields,
+        "charges": charges,
+        "invoice_pdf": render_invoice(fields, charges, layout, pages),
+        "bl_pdf": render_bl(fields, pages=1 + pages // 10),
+        "pages": pages,
+    }
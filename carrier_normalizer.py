@@ -0,0 +1,202 @@
+"""
+船公司名称标准化模块
+把发票和 Price List 上的船公司名称（全称、简称、SCAC 代码）统一为同一个代码，用于运费匹配:
+    - 别名表：代码 -> 名称变体（内置 DEFAULT_CARRIER_ALIASES，可用 carrier_aliases.json 补充）
+    - 精确匹配：整个名称（忽略大小写、标点和空格）与某个变体相同
+    - 按词匹配：名称中包含某个变体的完整单词序列（"MAERSK LINE A/S" -> MSK），
+      按别名表顺序取第一个命中的代码；不再按子串匹配（"ZHONGONE LINES" 不会被识别为 ONE）
+    - 结果缓存（LRU），normalize_series 对整列数据只标准化不重复的值
+
+用法:
+    import carrier_normalizer
+    carrier_normalizer.normalize("Yang Ming Marine Transport Corp.")     # -> "YML"
+    carrier_normalizer.normalize_series(df['Carrier'])                   # -> 分类（category）Series
+"""
+
+import os
+import re
+import json
+import threading
+import functools
+
+import pandas as pd
+
+import config_loader
+from app_logging import get_logger
+
+logger = get_logger(__name__)
+
+# ================= 配置常量 =================
+CARRIER_ALIASES_FILENAME = "carrier_aliases.json"   # 可选：用户自定义别名（代码 -> 名称变体列表）
+CARRIER_CACHE_SIZE = 1024                            # 标准化结果缓存条数
+
+# 内置别名表：标准代码 -> 名称变体（包括 SCAC 代码）；按词匹配时按此顺序优先
+DEFAULT_CARRIER_ALIASES = {
+    "YML": ("YANG MING", "YANGMING", "YMLU"),
+    "HMM": ("HMM", "HYUNDAI", "HDMU"),
+    "EMC": ("EMC", "EVERGREEN", "EGLV"),
+    "MSK": ("MSK", "MAERSK", "MAEU", "SEALAND", "SEA LAND"),
+    "COSCO": ("COSCO", "COSU"),
+    "ONE": ("ONE", "ONEY", "OCEAN NETWORK EXPRESS"),
+    "CMA": ("CMA", "CMA CGM", "CMDU", "CMACGM"),
+    "MSC": ("MSC", "MSCU", "MEDITERRANEAN SHIPPING"),
+    "OOCL": ("OOCL", "OOLU", "ORIENT OVERSEAS"),
+    "HLC": ("HLC", "HLCU", "HAPAG LLOYD", "HAPAG"),
+    "ZIM": ("ZIM", "ZIMU"),
+    "WHL": ("WHL", "WHLC", "WAN HAI"),
+}
+# ===========================================
+
+
+def _tokens(name):
+    """大写并拆分为只含字母和数字的词（"Hapag-Lloyd AG" -> ["HAPAG", "LLOYD", "AG"]）"""
+    return re.sub(r"[^A-Z0-9]+", " ", str(name).upper()).split()
+
+
+class CarrierNormalizer:
+    """
+    船公司名称标准化器（线程安全，构建后只读）
+
+    参数:
+        aliases (dict, optional): 代码 -> 名称变体（列表或单个字符串），默认使用 DEFAULT_CARRIER_ALIASES；
+                                  字典顺序即按词匹配的优先顺序
+        cache_size (int): 标准化结果缓存条数
+    """
+
+    def __init__(self, aliases=None, cache_size=CARRIER_CACHE_SIZE):
+        self.exact = {}        # 紧凑形式（去掉空格和标点）-> 代码
+        self._rules = {}       # 第一个词 -> [(优先顺序, 词序列, 代码), ...]
+        order = 0
+        for code, variants in (DEFAULT_CARRIER_ALIASES if aliases is None else aliases).items():
+            code = str(code).strip().upper()
+            if not code:
+                continue
+            if isinstance(variants, str):
+                variants = [variants]
+            for variant in (code, *variants):
+                words = tuple(_tokens(variant))
+                if not words:
+                    continue
+                self.exact.setdefault("".join(words), code)
+                self._rules.setdefault(words[0], []).append((order, words, code))
+                order += 1
+
+        self.normalize = functools.lru_cache(maxsize=cache_size)(self._normalize)
+
+    def _match_words(self, words):
+        """按词匹配：返回优先顺序最靠前（相同时词数最多）的变体对应的代码，没有时返回空字符串"""
+        best = None
+        for start, word in enumerate(words):
+            for order, rule, code in self._rules.get(word, ()):
+                if tuple(words[start:start + len(rule)]) != rule:
+                    continue
+                rank = (order, -len(rule))
+                if best is None or rank < best[0]:
+                    best = (rank, code)
+        return best[1] if best else ""
+
+    def _normalize(self, name):
+        """标准化单个名称（结果由 normalize 缓存）"""
+        words = _tokens(name)
+        if not words:
+            return name.strip().upper()
+        code = self.exact.get("".join(words)) or self._match_words(words)
+        if code:
+            return code
+        # 不在别名表中：返回原始的大写字符串（strip 后），双方写法相同时仍能匹配
+        return name.strip().upper()
+
+    def standardize(self, name):
+        """
+        标准化船公司名称
+
+        返回:
+            str: 标准代码；不在别名表中时返回大写、去除首尾空格的原名称；空值返回空字符串
+        """
+        if name is None or (isinstance(name, float) and name != name) or name is pd.NA:
+            return ""
+        name = str(name)
+        if not name.strip():
+            return ""
+        return self.normalize(name)
+
+    def normalize_series(self, names):
+        """
+        批量标准化（每个不重复的值只标准化一次）
+
+        参数:
+            names: 船公司名称列表，或 pandas Series（例如 DataFrame 的一列）
+
+        返回:
+            pandas.Series: 分类（category）类型的标准代码，输入为 Series 时索引不变；空值为空字符串
+        """
+        if not isinstance(names, pd.Series):
+            names = pd.Series(list(names), dtype=object)
+        mapping = {value: self.standardize(value) for value in names.dropna().unique()}
+        return names.map(mapping).fillna("").astype("category")
+
+    def cache_info(self):
+        """返回缓存命中统计"""
+        return self.normalize.cache_info()
+
+
+# ================= 默认标准化器 =================
+_NORMALIZER = None
+_NORMALIZER_LOCK = threading.Lock()
+
+
+def load_carrier_aliases():
+    """
+    carrier_aliases.json（可选，与 port_codes.json 同目录）加上内置别名表
+
+    文件格式: {"代码": ["名称变体", ...]}，例如 {"PIL": ["PACIFIC INTERNATIONAL LINES", "PCIU"]}；
+    文件中的代码优先于内置别名表匹配，与内置代码相同时合并变体
+
+    返回:
+        dict: 代码 -> 名称变体列表
+    """
+    custom = {}
+    json_file = os.path.join(config_loader.get_base_path(), CARRIER_ALIASES_FILENAME)
+    if os.path.exists(json_file):
+        try:
+            with open(json_file, 'r', encoding='utf-8-sig') as f:
+                data = json.load(f)
+            if not isinstance(data, dict):
+                raise ValueError(f"{CARRIER_ALIASES_FILENAME} 应为 JSON 对象（代码 -> 名称变体列表）")
+            custom = {str(code).strip().upper(): [variants] if isinstance(variants, str) else list(variants)
+                      for code, variants in data.items()}
+        except Exception as e:
+            print(f"[警告] 加载船公司别名文件失败，仅使用内置别名: {e}")
+            custom = {}
+
+    aliases = dict(custom)
+    for code, variants in DEFAULT_CARRIER_ALIASES.items():
+        aliases[code] = aliases.get(code, []) + list(variants)
+    return aliases
+
+
+def get_normalizer():
+    """返回默认标准化器（第一次调用时加载别名表）"""
+    global _NORMALIZER
+    if _NORMALIZER is None:
+        with _NORMALIZER_LOCK:
+            if _NORMALIZER is None:
+                _NORMALIZER = CarrierNormalizer(load_carrier_aliases())
+    return _NORMALIZER
+
+
+def reload_aliases():
+    """丢弃默认标准化器（修改 carrier_aliases.json 后调用，下次使用时重新加载）"""
+    global _NORMALIZER
+    with _NORMALIZER_LOCK:
+        _NORMALIZER = None
+
+
+def normalize(name):
+    """用默认标准化器标准化船公司名称"""
+    return get_normalizer().standardize(name)
+
+
+def normalize_series(names):
+    """用默认标准化器批量标准化船公司名称"""
+    return get_normalizer().normalize_series(names)
@@ -4,10 +4,210 @@ client_check.py
 """
 
 import os
+import json
+import hashlib
 import pandas as pd
 from openpyxl import load_workbook
 
+import config_loader
+import metrics
+from app_logging import get_logger
 
+logger = get_logger(__name__)
+
+# Client 列表头关键词（不区分大小写，按顺序匹配）
+CLIENT_KEYWORDS = ['Client', 'Customer', 'Cnee', 'Consignee']
+
+# Booking List 索引缓存格式版本（索引结构变化时递增，旧缓存自动失效）
+BOOKING_INDEX_VERSION = 1
+
+
+def _file_sha256(file_path):
+    """
+    计算文件内容的 SHA-256 哈希值（分块读取，避免大文件占用内存）
+    
+    参数:
+        file_path: 文件路径
+        
+    返回:
+        str: 十六进制哈希字符串
+    """
+    sha = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def _booking_index_cache_path(booking_list_path):
+    """
+    获取 Booking List 索引缓存文件路径（按文件绝对路径区分）
+    """
+    abs_path = os.path.normcase(os.path.abspath(booking_list_path))
+    path_key = hashlib.sha1(abs_path.encode('utf-8')).hexdigest()
+    return os.path.join(config_loader.get_cache_dir('booking_index'), f"{path_key}.json")
+
+
+def _parse_booking_list(booking_list_path):
+    """
+    解析 Booking List 所有 Sheet，构建行记录和单元格索引
+    
+    参数:
+        booking_list_path: Booking List Excel 文件路径
+        
+    返回:
+        dict: 包含：
+            - "rows": 行记录列表，每个元素包含 Sheet Name、Row Index、Client、
+              Client Col Index、Client Col Name
+            - "tokens": 单元格值（大写，去空格）-> 行记录下标列表
+    """
+    # 读取所有 Sheet
+    excel_file = pd.ExcelFile(booking_list_path)
+    sheet_names = excel_file.sheet_names
+    print(f"  发现 {len(sheet_names)} 个 Sheet: {', '.join(sheet_names)}")
+    
+    rows = []
+    tokens = {}
+    for sheet_name in sheet_names:
+        print(f"  正在读取 Sheet: {sheet_name}")
+        df_sheet = pd.read_excel(excel_file, sheet_name=sheet_name)
+        
+        # 步骤 2.1: 确定 Client 列索引
+        # 扫描表头，寻找包含关键词的列
+        client_col_index = None
+        client_col_name = None
+        
+        for col_idx, col_name in enumerate(df_sheet.columns):
+            col_name_str = str(col_name).strip().upper()
+            for keyword in CLIENT_KEYWORDS:
+                if keyword.upper() in col_name_str:
+                    client_col_index = col_idx
+                    client_col_name = str(col_name)
+                    print(f"    ✓ 找到 Client 列: 第 {col_idx + 1} 列 '{col_name}'")
+                    break
+            if client_col_index is not None:
+                break
+        
+        # 如果找不到 Client 列，跳过该 Sheet
+        if client_col_index is None:
+            print(f"    ⚠ 警告: Sheet '{sheet_name}' 中未找到 Client 列（关键词: {', '.join(CLIENT_KEYWORDS)}），跳过该 Sheet")
+            continue
+        
+        # 步骤 2.2: 全行扫描 - 将每个非空单元格登记到索引中
+        sheet_row_count = 0
+        for row_position, row_values in enumerate(df_sheet.itertuples(index=False, name=None)):
+            # Excel 行号 = 行位置 + 2 (因为 Excel 第一行是表头，从第2行开始是数据)
+            excel_row_index = row_position + 2
+            row_id = len(rows)
+            
+            # 将当前行所有单元格的值转换为字符串（去除空格，转大写）作为索引键
+            for cell_value in set(row_values):
+                if pd.notna(cell_value):
+                    cell_str = str(cell_value).strip().upper()
+                    if cell_str:  # 只登记非空值
+                        tokens.setdefault(cell_str, []).append(row_id)
+            
+            # 提取 Client 值（从确定的列索引获取）
+            client_value = ''
+            if client_col_index < len(row_values):
+                client_raw = row_values[client_col_index]
+                if pd.notna(client_raw):
+                    client_value = str(client_raw).strip()
+            
+            rows.append({
+                'Sheet Name': sheet_name,
+                'Row Index': excel_row_index,
+                'Client': client_value,
+                'Client Col Index': client_col_index,
+                'Client Col Name': client_col_name
+            })
+            sheet_row_count += 1
+        
+        print(f"    ✓ Sheet '{sheet_name}' 加载完成，共 {sheet_row_count} 行数据")
+    
+    return {'rows': rows, 'tokens': tokens}
+
+
+def load_booking_index(booking_list_path):
+    """
+    加载 Booking List 索引（带磁盘缓存）
+    
+    缓存按 文件路径 + 修改时间 + 文件大小 + 内容哈希 标识：
+    1. 路径、修改时间、大小都未变化 -> 直接使用缓存，不解析 Excel
+    2. 修改时间或大小变化但内容哈希相同（例如文件被复制/另存）-> 仍使用缓存
+    3. 内容变化 -> 重新解析 Excel 并更新缓存
+    
+    参数:
+        booking_list_path: Booking List Excel 文件路径
+        
+    返回:
+        dict: 与 _parse_booking_list() 返回结构相同
+    """
+    stat = os.stat(booking_list_path)
+    cache_path = None
+    cached = None
+    
+    try:
+        cache_path = _booking_index_cache_path(booking_list_path)
+        if os.path.exists(cache_path):
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+            if cached.get('version') != BOOKING_INDEX_VERSION:
+                cached = None
+    except Exception as e:
+        print(f"  ⚠ 读取 Booking List 索引缓存失败，将重新解析: {e}")
+        cached = None
+    
+    file_hash = None
+    if cached is not None:
+        if cached.get('mtime') == stat.st_mtime and cached.get('size') == stat.st_size:
+            print(f"  ✓ 使用 Booking List 索引缓存（文件未变化）: {cache_path}")
+            return cached['index']
+        file_hash = _file_sha256(booking_list_path)
+        if cached.get('sha256') == file_hash:
+            print(f"  ✓ 使用 Booking List 索引缓存（文件内容未变化）: {cache_path}")
+            cached['mtime'] = stat.st_mtime
+            cached['size'] = stat.st_size
+            _write_booking_index_cache(cache_path, cached)
+            return cached['index']
+        print("  Booking List 文件已变化，正在重建索引...")
+    
+    index = _parse_booking_list(booking_list_path)
+    
+    if cache_path:
+        if file_hash is None:
+            file_hash = _file_sha256(booking_list_path)
+        _write_booking_index_cache(cache_path, {
+            'version': BOOKING_INDEX_VERSION,
+            'path': os.path.abspath(booking_list_path),
+            'mtime': stat.st_mtime,
+            'size': stat.st_size,
+            'sha256': file_hash,
+            'index': index
+        })
+    
+    return index
+
+
+def _write_booking_index_cache(cache_path, payload):
+    """
+    写入 Booking List 索引缓存（先写临时文件再替换，避免写入中断导致缓存损坏）
+    """
+    tmp_path = cache_path + '.tmp'
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(payload, f, ensure_ascii=False)
+        os.replace(tmp_path, cache_path)
+    except Exception as e:
+        print(f"  ⚠ 写入 Booking List 索引缓存失败: {e}")
+        if os.path.exists(tmp_path):
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+
+@metrics.timed("client_check")
 def run_check(info_excel_path, booking_list_path):
     """
     主函数：执行客户匹配和校验
@@ -38,70 +238,9 @@ def run_check(info_excel_path, booking_list_path):
     print(f"\n【步骤 2】加载 Booking List 数据（全行扫描模式）...")
     
     try:
-        # 读取所有 Sheet
-        excel_file = pd.ExcelFile(booking_list_path)
-        sheet_names = excel_file.sheet_names
-        print(f"  发现 {len(sheet_names)} 个 Sheet: {', '.join(sheet_names)}")
-        
-        # 汇总所有数据，记录来源信息
-        source_data = []
-        for sheet_name in sheet_names:
-            print(f"  正在读取 Sheet: {sheet_name}")
-            df_sheet = pd.read_excel(booking_list_path, sheet_name=sheet_name)
-            
-            # 步骤 2.1: 确定 Client 列索引
-            # 扫描表头，寻找包含关键词的列
-            client_keywords = ['Client', 'Customer', 'Cnee', 'Consignee']
-            client_col_index = None
-            client_col_name = None
-            
-            for col_idx, col_name in enumerate(df_sheet.columns):
-                col_name_str = str(col_name).strip().upper()
-                for keyword in client_keywords:
-                    if keyword.upper() in col_name_str:
-                        client_col_index = col_idx
-                        client_col_name = col_name
-                        print(f"    ✓ 找到 Client 列: 第 {col_idx + 1} 列 '{col_name}'")
-                        break
-                if client_col_index is not None:
-                    break
-            
-            # 如果找不到 Client 列，跳过该 Sheet
-            if client_col_index is None:
-                print(f"    ⚠ 警告: Sheet '{sheet_name}' 中未找到 Client 列（关键词: {', '.join(client_keywords)}），跳过该 Sheet")
-                continue
-            
-            # 步骤 2.2: 全行扫描 - 记录每一行的所有数据
-            for idx, row in df_sheet.iterrows():
-                # Excel 行号 = pandas 索引 + 2 (因为 Excel 第一行是表头，从第2行开始是数据)
-                excel_row_index = idx + 2
-                
-                # 将当前行所有单元格的值转换为字符串列表（去除空格，转大写）
-                row_values = []
-                for cell_value in row:
-                    if pd.notna(cell_value):
-                        cell_str = str(cell_value).strip().upper()
-                        if cell_str:  # 只添加非空值
-                            row_values.append(cell_str)
-                
-                # 提取 Client 值（从确定的列索引获取）
-                client_value = ''
-                if client_col_index < len(row):
-                    client_raw = row.iloc[client_col_index]
-                    if pd.notna(client_raw):
-                        client_value = str(client_raw).strip()
-                
-                source_data.append({
-                    'Sheet Name': sheet_name,
-                    'Row Index': excel_row_index,
-                    'Row Values': row_values,  # 全行数据（大写，去空格）
-                    'Client': client_value,
-                    'Client Col Index': client_col_index,
-                    'Client Col Name': client_col_name
-                })
-            
-            print(f"    ✓ Sheet '{sheet_name}' 加载完成，共 {len([s for s in source_data if s['Sheet Name'] == sheet_name])} 行数据")
-        
+        booking_index = load_booking_index(booking_list_path)
+        source_data = booking_index['rows']
+        token_index = booking_index['tokens']
         print(f"✓ 共加载 {len(source_data)} 条源数据记录")
         
     except Exception as e:
@@ -156,33 +295,27 @@ def run_check(info_excel_path, booking_list_path):
         
         # 空值熔断：如果全部为空，判定为未找到
         if not obl and not hbl and not booking_no:
-            print(f"  行 {idx + 2}: OBL, HBL, Booking No 全部为空，判定为未找到")
+            logger.debug("  行 %d: OBL, HBL, Booking No 全部为空，判定为未找到", idx + 2)
             client_names.append("no client mapping")
             booking_list_positions.append("")
             notes.append("")
             match_statistics['no_match'] += 1
             continue
         
-        # 在源数据中查找匹配（全行扫描）
-        matches = []
-        for source_item in source_data:
-            row_values = source_item['Row Values']  # 已经是大写、去空格的列表
-            
-            # 匹配规则：检查目标值是否存在于该行的任何单元格中
-            # 只要任一条件满足即可（使用 or 逻辑）
-            matched = (
-                (booking_no and booking_no in row_values) or
-                (obl and obl in row_values) or
-                (hbl and hbl in row_values)
-            )
-            
-            if matched:
-                matches.append(source_item)
+        # 在源数据中查找匹配（通过单元格索引直接定位行）
+        # 匹配规则：目标值与该行任一单元格完全一致即可（使用 or 逻辑）
+        # 结果按 Booking List 中的原始行顺序排列，与全行扫描结果一致
+        matched_ids = set()
+        for value in (booking_no, obl, hbl):
+            if value:
+                matched_ids.update(token_index.get(value, []))
+        matches = [source_data[i] for i in sorted(matched_ids)]
         
         # ==================== 步骤 5: Determine Result ====================
         if len(matches) == 0:
             # Case A: 0 Matches
-            print(f"  行 {idx + 2}: 未找到匹配 (OBL={obl_raw or '(空)'}, HBL={hbl_raw or '(空)'}, Booking No={booking_no_raw or '(空)'})")
+            logger.debug("  行 %d: 未找到匹配 (OBL=%s, HBL=%s, Booking No=%s)", idx + 2,
+                         obl_raw or '(空)', hbl_raw or '(空)', booking_no_raw or '(空)')
             client_names.append("no client mapping")
             booking_list_positions.append("")
             notes.append("")
@@ -193,7 +326,7 @@ def run_check(info_excel_path, booking_list_path):
             match = matches[0]
             client_name = match['Client']
             position = f"{match['Sheet Name']}-row{match['Row Index']}"
-            print(f"  行 {idx + 2}: 找到 1 个匹配 -> Client: {client_name}, Position: {position}")
+            logger.debug("  行 %d: 找到 1 个匹配 -> Client: %s, Position: %s", idx + 2, client_name, position)
             client_names.append(client_name)
             booking_list_positions.append(position)
             notes.append("")
@@ -205,7 +338,8 @@ def run_check(info_excel_path, booking_list_path):
             client_name = first_match['Client']
             position = f"{first_match['Sheet Name']}-row{first_match['Row Index']}"
             note = f"Warning: Multiple matches found ({len(matches)})"
-            print(f"  行 {idx + 2}: 找到 {len(matches)} 个匹配 -> 使用第一个: Client: {client_name}, Position: {position}")
+            logger.debug("  行 %d: 找到 %d 个匹配 -> 使用第一个: Client: %s, Position: %s",
+                         idx + 2, len(matches), client_name, position)
             client_names.append(client_name)
             booking_list_positions.append(position)
             notes.append(note)
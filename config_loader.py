@@ -5,40 +5,134 @@
 
 import os
 import sys
+import threading
 import configparser
 from pathlib import Path
 
+# ================= 配置常量 =================
+# 设置此环境变量时从指定路径读取配置文件（例如基准测试、多套配置切换）
+CONFIG_PATH_ENV = 'INVOICEAUTO_CONFIG'
 
-def load_config():
+DEFAULT_IMAP_HOST = 'imap.qq.com'
+DEFAULT_IMAP_PORT = 993
+DEFAULT_IMAP_FOLDER = 'INBOX'
+# 处理后回写邮箱：成功的邮件移动到 processed_folder，失败的移动到 review_folder（配置为空表示不移动）
+DEFAULT_PROCESSED_FOLDER = 'Processed'
+DEFAULT_REVIEW_FOLDER = 'Needs-Review'
+# 其他邮箱在 [MAILBOX <名称>] 部分中配置（例如 [MAILBOX accounts]），字段与 [EMAIL] 相同
+MAILBOX_SECTION_PREFIX = 'MAILBOX '
+DEFAULT_MAILBOX_NAME = 'default'
+DEFAULT_API_URL = 'https://api.deepseek.com/chat/completions'
+
+# [PERFORMANCE] 默认值（config.ini 未配置时使用）
+DEFAULT_PERFORMANCE = {
+    'classify_workers': 2,            # 分类阶段线程数
+    'extract_workers': 4,             # 提取阶段（调用 AI）线程数
+    'stage_queue_size': 8,            # 阶段之间队列的最大长度（邮件数）
+    'info_flush_interval': 5.0,       # info.xlsx 增量写入的最短间隔（秒）
+    'imap_fetch_bulk': 0,             # 每条 FETCH 命令下载的邮件数（0 = 逐封下载）
+    'api_timeout': 60.0,              # AI 接口请求超时（秒）
+    'api_max_concurrency': 0,         # 同时进行的 AI 请求数上限（0 = 不限制，由提取线程数决定）
+    'api_requests_per_minute': 0,     # 每分钟 AI 请求数上限（0 = 不限制）
+    'port_cache_size': 4096,          # 港口代码解析结果缓存条数
+    'cache_dir': '',                  # 缓存目录（为空时使用程序目录下的 cache）
+}
+
+# [OCR] 默认值（扫描件识别，见 pdf_text）
+DEFAULT_OCR = {
+    'enabled': False,                 # 是否对没有文本的页面进行 OCR
+    'lang': 'eng',                    # Tesseract 语言，例如 "eng" 或 "eng+chi_sim"
+    'resolution': 300,                # 页面渲染分辨率（DPI）
+    'workers': 0,                     # OCR 进程数（0 = CPU 核数）
+    'tesseract_cmd': '',              # tesseract 程序路径（为空时从 PATH 查找）
+}
+
+# [REPORT] 默认值
+DEFAULT_XERO_DUE_DAYS = 30            # invoice 没有 DueDate 时的默认付款期限（天数）
+DEFAULT_SRTS_DUE_DAYS_FROM_ETA = 7    # SRTS 供应商：DueDate = ETA + 天数
+# ===========================================
+
+# 解析后的配置缓存：文件修改时间或大小变化时自动重新读取（常驻模式修改配置无需重启）
+_CONFIG_CACHE = {'path': None, 'stamp': None, 'config': None}
+_CONFIG_LOCK = threading.Lock()
+
+
+def get_base_path():
     """
-    加载配置文件
+    获取程序所在目录（config.ini、port_codes.json 等文件所在位置）
     
     返回:
-        configparser.ConfigParser: 配置对象
-        
-    异常:
-        如果配置文件不存在，会抛出 FileNotFoundError
+        str: EXE 环境下为 EXE 所在目录，普通运行时为脚本所在目录
     """
-    config = configparser.ConfigParser()
-    
     # 判断是否为打包后的 EXE 环境
     if getattr(sys, 'frozen', False):
         # EXE 环境：使用 EXE 文件所在的目录
-        base_path = os.path.dirname(sys.executable)
-    else:
-        # 普通 Python 脚本运行：使用脚本文件所在的目录
-        base_path = os.path.dirname(__file__)
+        return os.path.dirname(sys.executable)
+    # 普通 Python 脚本运行：使用脚本文件所在的目录
+    return os.path.dirname(os.path.abspath(__file__))
+
+
+def get_cache_dir(name=None):
+    """
+    获取程序缓存目录（不存在时自动创建）
     
-    config_file = os.path.join(base_path, 'config.ini')
+    参数:
+        name (str, optional): 子目录名称，例如 "booking_index"
+        
+    返回:
+        str: 缓存目录路径（默认位于程序目录下的 cache 文件夹，可通过 [PERFORMANCE] cache_dir 修改）
+    """
+    cache_dir = get_performance_config()['cache_dir'] or os.path.join(get_base_path(), 'cache')
+    if name:
+        cache_dir = os.path.join(cache_dir, name)
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+
+def get_config_path():
+    """返回配置文件路径（INVOICEAUTO_CONFIG 环境变量优先）"""
+    return os.environ.get(CONFIG_PATH_ENV) or os.path.join(get_base_path(), 'config.ini')
+
+
+def load_config():
+    """
+    加载配置文件（解析结果会缓存，文件修改后下次调用时自动重新读取）
     
-    if not os.path.exists(config_file):
+    返回:
+        configparser.ConfigParser: 配置对象（共享的缓存对象，请勿修改）
+        
+    异常:
+        如果配置文件不存在，会抛出 FileNotFoundError
+    """
+    config_file = get_config_path()
+    
+    try:
+        stat = os.stat(config_file)
+    except FileNotFoundError:
         raise FileNotFoundError(
             f"配置文件不存在: {config_file}\n"
             f"请复制 config.example.ini 为 config.ini 并填写你的配置信息。"
-        )
+        ) from None
+    stamp = (stat.st_mtime_ns, stat.st_size)
     
-    config.read(config_file, encoding='utf-8')
-    return config
+    with _CONFIG_LOCK:
+        if _CONFIG_CACHE['path'] == config_file and _CONFIG_CACHE['stamp'] == stamp:
+            return _CONFIG_CACHE['config']
+        
+        config = configparser.ConfigParser()
+        config.read(config_file, encoding='utf-8')
+        if _CONFIG_CACHE['path'] == config_file:
+            print(f"✓ 检测到配置文件已修改，已重新加载: {config_file}")
+        _CONFIG_CACHE.update(path=config_file, stamp=stamp, config=config)
+        return config
+
+
+def _load_optional_config():
+    """读取只包含可选项的配置：配置文件不存在时返回空配置（全部使用默认值）"""
+    try:
+        return load_config()
+    except FileNotFoundError:
+        return configparser.ConfigParser()
 
 
 def get_email_config():
@@ -73,3 +167,230 @@ def get_api_key():
     
     return api_key
 
+
+def get_imap_config():
+    """
+    获取 IMAP 服务器配置（可选项，未配置时使用 QQ 邮箱）
+    
+    返回:
+        dict: {"host": 服务器地址, "port": 端口, "ssl": 是否使用 SSL}
+    """
+    config = load_config()
+    return {
+        'host': config.get('EMAIL', 'imap_host', fallback=DEFAULT_IMAP_HOST),
+        'port': config.getint('EMAIL', 'imap_port', fallback=DEFAULT_IMAP_PORT),
+        'ssl': config.getboolean('EMAIL', 'imap_ssl', fallback=True),
+    }
+
+
+def _split_list(value):
+    """逗号分隔的配置项 -> 去掉空白后的列表"""
+    return [item.strip() for item in (value or '').split(',') if item.strip()]
+
+
+def _read_mailbox(config, section, name):
+    """读取一个邮箱部分（[EMAIL] 或 [MAILBOX <名称>]）"""
+    mail_user = config.get(section, 'mail_user', fallback='').strip()
+    mail_pass = config.get(section, 'mail_pass', fallback='').strip()
+    if not mail_user or not mail_pass:
+        raise ValueError(f"邮箱配置不完整，请检查 config.ini 中的 [{section}] 部分（需要 mail_user 和 mail_pass）")
+    folders = _split_list(config.get(section, 'folders', fallback=''))
+    since_days = config.getint(section, 'search_since_days', fallback=0)
+    if since_days < 0:
+        raise ValueError(f"[{section}] search_since_days 不能小于 0")
+    return {
+        'name': name,
+        'user': mail_user,
+        'password': mail_pass,
+        'host': config.get(section, 'imap_host', fallback=DEFAULT_IMAP_HOST),
+        'port': config.getint(section, 'imap_port', fallback=DEFAULT_IMAP_PORT),
+        'ssl': config.getboolean(section, 'imap_ssl', fallback=True),
+        'folders': folders or [DEFAULT_IMAP_FOLDER],
+        # 服务器端搜索条件（与 UNSEEN 组合为 AND(...)，减少需要下载的邮件）
+        'search_since_days': since_days,
+        'search_from': _split_list(config.get(section, 'search_from', fallback='')),
+        'search_subject': _split_list(config.get(section, 'search_subject', fallback='')),
+        'prescreen_pdf': config.getboolean(section, 'prescreen_pdf', fallback=True),
+        'processed_folder': config.get(section, 'processed_folder', fallback=DEFAULT_PROCESSED_FOLDER).strip(),
+        'review_folder': config.get(section, 'review_folder', fallback=DEFAULT_REVIEW_FOLDER).strip(),
+    }
+
+
+def get_mailbox_configs():
+    """
+    获取所有要下载的邮箱（[EMAIL] 为默认邮箱，[MAILBOX <名称>] 为其他邮箱，每个邮箱单独连接并行下载）
+    
+    配置了 [MAILBOX ...] 时 [EMAIL] 中的账号可以留空
+    
+    返回:
+        list: 邮箱配置列表，每个元素为 {
+            "name": 名称（[EMAIL] 为 "default"）,
+            "user": 账号, "password": 授权码,
+            "host": 服务器地址, "port": 端口, "ssl": 是否使用 SSL,
+            "folders": 要下载的文件夹列表（默认 ["INBOX"]）,
+            "search_since_days": 只搜索最近 N 天的邮件（0 表示不限）,
+            "search_from": 发件人域名 / 地址列表（任一匹配即可，为空表示不限）,
+            "search_subject": 标题关键词列表（任一匹配即可，为空表示不限）,
+            "prescreen_pdf": 是否先用 BODYSTRUCTURE 排除不含 PDF 的邮件（默认 True）,
+            "processed_folder": 处理成功的邮件移动到的文件夹（为空表示只标记为已读）,
+            "review_folder": 处理失败的邮件移动到的文件夹（为空表示保留在原文件夹，保持未读）,
+        }
+        
+    异常:
+        ValueError: 没有配置任何邮箱，或某个邮箱缺少账号 / 授权码
+    """
+    config = load_config()
+    mailboxes = []
+    extra_sections = [section for section in config.sections() if section.upper().startswith(MAILBOX_SECTION_PREFIX)]
+    if config.get('EMAIL', 'mail_user', fallback='').strip() or not extra_sections:
+        mailboxes.append(_read_mailbox(config, 'EMAIL', DEFAULT_MAILBOX_NAME))
+    
+    names = {mailbox['name'] for mailbox in mailboxes}
+    for section in extra_sections:
+        name = section[len(MAILBOX_SECTION_PREFIX):].strip()
+        if not name or name in names:
+            raise ValueError(f"邮箱名称为空或重复: [{section}]")
+        names.add(name)
+        mailboxes.append(_read_mailbox(config, section, name))
+    return mailboxes
+
+
+def get_api_url():
+    """
+    获取 AI 接口地址（可选项，未配置时使用 DeepSeek 官方地址）
+    
+    返回:
+        str: chat/completions 接口地址
+    """
+    config = load_config()
+    return config.get('API', 'api_url', fallback=DEFAULT_API_URL) or DEFAULT_API_URL
+
+
+def get_replay_config():
+    """
+    获取录制 / 回放配置（可选项，默认关闭）
+    
+    返回:
+        dict: {"mode": "off" / "record" / "replay", "fixture_dir": 数据目录, "speed": 回放速度倍数}
+    """
+    config = load_config()
+    return {
+        'mode': config.get('REPLAY', 'mode', fallback='off').strip().lower() or 'off',
+        'fixture_dir': config.get('REPLAY', 'fixture_dir', fallback=''),
+        'speed': config.getfloat('REPLAY', 'speed', fallback=1.0),
+    }
+
+
+def get_profiling_config():
+    """
+    获取性能分析配置（可选项，默认关闭）
+    
+    返回:
+        dict: {"enabled": 是否开启, "top_n": 汇总中每个阶段列出的行数}
+    """
+    config = load_config()
+    return {
+        'enabled': config.getboolean('PROFILING', 'enabled', fallback=False),
+        'top_n': config.getint('PROFILING', 'top_n', fallback=25),
+    }
+
+
+def get_logging_config():
+    """
+    获取日志配置（可选项）
+    
+    返回:
+        dict: {
+            "level": 控制台日志级别（默认 INFO）,
+            "file": 日志文件路径（默认为空，不写文件；相对路径相对于程序目录）,
+            "file_level": 文件日志级别（默认 DEBUG）,
+            "max_bytes": 单个日志文件最大字节数（默认 5 MB）,
+            "backup_count": 保留的历史日志文件数（默认 5）,
+        }
+    """
+    config = load_config()
+    log_file = config.get('LOGGING', 'file', fallback='').strip()
+    if log_file and not os.path.isabs(log_file):
+        log_file = os.path.join(get_base_path(), log_file)
+    return {
+        'level': config.get('LOGGING', 'level', fallback='INFO').strip().upper(),
+        'file': log_file,
+        'file_level': config.get('LOGGING', 'file_level', fallback='DEBUG').strip().upper(),
+        'max_bytes': config.getint('LOGGING', 'max_bytes', fallback=5 * 1024 * 1024),
+        'backup_count': config.getint('LOGGING', 'backup_count', fallback=5),
+    }
+
+
+def get_performance_config():
+    """
+    获取性能配置（可选项，未配置的项使用 DEFAULT_PERFORMANCE；配置文件不存在时全部使用默认值）
+    
+    返回:
+        dict: 与 DEFAULT_PERFORMANCE 相同的键，cache_dir 为绝对路径（未配置时为空字符串）
+        
+    异常:
+        ValueError: 数值格式错误或超出范围
+    """
+    config = _load_optional_config()
+    performance = {}
+    for key, default in DEFAULT_PERFORMANCE.items():
+        if isinstance(default, float):
+            value = config.getfloat('PERFORMANCE', key, fallback=default)
+        elif isinstance(default, int):
+            value = config.getint('PERFORMANCE', key, fallback=default)
+        else:
+            value = config.get('PERFORMANCE', key, fallback=default).strip()
+        if not isinstance(value, str) and value < 0:
+            raise ValueError(f"[PERFORMANCE] {key} 不能小于 0")
+        performance[key] = value
+    
+    for key in ('classify_workers', 'extract_workers', 'stage_queue_size'):
+        if performance[key] == 0:
+            raise ValueError(f"[PERFORMANCE] {key} 必须大于 0")
+    if performance['cache_dir'] and not os.path.isabs(performance['cache_dir']):
+        performance['cache_dir'] = os.path.join(get_base_path(), performance['cache_dir'])
+    return performance
+
+
+def get_ocr_config():
+    """
+    获取 OCR 配置（可选项，默认关闭；配置文件不存在时全部使用默认值）
+    
+    返回:
+        dict: 与 DEFAULT_OCR 相同的键
+        
+    异常:
+        ValueError: 数值格式错误或超出范围
+    """
+    config = _load_optional_config()
+    defaults = DEFAULT_OCR
+    ocr = {
+        'enabled': config.getboolean('OCR', 'enabled', fallback=defaults['enabled']),
+        'lang': config.get('OCR', 'lang', fallback=defaults['lang']).strip() or defaults['lang'],
+        'resolution': config.getint('OCR', 'resolution', fallback=defaults['resolution']),
+        'workers': config.getint('OCR', 'workers', fallback=defaults['workers']),
+        'tesseract_cmd': config.get('OCR', 'tesseract_cmd', fallback=defaults['tesseract_cmd']).strip(),
+    }
+    if ocr['resolution'] <= 0:
+        raise ValueError("[OCR] resolution 必须大于 0")
+    if ocr['workers'] < 0:
+        raise ValueError("[OCR] workers 不能小于 0")
+    return ocr
+
+
+def get_report_config():
+    """
+    获取报表配置（可选项）
+    
+    返回:
+        dict: {
+            "xero_default_due_days": invoice 没有 DueDate 时的付款期限（天数，默认 30）,
+            "srts_due_days_from_eta": SRTS 供应商 DueDate = ETA + 天数（默认 7）,
+        }
+    """
+    config = _load_optional_config()
+    return {
+        'xero_default_due_days': config.getint('REPORT', 'xero_default_due_days', fallback=DEFAULT_XERO_DUE_DAYS),
+        'srts_due_days_from_eta': config.getint('REPORT', 'srts_due_days_from_eta',
+                                                fallback=DEFAULT_SRTS_DUE_DAYS_FROM_ETA),
+    }
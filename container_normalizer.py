@@ -0,0 +1,127 @@
+"""
+柜型标准化模块
+自动查价（price_matcher）和报表生成（report_generator）共用，把发票上各种写法的柜型统一为标准柜型:
+    - 先识别尺寸（20 / 40 / 45），再识别特征（NOR、冷柜、高柜），按规则表顺序取第一条满足的规则
+    - ISO 6346 箱型代码（22G1、42G1、45G1、45R1、L5G1 ...）按代码含义识别尺寸和特征（45G1 是 40 尺高柜，不是 45 尺）
+    - 冷柜（20RF / 40RF）、45 尺高柜（45HC）、不通电冷柜（40NOR）有各自的柜型，不再归入普柜 / 高柜
+    - 结果缓存（LRU），normalize_series 对整列数据只标准化不重复的值
+
+用法:
+    import container_normalizer
+    container_normalizer.normalize("1 x 40' High Cube")                     # -> "40HQ"
+    container_normalizer.normalize_series(df['Container Type'])              # -> 分类（category）Series
+"""
+
+import re
+import functools
+
+import pandas as pd
+
+# ================= 配置常量 =================
+UNKNOWN_TYPE = "Unknown"
+CONTAINER_CACHE_SIZE = 1024    # 标准化结果缓存条数
+
+# 尺寸：20 / 40 / 45（前后不能紧挨其他数字，避免 "2024"、"120" 误判）
+SIZE_PATTERN = r"(?<!\d)(20|40|45)(?!\d)"
+
+# ISO 6346 箱型代码：长度（2 / 4 / L）+ 高度（5 为 9'6" 高柜）+ 箱型（G 普通、R 冷藏 ...）+ 数字
+ISO_SIZE_TYPE_PATTERN = r"(?<![A-Z0-9])([24L])([0-9])([GRVBSHUPT])[0-9](?![A-Z0-9])"
+ISO_LENGTHS = {"2": "20", "4": "40", "L": "45"}
+ISO_HIGH_CUBE_HEIGHT = "5"
+ISO_REEFER_TYPES = ("R",)
+
+# 特征关键词（正则，匹配大写后的柜型文本）
+FEATURE_PATTERNS = {
+    "NOR": r"(?<![A-Z])NOR(?![A-Z])|NON[\s-]*OPERAT",              # 不通电冷柜（Non-Operating Reefer）
+    "REEFER": r"REEFER|(?<![A-Z])(RF|RH|RQ)(?![A-Z])",             # 冷柜（含冷高柜 40RH）
+    "HIGH_CUBE": r"HQ|HC|HIGH|CUBE|HI-CUBE|HICUBE",                # 高柜
+    "TEU": r"TEU",                                                 # 没有尺寸时：TEU 通常指 20 尺
+    "FEU": r"FEU",                                                 # 没有尺寸时：FEU 通常指 40 尺
+}
+
+# 规则表：(标准柜型, 尺寸, 需要的特征)，按顺序取第一条满足的规则；尺寸为 None 表示文本中没有尺寸
+CONTAINER_RULES = (
+    ("40NOR", "40", ("NOR",)),
+    ("20RF", "20", ("NOR",)),
+    ("20RF", "20", ("REEFER",)),
+    ("40RF", "40", ("REEFER",)),
+    ("45HC", "45", ()),
+    ("40HQ", "40", ("HIGH_CUBE",)),
+    ("40GP", "40", ()),
+    ("20GP", "20", ()),
+    ("40NOR", None, ("NOR",)),
+    ("40HQ", None, ("HIGH_CUBE",)),      # 只写了 "High Cube" 没写尺寸，默认 40HQ
+    ("20GP", None, ("TEU",)),
+    ("40GP", None, ("FEU",)),
+)
+
+# 所有标准柜型（normalize_series 返回的分类顺序）
+CONTAINER_TYPES = ("20GP", "40GP", "40HQ", "45HC", "20RF", "40RF", "40NOR", UNKNOWN_TYPE)
+# ===========================================
+
+_SIZE = re.compile(SIZE_PATTERN)
+_ISO_SIZE_TYPE = re.compile(ISO_SIZE_TYPE_PATTERN)
+_FEATURES = {name: re.compile(pattern) for name, pattern in FEATURE_PATTERNS.items()}
+_CATEGORIES = pd.CategoricalDtype(categories=CONTAINER_TYPES)
+
+
+@functools.lru_cache(maxsize=CONTAINER_CACHE_SIZE)
+def _normalize(text):
+    """按规则表标准化大写后的柜型文本（结果缓存）"""
+    features = {name for name, pattern in _FEATURES.items() if pattern.search(text)}
+    iso_match = _ISO_SIZE_TYPE.search(text)
+    if iso_match:
+        # ISO 箱型代码优先：45G1 中的 "45" 是长度 4 + 高度 5，不是 45 尺
+        length, height, group = iso_match.groups()
+        size = ISO_LENGTHS[length]
+        if height == ISO_HIGH_CUBE_HEIGHT:
+            features.add("HIGH_CUBE")
+        if group in ISO_REEFER_TYPES:
+            features.add("REEFER")
+    else:
+        size_match = _SIZE.search(text)
+        size = size_match.group(1) if size_match else None
+    for container_type, rule_size, required in CONTAINER_RULES:
+        if rule_size == size and features.issuperset(required):
+            return container_type
+    return UNKNOWN_TYPE
+
+
+def normalize(raw_type):
+    """
+    标准化柜型
+
+    参数:
+        raw_type: 原始柜型，例如 "40HQ"、"40'HC"、"40FT High Cube"、"1x20GP"、"40' Reefer"、"40RF NOR"、"45HC"、"45G1"
+
+    返回:
+        str: CONTAINER_TYPES 中的一个（"20GP"、"40GP"、"40HQ"、"45HC"、"20RF"、"40RF"、"40NOR"），
+             无法识别或为空时返回 "Unknown"
+    """
+    if raw_type is None or raw_type is pd.NA or (isinstance(raw_type, float) and raw_type != raw_type):
+        return UNKNOWN_TYPE
+    text = str(raw_type).strip().upper()
+    if not text:
+        return UNKNOWN_TYPE
+    return _normalize(text)
+
+
+def normalize_series(values):
+    """
+    批量标准化柜型（每个不重复的值只标准化一次）
+
+    参数:
+        values: 柜型列表，或 pandas Series（例如 DataFrame 的一列）
+
+    返回:
+        pandas.Series: 分类（category）类型，分类为 CONTAINER_TYPES，输入为 Series 时索引不变
+    """
+    if not isinstance(values, pd.Series):
+        values = pd.Series(list(values), dtype=object)
+    mapping = {value: normalize(value) for value in values.dropna().unique()}
+    return values.map(mapping).fillna(UNKNOWN_TYPE).astype(_CATEGORIES)
+
+
+def cache_info():
+    """返回缓存命中统计"""
+    return _normalize.cache_info()
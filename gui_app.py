@@ -3,28 +3,33 @@
 包含敏感信息的硬编码配置，不显示在界面上
 """
 
+import time
+
+# 启动计时起点（用于统计从启动到窗口显示的耗时）
+_STARTUP_BEGIN = time.perf_counter()
+
 import os
 import sys
-import shutil
-import pandas as pd
-from datetime import datetime
 import threading
+import queue
 import tkinter as tk
 from tkinter import filedialog, scrolledtext, messagebox
 import traceback
 
 # 导入项目模块
-import invoice_extractor
-import EmailHandler
+# 只导入轻量模块；pipeline、report_generator 会加载 pandas / pdfplumber / imap_tools 等重型依赖，
+# 改为首次使用时导入，并在窗口显示后由后台线程预加载（见 warm_up）
+import app_logging
 import config_loader
-import client_check
-from price_matcher import FreightMatcher
-import report_generator
+import metrics
+import profiling
+
+logger = app_logging.get_logger(__name__)
 
 # ================= 配置区域 =================
 # 从配置文件加载配置信息
 try:
-    MAIL_USER, MAIL_PASS = config_loader.get_email_config()
+    MAILBOXES = config_loader.get_mailbox_configs()
     API_KEY = config_loader.get_api_key()
 except (FileNotFoundError, ValueError) as e:
     # 如果配置加载失败，显示错误并退出
@@ -40,34 +45,78 @@ except (FileNotFoundError, ValueError) as e:
 # ================================================================
 
 
+# ================= 启动配置 =================
+STARTUP_TARGET_SECONDS = 1.5  # 从启动到窗口显示的目标耗时（秒），超出时在日志中提示
+# ===========================================
+
+
+# ================= 日志显示配置 =================
+LOG_POLL_INTERVAL_MS = 50     # 日志队列刷新间隔（毫秒）
+LOG_MAX_LINES = 5000          # 日志框最多保留的行数，超出后删除最早的内容
+LOG_MAX_BATCH = 2000          # 每次刷新最多取出的日志条数，避免单次刷新阻塞界面
+# ===========================================
+
+
 class TextRedirector:
-    """重定向 print 输出到 ScrolledText 组件"""
-    def __init__(self, text_widget):
+    """
+    重定向 print 输出到 ScrolledText 组件（线程安全）
+    
+    工作线程只把文本放入队列，不直接操作 Tk 组件；
+    主线程通过 root.after 定时批量取出并一次性插入，超出行数上限时删除最早的日志。
+    """
+    def __init__(self, text_widget, poll_interval_ms=LOG_POLL_INTERVAL_MS, max_lines=LOG_MAX_LINES):
+        """
+        初始化日志重定向器（必须在主线程中创建）
+        
+        参数:
+            text_widget: ScrolledText 组件
+            poll_interval_ms (int): 队列刷新间隔（毫秒）
+            max_lines (int): 日志框最多保留的行数
+        """
         self.text_widget = text_widget
+        self.poll_interval_ms = poll_interval_ms
+        self.max_lines = max_lines
+        self.queue = queue.Queue()
+        self.text_widget.after(self.poll_interval_ms, self._drain)
     
     def write(self, text):
-        self.text_widget.insert(tk.END, text)
-        self.text_widget.see(tk.END)  # 自动滚动到底部
-        self.text_widget.update_idletasks()  # 强制刷新界面
+        if text:
+            self.queue.put(text)
     
     def flush(self):
         pass
-
-
-def sanitize_filename(filename):
-    """
-    清理文件名中的非法字符（Windows文件名不能包含：< > : " / \\ | ? *）
     
-    参数:
-        filename (str): 原始文件名
+    def clear(self):
+        """清空日志框和尚未显示的日志（在主线程中调用）"""
+        try:
+            while True:
+                self.queue.get_nowait()
+        except queue.Empty:
+            pass
+        self.text_widget.delete(1.0, tk.END)
+    
+    def _drain(self):
+        """取出队列中的日志批量插入到组件中（在主线程中定时执行）"""
+        chunks = []
+        try:
+            while len(chunks) < LOG_MAX_BATCH:
+                chunks.append(self.queue.get_nowait())
+        except queue.Empty:
+            pass
         
-    返回:
-        str: 清理后的文件名
-    """
-    illegal_chars = ['<', '>', ':', '"', '/', '\\', '|', '?', '*']
-    for char in illegal_chars:
-        filename = filename.replace(char, '_')
-    return filename
+        if chunks:
+            self.text_widget.insert(tk.END, "".join(chunks))
+            self._trim()
+            self.text_widget.see(tk.END)  # 自动滚动到底部
+        
+        self.text_widget.after(self.poll_interval_ms, self._drain)
+    
+    def _trim(self):
+        """超出行数上限时删除最早的日志"""
+        line_count = int(self.text_widget.index('end-1c').split('.')[0])
+        excess = line_count - self.max_lines
+        if excess > 0:
+            self.text_widget.delete('1.0', f'{excess + 1}.0')
 
 
 def shorten_path(path, max_length=60):
@@ -141,336 +190,6 @@ class Tooltip:
             self.tooltip_window = None
 
 
-def run_main_process(base_dir, log_output, booking_list_path=None, price_list_path=None):
-    """
-    主处理函数：执行完整的邮件处理流程（在独立线程中运行）
-    
-    参数:
-        base_dir (str): 基础目录路径
-        log_output: TextRedirector 对象，用于输出日志
-        booking_list_path (str, optional): Booking List 文件路径，用于客户信息核对
-        price_list_path (str, optional): Price List 文件路径，用于自动查价
-    """
-    # 强制覆盖 invoice_extractor 模块的 API_KEY
-    invoice_extractor.API_KEY = API_KEY
-    
-    # 重定向 print 输出到 GUI 文本框
-    old_stdout = sys.stdout
-    sys.stdout = log_output
-    
-    try:
-        print("=" * 60)
-        print("开始执行发票自动处理程序")
-        print("=" * 60)
-        
-        # 用于统计
-        all_excel_data = []
-        processed_email_count = 0
-        success_extract_count = 0
-        start_time = datetime.now()
-        
-        # ==================== 步骤 1：初始化目录 ====================
-        print("\n【步骤 1】初始化目录结构...")
-        
-        current_date = datetime.now().strftime("%Y%m%d")
-        print(f"当前日期: {current_date}")
-        
-        base_path = os.path.join(base_dir, "Download", current_date)
-        print(f"基础路径: {base_path}")
-        
-        if not os.path.exists(base_path):
-            os.makedirs(base_path)
-            print(f"✓ 已创建基础目录: {base_path}")
-        
-        temp_dir = os.path.join(base_path, "Temp")
-        invoice_dir = os.path.join(base_path, "Invoice附件")
-        bl_dir = os.path.join(base_path, "BL附件")
-        
-        for dir_path in [temp_dir, invoice_dir, bl_dir]:
-            if not os.path.exists(dir_path):
-                os.makedirs(dir_path)
-                print(f"✓ 已创建目录: {dir_path}")
-            else:
-                print(f"✓ 目录已存在: {dir_path}")
-        
-        print("目录初始化完成！\n")
-        
-        # ==================== 步骤 2：执行下载 ====================
-        print("【步骤 2】从邮箱下载并处理附件...")
-        email_list = EmailHandler.download_and_process_attachments(MAIL_USER, MAIL_PASS, temp_dir)
-        
-        if not email_list:
-            print("⚠ 警告：没有获取到任何邮件，程序结束。")
-            return
-        
-        print(f"✓ 成功获取 {len(email_list)} 封有效邮件\n")
-        
-        # ==================== 步骤 3：处理每一封邮件 ====================
-        print("【步骤 3】处理邮件和附件...")
-        
-        for email_idx, email_info in enumerate(email_list, 1):
-            processed_email_count += 1
-            print(f"\n--- 处理第 {email_idx}/{len(email_list)} 封邮件 ---")
-            print(f"邮件标题: {email_info['subject']}")
-            print(f"Booking No: {email_info.get('booking_no', '未提取到')}")
-            
-            invoice_files = [att for att in email_info['attachments'] if att['type'] == 'INVOICE' or att['type'] == 'UNKNOWN']
-            bl_files = [att for att in email_info['attachments'] if att['type'] == 'BL' or att['type'] == 'UNKNOWN']
-            
-            if not invoice_files:
-                print("  ⚠ 跳过：该邮件中没有 Invoice 文件")
-                continue
-            
-            print(f"  发现 {len(invoice_files)} 个 Invoice 文件，{len(bl_files)} 个 BL 文件")
-            
-            for invoice_att in invoice_files:
-                invoice_path = invoice_att['path']
-                invoice_filename = os.path.basename(invoice_path)
-                print(f"\n  处理 Invoice: {invoice_filename}")
-                
-                print("  正在调用 AI 提取发票数据...")
-                extracted_data = invoice_extractor.extract_invoice_data(invoice_path)
-                
-                if not extracted_data:
-                    print("  ⚠ 跳过：AI 提取失败或返回空数据")
-                    continue
-                
-                first_data = extracted_data[0]
-                
-                # 优先使用 OriginalFileNo（文件编号），如果为空则使用 InvoiceNo（发票编号）作为兜底
-                invoice_no = first_data.get('OriginalFileNo', '').strip() if first_data.get('OriginalFileNo') else ''
-                if not invoice_no:
-                    invoice_no = first_data.get('InvoiceNo', '').strip() if first_data.get('InvoiceNo') else ''
-                hbl = first_data.get('HBL', '').strip() if first_data.get('HBL') else ''
-                
-                print(f"  提取到文件编号: {invoice_no}")
-                print(f"  提取到 HBL: {hbl}")
-                print(f"  发票包含 {len(extracted_data)} 行费用明细")
-                
-                # 遍历所有费用行，为每行生成一条 Excel 数据
-                booking_no = email_info.get('booking_no', '')
-                for row_idx, row_data in enumerate(extracted_data, 1):
-                    excel_row = invoice_extractor.prepare_excel_row(row_data, invoice_filename, booking_no)
-                    all_excel_data.append(excel_row)
-                    print(f"  ✓ 已添加第 {row_idx}/{len(extracted_data)} 行费用数据到 Excel 列表")
-                
-                success_extract_count += len(extracted_data)
-                print(f"  ✓ 共添加 {len(extracted_data)} 条记录到 Excel 数据列表")
-                
-                # ========== 重命名与归档 ==========
-                print("\n  【文件移动和重命名】")
-                
-                # 处理 Invoice
-                if invoice_no:
-                    target_invoice_name = f"invoice {invoice_no}.pdf"
-                    target_invoice_name = sanitize_filename(target_invoice_name)
-                    target_invoice_path = os.path.join(invoice_dir, target_invoice_name)
-                    
-                    counter = 1
-                    original_target = target_invoice_path
-                    while os.path.exists(target_invoice_path):
-                        name, ext = os.path.splitext(original_target)
-                        target_invoice_path = f"{name}_{counter}{ext}"
-                        counter += 1
-                    
-                    try:
-                        shutil.move(invoice_path, target_invoice_path)
-                        print(f"  ✓ Invoice 已移动并重命名: {os.path.basename(target_invoice_path)}")
-                    except Exception as e:
-                        print(f"  ✗ Invoice 移动失败: {e}")
-                else:
-                    target_invoice_name = invoice_filename
-                    target_invoice_path = os.path.join(invoice_dir, target_invoice_name)
-                    
-                    counter = 1
-                    original_target = target_invoice_path
-                    while os.path.exists(target_invoice_path):
-                        name, ext = os.path.splitext(original_target)
-                        target_invoice_path = f"{name}_{counter}{ext}"
-                        counter += 1
-                    
-                    try:
-                        shutil.move(invoice_path, target_invoice_path)
-                        print(f"  ✓ Invoice 已移动（未重命名，invoice_no为空）: {os.path.basename(target_invoice_path)}")
-                    except Exception as e:
-                        print(f"  ✗ Invoice 移动失败: {e}")
-                
-                # 处理 BL
-                if bl_files:
-                    for bl_att in bl_files:
-                        bl_path = bl_att['path']
-                        bl_filename = os.path.basename(bl_path)
-                        
-                        if not os.path.exists(bl_path):
-                            print(f"  ⚠ BL 文件已不存在（可能已被处理）: {bl_filename}")
-                            continue
-                        
-                        if hbl:
-                            target_bl_name = f"BL {hbl}.pdf"
-                            target_bl_name = sanitize_filename(target_bl_name)
-                            target_bl_path = os.path.join(bl_dir, target_bl_name)
-                            
-                            counter = 1
-                            original_target = target_bl_path
-                            while os.path.exists(target_bl_path):
-                                name, ext = os.path.splitext(original_target)
-                                target_bl_path = f"{name}_{counter}{ext}"
-                                counter += 1
-                            
-                            try:
-                                shutil.move(bl_path, target_bl_path)
-                                print(f"  ✓ BL 已移动并重命名: {os.path.basename(target_bl_path)}")
-                            except Exception as e:
-                                print(f"  ✗ BL 移动失败: {e}")
-                        else:
-                            target_bl_name = f"BL_未知_{bl_filename}"
-                            target_bl_path = os.path.join(bl_dir, target_bl_name)
-                            
-                            counter = 1
-                            original_target = target_bl_path
-                            while os.path.exists(target_bl_path):
-                                name, ext = os.path.splitext(original_target)
-                                target_bl_path = f"{name}_{counter}{ext}"
-                                counter += 1
-                            
-                            try:
-                                shutil.move(bl_path, target_bl_path)
-                                print(f"  ✓ BL 已移动（HBL为空，标记为未知）: {os.path.basename(target_bl_path)}")
-                            except Exception as e:
-                                print(f"  ✗ BL 移动失败: {e}")
-        
-        print(f"\n邮件处理完成！共处理 {processed_email_count} 封邮件，成功提取 {success_extract_count} 条发票数据\n")
-        
-        # ==================== 步骤 4：生成 Excel 报表 ====================
-        print("【步骤 4】生成 Excel 报表...")
-        
-        # 定义 info.xlsx 路径（无论是否有数据都需要定义，用于后续步骤）
-        info_excel_path = os.path.join(base_path, "info.xlsx")
-        
-        if all_excel_data:
-            headers = [
-                "NO", "File Name", "FILENO", "File No", "DATE", "Carrier", "Vessel/Voyage",
-                "Loading Port", "Loading Port Code", "Destination", "Destination Code",
-                "ETD", "ETA", "Receipt", "OBL", "HBL", "MBL",
-                "Item", "Quantity", "Unit Price", "Container Type", "Amount", "Booking No",
-                "Supplier Name", "Due Date", "Currency"
-            ]
-            
-            df = pd.DataFrame(all_excel_data, columns=headers)
-            
-            # 格式化日期字段，只保留日期部分，去除时间
-            date_columns = ['DATE', 'ETD', 'ETA']
-            for col in date_columns:
-                if col in df.columns:
-                    df[col] = pd.to_datetime(df[col], errors='coerce')
-                    df[col] = df[col].dt.normalize()
-                    df[col] = df[col].dt.strftime('%Y/%m/%d')
-                    df[col] = df[col].replace('NaT', '').replace('nan', '')
-            
-            df.to_excel(info_excel_path, index=False, engine='openpyxl')
-            print(f"✓ 已生成 info.xlsx: {info_excel_path}")
-        else:
-            print("⚠ 警告：没有数据可写入 info.xlsx")
-        
-        # 生成 当日运行清单.xlsx
-        end_time = datetime.now()
-        run_duration = (end_time - start_time).total_seconds()
-        status = "成功" if success_extract_count > 0 else "无数据"
-        
-        summary_data = {
-            "运行时间": [start_time.strftime("%Y-%m-%d %H:%M:%S")],
-            "处理邮件总数": [processed_email_count],
-            "成功提取数": [success_extract_count],
-            "状态": [status]
-        }
-        
-        summary_df = pd.DataFrame(summary_data)
-        summary_excel_path = os.path.join(base_path, "当日运行清单.xlsx")
-        summary_df.to_excel(summary_excel_path, index=False, engine='openpyxl')
-        print(f"✓ 已生成 当日运行清单.xlsx: {summary_excel_path}")
-        
-        print("Excel 报表生成完成！\n")
-        
-        # ==================== 额外步骤：客户信息核对 (RPA) ====================
-        if booking_list_path and os.path.exists(booking_list_path):
-            print(f"\n【额外步骤】检测到 Booking List，开始执行客户核对...")
-            print(f"Booking List 路径: {booking_list_path}")
-            
-            # info.xlsx 的路径在上面已经定义为 info_excel_path
-            # 如果上面没定义变量，请使用 os.path.join(base_path, "info.xlsx")
-            
-            try:
-                # 调用我们在 Step 1 写的模块
-                client_check.run_check(info_excel_path, booking_list_path)
-                print("✓ 客户核对完成！结果已更新至 info.xlsx")
-            except Exception as e:
-                print(f"⚠ 警告：客户核对过程中出错: {e}")
-        else:
-            print("\n【额外步骤】未选择 Booking List 或文件不存在，跳过客户核对。")
-        
-        # ==================== 额外步骤：自动查价 ====================
-        if not price_list_path or not price_list_path.strip():
-            print("\n【额外步骤】未选择 Price List，跳过自动查价。")
-        elif not os.path.exists(price_list_path):
-            print(f"\n【额外步骤】Price List 文件不存在: {price_list_path}，跳过自动查价。")
-        else:
-            # 检查 info.xlsx 是否存在（如果没有数据，文件可能不存在）
-            if not os.path.exists(info_excel_path):
-                print(f"\n【额外步骤】info.xlsx 不存在，无法执行自动查价。")
-            else:
-                print(f"\n【额外步骤】检测到 Price List，开始执行自动查价...")
-                print(f"Price List 路径: {price_list_path}")
-                
-                try:
-                    # 实例化 FreightMatcher
-                    matcher = FreightMatcher()
-                    
-                    # 加载运价表
-                    matcher.load_price_list(price_list_path)
-                    
-                    # 获取刚刚生成的结果 Excel 文件路径（info.xlsx）
-                    generated_report_path = info_excel_path
-                    
-                    # 执行价格匹配和回填
-                    matcher.run_matching(generated_report_path)
-                    
-                    print("✓ 自动查价完成！结果已更新至 info.xlsx")
-                except Exception as e:
-                    print(f"⚠ 警告：查价失败: {e}")
-                    traceback.print_exc()
-        
-        # ==================== 步骤 5：清理环境 ====================
-        print("【步骤 5】清理临时文件...")
-        
-        try:
-            if os.path.exists(temp_dir):
-                if not os.listdir(temp_dir):
-                    os.rmdir(temp_dir)
-                    print(f"✓ 已删除空的 Temp 文件夹: {temp_dir}")
-                else:
-                    print(f"⚠ Temp 文件夹不为空，保留文件夹（可能还有未处理的文件）")
-        except Exception as e:
-            print(f"⚠ 删除 Temp 文件夹时出错: {e}")
-        
-        print("\n" + "=" * 60)
-        print("程序执行完成！")
-        print("=" * 60)
-        print(f"处理邮件数: {processed_email_count}")
-        print(f"成功提取数: {success_extract_count}")
-        print(f"输出目录: {base_path}")
-        
-        # 返回输出目录路径，供 GUI 记录使用
-        return base_path
-        
-    except Exception as e:
-        print(f"\n❌ 程序执行出错: {e}")
-        traceback.print_exc()
-        return None
-    finally:
-        # 恢复标准输出
-        sys.stdout = old_stdout
-
-
 class InvoiceAutoGUI:
     """主 GUI 应用程序类"""
     
@@ -496,6 +215,25 @@ class InvoiceAutoGUI:
         
         # 创建界面
         self.create_widgets()
+        
+        # 窗口显示后记录启动耗时，并开始后台预加载
+        self.startup_seconds = None
+        self.root.after_idle(self.on_window_ready)
+    
+    def on_window_ready(self):
+        """窗口首次显示后调用（主线程）"""
+        self.startup_seconds = time.perf_counter() - _STARTUP_BEGIN
+        if self.startup_seconds > STARTUP_TARGET_SECONDS:
+            logger.warning("⚠ 界面启动耗时 %.2f 秒，超过目标 %.1f 秒", self.startup_seconds, STARTUP_TARGET_SECONDS)
+        else:
+            logger.info("界面启动耗时 %.2f 秒", self.startup_seconds)
+        threading.Thread(target=self.run_warm_up, name="warm-up", daemon=True).start()
+    
+    def run_warm_up(self):
+        """后台线程：预加载处理模块（用户选择文件夹、文件的同时进行）"""
+        elapsed = warm_up()
+        if elapsed is not None:
+            logger.debug("后台预加载完成，耗时 %.2f 秒", elapsed)
     
     def create_widgets(self):
         """创建 GUI 组件"""
@@ -580,6 +318,26 @@ class InvoiceAutoGUI:
                                                    font=("Consolas", 9),
                                                    bg="#f5f5f5", fg="#000000")
         self.log_text.pack(fill=tk.BOTH, expand=True, pady=5)
+        
+        # 日志重定向对象（整个程序共用一个，保证日志顺序）
+        self.log_sink = TextRedirector(self.log_text)
+        self.setup_logging()
+    
+    def setup_logging(self):
+        """
+        日志输出到日志框（只显示 INFO 及以上，调试信息不进入界面）
+        config.ini 配置了 [LOGGING] file 时同时写入轮转日志文件
+        """
+        try:
+            logging_config = config_loader.get_logging_config()
+            app_logging.setup_logging(console=False, gui_sink=self.log_sink.write,
+                                      log_file=logging_config['file'],
+                                      file_level=logging_config['file_level'],
+                                      max_bytes=logging_config['max_bytes'],
+                                      backup_count=logging_config['backup_count'])
+        except (OSError, ValueError) as e:
+            app_logging.setup_logging(console=False, gui_sink=self.log_sink.write)
+            self.log_sink.write(f"⚠ 日志文件配置无效，仅在界面中显示日志: {e}\n")
     
     def browse_folder(self):
         """浏览并选择保存文件夹"""
@@ -653,22 +411,25 @@ class InvoiceAutoGUI:
             return
         
         # 清空日志
-        self.log_text.delete(1.0, tk.END)
+        self.log_sink.clear()
         
         # 禁用按钮
         self.start_btn.config(state=tk.DISABLED, text="处理中...")
         self.is_running = True
         
-        # 创建日志重定向对象
-        log_redirector = TextRedirector(self.log_text)
-        
         # 在独立线程中运行主处理函数
-        thread = threading.Thread(target=self.run_in_thread, args=(log_redirector,), daemon=True)
+        thread = threading.Thread(target=self.run_in_thread, args=(self.log_sink,), daemon=True)
         thread.start()
     
     def run_in_thread(self, log_redirector):
         """在线程中运行主处理函数"""
         try:
+            # 后台预加载尚未完成时在此等待导入完成
+            try:
+                from pipeline import run_main_process
+            except Exception as e:
+                log_redirector.write(f"❌ 加载处理模块失败: {e}\n")
+                return
             output_dir = run_main_process(self.save_dir, log_redirector, self.booking_list_path, self.price_list_path)
             # 记录输出目录，供"生成报表"功能使用
             if output_dir:
@@ -700,17 +461,12 @@ class InvoiceAutoGUI:
             return
         
         # 3. 清空日志并显示开始信息
-        self.log_text.delete(1.0, tk.END)
-        self.log_text.insert(tk.END, f"正在从 info.xlsx 生成报表...\n")
-        self.log_text.insert(tk.END, f"源文件: {info_path}\n\n")
-        self.log_text.update()
+        self.log_sink.clear()
+        self.log_sink.write(f"正在从 info.xlsx 生成报表...\n")
+        self.log_sink.write(f"源文件: {info_path}\n\n")
         
         # 4. 在独立线程中调用 report_generator.generate_all_reports(info_path)
-        # 创建日志重定向对象
-        log_redirector = TextRedirector(self.log_text)
-        
-        # 在独立线程中运行
-        thread = threading.Thread(target=self.run_generate_reports, args=(info_path, log_redirector), daemon=True)
+        thread = threading.Thread(target=self.run_generate_reports, args=(info_path, self.log_sink), daemon=True)
         thread.start()
     
     def run_generate_reports(self, info_path, log_redirector):
@@ -720,28 +476,64 @@ class InvoiceAutoGUI:
         sys.stdout = log_redirector
         
         try:
-            # 调用报表生成函数
-            result = report_generator.generate_all_reports(info_path)
+            import report_generator
             
-            # 显示结果（需要在主线程中更新 UI）
+            # 调用报表生成函数（config.ini 开启 [PROFILING] 时同时生成性能分析报告）
+            profile_config = config_loader.get_profiling_config()
+            if profile_config['enabled']:
+                profiling.start_session(os.path.dirname(os.path.abspath(info_path)), profile_config['top_n'])
+            # 报表指标单独记录：info.xlsx 可能来自以前的运行，不能用本进程最近一次流水线的指标覆盖该运行目录的指标
+            report_metrics = metrics.MetricsRegistry()
+            try:
+                with profiling.stage("generate_reports"), metrics.use_registry(report_metrics):
+                    result = report_generator.generate_all_reports(info_path)
+                profiling.snapshot("generate_reports")
+            finally:
+                profiling.finish_session()
+            
+            # 显示结果（日志队列线程安全，由主线程统一刷新到界面）
             if result['success']:
-                self.root.after(0, lambda: self.log_text.insert(tk.END, "\n✓ 报表生成成功！\n"))
-                self.root.after(0, lambda: self.log_text.insert(tk.END, f"输出目录: {result['output_dir']}\n"))
+                log_redirector.write("\n✓ 报表生成成功！\n")
+                log_redirector.write(f"输出目录: {result['output_dir']}\n")
                 for f in result['files']:
-                    self.root.after(0, lambda file=f: self.log_text.insert(tk.END, f"  - {file}\n"))
+                    log_redirector.write(f"  - {f}\n")
+                # 报表生成耗时写入运行目录的 report_metrics.json（不修改流水线的 run_metrics.json）
+                try:
+                    metrics.export_report_metrics(result['output_dir'], report_metrics)
+                except Exception as e:
+                    log_redirector.write(f"⚠ 警告：写入运行指标失败: {e}\n")
                 # 更新最近输出目录
                 if result['output_dir']:
                     self.root.after(0, lambda: setattr(self, 'last_output_dir', result['output_dir']))
             else:
-                self.root.after(0, lambda: self.log_text.insert(tk.END, f"\n✗ 生成失败: {result['error']}\n"))
+                log_redirector.write(f"\n✗ 生成失败: {result['error']}\n")
         except Exception as e:
-            self.root.after(0, lambda: self.log_text.insert(tk.END, f"\n✗ 生成报表时发生异常: {str(e)}\n"))
+            log_redirector.write(f"\n✗ 生成报表时发生异常: {str(e)}\n")
             traceback.print_exc()
         finally:
             # 恢复标准输出
             sys.stdout = old_stdout
 
 
+def warm_up():
+    """
+    预加载重型模块和港口代码表，使第一次点击按钮时无需等待导入
+    
+    返回:
+        float|None: 耗时（秒），失败时返回 None（首次使用时会重新导入并显示错误）
+    """
+    start = time.perf_counter()
+    try:
+        import pipeline          # noqa: F401  pandas / pdfplumber / imap_tools / requests / openpyxl
+        import report_generator  # noqa: F401
+        import port_resolver
+        port_resolver.get_resolver()
+    except Exception as e:
+        logger.warning("⚠ 后台预加载失败，将在首次使用时重新加载: %s", e)
+        return None
+    return time.perf_counter() - start
+
+
 def main():
     """主函数：启动 GUI 应用"""
     root = tk.Tk()
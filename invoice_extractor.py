@@ -1,11 +1,17 @@
 import json
 import requests
-import pdfplumber
-import re
 import time  # 如需使用 sleep，请使用 time.sleep()
 import os
-import sys
+import threading
 import config_loader
+import record_replay
+import metrics
+import port_resolver
+import pdf_text
+from PDFClassifier import score_invoice_page, count_amounts, INVOICE_PAGE_MIN_SCORE, CONTINUATION_MIN_AMOUNTS
+from app_logging import get_logger
+
+logger = get_logger(__name__)
 
 # ================= 配置区域 =================
 # 从配置文件加载 API Key
@@ -15,65 +21,84 @@ except (FileNotFoundError, ValueError) as e:
     print(f"[错误] API Key 配置加载失败: {e}")
     print("请确保已创建 config.ini 文件并填写正确的 API Key。")
     API_KEY = ""  # 设置为空字符串，后续调用会失败并提示
-# ===========================================
 
-# ================= 港口代码缓存 =================
-# 全局变量：缓存加载的港口代码字典，避免重复加载
-_PORT_CODES_CACHE = None
+# chat/completions 接口地址（由 pipeline 每次运行时按 config.ini 更新）
+API_URL = config_loader.DEFAULT_API_URL
+# 请求超时（秒）和限流设置（由 pipeline 每次运行时按 [PERFORMANCE] 更新，见 configure_api）
+API_TIMEOUT = config_loader.DEFAULT_PERFORMANCE['api_timeout']
 # ===========================================
 
-# ================= 港口代码加载函数 =================
-def load_port_codes():
+
+class _ApiLimiter:
     """
-    功能：从 port_codes.json 文件加载港口代码字典（带缓存）
-    
-    返回：
-        dict: 港口名称（大写）-> 5位代码 的字典
-        如果文件不存在或读取失败，返回空字典并记录错误日志
+    AI 请求限流：限制同时进行的请求数，以及相邻两次请求开始的最短间隔
+
+    参数:
+        max_concurrency (int): 同时进行的请求数上限（0 = 不限制）
+        requests_per_minute (int): 每分钟请求数上限（0 = 不限制）
     """
-    global _PORT_CODES_CACHE
-    
-    # 如果已经加载过，直接返回缓存
-    if _PORT_CODES_CACHE is not None:
-        return _PORT_CODES_CACHE
-    
-    try:
-        # 判断是否为打包后的 EXE 环境
-        if getattr(sys, 'frozen', False):
-            # EXE 环境：使用 EXE 文件所在的目录
-            base_path = os.path.dirname(sys.executable)
-        else:
-            # 普通 Python 脚本运行：使用脚本文件所在的目录
-            base_path = os.path.dirname(__file__)
-        
-        json_file = os.path.join(base_path, 'port_codes.json')
-        
-        if not os.path.exists(json_file):
-            print(f"[警告] 港口代码文件不存在: {json_file}")
-            print("请确保 port_codes.json 文件存在于项目根目录。")
-            _PORT_CODES_CACHE = {}
-            return {}
-        
-        with open(json_file, 'r', encoding='utf-8-sig') as f:
-            port_dict = json.load(f)
-        
-        print(f"[成功] 成功加载港口代码字典，共 {len(port_dict)} 个港口。")
-        _PORT_CODES_CACHE = port_dict
-        return port_dict
-        
-    except json.JSONDecodeError as e:
-        print(f"[错误] port_codes.json 文件格式错误: {e}")
-        _PORT_CODES_CACHE = {}
-        return {}
-    except Exception as e:
-        print(f"[错误] 加载港口代码文件失败: {e}")
-        _PORT_CODES_CACHE = {}
-        return {}
-# ===========================================
+
+    def __init__(self, max_concurrency=0, requests_per_minute=0):
+        self.max_concurrency = max_concurrency
+        self.requests_per_minute = requests_per_minute
+        self._semaphore = threading.BoundedSemaphore(max_concurrency) if max_concurrency else None
+        self._interval = 60.0 / requests_per_minute if requests_per_minute else 0.0
+        self._lock = threading.Lock()
+        self._next_start = 0.0
+
+    def __enter__(self):
+        if self._semaphore is not None:
+            self._semaphore.acquire()
+        if self._interval:
+            with self._lock:
+                now = time.monotonic()
+                start = max(now, self._next_start)
+                self._next_start = start + self._interval
+            if start > now:
+                metrics.inc("api_throttled")
+                time.sleep(start - now)
+        return self
+
+    def __exit__(self, *exc):
+        if self._semaphore is not None:
+            self._semaphore.release()
+        return False
+
+
+_API_LIMITER = _ApiLimiter()
+
+
+def configure_api(timeout=None, max_concurrency=0, requests_per_minute=0):
+    """
+    设置 AI 请求的超时和限流（设置未变化时保留原有的限流状态）
+
+    参数:
+        timeout (float): 请求超时（秒），None 表示保持不变
+        max_concurrency (int): 同时进行的请求数上限（0 = 不限制）
+        requests_per_minute (int): 每分钟请求数上限（0 = 不限制）
+    """
+    global API_TIMEOUT, _API_LIMITER
+    if timeout:
+        API_TIMEOUT = timeout
+    if (_API_LIMITER.max_concurrency, _API_LIMITER.requests_per_minute) != (max_concurrency, requests_per_minute):
+        _API_LIMITER = _ApiLimiter(max_concurrency, requests_per_minute)
+
+
+def _post_chat_completion(url, headers, payload):
+    """发送 chat/completions 请求（按 configure_api 的设置限流）"""
+    with _API_LIMITER:
+        return record_replay.post_chat_completion(requests.post, url, headers, payload, timeout=API_TIMEOUT)
+
+# ================= 港口代码 =================
+# 港口代码字典的加载和解析见 port_resolver（保留 load_port_codes 以兼容原有调用）
+load_port_codes = port_resolver.load_port_codes
 
 def get_port_code(port_name):
     """
-    功能：根据港口名称查找对应的 UN/LOCODE 代码（严格匹配模式）
+    功能：根据港口名称查找对应的 UN/LOCODE 代码
+    
+    支持标准化、别名和模糊匹配（例如 "SHANGHAI, CHINA"、"Port of Ningbo"、
+    "HO CHI MINH CITY (CAT LAI)"），详见 port_resolver
     
     参数：
         port_name: 港口名称（例如 "Shanghai" 或 "SHANGHAI"）
@@ -81,30 +106,53 @@ def get_port_code(port_name):
     返回：
         对应的 5 位代码，如果找不到则返回空字符串
     """
-    # 1. 如果 port_name 为空，返回空字符串
-    if not port_name:
-        return ""
-    
-    # 2. 加载港口代码字典
-    port_dict = load_port_codes()
-    
-    # 3. 如果字典为空（文件加载失败），返回空字符串
-    if not port_dict:
-        return ""
-    
-    # 4. 标准化输入：去除首尾空格并转换为大写
-    normalized_name = str(port_name).strip().upper()
-    
-    # 5. 严格匹配：直接查表
-    code = port_dict.get(normalized_name, "")
-    
-    if code:
-        print(f"DEBUG: 港口匹配成功: [{port_name}] -> [{code}]")
-    else:
-        print(f"DEBUG: 港口匹配失败: [{port_name}] (标准化后: [{normalized_name}])")
-    
-    return code
+    return port_resolver.resolve(port_name)
+
+def read_invoice_text(pdf_path):
+    """
+    读取发票中需要提取的页面文本（跳过条款、银行信息、提单副本等页面，减少 AI 的 Token 数）
+
+    按顺序逐页读取并打分（PDFClassifier.score_invoice_page），保留第一页、达到
+    INVOICE_PAGE_MIN_SCORE 的页面，以及紧接在保留页面之后、有 CONTINUATION_MIN_AMOUNTS 个以上金额的续页
+    （没有币种和总计的费用明细续页）；读到底部是总计金额的页面后不再读取后面的页面。
+    没有任何页面达到分数时（格式特殊的发票）使用已读取的全部页面
+
+    参数:
+        pdf_path (str): PDF 文件路径
+
+    返回:
+        str: 保留页面的文本（每页以换行结尾）；没有文本时返回空字符串
+    """
+    pages = []
+    kept = []
+    has_content = False
+    previous_kept = False
+    for page_number, text in enumerate(pdf_text.iter_pages(pdf_path)):
+        pages.append(text)
+        if not text:
+            previous_kept = False
+            continue
+        score, is_grand_total = score_invoice_page(text)
+        if score >= INVOICE_PAGE_MIN_SCORE:
+            has_content = True
+        # 续页：没有标题、币种和总计，只有费用明细（条款、提单页得分为负，不作为续页）
+        is_continuation = previous_kept and score > 0 and count_amounts(text) >= CONTINUATION_MIN_AMOUNTS
+        previous_kept = page_number == 0 or score >= INVOICE_PAGE_MIN_SCORE or is_continuation
+        if previous_kept:
+            kept.append(text)
+        if is_grand_total and score >= INVOICE_PAGE_MIN_SCORE:
+            break
+
+    if not has_content:
+        kept = [text for text in pages if text]
+    skipped = len(pages) - len(kept)
+    if skipped > 0:
+        metrics.inc("pdf_pages_skipped", skipped)
+        logger.debug("%s: 发送 %d 页，跳过 %d 页", os.path.basename(pdf_path), len(kept), skipped)
+    metrics.inc("pdf_pages_extracted", len(kept))
+    return "".join(text + "\n" for text in kept)
 
+@metrics.timed("extract_invoice")
 def extract_invoice_data(pdf_path):
     """
     功能：调用 DeepSeek 提取 PDF 中的发票数据（SRTS专用优化版本）
@@ -116,19 +164,15 @@ def extract_invoice_data(pdf_path):
 
     # 2. 读取PDF文字
     print(f"正在读取PDF文件：{pdf_path}")
-    full_text = ""
     try:
-        with pdfplumber.open(pdf_path) as pdf:
-            for page in pdf.pages:
-                text = page.extract_text()
-                if text:
-                    full_text += text + "\n"
+        with metrics.span("pdf_text"):
+            full_text = read_invoice_text(pdf_path)
     except Exception as e:
         print(f"读取PDF失败: {e}")
         return []
 
     if not full_text:
-        print("警告：无法提取文本，可能是扫描图片PDF")
+        print("警告：无法提取文本，可能是扫描图片PDF（可在 config.ini 的 [OCR] 中开启扫描件识别）")
         return []
 
     # 3. 构造提示词
@@ -173,7 +217,7 @@ def extract_invoice_data(pdf_path):
 
     print("正在调用 DeepSeek 进行智能提取...")
     
-    url = "https://api.deepseek.com/chat/completions"
+    url = API_URL
     headers = {
         "Content-Type": "application/json",
         "Authorization": f"Bearer {API_KEY}"
@@ -189,10 +233,15 @@ def extract_invoice_data(pdf_path):
     }
 
     try:
-        response = requests.post(url, headers=headers, json=payload, timeout=60)
+        with metrics.span("llm_request"):
+            response = _post_chat_completion(url, headers, payload)
+        metrics.inc("api_requests")
         
         if response.status_code == 200:
             res_json = response.json()
+            usage = res_json.get('usage') or {}
+            metrics.inc("api_prompt_tokens", usage.get('prompt_tokens', 0))
+            metrics.inc("api_completion_tokens", usage.get('completion_tokens', 0))
             content = res_json['choices'][0]['message']['content']
             
             # 清洗数据
@@ -214,6 +263,7 @@ def extract_invoice_data(pdf_path):
             print(f"提取成功！共找到 {len(result_list)} 条费用记录。")
             return result_list
         else:
+            metrics.inc("api_errors")
             print(f"API调用失败: {response.text}")
             return []
             
@@ -222,6 +272,7 @@ def extract_invoice_data(pdf_path):
         return []
 
 
+@metrics.timed("extract_invoice")
 def extract_invoice_data_generic(pdf_path):
     """
     功能：调用 DeepSeek 提取 PDF 中的发票数据（通用版本，适用于所有供应商）
@@ -237,19 +288,15 @@ def extract_invoice_data_generic(pdf_path):
 
     # 2. 读取PDF文字
     print(f"正在读取PDF文件：{pdf_path}")
-    full_text = ""
     try:
-        with pdfplumber.open(pdf_path) as pdf:
-            for page in pdf.pages:
-                text = page.extract_text()
-                if text:
-                    full_text += text + "\n"
+        with metrics.span("pdf_text"):
+            full_text = read_invoice_text(pdf_path)
     except Exception as e:
         print(f"读取PDF失败: {e}")
         return []
 
     if not full_text:
-        print("警告：无法提取文本，可能是扫描图片PDF")
+        print("警告：无法提取文本，可能是扫描图片PDF（可在 config.ini 的 [OCR] 中开启扫描件识别）")
         return []
 
     # 3. 构造通用提示词（不依赖SRTS特定格式）
@@ -298,7 +345,7 @@ def extract_invoice_data_generic(pdf_path):
 
     print("正在调用 DeepSeek 进行智能提取（通用模式）...")
     
-    url = "https://api.deepseek.com/chat/completions"
+    url = API_URL
     headers = {
         "Content-Type": "application/json",
         "Authorization": f"Bearer {API_KEY}"
@@ -314,10 +361,15 @@ def extract_invoice_data_generic(pdf_path):
     }
 
     try:
-        response = requests.post(url, headers=headers, json=payload, timeout=60)
+        with metrics.span("llm_request"):
+            response = _post_chat_completion(url, headers, payload)
+        metrics.inc("api_requests")
         
         if response.status_code == 200:
             res_json = response.json()
+            usage = res_json.get('usage') or {}
+            metrics.inc("api_prompt_tokens", usage.get('prompt_tokens', 0))
+            metrics.inc("api_completion_tokens", usage.get('completion_tokens', 0))
             content = res_json['choices'][0]['message']['content']
             
             # 清洗数据
@@ -333,6 +385,7 @@ def extract_invoice_data_generic(pdf_path):
             print(f"提取成功！共找到 {len(result_list)} 条费用记录。")
             return result_list
         else:
+            metrics.inc("api_errors")
             print(f"API调用失败: {response.text}")
             return []
             
@@ -343,6 +396,7 @@ def extract_invoice_data_generic(pdf_path):
 # =================================================================
 # 👇 这里是新增的函数：专门用于把数据组装成 Excel 的一行 (适配 Sheet1)
 # =================================================================
+@metrics.timed("prepare_excel_row")
 def prepare_excel_row(invoice_data, file_path, booking_no):
     """
     功能：适配 info.xlsx - Sheet1 的表头格式
@@ -0,0 +1,429 @@
+"""
+发票台账模块
+在 Download/invoice_ledger.db（SQLite）中持久记录每张已提取的发票，用于发现重复发票：
+    - 内容相同的 PDF（按文件 SHA-256 查找）：在调用 AI 之前跳过，不会重复提取和记账
+    - 供应商 + 发票号相同但内容不同的 PDF：照常提取，生成 XERO Bill 时标记为重复并单独列出
+
+每天的 info.xlsx 是独立的文件，台账跨日期保存，同一张发票隔天从另一封邮件再次收到也能发现
+两种查找都走索引（O(log n)），台账变大后不会变慢
+
+另外在 attachments 表中记录已处理完的附件（发票、提单、垃圾文件）的内容哈希，
+配合本次运行的内存索引（AttachmentIndex），回复 / 转发邮件中重复的附件在下载时即被识别，
+不再保存、分类和提取
+
+用法:
+    ledger = InvoiceLedger(ledger_path_for_base_dir(base_dir), run_dir=base_path)
+    original = ledger.find_duplicate(file_sha256(pdf_path), file_name)
+    outcome = ledger.register(rows, INFO_HEADERS, content_hash, file_name, email_id)
+
+    index = AttachmentIndex(ledger)
+    original = index.claim(content_hash, {"file_name": ..., "email_id": ..., "att_id": ...})
+"""
+
+import os
+import sqlite3
+import hashlib
+import threading
+from datetime import datetime
+
+# ================= 配置常量 =================
+LEDGER_FILENAME = "invoice_ledger.db"    # 保存在 Download 目录下（与每天的运行目录同级）
+LEDGER_SCHEMA_VERSION = 2               # 2: 增加 attachments 表
+
+# info.xlsx 中登记到台账的列（prepare_excel_row 生成的数据行按 INFO_HEADERS 对应）
+SUPPLIER_COLUMN = "Supplier Name"
+INVOICE_NO_COLUMN = "FILENO"             # 优先 InvoiceNo，否则 OriginalFileNo
+FILE_NAME_COLUMN = "File Name"
+HBL_COLUMN = "HBL"
+AMOUNT_COLUMN = "Amount"
+CURRENCY_COLUMN = "Currency"
+
+# register() 返回的重复原因
+DUPLICATE_NONE = ""              # 不是重复发票（或是同一个文件再次登记，例如断点续跑）
+DUPLICATE_CONTENT = "content"    # 与已登记的 PDF 内容完全相同
+DUPLICATE_INVOICE_NO = "invoice_no"    # 供应商 + 发票号与已登记的发票相同
+# ===========================================
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS invoices (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    supplier_name TEXT NOT NULL DEFAULT '',
+    invoice_no TEXT NOT NULL DEFAULT '',
+    content_hash TEXT NOT NULL,
+    run_dir TEXT NOT NULL,
+    file_name TEXT NOT NULL,
+    email_id TEXT NOT NULL DEFAULT '',
+    hbl TEXT NOT NULL DEFAULT '',
+    row_count INTEGER NOT NULL DEFAULT 0,
+    total_amount REAL,
+    currency TEXT NOT NULL DEFAULT '',
+    duplicate_of INTEGER REFERENCES invoices(id),
+    duplicate_reason TEXT NOT NULL DEFAULT '',
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_invoices_supplier_invoice ON invoices(supplier_name, invoice_no);
+CREATE INDEX IF NOT EXISTS idx_invoices_content_hash ON invoices(content_hash);
+CREATE TABLE IF NOT EXISTS attachments (
+    content_hash TEXT PRIMARY KEY,
+    file_type TEXT NOT NULL DEFAULT '',
+    run_dir TEXT NOT NULL,
+    email_id TEXT NOT NULL DEFAULT '',
+    att_id TEXT NOT NULL DEFAULT '',
+    file_name TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+"""
+
+
+def ledger_path_for_base_dir(base_dir):
+    """返回程序基础目录对应的台账路径（<base_dir>/Download/invoice_ledger.db）"""
+    return os.path.join(base_dir, "Download", LEDGER_FILENAME)
+
+
+def ledger_path_for_run_dir(run_dir):
+    """返回运行目录（Download/<日期>）对应的台账路径"""
+    return os.path.join(os.path.dirname(os.path.abspath(run_dir)), LEDGER_FILENAME)
+
+
+def bytes_sha256(payload):
+    """计算内存中附件内容的 SHA-256 哈希值（与 file_sha256 的结果一致）"""
+    return hashlib.sha256(payload).hexdigest()
+
+
+def file_sha256(file_path):
+    """
+    计算文件内容的 SHA-256 哈希值（分块读取，避免大文件占用内存）
+
+    参数:
+        file_path (str): 文件路径
+
+    返回:
+        str: 十六进制哈希字符串
+    """
+    sha = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def normalize_supplier(name):
+    """供应商名称标准化：去掉首尾空白、合并连续空白并转为大写"""
+    return " ".join(str(name or "").split()).upper()
+
+
+def normalize_invoice_no(invoice_no):
+    """发票号标准化：去掉所有空白并转为大写（"s2511 sed01" 与 "S2511SED01" 视为相同）"""
+    return "".join(str(invoice_no or "").split()).upper()
+
+
+def _to_amount(value):
+    """金额转换为数字（无法识别时返回 None）"""
+    try:
+        return float(str(value).replace(",", "").strip())
+    except (TypeError, ValueError):
+        return None
+
+
+def _clean(value):
+    """
+    单元格值转为字符串（空值 / NaN 转为空字符串）
+
+    有空单元格的数字列（例如纯数字的 FILENO）被 pandas 读成浮点数，12345 读出来是 12345.0；
+    整数值的浮点数按整数转换，与登记时的 "12345" 一致
+    """
+    if value is None or value != value:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).strip()
+
+
+class InvoiceLedger:
+    """
+    发票台账（SQLite，线程安全：所有操作共用一个连接并加锁）
+
+    参数:
+        db_path (str): 台账文件路径（不存在时自动创建）
+        run_dir (str): 当前运行目录；运行目录 + 邮件标识 + 文件名相同的记录视为同一个附件
+            （断点续跑时再次登记），用于区分「同一个附件再次登记」和「另一个附件重复」
+    """
+
+    def __init__(self, db_path, run_dir=""):
+        self.db_path = db_path
+        self.run_dir = os.path.abspath(run_dir) if run_dir else ""
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+            self._conn.execute(f"PRAGMA user_version = {LEDGER_SCHEMA_VERSION}")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def _is_same_file(self, entry, file_name, run_dir=None, email_id=None):
+        run_dir = os.path.abspath(run_dir) if run_dir else self.run_dir
+        if email_id is not None and entry['email_id'] != str(email_id):
+            return False
+        return entry['file_name'] == file_name and entry['run_dir'] == run_dir
+
+    def _query_one(self, sql, params):
+        with self._lock:
+            row = self._conn.execute(sql, params).fetchone()
+        return dict(row) if row is not None else None
+
+    def count(self):
+        """返回已登记的发票数"""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM invoices").fetchone()[0]
+
+    def find_by_hash(self, content_hash):
+        """
+        按 PDF 内容哈希查找最早登记的发票
+
+        返回:
+            dict|None: 台账记录（不存在时返回 None）
+        """
+        return self._query_one("SELECT * FROM invoices WHERE content_hash = ? ORDER BY id LIMIT 1",
+                               (content_hash,))
+
+    def find_by_key(self, supplier_name, invoice_no):
+        """
+        按供应商 + 发票号查找最早登记的发票（发票号为空时不查找）
+
+        返回:
+            dict|None: 台账记录（不存在时返回 None）
+        """
+        invoice_no = normalize_invoice_no(invoice_no)
+        if not invoice_no:
+            return None
+        return self._query_one(
+            "SELECT * FROM invoices WHERE supplier_name = ? AND invoice_no = ? ORDER BY id LIMIT 1",
+            (normalize_supplier(supplier_name), invoice_no))
+
+    def find_duplicate(self, content_hash, file_name, email_id="", run_dir=None):
+        """
+        调用 AI 之前检查：是否已登记过内容完全相同的另一个 PDF
+
+        参数:
+            content_hash (str): 文件 SHA-256
+            file_name (str): 文件名（Temp 中的文件名，与 info.xlsx 的 File Name 列一致）
+            email_id (str): 邮件标识
+            run_dir (str, optional): 运行目录，默认使用创建台账时指定的目录
+
+        返回:
+            dict|None: 最早登记的台账记录；没有登记过或是同一个附件时返回 None
+        """
+        original = self.find_by_hash(content_hash)
+        if original is None or self._is_same_file(original, file_name, run_dir, str(email_id or "")):
+            return None
+        return original
+
+    def register(self, rows, headers, content_hash, file_name, email_id="", run_dir=None):
+        """
+        登记一张发票（同一个附件再次登记时不重复写入）
+
+        参数:
+            rows (list): 这张发票的 info.xlsx 数据行（prepare_excel_row 的输出）
+            headers (list): 数据行对应的列名（pipeline.INFO_HEADERS）
+            content_hash (str): PDF 文件 SHA-256
+            file_name (str): 文件名
+            email_id (str): 邮件标识
+            run_dir (str, optional): 运行目录，默认使用创建台账时指定的目录
+
+        返回:
+            dict: {
+                "entry_id": 本次登记（或已有的同一附件）的记录编号,
+                "duplicate": DUPLICATE_NONE / DUPLICATE_CONTENT / DUPLICATE_INVOICE_NO,
+                "original": 重复时最早登记的台账记录（否则为 None）,
+            }
+        """
+        run_dir = os.path.abspath(run_dir) if run_dir else self.run_dir
+        email_id = str(email_id or "")
+        records = [dict(zip(headers, row)) for row in rows]
+        first = records[0] if records else {}
+        supplier = normalize_supplier(first.get(SUPPLIER_COLUMN))
+        invoice_no = normalize_invoice_no(first.get(INVOICE_NO_COLUMN))
+        amounts = [_to_amount(record.get(AMOUNT_COLUMN)) for record in records]
+        amounts = [amount for amount in amounts if amount is not None]
+
+        with self._lock, self._conn:
+            # 同一个附件已经登记过（断点续跑时再次归档）
+            existing = self._conn.execute(
+                "SELECT * FROM invoices WHERE content_hash = ? AND run_dir = ? AND file_name = ? AND email_id = ? "
+                "LIMIT 1", (content_hash, run_dir, file_name, email_id)).fetchone()
+            if existing is not None:
+                original = None
+                if existing['duplicate_of'] is not None:
+                    original = dict(self._conn.execute("SELECT * FROM invoices WHERE id = ?",
+                                                       (existing['duplicate_of'],)).fetchone())
+                return {"entry_id": existing['id'], "duplicate": existing['duplicate_reason'], "original": original}
+
+            duplicate = DUPLICATE_NONE
+            original = self._conn.execute(
+                "SELECT * FROM invoices WHERE content_hash = ? ORDER BY id LIMIT 1", (content_hash,)).fetchone()
+            if original is not None:
+                duplicate = DUPLICATE_CONTENT
+            elif invoice_no:
+                original = self._conn.execute(
+                    "SELECT * FROM invoices WHERE supplier_name = ? AND invoice_no = ? ORDER BY id LIMIT 1",
+                    (supplier, invoice_no)).fetchone()
+                if original is not None:
+                    duplicate = DUPLICATE_INVOICE_NO
+            original = dict(original) if original is not None else None
+
+            cursor = self._conn.execute(
+                "INSERT INTO invoices (supplier_name, invoice_no, content_hash, run_dir, file_name, email_id, "
+                "hbl, row_count, total_amount, currency, duplicate_of, duplicate_reason, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (supplier, invoice_no, content_hash, run_dir, file_name, email_id,
+                 _clean(first.get(HBL_COLUMN)), len(records), sum(amounts) if amounts else None,
+                 _clean(first.get(CURRENCY_COLUMN)), original['id'] if original else None, duplicate,
+                 datetime.now().isoformat(timespec='seconds')))
+            return {"entry_id": cursor.lastrowid, "duplicate": duplicate, "original": original}
+
+    def find_attachment(self, content_hash):
+        """
+        查找之前已处理完的内容相同的附件
+
+        返回:
+            dict|None: attachments 表中的记录
+        """
+        return self._query_one("SELECT * FROM attachments WHERE content_hash = ?", (content_hash,))
+
+    def remember_attachments(self, attachments, run_dir=None):
+        """
+        登记已处理完的附件（已登记过的内容哈希保持最早的记录）
+
+        参数:
+            attachments (list): [{"content_hash", "type", "email_id", "att_id", "filename"}, ...]
+                （运行日志中的附件记录）
+            run_dir (str, optional): 运行目录，默认使用创建台账时指定的目录
+
+        返回:
+            int: 新登记的附件数
+        """
+        run_dir = os.path.abspath(run_dir) if run_dir else self.run_dir
+        created_at = datetime.now().isoformat(timespec='seconds')
+        rows = [(att['content_hash'], att.get('type') or '', run_dir, str(att.get('email_id') or ''),
+                 att.get('att_id') or '', att.get('filename') or os.path.basename(att.get('path') or ''), created_at)
+                for att in attachments if att.get('content_hash')]
+        with self._lock, self._conn:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO attachments (content_hash, file_type, run_dir, email_id, att_id, file_name, "
+                "created_at) VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            return self._conn.total_changes - before
+
+    def _entry_for_rows(self, supplier_name, invoice_no, file_name, run_dir):
+        """
+        查找 info.xlsx 中一组数据行对应的台账记录：同一运行目录、同一文件名的最新一条生成了数据行的记录
+        （info.xlsx 每次运行重写，最新登记的就是当前文件中的数据；内容重复的发票不生成数据行）
+        """
+        return self._query_one(
+            "SELECT * FROM invoices WHERE supplier_name = ? AND invoice_no = ? AND run_dir = ? AND file_name = ? "
+            "AND duplicate_reason != ? ORDER BY id DESC LIMIT 1",
+            (supplier_name, invoice_no, run_dir, file_name, DUPLICATE_CONTENT))
+
+    def find_duplicate_rows(self, df, run_dir=None):
+        """
+        导出 XERO 之前检查：找出「供应商 + 发票号」已由另一个文件登记过的数据行
+
+        每个 (供应商, 发票号, 文件名) 组合只查询一次；数据行由流水线登记过时按登记时的判断，
+        否则（例如手工整理的 info.xlsx）与最早登记的同号发票比较
+
+        参数:
+            df (pandas.DataFrame): info.xlsx 数据（需要 Supplier Name、FILENO、File Name 列）
+            run_dir (str, optional): info.xlsx 所在的运行目录，默认使用创建台账时指定的目录
+
+        返回:
+            dict: 行索引 -> 最早登记的台账记录（只包含重复的行）
+        """
+        if df.empty or INVOICE_NO_COLUMN not in df.columns:
+            return {}
+
+        run_dir = os.path.abspath(run_dir) if run_dir else self.run_dir
+        duplicates = {}
+        checked = {}
+        for idx, row in df.iterrows():
+            key = (normalize_supplier(_clean(row.get(SUPPLIER_COLUMN))),
+                   normalize_invoice_no(_clean(row.get(INVOICE_NO_COLUMN))),
+                   _clean(row.get(FILE_NAME_COLUMN)))
+            if key not in checked:
+                original = None
+                if key[1]:
+                    entry = self._entry_for_rows(key[0], key[1], key[2], run_dir)
+                    if entry is None:
+                        original = self.find_by_key(key[0], key[1])
+                        if original is not None and self._is_same_file(original, key[2], run_dir):
+                            original = None
+                    elif entry['duplicate_of'] is not None:
+                        original = self._query_one("SELECT * FROM invoices WHERE id = ?", (entry['duplicate_of'],))
+                checked[key] = original
+            if checked[key] is not None:
+                duplicates[idx] = checked[key]
+        return duplicates
+
+
+class AttachmentIndex:
+    """
+    附件内容索引（按 SHA-256，线程安全）：
+    本次运行中已下载的附件（内存）+ 之前的运行中已处理完的附件（台账 attachments 表）
+
+    内容相同的附件只保存和处理第一份，之后的副本在下载时直接引用第一份
+
+    参数:
+        ledger (InvoiceLedger, optional): 发票台账（为空时只在本次运行内去重）
+    """
+
+    def __init__(self, ledger=None):
+        self.ledger = ledger
+        self._seen = {}
+        self._lock = threading.Lock()
+
+    def claim(self, content_hash, entry):
+        """
+        登记一个即将保存的附件
+
+        参数:
+            content_hash (str): 附件内容 SHA-256
+            entry (dict): 附件信息 {"file_name", "email_id", "att_id"}（作为之后副本引用的对象）
+
+        返回:
+            dict|None: 内容相同的第一份附件（本次运行的 entry 或台账记录）；没有时返回 None 并登记本附件
+        """
+        with self._lock:
+            original = self._seen.get(content_hash)
+            if original is None and self.ledger is not None:
+                original = self.ledger.find_attachment(content_hash)
+            if original is None:
+                self._seen[content_hash] = dict(entry, run_dir=self.ledger.run_dir if self.ledger else "")
+            return original
+
+    def release(self, content_hash):
+        """附件保存失败时撤销登记（之后的副本照常保存）"""
+        with self._lock:
+            self._seen.pop(content_hash, None)
+
+
+def describe_attachment(entry):
+    """附件索引记录的简短描述，例如 "20260107/invoice_a.pdf（邮件 1532）" """
+    run_dir = os.path.basename(entry.get('run_dir') or '')
+    file_name = f"{run_dir}/{entry['file_name']}" if run_dir else entry['file_name']
+    return f"{file_name}（邮件 {entry['email_id']}）" if entry.get('email_id') else file_name
+
+
+def describe_entry(entry):
+    """台账记录的简短描述（用于日志），例如 "20260107/invoice_a.pdf（台账 #12）" """
+    return f"{os.path.basename(entry['run_dir'])}/{entry['file_name']}（台账 #{entry['id']}）"
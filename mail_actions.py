@@ -0,0 +1,275 @@
+"""
+邮件处理结果回写模块
+下载时不再把邮件标记为已读（提取失败的邮件不会因为下载过就变成已读），
+运行结束后按每封邮件的处理结果批量回写邮箱：
+    - 处理成功：标记为已读，移动到 Processed 文件夹
+    - 处理失败（提取失败、没有发票、处理出错）：移动到 Needs-Review 文件夹（保持未读，便于人工查看）
+    - 无需处理（没有 PDF 附件 / 附件都是垃圾文件）：只标记为已读
+
+同一个文件夹中结果相同的邮件合并为 UID 区间（例如 "1:3,5,7:9"），
+每批只发送一条 UID STORE / UID MOVE 命令；服务器不支持 MOVE 时使用 COPY + STORE \\Deleted + UID EXPUNGE
+
+用法:
+    actions = MailActions()
+    actions.register(mailbox_name, folder, uid, email_id)   # 下载时登记
+    actions.resolve(mailbox_name, folder, uid, OUTCOME_PROCESSED)
+    actions.apply(config_loader.get_mailbox_configs())
+"""
+
+import threading
+
+from imap_tools.utils import encode_folder
+
+import EmailHandler
+import metrics
+import record_replay
+from app_logging import get_logger
+from config_loader import DEFAULT_MAILBOX_NAME
+from run_journal import is_finished, STAGE_DISCARDED
+
+logger = get_logger(__name__)
+
+# ================= 配置常量 =================
+OUTCOME_PENDING = "pending"        # 已下载，尚未得到处理结果（运行结束时仍未确定的按失败处理）
+OUTCOME_PROCESSED = "processed"    # 处理成功
+OUTCOME_REVIEW = "review"          # 需要人工查看
+OUTCOME_IGNORED = "ignored"        # 无需处理
+
+# 视为处理成功的丢弃原因：重复发票（台账中已有内容相同的发票）、重复附件（下载时与已下载的附件内容相同）
+DUPLICATE_REASONS = ("duplicate", "duplicate_attachment")
+
+UIDS_PER_BATCH = 500               # 每条命令最多包含的 UID 数（压缩为区间后命令长度通常很短）
+# ===========================================
+
+
+def compress_uids(uids):
+    """
+    将 UID 列表压缩为 IMAP UID 集合字符串
+
+    参数:
+        uids (iterable): UID（字符串或整数）
+
+    返回:
+        str: 例如 [1, 2, 3, 5, 7, 8] -> "1:3,5,7:8"（空列表返回空字符串）
+    """
+    ordered = sorted({int(uid) for uid in uids})
+    ranges = []
+    for uid in ordered:
+        if ranges and uid == ranges[-1][1] + 1:
+            ranges[-1][1] = uid
+        else:
+            ranges.append([uid, uid])
+    return ",".join(str(start) if start == end else f"{start}:{end}" for start, end in ranges)
+
+
+def iter_uid_batches(uids, batch_size=UIDS_PER_BATCH):
+    """按 batch_size 分批，每批返回一个压缩后的 UID 集合字符串"""
+    ordered = sorted({int(uid) for uid in uids})
+    for index in range(0, len(ordered), batch_size):
+        yield compress_uids(ordered[index:index + batch_size])
+
+
+def outcome_from_journal(journal, email_id):
+    """
+    根据运行日志判断之前已处理过的邮件的结果
+
+    返回:
+        str|None: OUTCOME_*；还有未处理完的附件时返回 None（由续跑继续处理）
+    """
+    attachments = journal.email_attachments(email_id)
+    if not attachments:
+        return OUTCOME_IGNORED
+    if not all(is_finished(att) for att in attachments):
+        return None
+    # 丢弃原因：垃圾文件没有原因，重复发票 / 附件见 DUPLICATE_REASONS，其他原因（提取失败、没有发票、出错）需要人工查看
+    if any(att.get('stage') == STAGE_DISCARDED and att.get('reason') not in (None,) + DUPLICATE_REASONS
+           for att in attachments):
+        return OUTCOME_REVIEW
+    if any(att.get('stage') != STAGE_DISCARDED or att.get('reason') in DUPLICATE_REASONS for att in attachments):
+        return OUTCOME_PROCESSED
+    return OUTCOME_IGNORED
+
+
+class MailActions:
+    """
+    收集本次运行中每封邮件的处理结果（线程安全），运行结束后调用 apply() 批量回写邮箱
+
+    邮件以 (邮箱名称, 文件夹, UID) 标识
+    """
+
+    def __init__(self):
+        self._outcomes = {}        # (mailbox, folder, uid) -> 结果
+        self._email_ids = {}       # (mailbox, folder, uid) -> 邮件标识
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key_of(email_info):
+        imap = email_info.get('imap') or {}
+        if not imap.get('uid'):
+            return None
+        return imap['mailbox'], imap['folder'], str(imap['uid'])
+
+    def register(self, mailbox_name, folder, uid, email_id=""):
+        """登记一封已下载的邮件（已有结果时不覆盖）"""
+        key = (mailbox_name, folder, str(uid))
+        with self._lock:
+            self._outcomes.setdefault(key, OUTCOME_PENDING)
+            if email_id:
+                self._email_ids[key] = email_id
+
+    def resolve(self, mailbox_name, folder, uid, outcome):
+        """记录一封邮件的处理结果"""
+        with self._lock:
+            self._outcomes[(mailbox_name, folder, str(uid))] = outcome
+
+    def ignore(self, mailbox_name, folder, uid):
+        """记录一封无需处理的邮件（没有 PDF 附件）"""
+        self.resolve(mailbox_name, folder, uid, OUTCOME_IGNORED)
+
+    def register_email(self, email_info):
+        """登记 iter_downloaded_emails / 运行日志返回的邮件字典（没有邮箱位置信息时忽略）"""
+        key = self._key_of(email_info)
+        if key is not None:
+            self.register(*key, email_id=email_info.get('email_id', ''))
+
+    def resolve_email(self, email_info, outcome):
+        key = self._key_of(email_info)
+        if key is not None:
+            self.resolve(*key, outcome)
+
+    def resolve_from_journal(self, journal):
+        """尚未得到结果的邮件（例如之前的运行已处理完、本次跳过下载的邮件）按运行日志判断结果"""
+        with self._lock:
+            pending = [(key, self._email_ids.get(key)) for key, outcome in self._outcomes.items()
+                       if outcome == OUTCOME_PENDING]
+        for key, email_id in pending:
+            outcome = outcome_from_journal(journal, email_id) if email_id else None
+            if outcome is not None:
+                self.resolve(*key, outcome)
+
+    def summary(self):
+        """各结果的邮件数"""
+        with self._lock:
+            counts = {}
+            for outcome in self._outcomes.values():
+                counts[outcome] = counts.get(outcome, 0) + 1
+            return counts
+
+    def apply(self, mailboxes):
+        """
+        按邮箱 / 文件夹批量回写处理结果（每个邮箱一个连接）
+
+        参数:
+            mailboxes (list): config_loader.get_mailbox_configs() 的返回值
+
+        返回:
+            dict: {"processed": 移动 / 标记的成功邮件数, "review": 需要人工查看的邮件数,
+                   "ignored": 标记为已读的邮件数, "errors": 回写失败的邮箱列表}；
+            回放模式下不连接邮箱，直接返回 0
+        """
+        totals = {OUTCOME_PROCESSED: 0, OUTCOME_REVIEW: 0, OUTCOME_IGNORED: 0, 'errors': []}
+        if record_replay.current_mode() == record_replay.MODE_REPLAY:
+            return totals
+        with self._lock:
+            grouped = {}
+            for (mailbox_name, folder, uid), outcome in self._outcomes.items():
+                # 运行结束时仍没有结果的邮件（处理出错）按失败处理
+                outcome = OUTCOME_REVIEW if outcome == OUTCOME_PENDING else outcome
+                grouped.setdefault(mailbox_name, {}).setdefault(folder, {}).setdefault(outcome, []).append(uid)
+
+        configs = {mailbox['name']: mailbox for mailbox in mailboxes}
+        for mailbox_name, folders in grouped.items():
+            config = configs.get(mailbox_name)
+            if config is None:
+                print(f"  ⚠ 邮箱 {mailbox_name} 已不在配置中，跳过回写处理结果")
+                continue
+            try:
+                counts = _apply_mailbox(config, folders)
+            except Exception as e:
+                print(f"  ✗ 邮箱 {mailbox_name} 回写处理结果失败: {e}（邮件保持未读，下次运行时重新检查）")
+                metrics.inc("mail_action_failures")
+                totals['errors'].append(mailbox_name)
+                continue
+            for outcome, count in counts.items():
+                totals[outcome] += count
+        return totals
+
+
+def _apply_mailbox(config, folders):
+    """连接一个邮箱，逐个文件夹回写处理结果，返回各结果的邮件数"""
+    counts = {OUTCOME_PROCESSED: 0, OUTCOME_REVIEW: 0, OUTCOME_IGNORED: 0}
+    label = f"[{config['name']}] " if config['name'] != DEFAULT_MAILBOX_NAME else ""
+    mailbox = EmailHandler.connect_mailbox(config['host'], config['port'], config['ssl'])
+    with mailbox.login(config['user'], config['password'], initial_folder=None) as mailbox:
+        capabilities = set(getattr(mailbox.client, 'capabilities', ()))
+        created = set()
+        for folder, outcomes in folders.items():
+            mailbox.folder.set(folder)
+            processed = outcomes.get(OUTCOME_PROCESSED, [])
+            review = outcomes.get(OUTCOME_REVIEW, [])
+            ignored = outcomes.get(OUTCOME_IGNORED, [])
+
+            # 成功和无需处理的邮件标记为已读（一批一条 UID STORE）
+            _store(mailbox, processed + ignored, '+FLAGS.SILENT', '(\\Seen)')
+            if config.get('processed_folder') and processed:
+                _move(mailbox, processed, config['processed_folder'], capabilities, created)
+            if config.get('review_folder') and review:
+                _move(mailbox, review, config['review_folder'], capabilities, created)
+
+            counts[OUTCOME_PROCESSED] += len(processed)
+            counts[OUTCOME_REVIEW] += len(review)
+            counts[OUTCOME_IGNORED] += len(ignored)
+            print(f"  ✓ {label}{folder}: {len(processed)} 封处理成功"
+                  f"{' → ' + config['processed_folder'] if config.get('processed_folder') and processed else ''}，"
+                  f"{len(review)} 封需要人工查看"
+                  f"{' → ' + config['review_folder'] if config.get('review_folder') and review else ''}，"
+                  f"{len(ignored)} 封无需处理（已标记为已读）")
+    return counts
+
+
+def _check(result, command):
+    status, data = result
+    if status != 'OK':
+        detail = b" ".join(item for item in data if isinstance(item, bytes)).decode(errors='replace')
+        raise RuntimeError(f"{command} 失败: {detail}")
+    return data
+
+
+def _store(mailbox, uids, mode, flags):
+    for uid_set in iter_uid_batches(uids):
+        _check(mailbox.client.uid('STORE', uid_set, mode, flags), "UID STORE")
+        metrics.inc("imap_store_commands")
+
+
+def _needs_create(result):
+    """目标文件夹不存在时服务器返回 NO [TRYCREATE]"""
+    status, data = result
+    return status == 'NO' and any(b"TRYCREATE" in item.upper() for item in data if isinstance(item, bytes))
+
+
+def _copy_or_move(mailbox, command, uid_set, folder, created):
+    """执行 UID COPY / UID MOVE，目标文件夹不存在时创建后重试一次"""
+    result = mailbox.client.uid(command, uid_set, encode_folder(folder))
+    if _needs_create(result) and folder not in created:
+        print(f"  创建文件夹: {folder}")
+        mailbox.folder.create(folder)
+        created.add(folder)
+        result = mailbox.client.uid(command, uid_set, encode_folder(folder))
+    _check(result, f"UID {command}")
+
+
+def _move(mailbox, uids, folder, capabilities, created):
+    """将邮件移动到 folder（每批一条 UID MOVE；不支持 MOVE 时每批 COPY + STORE + UID EXPUNGE）"""
+    for uid_set in iter_uid_batches(uids):
+        if 'MOVE' in capabilities:
+            _copy_or_move(mailbox, 'MOVE', uid_set, folder, created)
+        else:
+            _copy_or_move(mailbox, 'COPY', uid_set, folder, created)
+            _check(mailbox.client.uid('STORE', uid_set, '+FLAGS.SILENT', '(\\Deleted)'), "UID STORE")
+            if 'UIDPLUS' in capabilities:
+                # 只删除本批邮件，不影响文件夹中其他带 \Deleted 标记的邮件
+                _check(mailbox.client.uid('EXPUNGE', uid_set), "UID EXPUNGE")
+            else:
+                logger.warning("⚠ 服务器不支持 MOVE 和 UIDPLUS，已复制到 %s 的邮件在原文件夹中标记为删除，"
+                               "由邮箱客户端清除", folder)
+        metrics.inc("imap_move_commands")
@@ -0,0 +1,157 @@
+"""
+邮箱 IDLE 监听模块
+使用 IMAP IDLE 与邮箱保持长连接，新邮件到达后几秒内通知常驻模式开始处理，
+不必按固定间隔反复连接、登录邮箱来检查新邮件
+
+- 每个邮箱的每个文件夹单独一个连接和线程（IDLE 只监听当前选中的文件夹）
+- 每隔 IDLE_KEEPALIVE_SECONDS 结束并重新发起 IDLE（RFC 2177 建议不超过 29 分钟），同时起到保活作用
+- 连接断开或出错后自动重连，重连间隔按指数退避增长
+- 重连成功后通知一次：断线期间到达的邮件也会被处理
+
+用法:
+    wake_event = threading.Event()
+    listeners = mail_listener.start_listeners(config_loader.get_mailbox_configs(), wake_event.set, stop_event)
+    wake_event.wait()                  # 有新邮件时被唤醒
+    mail_listener.stop_listeners(listeners)
+"""
+
+import time
+import threading
+
+import EmailHandler
+from app_logging import get_logger
+
+logger = get_logger(__name__)
+
+# ================= 配置常量 =================
+IDLE_KEEPALIVE_SECONDS = 5 * 60     # 每次 IDLE 的最长时间，到时重新发起（必须小于 29 分钟）
+IDLE_POLL_SECONDS = 1.0             # 等待服务器推送时检查停止请求的间隔
+RECONNECT_MIN_SECONDS = 5           # 第一次重连前的等待时间
+RECONNECT_MAX_SECONDS = 5 * 60      # 重连等待时间的上限
+STOP_JOIN_TIMEOUT = 10              # 停止时等待每个监听线程结束的时间（秒）
+NEW_MAIL_RESPONSES = (b"EXISTS", b"RECENT")
+# ===========================================
+
+
+class IdleNotSupportedError(RuntimeError):
+    """邮箱服务器不支持 IDLE"""
+
+
+class MailboxListener(threading.Thread):
+    """
+    单个邮箱文件夹的 IDLE 监听线程
+
+    参数:
+        mailbox (dict): config_loader.get_mailbox_configs() 返回的邮箱配置
+        folder (str): 要监听的文件夹
+        on_new_mail (callable): 有新邮件时调用 on_new_mail(label)（在监听线程中调用，应尽快返回）
+        stop_event (threading.Event): 设置后监听线程在 IDLE_POLL_SECONDS 内结束
+        keepalive (float): 每次 IDLE 的最长时间（秒）
+    """
+
+    def __init__(self, mailbox, folder, on_new_mail, stop_event=None, keepalive=IDLE_KEEPALIVE_SECONDS):
+        self.label = mailbox['name'] if folder.upper() == 'INBOX' else f"{mailbox['name']}/{folder}"
+        super().__init__(name=f"idle-{self.label}", daemon=True)
+        self.mailbox = mailbox
+        self.folder = folder
+        self.on_new_mail = on_new_mail
+        self.stop_event = stop_event if stop_event is not None else threading.Event()
+        self.keepalive = keepalive
+        self.connected = False
+        self.reconnects = 0
+        self.notifications = 0
+        self.last_error = None
+
+    def stop(self):
+        self.stop_event.set()
+
+    def run(self):
+        delay = RECONNECT_MIN_SECONDS
+        while not self.stop_event.is_set():
+            try:
+                self._listen()
+                delay = RECONNECT_MIN_SECONDS
+            except IdleNotSupportedError as e:
+                self.last_error = str(e)
+                print(f"⚠ [{self.label}] {e}，该邮箱只能按轮询间隔检查新邮件")
+                return
+            except Exception as e:
+                self.connected = False
+                self.last_error = str(e)
+                logger.warning("⚠ [%s] IDLE 连接中断: %s，%d 秒后重连", self.label, e, delay)
+                if self.stop_event.wait(delay):
+                    return
+                delay = min(delay * 2, RECONNECT_MAX_SECONDS)
+                self.reconnects += 1
+
+    def _listen(self):
+        """连接、登录并循环 IDLE，直到收到停止请求（连接出错时抛出异常）"""
+        mailbox = EmailHandler.connect_mailbox(self.mailbox['host'], self.mailbox['port'], self.mailbox['ssl'])
+        with mailbox.login(self.mailbox['user'], self.mailbox['password'], initial_folder=self.folder):
+            if 'IDLE' not in getattr(mailbox.client, 'capabilities', ()):
+                raise IdleNotSupportedError("邮箱服务器不支持 IDLE")
+            self.connected = True
+            print(f"✓ [{self.label}] 已开始监听新邮件（IMAP IDLE）")
+            if self.reconnects:
+                self._notify()
+
+            while not self.stop_event.is_set():
+                if self._idle_once(mailbox):
+                    self._notify()
+        self.connected = False
+
+    def _idle_once(self, mailbox):
+        """
+        发起一次 IDLE，直到服务器推送新邮件、保活时间到或收到停止请求
+
+        返回:
+            bool: 是否收到新邮件通知
+        """
+        deadline = time.monotonic() + self.keepalive
+        responses = []
+        mailbox.idle.start()
+        try:
+            while not responses and not self.stop_event.is_set() and time.monotonic() < deadline:
+                responses = mailbox.idle.poll(timeout=IDLE_POLL_SECONDS)
+        finally:
+            mailbox.idle.stop()
+        logger.debug("[%s] IDLE 响应: %s", self.label, responses)
+        return any(keyword in response for response in responses for keyword in NEW_MAIL_RESPONSES)
+
+    def _notify(self):
+        self.notifications += 1
+        logger.debug("[%s] 收到新邮件通知", self.label)
+        self.on_new_mail(self.label)
+
+
+def start_listeners(mailboxes, on_new_mail, stop_event=None, keepalive=IDLE_KEEPALIVE_SECONDS):
+    """
+    为每个邮箱的每个文件夹启动一个 IDLE 监听线程
+
+    参数:
+        mailboxes (list): config_loader.get_mailbox_configs() 的返回值
+        on_new_mail (callable): 有新邮件时调用 on_new_mail(label)
+        stop_event (threading.Event): 共用的停止信号（为空时新建一个）
+        keepalive (float): 每次 IDLE 的最长时间（秒）
+
+    返回:
+        list: 已启动的 MailboxListener 列表
+    """
+    if not 0 < keepalive < 29 * 60:
+        raise ValueError("IDLE 保活时间必须大于 0 且小于 29 分钟")
+    stop_event = stop_event if stop_event is not None else threading.Event()
+    listeners = []
+    for mailbox in mailboxes:
+        for folder in mailbox['folders']:
+            listener = MailboxListener(mailbox, folder, on_new_mail, stop_event, keepalive)
+            listener.start()
+            listeners.append(listener)
+    return listeners
+
+
+def stop_listeners(listeners, timeout=STOP_JOIN_TIMEOUT):
+    """停止监听线程并等待退出（退出 IDLE、注销登录）"""
+    for listener in listeners:
+        listener.stop()
+    for listener in listeners:
+        listener.join(timeout)
@@ -0,0 +1,342 @@
+"""
+命令行入口（无界面）
+支持单次运行（适合 cron / 计划任务）和常驻轮询模式（适合 systemd），不需要显示器
+
+用法:
+    python main.py                                  # 单次运行，处理完成后退出
+    python main.py --daemon --interval 300          # 常驻模式，每 300 秒检查一次邮箱
+    python main.py --daemon --idle                  # 常驻模式 + IMAP IDLE：新邮件到达后几秒内开始处理
+    python main.py --log-format json                # 每行输出一个 JSON 日志对象
+    python main.py --log-level DEBUG --log-file logs/run.log   # 输出调试日志，并写入轮转日志文件
+    python main.py --record fixtures/day1           # 录制邮件和 AI 响应
+    python main.py --replay fixtures/day1 --replay-speed 10   # 以 10 倍速回放录制的数据
+    python main.py --profile                        # 生成每个阶段的性能分析报告
+
+退出码:
+    0 - 运行完成（包括没有新邮件的情况）；常驻模式收到停止信号后正常退出
+    1 - 运行出错
+    2 - 配置错误（config.ini 不存在或配置不完整）
+"""
+
+import argparse
+import json
+import os
+import signal
+import sys
+import threading
+import time
+from datetime import datetime
+
+import app_logging
+import config_loader
+
+# ================= 配置常量 =================
+EXIT_OK = 0
+EXIT_ERROR = 1
+EXIT_CONFIG_ERROR = 2
+
+DEFAULT_POLL_INTERVAL = 300  # 常驻模式默认轮询间隔（秒）
+IDLE_DEBOUNCE_SECONDS = 3    # IDLE 模式收到新邮件通知后再等待的时间（秒），同时到达的多封邮件合并为一次运行
+# ===========================================
+
+
+class RunLogger:
+    """
+    命令行日志输出
+
+    - text 格式：保留原有 print 输出，事件行带时间戳
+    - json 格式：将 print 输出逐行转换为 JSON 对象（ts、level、msg），事件附带结构化字段
+    """
+
+    def __init__(self, log_format='text', stream=None):
+        self.log_format = log_format
+        self.stream = stream if stream is not None else sys.stdout
+        self._buffer = ""
+        self._lock = threading.Lock()
+
+    def write(self, text):
+        """作为 sys.stdout 使用时接收 print 输出"""
+        if self.log_format != 'json':
+            self.stream.write(text)
+            return
+        with self._lock:
+            self._buffer += text
+            while "\n" in self._buffer:
+                line, self._buffer = self._buffer.split("\n", 1)
+                if line.strip():
+                    self._emit_json({'level': _guess_level(line), 'msg': line})
+
+    def flush(self):
+        with self._lock:
+            if self.log_format == 'json' and self._buffer.strip():
+                self._emit_json({'level': _guess_level(self._buffer), 'msg': self._buffer})
+                self._buffer = ""
+        self.stream.flush()
+
+    def event(self, name, level='INFO', **fields):
+        """输出一条结构化事件（例如运行开始、运行结束）"""
+        if self.log_format == 'json':
+            with self._lock:
+                record = {'level': level, 'event': name}
+                record.update(fields)
+                self._emit_json(record)
+            return
+        details = " ".join(f"{key}={value}" for key, value in fields.items())
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.stream.write(f"[{timestamp}] [{level}] {name} {details}".rstrip() + "\n")
+        self.stream.flush()
+
+    def _emit_json(self, record):
+        record = dict(record)
+        record['ts'] = datetime.now().isoformat(timespec='seconds')
+        self.stream.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        self.stream.flush()
+
+
+def _guess_level(line):
+    """根据 print 文本中的提示符号推断日志级别"""
+    if "✗" in line or "❌" in line or "错误" in line:
+        return 'ERROR'
+    if "⚠" in line or "警告" in line:
+        return 'WARNING'
+    return 'INFO'
+
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="InvoiceAuto 命令行模式（无界面）")
+    parser.add_argument('--base-dir', default=os.getcwd(),
+                        help="保存位置（会在其下创建 Download/<日期> 目录），默认当前目录")
+    parser.add_argument('--booking-list', default=None,
+                        help="Booking List 文件路径（可选，用于客户信息核对）")
+    parser.add_argument('--price-list', default=None,
+                        help="Price List 文件路径（可选，用于自动查价）")
+    parser.add_argument('--daemon', action='store_true',
+                        help="常驻模式：按轮询间隔持续检查邮箱，直到收到 SIGTERM/SIGINT")
+    parser.add_argument('--interval', type=int, default=DEFAULT_POLL_INTERVAL,
+                        help=f"常驻模式的轮询间隔（秒），默认 {DEFAULT_POLL_INTERVAL}；"
+                             f"开启 --idle 时作为兜底检查间隔")
+    parser.add_argument('--idle', action='store_true',
+                        help="常驻模式下使用 IMAP IDLE 监听新邮件，新邮件到达后立即处理（自动开启 --daemon）")
+    parser.add_argument('--classify-workers', type=int, default=None,
+                        help="分类阶段的工作线程数（默认使用 config.ini [PERFORMANCE] classify_workers）")
+    parser.add_argument('--extract-workers', type=int, default=None,
+                        help="提取阶段（调用 AI）的工作线程数（默认使用 config.ini [PERFORMANCE] extract_workers）")
+    replay_group = parser.add_mutually_exclusive_group()
+    replay_group.add_argument('--record', metavar='DIR', default=None,
+                              help="录制模式：把下载的邮件和 AI 响应保存到 DIR（用于之后回放）")
+    replay_group.add_argument('--replay', metavar='DIR', default=None,
+                              help="回放模式：不连接邮箱、不调用 AI，使用 DIR 中录制的数据")
+    parser.add_argument('--replay-speed', type=float, default=1.0,
+                        help="回放速度倍数：1 = 按录制时的耗时（默认），10 = 快 10 倍，0 = 不等待")
+    parser.add_argument('--profile', action='store_true',
+                        help="性能分析：在运行目录的 profile/ 中生成每个阶段的 cProfile 和内存分配报告")
+    parser.add_argument('--profile-top', type=int, default=25,
+                        help="性能分析汇总中每个阶段列出的行数，默认 25")
+    parser.add_argument('--log-format', choices=['text', 'json'], default='text',
+                        help="日志格式：text（默认）或 json（每行一个 JSON 对象）")
+    parser.add_argument('--log-level', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'], type=str.upper, default=None,
+                        help="控制台日志级别（默认取 config.ini [LOGGING] level，未配置时为 INFO）")
+    parser.add_argument('--log-file', default=None,
+                        help="日志文件路径（按大小轮转，默认取 config.ini [LOGGING] file）")
+    args = parser.parse_args(argv)
+    if args.interval <= 0:
+        parser.error("--interval 必须大于 0")
+    if args.profile_top <= 0:
+        parser.error("--profile-top 必须大于 0")
+    if args.replay_speed < 0:
+        parser.error("--replay-speed 不能小于 0")
+    if args.idle and args.replay:
+        parser.error("--idle 不能与 --replay 同时使用（回放模式不连接邮箱）")
+    if args.idle:
+        args.daemon = True
+    for name in ('classify_workers', 'extract_workers'):
+        value = getattr(args, name)
+        if value is not None and value <= 0:
+            parser.error(f"--{name.replace('_', '-')} 必须大于 0")
+    return args
+
+
+def check_config(log):
+    """
+    启动前检查配置文件
+
+    返回:
+        bool: 配置完整返回 True
+    """
+    try:
+        config_loader.get_mailbox_configs()
+        config_loader.get_api_key()
+        return True
+    except (FileNotFoundError, ValueError) as e:
+        log.event('config_error', level='ERROR', error=str(e))
+        return False
+
+
+def setup_logging(args, log):
+    """
+    按 config.ini [LOGGING] 和命令行参数配置日志（命令行优先）
+    日志直接写入原始输出流，json 格式下与事件行一样每行一个 JSON 对象
+
+    返回:
+        bool: 配置成功返回 True
+    """
+    try:
+        logging_config = config_loader.get_logging_config()
+        app_logging.setup_logging(level=args.log_level or logging_config['level'],
+                                  log_format=args.log_format,
+                                  log_file=args.log_file or logging_config['file'],
+                                  file_level=logging_config['file_level'],
+                                  max_bytes=logging_config['max_bytes'],
+                                  backup_count=logging_config['backup_count'],
+                                  stream=log.stream)
+        return True
+    except (OSError, ValueError) as e:
+        log.event('config_error', level='ERROR', error=f"日志配置无效: {e}")
+        return False
+
+
+def run_once(args, log):
+    """
+    执行一次完整流程
+
+    返回:
+        int: 退出码
+    """
+    # 延迟导入：配置检查失败时不必加载 pandas / pdfplumber 等重型依赖
+    import pipeline
+
+    stage_workers = {}
+    if args.classify_workers:
+        stage_workers['classify'] = args.classify_workers
+    if args.extract_workers:
+        stage_workers['extract'] = args.extract_workers
+
+    # 命令行指定的录制 / 回放优先于 config.ini
+    replay = None
+    if args.record:
+        replay = {'mode': 'record', 'fixture_dir': args.record}
+    elif args.replay:
+        replay = {'mode': 'replay', 'fixture_dir': args.replay, 'speed': args.replay_speed}
+
+    # --profile 优先于 config.ini；未指定时由 config.ini 的 [PROFILING] 决定
+    profile = {'enabled': True, 'top_n': args.profile_top} if args.profile else None
+
+    log.event('run_started', base_dir=args.base_dir)
+    result = pipeline.run_pipeline(args.base_dir, args.booking_list, args.price_list,
+                                   stage_workers=stage_workers, replay=replay, profile=profile)
+    for stats in result.get('mailboxes', []):
+        log.event('mailbox_finished', level='ERROR' if stats['status'] == pipeline.STATUS_ERROR else 'INFO',
+                  mailbox=stats['name'], status=stats['status'], emails=stats['emails'],
+                  attachments=stats['attachments'], duration=stats['duration'], error=stats['error'])
+    if result['status'] == pipeline.STATUS_ERROR:
+        level = 'ERROR'
+    else:
+        # 部分邮箱下载失败时仍正常结束，但以 WARNING 输出
+        level = 'WARNING' if result['error'] else 'INFO'
+    log.event('run_finished', level=level,
+              status=result['status'],
+              output_dir=result['output_dir'],
+              email_count=result['email_count'],
+              extract_count=result['extract_count'],
+              duration=round(result['duration'], 2),
+              error=result['error'])
+
+    if result['status'] == pipeline.STATUS_ERROR:
+        return EXIT_ERROR
+    return EXIT_OK
+
+
+def wait_for_next_run(args, log, stop_event, wake_event):
+    """
+    常驻模式两次运行之间的等待
+
+    - 未开启 IDLE：等待 args.interval 秒
+    - 开启 IDLE：等到新邮件通知（再等待 IDLE_DEBOUNCE_SECONDS 合并同时到达的邮件），
+      最长等待 args.interval 秒（兜底检查，防止漏掉通知）
+    """
+    if wake_event is None:
+        stop_event.wait(args.interval)
+        return
+    deadline = time.monotonic() + args.interval
+    while not stop_event.is_set() and not wake_event.is_set():
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        # 分段等待：两个事件任一被设置时都能及时返回
+        wake_event.wait(min(remaining, 1.0))
+    if wake_event.is_set() and not stop_event.is_set():
+        log.event('new_mail')
+        stop_event.wait(IDLE_DEBOUNCE_SECONDS)
+
+
+def run_daemon(args, log):
+    """
+    常驻模式：循环执行流程，两次运行之间等待 args.interval 秒
+    开启 --idle 时通过 IMAP IDLE 监听新邮件，新邮件到达后立即开始下一次运行
+    收到 SIGTERM / SIGINT 后在当前运行结束时退出
+
+    返回:
+        int: 退出码
+    """
+    stop_event = threading.Event()
+
+    def _handle_signal(signum, frame):
+        log.event('stop_requested', signal=signum)
+        stop_event.set()
+
+    signal.signal(signal.SIGINT, _handle_signal)
+    if hasattr(signal, 'SIGTERM'):
+        signal.signal(signal.SIGTERM, _handle_signal)
+
+    log.event('daemon_started', interval=args.interval, idle=args.idle)
+    wake_event = None
+    listeners = []
+    if args.idle:
+        import mail_listener
+        wake_event = threading.Event()
+        listeners = mail_listener.start_listeners(config_loader.get_mailbox_configs(),
+                                                  lambda label: wake_event.set(), stop_event)
+        log.event('idle_started', listeners=len(listeners))
+
+    consecutive_failures = 0
+    try:
+        while not stop_event.is_set():
+            if wake_event is not None:
+                # 运行开始前清除通知：运行期间到达的新邮件会触发下一次运行
+                wake_event.clear()
+            exit_code = run_once(args, log)
+            consecutive_failures = consecutive_failures + 1 if exit_code != EXIT_OK else 0
+            if consecutive_failures:
+                log.event('run_failed', level='WARNING', consecutive_failures=consecutive_failures)
+            wait_for_next_run(args, log, stop_event, wake_event)
+    finally:
+        if listeners:
+            mail_listener.stop_listeners(listeners)
+
+    log.event('daemon_stopped')
+    return EXIT_OK
+
+
+def main(argv=None):
+    """命令行主函数，返回退出码"""
+    args = parse_args(argv)
+    log = RunLogger(args.log_format)
+
+    if not check_config(log) or not setup_logging(args, log):
+        return EXIT_CONFIG_ERROR
+
+    # 将流程中的 print 输出交给日志对象处理（json 格式下逐行转换为 JSON）
+    old_stdout = sys.stdout
+    sys.stdout = log
+    try:
+        if args.daemon:
+            return run_daemon(args, log)
+        return run_once(args, log)
+    finally:
+        log.flush()
+        sys.stdout = old_stdout
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,318 @@
+"""
+运行指标模块
+记录各处理环节的耗时（次数、p50/p95/最大值）和计数（API tokens、下载字节数等），
+运行结束后导出为 JSON 和 Prometheus 文本格式，写入当日运行目录（与 当日运行清单.xlsx 同目录）
+
+用法:
+    import metrics
+
+    with metrics.span("imap_fetch"):          # 计时代码块
+        ...
+
+    @metrics.timed("classify_pdf")            # 计时函数
+    def classify_pdf_content(file_path): ...
+
+    metrics.inc("api_prompt_tokens", 1234)    # 累加计数
+
+    registry = metrics.MetricsRegistry()      # 单独记录一个操作（例如在界面中生成报表），不影响运行指标
+    with metrics.use_registry(registry):
+        ...
+"""
+
+import os
+import json
+import math
+import time
+import random
+import threading
+import functools
+from contextlib import contextmanager
+from datetime import datetime
+
+# ================= 配置常量 =================
+METRICS_JSON_FILENAME = "run_metrics.json"
+METRICS_PROM_FILENAME = "metrics.prom"
+REPORT_METRICS_JSON_FILENAME = "report_metrics.json"   # 在界面中单独生成报表时的指标
+PROMETHEUS_PREFIX = "invoiceauto"
+
+# 每个环节最多保留的耗时样本数（超过后随机抽样，保证内存占用固定）
+MAX_SAMPLES = 10000
+# ===========================================
+
+
+class _Timer:
+    """单个环节的耗时统计"""
+
+    __slots__ = ("count", "total", "max", "samples")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = []
+
+    def observe(self, seconds, rng):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        if len(self.samples) < MAX_SAMPLES:
+            self.samples.append(seconds)
+        else:
+            # 蓄水池抽样
+            index = rng.randrange(self.count)
+            if index < MAX_SAMPLES:
+                self.samples[index] = seconds
+
+
+def _percentile(sorted_values, fraction):
+    """计算分位数（最近秩法）"""
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(fraction * len(sorted_values))
+    return sorted_values[max(0, min(len(sorted_values), rank) - 1)]
+
+
+class MetricsRegistry:
+    """
+    指标注册表（线程安全）
+
+    - timers: 环节名 -> 耗时统计
+    - counters: 计数名 -> 累计值
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rng = random.Random(0)
+        self.reset()
+
+    def reset(self):
+        """清空所有指标（每次运行开始时调用）"""
+        with self._lock:
+            self.timers = {}
+            self.counters = {}
+            self.started_at = datetime.now()
+
+    def observe(self, name, seconds):
+        """记录一次耗时（秒）"""
+        with self._lock:
+            timer = self.timers.get(name)
+            if timer is None:
+                timer = self.timers[name] = _Timer()
+            timer.observe(seconds, self._rng)
+
+    def inc(self, name, amount=1):
+        """累加计数"""
+        if not amount:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    @contextmanager
+    def span(self, name):
+        """计时代码块（出现异常时同样记录耗时）"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def timed(self, name):
+        """计时函数的装饰器"""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.observe(name, time.perf_counter() - start)
+            return wrapper
+        return decorator
+
+    def timed_iter(self, name, iterable):
+        """逐个取出 iterable 的元素，并记录每次取值的耗时（例如逐封从邮箱下载邮件）"""
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self.observe(name, time.perf_counter() - start)
+            yield item
+
+    def summary(self):
+        """
+        汇总当前指标
+
+        返回:
+            dict: {
+                "started_at": 开始时间,
+                "timers": {环节名: {"count", "total", "p50", "p95", "max"}}（秒）,
+                "counters": {计数名: 值},
+            }
+        """
+        with self._lock:
+            timers = {}
+            for name, timer in sorted(self.timers.items()):
+                samples = sorted(timer.samples)
+                timers[name] = {
+                    "count": timer.count,
+                    "total": round(timer.total, 6),
+                    "p50": round(_percentile(samples, 0.50), 6),
+                    "p95": round(_percentile(samples, 0.95), 6),
+                    "max": round(timer.max, 6),
+                }
+            return {
+                "started_at": self.started_at.isoformat(timespec="seconds"),
+                "timers": timers,
+                "counters": dict(sorted(self.counters.items())),
+            }
+
+
+def format_prometheus(summary, prefix=PROMETHEUS_PREFIX):
+    """
+    将 summary() 的结果转换为 Prometheus 文本格式（可供 node_exporter textfile collector 采集）
+
+    返回:
+        str: Prometheus 文本
+    """
+    lines = []
+    duration_metric = f"{prefix}_stage_duration_seconds"
+    lines.append(f"# HELP {duration_metric} Duration of each processing step in the last run.")
+    lines.append(f"# TYPE {duration_metric} summary")
+    for name, stat in summary["timers"].items():
+        label = f'stage="{name}"'
+        lines.append(f'{duration_metric}{{{label},quantile="0.5"}} {stat["p50"]}')
+        lines.append(f'{duration_metric}{{{label},quantile="0.95"}} {stat["p95"]}')
+        lines.append(f"{duration_metric}_sum{{{label}}} {stat['total']}")
+        lines.append(f"{duration_metric}_count{{{label}}} {stat['count']}")
+
+    max_metric = f"{prefix}_stage_duration_max_seconds"
+    lines.append(f"# HELP {max_metric} Slowest single call of each processing step in the last run.")
+    lines.append(f"# TYPE {max_metric} gauge")
+    for name, stat in summary["timers"].items():
+        lines.append(f'{max_metric}{{stage="{name}"}} {stat["max"]}')
+
+    for name, value in summary["counters"].items():
+        metric = f"{prefix}_{name}_total"
+        lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric} {value}")
+
+    timestamp_metric = f"{prefix}_last_run_timestamp_seconds"
+    lines.append(f"# TYPE {timestamp_metric} gauge")
+    lines.append(f"{timestamp_metric} {int(time.time())}")
+    return "\n".join(lines) + "\n"
+
+
+def _write_atomic(path, text):
+    """先写临时文件再替换，避免采集程序读到写了一半的文件"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def export_run_metrics(run_dir, registry=None):
+    """
+    将指标写入运行目录：run_metrics.json 和 metrics.prom
+
+    参数:
+        run_dir (str): 当日运行目录
+        registry (MetricsRegistry, optional): 默认使用全局注册表
+
+    返回:
+        dict: summary() 的结果
+    """
+    summary = (registry or REGISTRY).summary()
+    summary["exported_at"] = datetime.now().isoformat(timespec="seconds")
+    _write_atomic(os.path.join(run_dir, METRICS_JSON_FILENAME),
+                  json.dumps(summary, ensure_ascii=False, indent=2))
+    _write_atomic(os.path.join(run_dir, METRICS_PROM_FILENAME), format_prometheus(summary))
+    return summary
+
+
+def export_report_metrics(run_dir, registry):
+    """
+    将单独生成报表的指标写入运行目录的 report_metrics.json（不覆盖流水线的 run_metrics.json 和 metrics.prom）
+
+    参数:
+        run_dir (str): 报表所在的运行目录
+        registry (MetricsRegistry): 生成报表时使用的注册表（见 use_registry）
+
+    返回:
+        dict: summary() 的结果
+    """
+    summary = registry.summary()
+    summary["exported_at"] = datetime.now().isoformat(timespec="seconds")
+    _write_atomic(os.path.join(run_dir, REPORT_METRICS_JSON_FILENAME),
+                  json.dumps(summary, ensure_ascii=False, indent=2))
+    return summary
+
+
+# 全局注册表（同一进程内的所有模块共用）
+REGISTRY = MetricsRegistry()
+
+# 当前线程使用的注册表（use_registry 设置；未设置时使用全局注册表）
+_LOCAL = threading.local()
+
+
+def current_registry():
+    """当前线程记录指标使用的注册表"""
+    return getattr(_LOCAL, "registry", None) or REGISTRY
+
+
+@contextmanager
+def use_registry(registry):
+    """
+    在当前线程中把指标记录到 registry（其他线程仍记录到原来的注册表）
+
+    参数:
+        registry (MetricsRegistry): 单独的注册表
+    """
+    previous = getattr(_LOCAL, "registry", None)
+    _LOCAL.registry = registry
+    try:
+        yield registry
+    finally:
+        _LOCAL.registry = previous
+
+
+def observe(name, seconds):
+    """记录一次耗时（秒）"""
+    current_registry().observe(name, seconds)
+
+
+def inc(name, amount=1):
+    """累加计数"""
+    current_registry().inc(name, amount)
+
+
+def span(name):
+    """计时代码块"""
+    return current_registry().span(name)
+
+
+def timed(name):
+    """计时函数的装饰器（记录到调用时所在线程的注册表）"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                observe(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def timed_iter(name, iterable):
+    """逐个取出 iterable 的元素，并记录每次取值的耗时"""
+    return current_registry().timed_iter(name, iterable)
+
+
+reset = REGISTRY.reset
+summary = REGISTRY.summary
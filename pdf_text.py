@@ -0,0 +1,254 @@
+"""
+PDF 文本读取模块
+分类（PDFClassifier）和提取（invoice_extractor）共用：用 pdfplumber 逐页读取文本，
+没有文本的页面（扫描件）可选用本地 Tesseract OCR 识别
+
+- OCR 默认关闭，在 config.ini 的 [OCR] 部分开启（需要安装 pytesseract 和 Tesseract 程序）
+- 只识别没有文本的页面；有文本的页面不受影响
+- 在进程池中识别（渲染和识别都是 CPU 密集型，不受 GIL 限制），多个页面同时识别
+- 识别结果按「文件 SHA-256 + 页码 + 语言 + 分辨率」缓存在 cache/ocr 中，重新运行时不再识别
+
+用法:
+    pdf_text.configure_ocr(config_loader.get_ocr_config())    # 每次运行开始时
+    text = pdf_text.read_text(pdf_path)                       # 全文（每页以换行结尾）
+    pages = pdf_text.read_pages(pdf_path, max_pages=1)        # 逐页文本
+    for text in pdf_text.iter_pages(pdf_path): ...            # 逐页按需读取（停止迭代后不再读取后面的页面）
+"""
+
+import os
+import shutil
+import threading
+import importlib.util
+from concurrent.futures import ProcessPoolExecutor
+
+import pdfplumber
+
+import config_loader
+import metrics
+from app_logging import get_logger
+from invoice_ledger import file_sha256
+
+logger = get_logger(__name__)
+
+# ================= 配置常量 =================
+OCR_CACHE_NAME = "ocr"                # 缓存子目录（config_loader.get_cache_dir）
+OCR_CACHE_VERSION = 1                 # 缓存格式版本（识别方式变化时递增，旧缓存自动失效）
+# ===========================================
+
+_OCR_SETTINGS = dict(config_loader.DEFAULT_OCR)
+_POOL = None
+_POOL_WORKERS = None
+_POOL_LOCK = threading.Lock()
+_UNAVAILABLE_WARNED = set()
+
+
+def configure_ocr(settings=None):
+    """
+    设置 OCR（由 pipeline 每次运行时按 config.ini 更新；进程数变化时重建进程池）
+
+    参数:
+        settings (dict, optional): config_loader.get_ocr_config() 的返回值，未指定的项使用 config_loader.DEFAULT_OCR
+    """
+    global _OCR_SETTINGS
+    _OCR_SETTINGS = dict(config_loader.DEFAULT_OCR, **(settings or {}))
+    if not _OCR_SETTINGS['enabled'] or _pool_size() != _POOL_WORKERS:
+        shutdown_ocr_pool()
+
+
+def ocr_unavailable_reason():
+    """
+    检查 OCR 依赖
+
+    返回:
+        str: 不能使用 OCR 的原因；可以使用时返回空字符串
+    """
+    if importlib.util.find_spec("pytesseract") is None:
+        return "未安装 pytesseract（pip install pytesseract）"
+    tesseract_cmd = _OCR_SETTINGS['tesseract_cmd'] or "tesseract"
+    if not (os.path.isfile(tesseract_cmd) or shutil.which(tesseract_cmd)):
+        return f"找不到 Tesseract 程序: {tesseract_cmd}（请安装 Tesseract 或在 [OCR] tesseract_cmd 中指定路径）"
+    return ""
+
+
+def shutdown_ocr_pool():
+    """关闭 OCR 进程池（下次需要时重新创建）"""
+    global _POOL, _POOL_WORKERS
+    with _POOL_LOCK:
+        pool, _POOL, _POOL_WORKERS = _POOL, None, None
+    if pool is not None:
+        pool.shutdown(wait=True)
+
+
+def _pool_size():
+    return _OCR_SETTINGS['workers'] or os.cpu_count() or 1
+
+
+def _get_pool():
+    global _POOL, _POOL_WORKERS
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL_WORKERS = _pool_size()
+            _POOL = ProcessPoolExecutor(max_workers=_POOL_WORKERS)
+        return _POOL
+
+
+def _ocr_page(pdf_path, page_number, lang, resolution, tesseract_cmd):
+    """在 OCR 子进程中渲染并识别一页（返回识别出的文本）"""
+    import pytesseract
+    if tesseract_cmd:
+        pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+    with pdfplumber.open(pdf_path) as pdf:
+        image = pdf.pages[page_number].to_image(resolution=resolution).original
+    return pytesseract.image_to_string(image, lang=lang)
+
+
+def _cache_path(content_hash, page_number, settings):
+    """OCR 缓存文件路径（识别语言或分辨率不同时分别缓存）"""
+    name = (f"v{OCR_CACHE_VERSION}-{content_hash}-p{page_number}-"
+            f"{settings['lang'].replace('+', '_')}-{settings['resolution']}.txt")
+    return os.path.join(config_loader.get_cache_dir(OCR_CACHE_NAME), content_hash[:2], name)
+
+
+def _read_cache(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+    except OSError as e:
+        logger.warning("⚠ 读取 OCR 缓存失败 %s: %s", path, e)
+        return None
+
+
+def _write_cache(path, text):
+    """写入 OCR 缓存（先写临时文件再替换，多个进程同时写入时不会读到半个文件）"""
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(temp_path, path)
+    except OSError as e:
+        logger.warning("⚠ 写入 OCR 缓存失败 %s: %s", path, e)
+
+
+def ocr_pages(pdf_path, page_numbers, content_hash=None):
+    """
+    识别 PDF 中指定的页面（优先使用缓存，未缓存的页面在进程池中同时识别）
+
+    参数:
+        pdf_path (str): PDF 文件路径
+        page_numbers (list): 页码（从 0 开始）
+        content_hash (str, optional): 文件 SHA-256（已计算过时传入，避免重复计算）
+
+    返回:
+        dict: 页码 -> 识别出的文本（OCR 未开启、依赖缺失或识别失败的页面不包含在内）
+    """
+    settings = _OCR_SETTINGS
+    if not settings['enabled'] or not page_numbers:
+        return {}
+    reason = ocr_unavailable_reason()
+    if reason:
+        if reason not in _UNAVAILABLE_WARNED:
+            _UNAVAILABLE_WARNED.add(reason)
+            print(f"⚠ 已开启 OCR，但{reason}，扫描件将无法识别")
+        return {}
+
+    content_hash = content_hash or file_sha256(pdf_path)
+    texts = {}
+    pending = {}
+    for page_number in page_numbers:
+        cache_path = _cache_path(content_hash, page_number, settings)
+        cached = _read_cache(cache_path)
+        if cached is not None:
+            texts[page_number] = cached
+            metrics.inc("ocr_cache_hits")
+        else:
+            pending[page_number] = cache_path
+    if not pending:
+        return texts
+
+    print(f"  正在 OCR 识别 {os.path.basename(pdf_path)} 的 {len(pending)} 个扫描页面...")
+    with metrics.span("ocr"):
+        pool = _get_pool()
+        futures = {page_number: pool.submit(_ocr_page, os.path.abspath(pdf_path), page_number, settings['lang'],
+                                            settings['resolution'], settings['tesseract_cmd'])
+                   for page_number in pending}
+        for page_number, future in futures.items():
+            try:
+                text = future.result()
+            except Exception as e:
+                print(f"  ✗ OCR 识别第 {page_number + 1} 页失败: {e}")
+                metrics.inc("ocr_failures")
+                continue
+            metrics.inc("ocr_pages")
+            texts[page_number] = text
+            _write_cache(pending[page_number], text)
+    return texts
+
+
+def read_pages(pdf_path, max_pages=None):
+    """
+    逐页读取 PDF 文本（没有文本的页面按 [OCR] 设置识别）
+
+    参数:
+        pdf_path (str): PDF 文件路径
+        max_pages (int, optional): 只读取前几页（例如分类只需要第一页）
+
+    返回:
+        list: 每页的文本（没有文本的页面为空字符串）
+
+    异常:
+        PDF 无法打开或读取时抛出 pdfplumber 的异常
+    """
+    with pdfplumber.open(pdf_path) as pdf:
+        pages = pdf.pages if max_pages is None else pdf.pages[:max_pages]
+        texts = [page.extract_text() or "" for page in pages]
+    blank_pages = [page_number for page_number, text in enumerate(texts) if not text.strip()]
+    for page_number, text in ocr_pages(pdf_path, blank_pages).items():
+        texts[page_number] = text
+    return texts
+
+
+def iter_pages(pdf_path):
+    """
+    逐页读取 PDF 文本（生成器；没有文本的页面按 [OCR] 设置逐页识别）
+
+    调用方找到需要的内容后停止迭代，后面的页面不再读取（例如发票的条款页）。
+    开启 OCR 时，读到第一个没有文本的页面后读取剩余页面的文本，把所有没有文本的页面一次提交到进程池同时识别
+    （逐页识别时每次只有一个页面在识别，进程池不起作用）
+
+    返回:
+        生成器，每次返回一页的文本（没有文本的页面为空字符串）
+    """
+    with pdfplumber.open(pdf_path) as pdf:
+        pages = pdf.pages
+        for page_number, page in enumerate(pages):
+            text = page.extract_text() or ""
+            page.close()
+            if text.strip() or not _OCR_SETTINGS['enabled']:
+                yield text
+                continue
+
+            texts = [text]
+            for rest in pages[page_number + 1:]:
+                texts.append(rest.extract_text() or "")
+                rest.close()
+            break
+        else:
+            return
+
+    blank_pages = [page_number + offset for offset, text in enumerate(texts) if not text.strip()]
+    recognized = ocr_pages(pdf_path, blank_pages)
+    for offset, text in enumerate(texts):
+        yield recognized.get(page_number + offset, text)
+
+
+def read_text(pdf_path):
+    """
+    读取 PDF 全文（每页文本以换行结尾，跳过没有文本的页面）
+
+    返回:
+        str: 全文；所有页面都没有文本（且未能 OCR 识别）时返回空字符串
+    """
+    return "".join(text + "\n" for text in read_pages(pdf_path) if text)
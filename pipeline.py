@@ -0,0 +1,1049 @@
+"""
+发票处理流水线模块
+将完整的处理流程拆分为独立阶段，供图形界面 (gui_app.py) 和命令行 (main.py) 共用
+本模块不依赖 tkinter，可在没有显示器的服务器上运行
+"""
+
+import os
+import sys
+import time
+import queue
+import threading
+import traceback
+from datetime import datetime
+
+import pandas as pd
+
+import invoice_extractor
+import EmailHandler
+import config_loader
+import client_check
+import record_replay
+import metrics
+import profiling
+import port_resolver
+import invoice_ledger
+import archive_manager
+import pdf_text
+import mail_actions
+from price_matcher import FreightMatcher
+from run_journal import (RunJournal, stage_reached, is_finished, STAGE_EXTRACTED,
+                         STAGE_ARCHIVED, STAGE_REPORTED, STAGE_DISCARDED)
+
+
+# info.xlsx 表头（与 invoice_extractor.prepare_excel_row 返回的列表顺序一一对应）
+INFO_HEADERS = [
+    "NO", "File Name", "FILENO", "File No", "DATE", "Carrier", "Vessel/Voyage",
+    "Loading Port", "Loading Port Code", "Destination", "Destination Code",
+    "ETD", "ETA", "Receipt", "OBL", "HBL", "MBL",
+    "Item", "Quantity", "Unit Price", "Container Type", "Amount", "Booking No",
+    "Supplier Name", "Due Date", "Currency"
+]
+
+# ================= 流水线配置 =================
+# 各阶段默认工作线程数（下载固定 1 个连接，归档固定 1 个线程）
+# 以下默认值可在 config.ini 的 [PERFORMANCE] 中修改，见 config_loader.DEFAULT_PERFORMANCE
+DEFAULT_STAGE_WORKERS = {
+    "classify": config_loader.DEFAULT_PERFORMANCE['classify_workers'],
+    "extract": config_loader.DEFAULT_PERFORMANCE['extract_workers'],
+}
+# 队列长度（stage_queue_size）、info.xlsx 写入间隔（info_flush_interval）等同样在 [PERFORMANCE] 中设置
+
+_STAGE_DONE = object()        # 通知工作线程退出的标记
+# ===========================================
+
+# 运行状态
+STATUS_SUCCESS = "success"        # 处理完成且提取到数据
+STATUS_NO_DATA = "no_data"        # 处理完成但没有提取到任何发票数据
+STATUS_NO_EMAILS = "no_emails"    # 没有获取到任何有效邮件
+STATUS_ERROR = "error"            # 运行出错
+
+
+def sanitize_filename(filename):
+    """
+    清理文件名中的非法字符（Windows文件名不能包含：< > : " / \\ | ? *）
+
+    参数:
+        filename (str): 原始文件名
+
+    返回:
+        str: 清理后的文件名
+    """
+    illegal_chars = ['<', '>', ':', '"', '/', '\\', '|', '?', '*']
+    for char in illegal_chars:
+        filename = filename.replace(char, '_')
+    return filename
+
+
+def init_run_dirs(base_dir):
+    """
+    阶段 1：初始化当日目录结构
+
+    参数:
+        base_dir (str): 基础目录路径
+
+    返回:
+        dict: 包含 base_path、temp_dir、invoice_dir、bl_dir 四个路径
+    """
+    current_date = datetime.now().strftime("%Y%m%d")
+    print(f"当前日期: {current_date}")
+
+    base_path = os.path.join(base_dir, "Download", current_date)
+    print(f"基础路径: {base_path}")
+
+    if not os.path.exists(base_path):
+        os.makedirs(base_path)
+        print(f"✓ 已创建基础目录: {base_path}")
+
+    dirs = {
+        "base_path": base_path,
+        "temp_dir": os.path.join(base_path, "Temp"),
+        "invoice_dir": os.path.join(base_path, "Invoice附件"),
+        "bl_dir": os.path.join(base_path, "BL附件"),
+    }
+
+    for dir_path in [dirs["temp_dir"], dirs["invoice_dir"], dirs["bl_dir"]]:
+        if not os.path.exists(dir_path):
+            os.makedirs(dir_path)
+            print(f"✓ 已创建目录: {dir_path}")
+        else:
+            print(f"✓ 目录已存在: {dir_path}")
+
+    return dirs
+
+
+def _report_archived(result, label, success_message):
+    """
+    显示一个文件的归档结果
+
+    返回:
+        str|None: 实际的目标路径，移动失败返回 None
+    """
+    if result.get('error'):
+        print(f"  ✗ {label} 移动失败: {result['error']}")
+        return None
+    if result['duplicate']:
+        print(f"  ⏭ {label} 与已归档的文件内容相同，不再重复保存: {os.path.basename(result['path'])}")
+    else:
+        print(f"  ✓ {success_message}: {os.path.basename(result['path'])}")
+    return result['path']
+
+
+def _archive_file(source_path, target_path, label, success_message, content_hash=None):
+    """
+    将文件移动到归档目录（目标已存在时自动添加序号，内容相同的文件不重复保存，见 archive_manager）
+
+    参数:
+        source_path (str): 源文件路径
+        target_path (str): 期望的目标路径
+        label (str): 日志中显示的文件类别（"Invoice" 或 "BL"）
+        success_message (str): 移动成功时显示的提示
+        content_hash (str, optional): 源文件 SHA-256（下载时已计算）
+
+    返回:
+        str|None: 实际的目标路径，移动失败返回 None
+    """
+    directory = archive_manager.archive_dir(os.path.dirname(target_path))
+    result = directory.move_many([(source_path, os.path.basename(target_path), content_hash)])[0]
+    return _report_archived(result, label, success_message)
+
+
+def archive_invoice(invoice_path, invoice_no, invoice_dir, content_hash=None):
+    """
+    阶段 4a：Invoice 重命名并归档到 Invoice附件 目录
+
+    参数:
+        invoice_path (str): Temp 中的发票文件路径
+        invoice_no (str): 文件编号（为空时保留原文件名）
+        invoice_dir (str): Invoice附件 目录
+        content_hash (str, optional): 发票文件 SHA-256（下载时已计算）
+    """
+    if invoice_no:
+        target_invoice_name = sanitize_filename(f"invoice {invoice_no}.pdf")
+        target_invoice_path = os.path.join(invoice_dir, target_invoice_name)
+        return _archive_file(invoice_path, target_invoice_path, "Invoice", "Invoice 已移动并重命名", content_hash)
+
+    target_invoice_path = os.path.join(invoice_dir, os.path.basename(invoice_path))
+    return _archive_file(invoice_path, target_invoice_path, "Invoice", "Invoice 已移动（未重命名，invoice_no为空）",
+                         content_hash)
+
+
+def archive_bl_files(bl_files, hbl, bl_dir, journal=None):
+    """
+    阶段 4b：BL 重命名并归档到 BL附件 目录（一封邮件的 BL 一批移动）
+
+    参数:
+        bl_files (list): 附件列表（每个元素包含 "path"，启用运行日志时包含 "att_id"，下载时计算过哈希时包含 "content_hash"）
+        hbl (str): 发票中提取的 HBL（为空时标记为未知）
+        bl_dir (str): BL附件 目录
+        journal (RunJournal, optional): 运行日志，归档成功后记录 archived 阶段
+    """
+    pending = []
+    for bl_att in bl_files:
+        bl_path = bl_att['path']
+        bl_filename = os.path.basename(bl_path)
+
+        if not os.path.exists(bl_path):
+            print(f"  ⚠ BL 文件已不存在（可能已被处理）: {bl_filename}")
+            continue
+
+        if hbl:
+            pending.append((bl_att, sanitize_filename(f"BL {hbl}.pdf"), "BL 已移动并重命名"))
+        else:
+            pending.append((bl_att, f"BL_未知_{bl_filename}", "BL 已移动（HBL为空，标记为未知）"))
+    if not pending:
+        return
+
+    results = archive_manager.archive_dir(bl_dir).move_many(
+        [(bl_att['path'], target_name, bl_att.get('content_hash')) for bl_att, target_name, _ in pending])
+    for (bl_att, _, success_message), result in zip(pending, results):
+        archived_path = _report_archived(result, "BL", success_message)
+        if archived_path and journal is not None and bl_att.get('att_id'):
+            # 以 BL 身份归档的附件（包括 UNKNOWN 类型）不再作为发票处理
+            journal.record_attachment(bl_att['att_id'], STAGE_ARCHIVED, type='BL',
+                                      archived_path=archived_path)
+
+
+def extract_invoice(invoice_path):
+    """
+    阶段 3：调用 AI 提取一张发票的数据
+
+    参数:
+        invoice_path (str): 发票文件路径
+
+    返回:
+        list: 费用明细列表（每行一个字典），提取失败返回空列表
+    """
+    print("  正在调用 AI 提取发票数据...")
+    extracted_data = invoice_extractor.extract_invoice_data(invoice_path)
+
+    if not extracted_data:
+        print("  ⚠ 跳过：AI 提取失败或返回空数据")
+        return []
+    return extracted_data
+
+
+def get_invoice_keys(extracted_data):
+    """
+    从提取结果中获取用于归档命名的文件编号和 HBL
+
+    返回:
+        tuple: (invoice_no, hbl)
+    """
+    first_data = extracted_data[0]
+
+    # 优先使用 OriginalFileNo（文件编号），如果为空则使用 InvoiceNo（发票编号）作为兜底
+    invoice_no = first_data.get('OriginalFileNo', '').strip() if first_data.get('OriginalFileNo') else ''
+    if not invoice_no:
+        invoice_no = first_data.get('InvoiceNo', '').strip() if first_data.get('InvoiceNo') else ''
+    hbl = first_data.get('HBL', '').strip() if first_data.get('HBL') else ''
+    return invoice_no, hbl
+
+
+def build_excel_rows(extracted_data, invoice_filename, booking_no):
+    """
+    将提取结果转换为 info.xlsx 的数据行（每行费用明细生成一行）
+
+    返回:
+        list: prepare_excel_row 生成的数据行列表
+    """
+    excel_rows = []
+    for row_idx, row_data in enumerate(extracted_data, 1):
+        excel_rows.append(invoice_extractor.prepare_excel_row(row_data, invoice_filename, booking_no))
+        print(f"  ✓ 已添加第 {row_idx}/{len(extracted_data)} 行费用数据到 Excel 列表")
+
+    print(f"  ✓ 共添加 {len(extracted_data)} 条记录到 Excel 数据列表")
+    return excel_rows
+
+
+def extract_email_invoices(email_info, journal=None, ledger=None):
+    """
+    流水线阶段「提取」：为一封邮件中的每张发票获取提取结果
+
+    已在运行日志中完成提取的发票直接使用保存的数据（不再调用 AI），
+    结果保存在附件字典的 "extracted" 字段中（提取失败为 None）；
+    与发票台账中已登记的 PDF 内容完全相同的发票不调用 AI，
+    附件字典的 "duplicate_of" 字段为最早登记的台账记录
+
+    参数:
+        email_info (dict): 已分类的邮件信息
+        journal (RunJournal, optional): 运行日志
+        ledger (InvoiceLedger, optional): 发票台账
+
+    返回:
+        dict: 同一个 email_info
+    """
+    for att in email_info['attachments']:
+        if att['type'] not in ('INVOICE', 'UNKNOWN'):
+            continue
+
+        att_id = att.get('att_id')
+        record = journal.get_attachment(att_id) if journal is not None and att_id else {}
+        if is_finished(record):
+            continue
+
+        invoice_filename = os.path.basename(att['path'])
+        if stage_reached(record, STAGE_EXTRACTED):
+            print(f"  ✓ {invoice_filename}: 使用运行日志中保存的提取结果（不再调用 AI）")
+            att['extracted'] = record['data']
+            continue
+
+        print(f"\n  处理 Invoice: {invoice_filename}")
+        if ledger is not None:
+            # 下载时已计算哈希（旧版运行日志续跑的附件除外）
+            att['content_hash'] = att.get('content_hash') or invoice_ledger.file_sha256(att['path'])
+            original = ledger.find_duplicate(att['content_hash'], invoice_filename, email_info.get('email_id', ''))
+            if original is not None:
+                print(f"  ⚠ 跳过：与已处理的发票内容完全相同: {invoice_ledger.describe_entry(original)}")
+                metrics.inc("duplicate_invoices")
+                att['extracted'] = None
+                att['duplicate_of'] = original
+                continue
+
+        extracted_data = extract_invoice(att['path'])
+        if not extracted_data:
+            att['extracted'] = None
+            if journal is not None and att_id:
+                if not journal.record_extract_failure(att_id):
+                    print("  ⚠ 多次提取失败，后续运行不再重试该发票")
+            continue
+
+        att['extracted'] = extracted_data
+        if journal is not None and att_id:
+            invoice_no, hbl = get_invoice_keys(extracted_data)
+            journal.record_attachment(att_id, STAGE_EXTRACTED, data=extracted_data,
+                                      invoice_no=invoice_no, hbl=hbl, content_hash=att.get('content_hash'))
+    return email_info
+
+
+def register_invoice(ledger, invoice_att, record, email_rows, email_id):
+    """
+    在发票台账中登记一张发票
+
+    参数:
+        ledger (InvoiceLedger): 发票台账
+        invoice_att (dict): 发票附件（提取阶段计算过哈希时包含 "content_hash"）
+        record (dict): 运行日志中的附件记录
+        email_rows (list): 这张发票的 info.xlsx 数据行
+        email_id (str): 邮件标识
+
+    返回:
+        dict: InvoiceLedger.register() 的结果；无法计算文件哈希时返回 None
+    """
+    content_hash = invoice_att.get('content_hash') or record.get('content_hash')
+    if not content_hash:
+        # 续跑时文件可能已归档
+        path = invoice_att['path'] if os.path.exists(invoice_att['path']) else record.get('archived_path', '')
+        if not path or not os.path.exists(path):
+            print("  ⚠ 发票文件已不存在，未登记到发票台账")
+            return None
+        content_hash = invoice_ledger.file_sha256(path)
+    return ledger.register(email_rows, INFO_HEADERS, content_hash, os.path.basename(invoice_att['path']),
+                           email_id)
+
+
+def archive_email(email_info, dirs, journal=None, ledger=None):
+    """
+    流水线阶段「归档」：生成数据行，并将 Invoice/BL 重命名归档
+
+    需要先调用 extract_email_invoices()；已归档的文件不再移动。
+    启用发票台账时登记每张发票：与已登记的 PDF 内容相同的发票不生成数据行，
+    供应商 + 发票号重复的发票照常生成数据行，生成 XERO Bill 时再标记
+
+    参数:
+        email_info (dict): 已提取的邮件信息
+        dirs (dict): init_run_dirs() 返回的目录字典
+        journal (RunJournal, optional): 运行日志
+        ledger (InvoiceLedger, optional): 发票台账
+
+    返回:
+        tuple: (email_rows, att_ids)
+            - email_rows: 这封邮件生成的 info.xlsx 数据行
+            - att_ids: 生成了数据行的附件标识（写入 info.xlsx 后标记为 reported）
+    """
+    print(f"邮件标题: {email_info['subject']}")
+    print(f"Booking No: {email_info.get('booking_no', '未提取到')}")
+
+    invoice_files = [att for att in email_info['attachments'] if att['type'] == 'INVOICE' or att['type'] == 'UNKNOWN']
+    bl_files = [att for att in email_info['attachments'] if att['type'] == 'BL' or att['type'] == 'UNKNOWN']
+
+    original = _duplicate_invoice_original(email_info, ledger) if not invoice_files else None
+    if original is not None:
+        # 发票与已处理的发票相同（下载时已作为重复附件跳过），提单按原发票的 HBL 归档
+        print(f"  ⚠ 重复发票，不生成数据行（原发票: {invoice_ledger.describe_entry(original)}）")
+        if bl_files:
+            archive_bl_files(bl_files, original.get('hbl', ''), dirs["bl_dir"], journal)
+        return [], []
+
+    if not invoice_files:
+        print("  ⚠ 跳过：该邮件中没有 Invoice 文件")
+        if journal is not None:
+            for att in email_info['attachments']:
+                if att.get('att_id'):
+                    journal.record_attachment(att['att_id'], STAGE_DISCARDED, reason="no_invoice")
+        return [], []
+
+    print(f"  发现 {len(invoice_files)} 个 Invoice 文件，{len(bl_files)} 个 BL 文件")
+
+    email_rows = []
+    att_ids = []
+    booking_no = email_info.get('booking_no', '')
+    for invoice_att in invoice_files:
+        invoice_path = invoice_att['path']
+        invoice_filename = os.path.basename(invoice_path)
+        att_id = invoice_att.get('att_id')
+        record = journal.get_attachment(att_id) if journal is not None and att_id else {}
+        print(f"\n  归档 Invoice: {invoice_filename}")
+
+        if is_finished(record):
+            # 上次运行已写入 info.xlsx，只需使用保存的 HBL 归档剩余的 BL
+            print("  ✓ 该发票已在上次运行中处理完成，跳过")
+            if bl_files:
+                archive_bl_files(bl_files, record.get('hbl', ''), dirs["bl_dir"], journal)
+            continue
+
+        if invoice_att.get('duplicate_of'):
+            _skip_duplicate_invoice(invoice_att, invoice_att['duplicate_of'], bl_files, dirs, journal)
+            continue
+
+        extracted_data = invoice_att.get('extracted')
+        if not extracted_data:
+            print("  ⚠ 跳过：AI 提取失败或返回空数据")
+            continue
+
+        invoice_no, hbl = get_invoice_keys(extracted_data)
+        print(f"  提取到文件编号: {invoice_no}")
+        print(f"  提取到 HBL: {hbl}")
+        print(f"  发票包含 {len(extracted_data)} 行费用明细")
+
+        invoice_rows = build_excel_rows(extracted_data, invoice_filename, booking_no)
+        if ledger is not None:
+            outcome = register_invoice(ledger, invoice_att, record, invoice_rows, email_info.get('email_id', ''))
+            if outcome and outcome['duplicate'] == invoice_ledger.DUPLICATE_CONTENT:
+                # 同一批中内容相同的发票在提取阶段同时通过了检查，这里再拦截一次
+                metrics.inc("duplicate_invoices")
+                _skip_duplicate_invoice(invoice_att, outcome['original'], bl_files, dirs, journal)
+                continue
+            if outcome and outcome['duplicate'] == invoice_ledger.DUPLICATE_INVOICE_NO:
+                print(f"  ⚠ 供应商和发票号与已处理的发票相同: {invoice_ledger.describe_entry(outcome['original'])}，"
+                      f"生成 XERO Bill 时将标记为重复")
+                metrics.inc("duplicate_invoice_numbers")
+
+        email_rows.extend(invoice_rows)
+        if att_id:
+            att_ids.append(att_id)
+
+        # ========== 重命名与归档 ==========
+        print("\n  【文件移动和重命名】")
+        if stage_reached(record, STAGE_ARCHIVED):
+            print(f"  ✓ Invoice 已在上次运行中归档: {os.path.basename(record.get('archived_path', ''))}")
+        else:
+            archived_path = archive_invoice(invoice_path, invoice_no, dirs["invoice_dir"], invoice_att.get('content_hash'))
+            if archived_path and journal is not None and att_id:
+                journal.record_attachment(att_id, STAGE_ARCHIVED, archived_path=archived_path)
+        if bl_files:
+            archive_bl_files(bl_files, hbl, dirs["bl_dir"], journal)
+
+    return email_rows, att_ids
+
+
+def email_outcome(email_info, journal=None):
+    """
+    一封邮件归档后的处理结果（运行结束后据此回写邮箱）
+
+    参数:
+        email_info (dict): 已归档的邮件信息
+        journal (RunJournal, optional): 运行日志（续跑时判断上次已完成的发票）
+
+    返回:
+        str: mail_actions.OUTCOME_PROCESSED（至少一张发票生成了数据行或是重复发票 / 重复附件，且没有提取失败的发票）
+             或 mail_actions.OUTCOME_REVIEW（没有发票，或有发票提取失败）
+    """
+    # 下载时跳过的重复附件引用已处理过的第一份附件
+    succeeded = 1 if email_info.get('duplicates') else 0
+    failed = 0
+    for att in email_info['attachments']:
+        if att['type'] not in ('INVOICE', 'UNKNOWN'):
+            continue
+        record = journal.get_attachment(att['att_id']) if journal is not None and att.get('att_id') else {}
+        if att.get('extracted') or att.get('duplicate_of') or \
+                (is_finished(record) and record.get('reason') in (None,) + mail_actions.DUPLICATE_REASONS):
+            succeeded += 1
+        elif att['type'] == 'INVOICE':
+            # 类型未知的文件提取失败通常只是提单，不算失败
+            failed += 1
+    return mail_actions.OUTCOME_PROCESSED if succeeded and not failed else mail_actions.OUTCOME_REVIEW
+
+
+def awaits_duplicate_original(email_info, ledger):
+    """
+    邮件中没有需要处理的发票，但有下载时跳过的重复附件、且台账中还没有对应的发票：
+    第一份附件可能还在本次运行的流水线中，应等它归档后再归档这封邮件（提单需要原发票的 HBL）
+    """
+    if ledger is None or not email_info.get('duplicates'):
+        return False
+    if any(att['type'] in ('INVOICE', 'UNKNOWN') for att in email_info['attachments']):
+        return False
+    return _duplicate_invoice_original(email_info, ledger) is None
+
+
+def _duplicate_invoice_original(email_info, ledger):
+    """邮件中下载时跳过的重复附件如果是台账中已登记的发票，返回该发票的台账记录，否则返回 None"""
+    if ledger is None:
+        return None
+    for duplicate in email_info.get('duplicates') or []:
+        original = ledger.find_by_hash(duplicate['content_hash'])
+        if original is not None:
+            return original
+    return None
+
+
+def _skip_duplicate_invoice(invoice_att, original, bl_files, dirs, journal):
+    """
+    重复发票（与台账中已登记的 PDF 内容相同）：不生成数据行，
+    同一封邮件中的 BL 按原发票的 HBL 归档，发票文件（与已归档的原发票完全相同）从 Temp 中删除
+    """
+    print(f"  ⚠ 重复发票，不生成数据行（原发票: {invoice_ledger.describe_entry(original)}）")
+    try:
+        if os.path.exists(invoice_att['path']):
+            os.remove(invoice_att['path'])
+    except OSError as e:
+        print(f"  ⚠ 删除重复发票文件失败: {e}")
+    bl_files = [bl_att for bl_att in bl_files if bl_att is not invoice_att]
+    if bl_files:
+        archive_bl_files(bl_files, original.get('hbl', ''), dirs["bl_dir"], journal)
+    if journal is not None and invoice_att.get('att_id'):
+        journal.record_attachment(invoice_att['att_id'], STAGE_DISCARDED, reason="duplicate",
+                                  duplicate_of=original['id'])
+
+
+def process_email(email_info, dirs, journal=None, ledger=None):
+    """
+    顺序处理一封邮件：逐个提取 Invoice，并将 Invoice/BL 重命名归档
+
+    参数和返回值同 archive_email()
+    """
+    extract_email_invoices(email_info, journal, ledger)
+    return archive_email(email_info, dirs, journal, ledger)
+
+
+@metrics.timed("write_info_excel")
+def write_info_excel(all_excel_data, info_excel_path):
+    """
+    阶段 5：将所有数据行写入 info.xlsx（日期字段只保留日期部分）
+
+    参数:
+        all_excel_data (list): prepare_excel_row 生成的数据行列表
+        info_excel_path (str): info.xlsx 路径
+    """
+    df = pd.DataFrame(all_excel_data, columns=INFO_HEADERS)
+
+    # 格式化日期字段，只保留日期部分，去除时间
+    date_columns = ['DATE', 'ETD', 'ETA']
+    for col in date_columns:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col], errors='coerce')
+            df[col] = df[col].dt.normalize()
+            df[col] = df[col].dt.strftime('%Y/%m/%d')
+            df[col] = df[col].replace('NaT', '').replace('nan', '')
+
+    df.to_excel(info_excel_path, index=False, engine='openpyxl')
+    print(f"✓ 已生成 info.xlsx: {info_excel_path}")
+
+
+def write_run_summary(base_path, start_time, processed_email_count, success_extract_count):
+    """
+    生成 当日运行清单.xlsx
+
+    返回:
+        str: 当日运行清单.xlsx 路径
+    """
+    status = "成功" if success_extract_count > 0 else "无数据"
+
+    summary_data = {
+        "运行时间": [start_time.strftime("%Y-%m-%d %H:%M:%S")],
+        "处理邮件总数": [processed_email_count],
+        "成功提取数": [success_extract_count],
+        "状态": [status]
+    }
+
+    summary_df = pd.DataFrame(summary_data)
+    summary_excel_path = os.path.join(base_path, "当日运行清单.xlsx")
+    summary_df.to_excel(summary_excel_path, index=False, engine='openpyxl')
+    print(f"✓ 已生成 当日运行清单.xlsx: {summary_excel_path}")
+    return summary_excel_path
+
+
+def run_client_check(info_excel_path, booking_list_path):
+    """额外步骤：客户信息核对 (RPA)"""
+    if booking_list_path and os.path.exists(booking_list_path):
+        print(f"\n【额外步骤】检测到 Booking List，开始执行客户核对...")
+        print(f"Booking List 路径: {booking_list_path}")
+
+        try:
+            client_check.run_check(info_excel_path, booking_list_path)
+            print("✓ 客户核对完成！结果已更新至 info.xlsx")
+        except Exception as e:
+            print(f"⚠ 警告：客户核对过程中出错: {e}")
+    else:
+        print("\n【额外步骤】未选择 Booking List 或文件不存在，跳过客户核对。")
+
+
+def run_price_matching(info_excel_path, price_list_path):
+    """额外步骤：自动查价"""
+    if not price_list_path or not price_list_path.strip():
+        print("\n【额外步骤】未选择 Price List，跳过自动查价。")
+    elif not os.path.exists(price_list_path):
+        print(f"\n【额外步骤】Price List 文件不存在: {price_list_path}，跳过自动查价。")
+    elif not os.path.exists(info_excel_path):
+        # 检查 info.xlsx 是否存在（如果没有数据，文件可能不存在）
+        print(f"\n【额外步骤】info.xlsx 不存在，无法执行自动查价。")
+    else:
+        print(f"\n【额外步骤】检测到 Price List，开始执行自动查价...")
+        print(f"Price List 路径: {price_list_path}")
+
+        try:
+            matcher = FreightMatcher()
+            matcher.load_price_list(price_list_path)
+            matcher.run_matching(info_excel_path)
+            print("✓ 自动查价完成！结果已更新至 info.xlsx")
+        except Exception as e:
+            print(f"⚠ 警告：查价失败: {e}")
+            traceback.print_exc()
+
+
+def cleanup_temp(temp_dir):
+    """阶段 6：Temp 文件夹为空时删除"""
+    try:
+        if os.path.exists(temp_dir):
+            if not os.listdir(temp_dir):
+                os.rmdir(temp_dir)
+                print(f"✓ 已删除空的 Temp 文件夹: {temp_dir}")
+            else:
+                print(f"⚠ Temp 文件夹不为空，保留文件夹（可能还有未处理的文件）")
+    except Exception as e:
+        print(f"⚠ 删除 Temp 文件夹时出错: {e}")
+
+
+class _InfoWriter:
+    """
+    流水线阶段「写入」：收集数据行并增量写入 info.xlsx
+
+    每处理完一封邮件后，如果距离上次写入已超过 flush_interval 秒就重写 info.xlsx，
+    使前面邮件的数据在邮箱全部处理完之前就能看到；写入后将对应附件标记为 reported
+    """
+
+    def __init__(self, info_excel_path, journal, flush_interval):
+        self.info_excel_path = info_excel_path
+        self.journal = journal
+        self.flush_interval = flush_interval
+        self.rows = []
+        self._unreported_ids = []
+        self._last_flush = time.monotonic()
+
+    def add(self, rows, att_ids):
+        """添加一封邮件的数据行，必要时写入文件"""
+        self.rows.extend(rows)
+        self._unreported_ids.extend(att_ids)
+        if rows and time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """将当前所有数据行写入 info.xlsx"""
+        if not self.rows:
+            return
+        write_info_excel(self.rows, self.info_excel_path)
+        for att_id in self._unreported_ids:
+            self.journal.record_attachment(att_id, STAGE_REPORTED)
+        self._unreported_ids = []
+        self._last_flush = time.monotonic()
+
+
+def _stage_worker(stage_name, func, in_queue, out_queue):
+    """
+    流水线工作线程：从 in_queue 取出邮件，处理后放入 out_queue
+
+    单封邮件处理出错时只记录错误并跳过（运行日志中保留其进度，下次运行继续），
+    不影响其他邮件；取到 _STAGE_DONE 时退出
+    """
+    while True:
+        item = in_queue.get()
+        if item is _STAGE_DONE:
+            return
+        try:
+            with metrics.span(f"stage_{stage_name}"), profiling.stage(stage_name):
+                result = func(item)
+        except Exception as e:
+            print(f"  ✗ [{stage_name}] 处理邮件出错（{item.get('subject', '')}）: {e}")
+            traceback.print_exc()
+            continue
+        if result is not None and out_queue is not None:
+            out_queue.put(result)
+
+
+def _start_workers(stage_name, count, func, in_queue, out_queue):
+    """启动某个阶段的 count 个工作线程"""
+    threads = []
+    for index in range(max(1, count)):
+        thread = threading.Thread(target=_stage_worker, args=(stage_name, func, in_queue, out_queue),
+                                  name=f"{stage_name}-{index + 1}", daemon=True)
+        thread.start()
+        threads.append(thread)
+    return threads
+
+
+def _finish_stage(stage_name, threads, next_queue, next_worker_count):
+    """等待某个阶段的全部线程结束，再通知下一阶段的每个线程退出"""
+    for thread in threads:
+        thread.join()
+    profiling.snapshot(stage_name)
+    if next_queue is not None:
+        for _ in range(max(1, next_worker_count)):
+            next_queue.put(_STAGE_DONE)
+
+
+def _new_mailbox_stats(mailbox):
+    """单个邮箱的下载统计（写入运行结果的 "mailboxes"）"""
+    return {
+        'name': mailbox['name'],
+        'user': mailbox['user'],
+        'status': STATUS_SUCCESS,
+        'emails': 0,
+        'attachments': 0,
+        'bytes': 0,
+        'duration': 0.0,
+        'error': '',
+    }
+
+
+def _report_mailbox_stats(mailbox_stats):
+    """
+    打印每个邮箱的下载统计
+
+    返回:
+        list: 下载失败的邮箱统计
+    """
+    if len(mailbox_stats) > 1:
+        print("\n各邮箱下载统计:")
+        for stats in mailbox_stats:
+            mark = "✗" if stats['status'] == STATUS_ERROR else "✓"
+            print(f"  {mark} {stats['name']} ({stats['user']}): {stats['emails']} 封邮件，"
+                  f"{stats['attachments']} 个 PDF 附件，{stats['bytes'] / 1024:.0f} KB，{stats['duration']:.1f} 秒")
+    failed = [stats for stats in mailbox_stats if stats['status'] == STATUS_ERROR]
+    for stats in failed:
+        print(f"  ✗ 邮箱 {stats['name']} 下载失败: {stats['error']}")
+    return failed
+
+
+def _apply_mail_actions(actions, journal, mailboxes):
+    """按每封邮件的处理结果批量回写邮箱（标记已读 / 移动到 Processed、Needs-Review），失败不影响运行结果"""
+    actions.resolve_from_journal(journal)
+    if not actions.summary():
+        return
+    print("\n回写邮件处理结果（标记已读 / 移动文件夹）...")
+    with metrics.span("mail_actions"), profiling.stage("mail_actions"):
+        totals = actions.apply(mailboxes)
+    print(f"✓ 邮件处理结果已回写: {totals[mail_actions.OUTCOME_PROCESSED]} 封处理成功，"
+          f"{totals[mail_actions.OUTCOME_REVIEW]} 封需要人工查看，{totals[mail_actions.OUTCOME_IGNORED]} 封无需处理")
+
+
+def _remember_attachments(ledger, journal):
+    """将本次运行中已处理完的附件登记到台账的附件索引（之后的运行中再次收到时在下载阶段跳过），失败不影响运行结果"""
+    try:
+        count = ledger.remember_attachments(journal.finished_attachments())
+    except Exception as e:
+        print(f"⚠ 警告：登记附件索引失败: {e}")
+        return
+    if count:
+        print(f"✓ 已登记 {count} 个已处理完的附件到附件索引")
+
+
+def _export_metrics(result):
+    """将本次运行的指标写入运行目录（run_metrics.json、metrics.prom），失败不影响运行结果"""
+    metrics.observe("run_total", result['duration'])
+    metrics.inc("emails_processed", result['email_count'])
+    metrics.inc("rows_extracted", result['extract_count'])
+    try:
+        metrics.export_run_metrics(result['output_dir'])
+        print(f"✓ 已生成运行指标: {os.path.join(result['output_dir'], metrics.METRICS_JSON_FILENAME)}")
+    except Exception as e:
+        print(f"⚠ 警告：写入运行指标失败: {e}")
+
+
+def run_pipeline(base_dir, booking_list_path=None, price_list_path=None, stage_workers=None, replay=None,
+                 profile=None):
+    """
+    执行完整的邮件处理流程
+
+    下载 → 分类 → 提取 → 归档 四个阶段通过有界队列串联并行执行：
+    下载第 2 封邮件的同时分类/提取第 1 封邮件，info.xlsx 在邮箱处理完之前就会逐步写入
+
+    参数:
+        base_dir (str): 基础目录路径
+        booking_list_path (str, optional): Booking List 文件路径，用于客户信息核对
+        price_list_path (str, optional): Price List 文件路径，用于自动查价
+        stage_workers (dict, optional): 各阶段的工作线程数，例如 {"classify": 2, "extract": 4}，
+            未指定的阶段使用 config.ini [PERFORMANCE] 的设置（默认 DEFAULT_STAGE_WORKERS）
+        replay (dict, optional): 录制 / 回放设置 {"mode", "fixture_dir", "speed"}，
+            未指定时使用 config.ini 的 [REPLAY] 部分（默认关闭）
+        profile (dict, optional): 性能分析设置 {"enabled", "top_n"}，开启后在运行目录的 profile/
+            中生成每个阶段的 cProfile 和 tracemalloc 报告；未指定时使用 config.ini 的 [PROFILING] 部分
+
+    返回:
+        dict: 运行结果字典，包含：
+            - status (str): STATUS_SUCCESS / STATUS_NO_DATA / STATUS_NO_EMAILS / STATUS_ERROR
+            - output_dir (str): 输出目录路径（未创建时为空字符串）
+            - email_count (int): 处理的邮件数
+            - extract_count (int): 成功提取的费用行数
+            - duration (float): 运行耗时（秒）
+            - error (str): 错误信息（如有；部分邮箱下载失败时列出失败的邮箱）
+            - mailboxes (list): 每个邮箱的下载统计 {"name", "user", "status", "emails", "attachments",
+              "bytes", "duration", "error"}；所有邮箱都失败且没有处理任何邮件时 status 为 STATUS_ERROR
+    """
+    start_time = datetime.now()
+    result = {
+        'status': STATUS_ERROR,
+        'output_dir': '',
+        'email_count': 0,
+        'extract_count': 0,
+        'duration': 0.0,
+        'error': '',
+        'mailboxes': [],
+    }
+    workers = dict(DEFAULT_STAGE_WORKERS)
+    ledger = None
+    journal = None
+    metrics.reset()
+    # 归档目录的文件名索引每次运行重新读取
+    archive_manager.reset()
+
+    try:
+        # 每次运行时读取配置（config.ini 修改后自动重新加载），修改后无需重启程序
+        performance = config_loader.get_performance_config()
+        workers.update(classify=performance['classify_workers'], extract=performance['extract_workers'])
+        workers.update(stage_workers or {})
+        mailboxes = [dict(mailbox, fetch_bulk=performance['imap_fetch_bulk'])
+                     for mailbox in config_loader.get_mailbox_configs()]
+        invoice_extractor.API_KEY = config_loader.get_api_key()
+        invoice_extractor.API_URL = config_loader.get_api_url()
+        invoice_extractor.configure_api(performance['api_timeout'], performance['api_max_concurrency'],
+                                        performance['api_requests_per_minute'])
+        port_resolver.set_cache_size(performance['port_cache_size'])
+        pdf_text.configure_ocr(config_loader.get_ocr_config())
+        replay = replay or config_loader.get_replay_config()
+        record_replay.activate(replay.get('mode'), replay.get('fixture_dir'), replay.get('speed', 1.0))
+        if record_replay.current_mode() == record_replay.MODE_REPLAY and len(mailboxes) > 1:
+            # 回放数据不区分邮箱，只需回放一次
+            mailboxes = mailboxes[:1]
+
+        print("=" * 60)
+        print("开始执行发票自动处理程序")
+        print("=" * 60)
+
+        # ==================== 步骤 1：初始化目录 ====================
+        print("\n【步骤 1】初始化目录结构...")
+        dirs = init_run_dirs(base_dir)
+        base_path = dirs["base_path"]
+        result['output_dir'] = base_path
+        print("目录初始化完成！\n")
+
+        profile = profile or config_loader.get_profiling_config()
+        if profile.get('enabled'):
+            profiling.start_session(base_path, profile.get('top_n', profiling.DEFAULT_TOP_N))
+
+        # 打开运行日志，还原上次中断时未处理完的附件
+        journal = RunJournal(base_path)
+        # 发票台账（跨日期保存），用于发现重复发票
+        ledger = invoice_ledger.InvoiceLedger(invoice_ledger.ledger_path_for_base_dir(base_dir), run_dir=base_path)
+        # 附件内容索引：回复 / 转发邮件中重复的附件只处理第一份
+        attachment_index = invoice_ledger.AttachmentIndex(ledger)
+        resumed_emails = journal.pending_emails()
+        if resumed_emails:
+            print(f"✓ 发现上次运行未处理完的邮件 {len(resumed_emails)} 封，将从中断的阶段继续处理")
+
+        # 定义 info.xlsx 路径（无论是否有数据都需要定义，用于后续步骤）
+        info_excel_path = os.path.join(base_path, "info.xlsx")
+        info_writer = _InfoWriter(info_excel_path, journal, performance['info_flush_interval'])
+
+        # ==================== 步骤 2-3：流水线处理 ====================
+        print("【步骤 2】从邮箱下载附件，并流水线处理（分类 → 提取 → 归档）...")
+        print(f"  工作线程数: 分类 {workers['classify']}，提取 {workers['extract']}")
+
+        classify_queue = queue.Queue(maxsize=performance['stage_queue_size'])
+        extract_queue = queue.Queue(maxsize=performance['stage_queue_size'])
+        archive_queue = queue.Queue(maxsize=performance['stage_queue_size'])
+        counters = {'emails': 0}
+        # 每封邮件的处理结果，流水线结束后批量回写邮箱
+        actions = mail_actions.MailActions()
+        for email_info in resumed_emails:
+            actions.register_email(email_info)
+        mailbox_stats = {mailbox['name']: _new_mailbox_stats(mailbox) for mailbox in mailboxes}
+        result['mailboxes'] = list(mailbox_stats.values())
+        if len(mailboxes) > 1:
+            print(f"  同时下载 {len(mailboxes)} 个邮箱: {', '.join(mailbox_stats)}")
+
+        def _resume():
+            for email_info in resumed_emails:
+                classify_queue.put(email_info)
+
+        def _download(mailbox):
+            # 每个邮箱一个连接；一个邮箱出错不影响其他邮箱，已下载的邮件继续在后续阶段处理完
+            stats = mailbox_stats[mailbox['name']]
+            started = time.perf_counter()
+            try:
+                with profiling.stage("download"):
+                    for email_info in EmailHandler.iter_downloaded_emails(mailbox['user'], mailbox['password'],
+                                                                          dirs["temp_dir"], journal=journal,
+                                                                          imap_config=mailbox, stats=stats,
+                                                                          actions=actions,
+                                                                          content_index=attachment_index):
+                        actions.register_email(email_info)
+                        classify_queue.put(email_info)
+            except Exception as e:
+                stats['status'] = STATUS_ERROR
+                stats['error'] = str(e)
+                metrics.inc("mailbox_failures")
+                print(f"  ✗ [download] 邮箱 {mailbox['name']} 下载邮件出错: {e}")
+            finally:
+                stats['duration'] = round(time.perf_counter() - started, 3)
+
+        def _classify(email_info):
+            classified = EmailHandler.classify_email_attachments(email_info, journal)
+            if classified is None:
+                actions.resolve_email(email_info, mail_actions.OUTCOME_IGNORED)
+            return classified
+
+        deferred_emails = []
+
+        def _archive(email_info, defer=True):
+            if defer and awaits_duplicate_original(email_info, ledger):
+                deferred_emails.append(email_info)
+                return
+            counters['emails'] += 1
+            print(f"\n--- 归档第 {counters['emails']} 封邮件 ---")
+            email_rows, att_ids = archive_email(email_info, dirs, journal, ledger)
+            info_writer.add(email_rows, att_ids)
+            actions.resolve_email(email_info, email_outcome(email_info, journal))
+
+        download_threads = [threading.Thread(target=_resume, name="download-resume", daemon=True)]
+        download_threads += [threading.Thread(target=_download, args=(mailbox,), name=f"download-{mailbox['name']}",
+                                              daemon=True) for mailbox in mailboxes]
+        for thread in download_threads:
+            thread.start()
+        classify_threads = _start_workers("classify", workers['classify'], _classify,
+                                          classify_queue, extract_queue)
+        extract_threads = _start_workers("extract", workers['extract'],
+                                         lambda e: extract_email_invoices(e, journal, ledger),
+                                         extract_queue, archive_queue)
+        # 归档阶段只用 1 个线程，保证文件重命名不冲突、数据行顺序稳定
+        archive_threads = _start_workers("archive", 1, _archive, archive_queue, None)
+
+        _finish_stage("download", download_threads, classify_queue, workers['classify'])
+        _finish_stage("classify", classify_threads, extract_queue, workers['extract'])
+        _finish_stage("extract", extract_threads, archive_queue, 1)
+        _finish_stage("archive", archive_threads, None, 0)
+        for email_info in deferred_emails:
+            _archive(email_info, defer=False)
+        _apply_mail_actions(actions, journal, mailboxes)
+
+        processed_email_count = counters['emails']
+        success_extract_count = len(info_writer.rows)
+        result['email_count'] = processed_email_count
+        result['extract_count'] = success_extract_count
+
+        failed_mailboxes = _report_mailbox_stats(result['mailboxes'])
+        if failed_mailboxes:
+            result['error'] = "邮箱下载失败: " + "; ".join(f"{stats['name']}: {stats['error']}"
+                                                           for stats in failed_mailboxes)
+
+        if processed_email_count == 0:
+            if failed_mailboxes:
+                # 邮箱连接失败不能当作「没有邮件」
+                print("❌ 邮箱下载失败，没有处理任何邮件。")
+                result['status'] = STATUS_ERROR
+                return result
+            print("⚠ 警告：没有获取到任何邮件，程序结束。")
+            result['status'] = STATUS_NO_EMAILS
+            return result
+
+        print(f"\n邮件处理完成！共处理 {processed_email_count} 封邮件，成功提取 {success_extract_count} 条发票数据\n")
+
+        # ==================== 步骤 4：生成 Excel 报表 ====================
+        print("【步骤 4】生成 Excel 报表...")
+
+        with profiling.stage("report"):
+            if info_writer.rows:
+                info_writer.flush()
+            else:
+                print("⚠ 警告：没有数据可写入 info.xlsx")
+
+            write_run_summary(base_path, start_time, processed_email_count, success_extract_count)
+        profiling.snapshot("report")
+        print("Excel 报表生成完成！\n")
+
+        # ==================== 额外步骤：客户核对与自动查价 ====================
+        with profiling.stage("client_check"):
+            run_client_check(info_excel_path, booking_list_path)
+        profiling.snapshot("client_check")
+        with profiling.stage("price_matching"):
+            run_price_matching(info_excel_path, price_list_path)
+        profiling.snapshot("price_matching")
+
+        # ==================== 步骤 5：清理环境 ====================
+        print("【步骤 5】清理临时文件...")
+        cleanup_temp(dirs["temp_dir"])
+
+        print("\n" + "=" * 60)
+        print("程序执行完成！")
+        print("=" * 60)
+        print(f"处理邮件数: {processed_email_count}")
+        print(f"成功提取数: {success_extract_count}")
+        print(f"输出目录: {base_path}")
+
+        result['status'] = STATUS_SUCCESS if success_extract_count > 0 else STATUS_NO_DATA
+        return result
+
+    except Exception as e:
+        print(f"\n❌ 程序执行出错: {e}")
+        traceback.print_exc()
+        result['status'] = STATUS_ERROR
+        result['error'] = str(e)
+        return result
+    finally:
+        if ledger is not None:
+            if journal is not None:
+                # info.xlsx 写入后发票才算处理完，最后登记
+                _remember_attachments(ledger, journal)
+            ledger.close()
+        result['duration'] = (datetime.now() - start_time).total_seconds()
+        if result['output_dir']:
+            _export_metrics(result)
+        profiling.finish_session()
+
+
+def run_main_process(base_dir, log_output=None, booking_list_path=None, price_list_path=None):
+    """
+    主处理函数：执行完整的邮件处理流程（图形界面在独立线程中调用）
+
+    参数:
+        base_dir (str): 基础目录路径
+        log_output: 日志输出对象（例如 gui_app.TextRedirector），为 None 时直接输出到标准输出
+        booking_list_path (str, optional): Booking List 文件路径，用于客户信息核对
+        price_list_path (str, optional): Price List 文件路径，用于自动查价
+
+    返回:
+        str|None: 输出目录路径；没有邮件或运行出错时返回 None
+    """
+    # 重定向 print 输出到指定对象
+    old_stdout = sys.stdout
+    if log_output is not None:
+        sys.stdout = log_output
+
+    try:
+        result = run_pipeline(base_dir, booking_list_path, price_list_path)
+        if result['status'] in (STATUS_SUCCESS, STATUS_NO_DATA):
+            return result['output_dir']
+        return None
+    finally:
+        # 恢复标准输出
+        sys.stdout = old_stdout
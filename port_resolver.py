@@ -0,0 +1,445 @@
+"""
+港口代码解析模块
+把发票上的港口名称解析为 UN/LOCODE 代码（port_codes.json），支持:
+    - 标准化：大小写、重音、标点、空格（"Los Angeles" 与 "LOSANGELES" 视为相同）
+    - 去除修饰词：PORT OF / PORT / SEAPORT、括号内容、国家后缀（"SHANGHAI, CHINA"）
+    - 别名表：旧称、当地拼写、码头名（"SAIGON"、"CAT LAI" -> 胡志明）
+    - 模糊匹配：三字母组（trigram）索引取候选，再按相似度打分，低于阈值视为未找到
+    - 结果缓存（LRU），resolve_many 对整列数据只解析不重复的值
+
+用法:
+    import port_resolver
+    port_resolver.resolve("HO CHI MINH CITY (CAT LAI)")     # -> "VNSGN"
+    port_resolver.resolve_many(df['Loading Port'])          # -> 代码 Series
+"""
+
+import os
+import re
+import json
+import threading
+import functools
+import unicodedata
+from collections import Counter, namedtuple
+from difflib import SequenceMatcher
+
+import config_loader
+from app_logging import get_logger
+
+logger = get_logger(__name__)
+
+# ================= 配置常量 =================
+PORT_CODES_FILENAME = "port_codes.json"
+PORT_ALIASES_FILENAME = "port_aliases.json"    # 可选：用户自定义别名（格式同内置别名表）
+
+PORT_CACHE_SIZE = 4096         # 解析结果缓存条数
+FUZZY_THRESHOLD = 0.8          # 模糊匹配的最低相似度（0~1）
+FUZZY_MIN_LENGTH = 4           # 少于该长度的名称不做模糊匹配
+FUZZY_MAX_CANDIDATES = 20      # 每次模糊匹配最多打分的候选数
+FUZZY_AMBIGUITY_MARGIN = 0.02  # 最高分的两个候选代码不同且分差小于该值时视为无法确定
+SUBSPAN_MIN_LENGTH = 4         # 按词组匹配时词组的最短长度（避免 "US"、"NO" 等短词误配）
+
+# 内置别名：别名 -> port_codes.json 中的港口名称或 5 位代码
+DEFAULT_PORT_ALIASES = {
+    "SAIGON": "HOCHIMINH",
+    "CAT LAI": "HOCHIMINH",
+    "HCMC": "HOCHIMINH",
+    "HCM": "HOCHIMINH",
+    "PORT KLANG": "KELANG",
+    "KLANG": "KELANG",
+    "TANJUNG PRIOK": "JAKARTA",
+    "BOMBAY": "MUMBAI",
+    "MADRAS": "CHENNAI",
+    "CALCUTTA": "KOLKATA",
+    "ANTWERPEN": "ANTWERP",
+    "GENOVA": "GENOA",
+    "NAPOLI": "NAPLES",
+    "LISBOA": "LISBON",
+    "PORTO": "OPORTO",
+    "GOTEBORG": "GOTHENBURG",
+    "KOMPONG SOM": "SIHANOUKVILLE",
+    "HONG KONG SAR": "HONGKONG",
+}
+
+# 国家 / 地区后缀（在名称末尾时去掉）
+COUNTRY_SUFFIXES = (
+    "CHINA", "P R CHINA", "PR CHINA", "PRC", "TAIWAN", "VIETNAM", "VIET NAM", "THAILAND",
+    "MALAYSIA", "INDONESIA", "PHILIPPINES", "CAMBODIA", "MYANMAR", "JAPAN", "KOREA",
+    "SOUTH KOREA", "REPUBLIC OF KOREA", "INDIA", "PAKISTAN", "SRI LANKA", "BANGLADESH",
+    "UAE", "U A E", "UNITED ARAB EMIRATES", "SAUDI ARABIA", "AUSTRALIA", "NEW ZEALAND", "NZ",
+    "USA", "U S A", "US", "UNITED STATES", "CANADA", "MEXICO", "BRAZIL", "ARGENTINA", "CHILE",
+    "PERU", "COLOMBIA", "UK", "U K", "UNITED KINGDOM", "GREAT BRITAIN", "NETHERLANDS",
+    "THE NETHERLANDS", "BELGIUM", "GERMANY", "FRANCE", "SPAIN", "ITALY", "GREECE", "SWEDEN",
+    "POLAND", "DENMARK", "NORWAY", "IRELAND", "PORTUGAL", "RUSSIA", "SOUTH AFRICA", "EGYPT",
+    "MOROCCO", "NIGERIA", "KENYA", "TANZANIA", "ISRAEL", "IRAN", "OMAN", "QATAR",
+)
+
+# 名称开头 / 结尾的修饰词
+LEADING_NOISE = (("PORT", "OF"), ("PORT",))
+TRAILING_NOISE = (("SEAPORT",), ("PORT",), ("TERMINAL",), ("HARBOUR",), ("HARBOR",))
+# ===========================================
+
+PortMatch = namedtuple("PortMatch", ["code", "key", "score", "method"])
+PortMatch.__doc__ = """
+港口解析结果
+
+    code: 5 位代码（未找到时为空字符串）
+    key: 命中的港口名称（标准化后）
+    score: 相似度（精确匹配为 1.0）
+    method: 命中方式 exact / code / alias / cleaned / segment / fuzzy / none
+"""
+
+_NO_MATCH = PortMatch("", "", 0.0, "none")
+_COUNTRY_TOKENS = sorted((tuple(name.split()) for name in COUNTRY_SUFFIXES), key=len, reverse=True)
+_SEGMENT_SPLIT = re.compile(r"[,/;()\[\]]|\s-\s|-")
+_CODE_PATTERN = re.compile(r"[A-Z]{2}[A-Z0-9]{3}")
+_PARENTHESES = re.compile(r"\([^)]*\)|\[[^\]]*\]")
+
+
+def _fold(name):
+    """大写并去掉重音符号（"Málaga" -> "MALAGA"），保留标点用于切分"""
+    text = unicodedata.normalize("NFKD", str(name))
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return " ".join(text.upper().split())
+
+
+def _tokens(text):
+    """拆分为只含字母和数字的词"""
+    return re.sub(r"[^A-Z0-9]+", " ", text).split()
+
+
+def _strip_noise(tokens):
+    """去掉 PORT OF / PORT 等修饰词和末尾的国家名（去掉后为空时保留原词）"""
+    tokens = list(tokens)
+    changed = True
+    while changed and tokens:
+        changed = False
+        for noise in LEADING_NOISE:
+            if len(tokens) > len(noise) and tuple(tokens[:len(noise)]) == noise:
+                tokens = tokens[len(noise):]
+                changed = True
+                break
+        for noise in TRAILING_NOISE + tuple(_COUNTRY_TOKENS):
+            if len(tokens) > len(noise) and tuple(tokens[-len(noise):]) == noise:
+                tokens = tokens[:-len(noise)]
+                changed = True
+                break
+    return tokens
+
+
+def normalize_port_name(name):
+    """
+    标准化港口名称：大写、去重音、去标点和空格
+
+    参数:
+        name: 港口名称
+
+    返回:
+        str: 紧凑形式（例如 "Los Angeles, CA" -> "LOSANGELESCA"），空值返回空字符串
+    """
+    if name is None:
+        return ""
+    return "".join(_tokens(_fold(name)))
+
+
+def clean_port_name(name):
+    """
+    标准化并去掉括号内容、PORT OF 等修饰词和国家后缀
+
+    返回:
+        str: 紧凑形式（例如 "Port of Ningbo, China" -> "NINGBO"）
+    """
+    if name is None:
+        return ""
+    text = _PARENTHESES.sub(" ", _fold(name))
+    return "".join(_strip_noise(_tokens(text)))
+
+
+def _trigrams(key):
+    padded = f"#{key}#"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class PortResolver:
+    """
+    港口代码解析器（线程安全，构建后只读）
+
+    参数:
+        port_codes (dict): 港口名称 -> 5 位代码（port_codes.json 的内容）
+        aliases (dict, optional): 别名 -> 港口名称或代码，默认使用 DEFAULT_PORT_ALIASES
+        threshold (float): 模糊匹配的最低相似度
+        cache_size (int): 解析结果缓存条数
+    """
+
+    def __init__(self, port_codes, aliases=None, threshold=FUZZY_THRESHOLD, cache_size=PORT_CACHE_SIZE):
+        self.threshold = threshold
+        self.names = {}        # 标准化名称 -> 代码
+        self.cleaned = {}      # 去掉修饰词后的名称 -> 代码
+        self.codes = set()
+        for name, code in port_codes.items():
+            code = str(code).strip().upper()
+            if not code:
+                continue
+            self.codes.add(code)
+            self.names.setdefault(normalize_port_name(name), code)
+            cleaned = clean_port_name(name)
+            if cleaned:
+                self.cleaned.setdefault(cleaned, code)
+
+        self.aliases = {}
+        for alias, target in (DEFAULT_PORT_ALIASES if aliases is None else aliases).items():
+            code = self._alias_target(target)
+            if code:
+                self.aliases[normalize_port_name(alias)] = code
+            else:
+                logger.debug("港口别名 [%s] 的目标 [%s] 不在港口代码表中，已忽略", alias, target)
+
+        # 三字母组倒排索引：trigram -> 名称集合
+        self._grams = {}
+        self._key_codes = dict(self.cleaned)
+        self._key_codes.update(self.names)
+        for key in self._key_codes:
+            for gram in _trigrams(key):
+                self._grams.setdefault(gram, set()).add(key)
+
+        self.lookup = functools.lru_cache(maxsize=cache_size)(self._lookup)
+
+    def _alias_target(self, target):
+        """别名目标：港口名称优先，否则按 5 位代码处理（可以是港口代码表中没有的代码）"""
+        target = str(target).strip()
+        key = normalize_port_name(target)
+        if key in self.names:
+            return self.names[key]
+        code = self.cleaned.get(clean_port_name(target), "")
+        if code:
+            return code
+        if _CODE_PATTERN.fullmatch(target.upper()):
+            return target.upper()
+        return ""
+
+    def _exact(self, key):
+        """按标准化名称、别名、去修饰词名称依次查表"""
+        if key in self.names:
+            return self.names[key], "exact"
+        if key in self.aliases:
+            return self.aliases[key], "alias"
+        if key in self.cleaned:
+            return self.cleaned[key], "cleaned"
+        return "", ""
+
+    def _lookup(self, name):
+        """解析单个名称（结果由 lookup 缓存）"""
+        if name is None:
+            return _NO_MATCH
+        folded = _fold(name)
+        key = normalize_port_name(folded)
+        if not key:
+            return _NO_MATCH
+
+        # 1. 原名称 / 已经是代码
+        code, method = self._exact(key)
+        if code:
+            return PortMatch(code, key, 1.0, method)
+        if len(key) == 5 and key in self.codes:
+            return PortMatch(key, key, 1.0, "code")
+
+        # 2. 去掉括号、修饰词和国家后缀
+        cleaned = clean_port_name(folded)
+        code, method = self._exact(cleaned)
+        if code:
+            return PortMatch(code, cleaned, 1.0, "cleaned" if method == "exact" else method)
+
+        # 3. 按逗号、括号、斜杠拆分后逐段查找（"SHANGHAI, CHINA"、"HO CHI MINH (CAT LAI)"）
+        segments = [seg for seg in _SEGMENT_SPLIT.split(folded) if seg.strip()]
+        if len(segments) > 1:
+            for segment in segments:
+                for seg_key in (normalize_port_name(segment), clean_port_name(segment)):
+                    code, method = self._exact(seg_key)
+                    if code:
+                        return PortMatch(code, seg_key, 1.0, "segment")
+
+        # 4. 连续词组，从长到短（"NINGBO ZHOUSHAN" -> "NINGBO"）
+        tokens = _strip_noise(_tokens(_PARENTHESES.sub(" ", folded)))
+        if len(tokens) > 1:
+            spans = []
+            for start in range(len(tokens)):
+                for end in range(start + 1, len(tokens) + 1):
+                    span = "".join(tokens[start:end])
+                    if len(span) >= SUBSPAN_MIN_LENGTH and end - start < len(tokens):
+                        spans.append((len(span), -start, span))
+            for _, _, span in sorted(spans, reverse=True):
+                code, method = self._exact(span)
+                if code:
+                    return PortMatch(code, span, 1.0, "segment")
+
+        # 5. 模糊匹配
+        return self._fuzzy(cleaned or key)
+
+    def _fuzzy(self, key):
+        """三字母组索引取候选，按相似度打分"""
+        if len(key) < FUZZY_MIN_LENGTH:
+            return _NO_MATCH
+        shared = Counter()
+        for gram in _trigrams(key):
+            for candidate in self._grams.get(gram, ()):
+                shared[candidate] += 1
+        if not shared:
+            return _NO_MATCH
+
+        scored = []
+        for candidate, _ in shared.most_common(FUZZY_MAX_CANDIDATES):
+            score = SequenceMatcher(None, key, candidate).ratio()
+            scored.append((score, candidate))
+        scored.sort(reverse=True)
+        best_score, best_key = scored[0]
+        if best_score < self.threshold:
+            return _NO_MATCH
+        best_code = self._key_codes[best_key]
+        for score, candidate in scored[1:]:
+            if best_score - score >= FUZZY_AMBIGUITY_MARGIN:
+                break
+            if self._key_codes[candidate] != best_code:
+                logger.debug("港口模糊匹配不确定: [%s] -> [%s] / [%s]", key, best_key, candidate)
+                return _NO_MATCH
+        return PortMatch(best_code, best_key, round(best_score, 4), "fuzzy")
+
+    def resolve(self, name):
+        """
+        解析港口代码
+
+        返回:
+            str: 5 位代码，找不到时返回空字符串
+        """
+        if not name or (isinstance(name, float) and name != name):
+            return ""
+        match = self.lookup(str(name))
+        if match.code:
+            logger.debug("港口匹配成功: [%s] -> [%s] (%s, %.2f)", name, match.code, match.method, match.score)
+        else:
+            logger.debug("港口匹配失败: [%s] (标准化后: [%s])", name, normalize_port_name(name))
+        return match.code
+
+    def resolve_many(self, names):
+        """
+        批量解析（每个不重复的值只解析一次）
+
+        参数:
+            names: 港口名称列表，或 pandas Series（例如 DataFrame 的一列）
+
+        返回:
+            与输入对应的代码：输入为 Series 时返回 Series（索引不变），否则返回 list
+        """
+        if hasattr(names, "map") and hasattr(names, "unique"):
+            mapping = {value: self.resolve(value) for value in names.unique()}
+            return names.map(mapping).fillna("")
+        mapping = {}
+        result = []
+        for value in names:
+            try:
+                code = mapping[value]
+            except KeyError:
+                code = mapping[value] = self.resolve(value)
+            except TypeError:
+                code = self.resolve(value)
+            result.append(code)
+        return result
+
+    def cache_info(self):
+        """返回缓存命中统计"""
+        return self.lookup.cache_info()
+
+
+# ================= 默认解析器 =================
+_PORT_CODES_CACHE = None
+_RESOLVER = None
+_cache_size = PORT_CACHE_SIZE
+_RESOLVER_LOCK = threading.Lock()
+
+
+def _read_json_dict(file_path, description):
+    with open(file_path, 'r', encoding='utf-8-sig') as f:
+        data = json.load(f)
+    if not isinstance(data, dict):
+        raise ValueError(f"{description} 应为 JSON 对象（名称 -> 代码）")
+    return data
+
+
+def load_port_codes():
+    """
+    从 port_codes.json 文件加载港口代码字典（带缓存）
+
+    返回:
+        dict: 港口名称 -> 5位代码 的字典
+        如果文件不存在或读取失败，返回空字典并记录错误日志
+    """
+    global _PORT_CODES_CACHE
+    if _PORT_CODES_CACHE is not None:
+        return _PORT_CODES_CACHE
+
+    json_file = os.path.join(config_loader.get_base_path(), PORT_CODES_FILENAME)
+    if not os.path.exists(json_file):
+        print(f"[警告] 港口代码文件不存在: {json_file}")
+        print("请确保 port_codes.json 文件存在于项目根目录。")
+        _PORT_CODES_CACHE = {}
+        return _PORT_CODES_CACHE
+    try:
+        port_dict = _read_json_dict(json_file, PORT_CODES_FILENAME)
+    except json.JSONDecodeError as e:
+        print(f"[错误] port_codes.json 文件格式错误: {e}")
+        port_dict = {}
+    except Exception as e:
+        print(f"[错误] 加载港口代码文件失败: {e}")
+        port_dict = {}
+    else:
+        print(f"[成功] 成功加载港口代码字典，共 {len(port_dict)} 个港口。")
+    _PORT_CODES_CACHE = port_dict
+    return port_dict
+
+
+def load_port_aliases():
+    """
+    内置别名表加上 port_aliases.json（可选，与 port_codes.json 同目录，同名时覆盖内置别名）
+
+    返回:
+        dict: 别名 -> 港口名称或代码
+    """
+    aliases = dict(DEFAULT_PORT_ALIASES)
+    json_file = os.path.join(config_loader.get_base_path(), PORT_ALIASES_FILENAME)
+    if os.path.exists(json_file):
+        try:
+            aliases.update(_read_json_dict(json_file, PORT_ALIASES_FILENAME))
+        except Exception as e:
+            print(f"[警告] 加载港口别名文件失败，仅使用内置别名: {e}")
+    return aliases
+
+
+def get_resolver():
+    """返回默认解析器（第一次调用时加载 port_codes.json 并建立索引）"""
+    global _RESOLVER
+    if _RESOLVER is None:
+        with _RESOLVER_LOCK:
+            if _RESOLVER is None:
+                _RESOLVER = PortResolver(load_port_codes(), load_port_aliases(), cache_size=_cache_size)
+    return _RESOLVER
+
+
+def set_cache_size(cache_size):
+    """
+    设置默认解析器的缓存条数（[PERFORMANCE] port_cache_size）
+
+    与当前解析器不同时丢弃它，下次使用时按新的大小重新建立
+    """
+    global _RESOLVER, _cache_size
+    with _RESOLVER_LOCK:
+        if cache_size != _cache_size:
+            _cache_size = cache_size
+            _RESOLVER = None
+
+
+def resolve(name):
+    """用默认解析器解析港口代码（找不到时返回空字符串）"""
+    return get_resolver().resolve(name)
+
+
+def resolve_many(names):
+    """用默认解析器批量解析港口代码"""
+    return get_resolver().resolve_many(names)
@@ -1,6 +1,30 @@
 import pandas as pd
 import os
+import logging
+from collections import namedtuple
 from datetime import datetime, date
+from types import MappingProxyType
+
+import carrier_normalizer
+import container_normalizer
+import metrics
+import port_resolver
+from app_logging import get_logger
+
+logger = get_logger(__name__)
+
+# 只按列名完全相同（或与别名完全相同）查找价格列的柜型：包含匹配会把 "No"、"Remark" 等普通列误认为价格列
+EXACT_PRICE_COLUMN_TYPES = ("45HC", "20RF", "40RF", "40NOR")
+
+PriceListSchema = namedtuple("PriceListSchema", ["carrier", "pol", "pod", "effective_date", "expiry_date",
+                                                 "price_columns"])
+PriceListSchema.__doc__ = """
+Price List 的列角色（load_price_list 时确定一次，只读）
+
+    carrier / pol / pod: Carrier、POL Code、POD Code 列名
+    effective_date / expiry_date: Effective Date、Expiry Date 列名
+    price_columns: 标准柜型 -> 价格列名（只读映射，Price List 中没有对应列的柜型不包含在内）
+"""
 
 
 class FreightMatcher:
@@ -13,6 +37,10 @@ class FreightMatcher:
         初始化 FreightMatcher 实例
         """
         self.price_list = None
+        self.schema = None              # PriceListSchema（load_price_list 时确定）
+        self._price_carriers = None     # 标准化后的 Carrier 列（分类类型）
+        self._price_pols = None         # 大写、去除首尾空格后的 POL Code 列
+        self._price_pods = None         # 字符串类型的 POD Code 列
     
     def load_price_list(self, excel_path):
         """
@@ -23,11 +51,15 @@ class FreightMatcher:
         
         返回:
             pandas.DataFrame: 处理后的价格列表数据
+        
+        异常:
+            ValueError: Excel 中没有数据，或找不到 Carrier、POL Code、POD Code、日期列
         """
         if not os.path.exists(excel_path):
             raise FileNotFoundError(f"文件不存在: {excel_path}")
         
         print(f"正在读取 Price List 文件: {excel_path}")
+        self.schema = None
         
         # 读取所有 Sheet 的数据
         excel_file = pd.ExcelFile(excel_path)
@@ -58,9 +90,174 @@ class FreightMatcher:
         # 数据标准化处理
         self._clean_column_names()  # 先清洗表头
         self._clean_data()  # 再处理数据内容
+        self.schema = self._resolve_schema()  # 最后确定各列的角色（每个 Price List 只查找一次）
+        self._prepare_match_columns()
         
         return self.price_list
     
+    def _resolve_schema(self):
+        """
+        确定 Price List 各列的角色：Carrier、POL Code、POD Code、日期列，以及每种标准柜型的价格列
+        
+        返回:
+            PriceListSchema: 列角色（价格列为只读映射）
+        
+        异常:
+            ValueError: 找不到 Carrier、POL Code、POD Code 或日期列
+        """
+        # 打印所有列名用于调试
+        print(f"  Price List 所有列名: {list(self.price_list.columns)}")
+        
+        # 查找 Price List 中的必要列
+        carrier_col = None
+        pol_col = None
+        pod_col = None
+        effective_date_col = None
+        expiry_date_col = None
+        
+        for col in self.price_list.columns:
+            col_str = str(col)
+            col_lower = col_str.lower().strip()
+            
+            # Carrier 列匹配（更灵活）
+            if not carrier_col:
+                if ('carrier' in col_lower or 
+                    '船公司' in col_str or 
+                    'shipping line' in col_lower or
+                    'line' in col_lower and 'carrier' not in col_lower or
+                    col_lower in ['carrier', 'carrier name', 'carrier_name', '船公司名称']):
+                    carrier_col = col
+                    print(f"  ✓ 找到 Carrier 列: {col}")
+            
+            # POL Code 列匹配（更灵活）
+            if not pol_col:
+                if (('pol' in col_lower and 'code' in col_lower) or
+                    ('pol' in col_lower and 'port' in col_lower) or
+                    ('origin' in col_lower and 'code' in col_lower) or
+                    ('origin' in col_lower and 'port' in col_lower and 'code' in col_lower) or
+                    col_lower in ['pol code', 'pol_code', 'pol', 'origin port code', 'origin_port_code']):
+                    pol_col = col
+                    print(f"  ✓ 找到 POL Code 列: {col}")
+            
+            # POD Code 列匹配（更灵活）
+            if not pod_col:
+                if (('pod' in col_lower and 'code' in col_lower) or
+                    ('pod' in col_lower and 'port' in col_lower) or
+                    ('destination' in col_lower and 'code' in col_lower) or
+                    ('discharge' in col_lower and 'code' in col_lower) or
+                    col_lower in ['pod code', 'pod_code', 'pod', 'destination port code', 'destination_port_code']):
+                    pod_col = col
+                    print(f"  ✓ 找到 POD Code 列: {col}")
+            
+            # Effective Date 列匹配
+            if not effective_date_col:
+                if ('effective date' in col_lower or 
+                    'effective_date' in col_lower or 
+                    '生效日期' in col_str or
+                    'effective' in col_lower and 'date' in col_lower):
+                    effective_date_col = col
+                    print(f"  ✓ 找到 Effective Date 列: {col}")
+            
+            # Expiry Date 列匹配
+            if not expiry_date_col:
+                if ('expiry date' in col_lower or 
+                    'expiry_date' in col_lower or 
+                    '到期日期' in col_str or 
+                    'expire' in col_lower and 'date' in col_lower or
+                    'valid until' in col_lower or
+                    'valid_until' in col_lower):
+                    expiry_date_col = col
+                    print(f"  ✓ 找到 Expiry Date 列: {col}")
+        
+        # 如果还没找到，尝试按常见列位置查找（备用方案）
+        # 通常 Carrier 在第2列（索引1），POL Code 在第3列（索引2），POD Code 在第8列（索引7）
+        if not carrier_col and len(self.price_list.columns) > 1:
+            # 尝试第2列（索引1）
+            potential_carrier = self.price_list.columns[1]
+            print(f"  ⚠ Carrier 列未找到，尝试使用第2列: {potential_carrier}")
+            carrier_col = potential_carrier
+        
+        if not pol_col and len(self.price_list.columns) > 2:
+            # 尝试第3列（索引2）
+            potential_pol = self.price_list.columns[2]
+            print(f"  ⚠ POL Code 列未找到，尝试使用第3列: {potential_pol}")
+            pol_col = potential_pol
+        
+        # 如果没有找到 POD Code 列，尝试使用第8列（H列，索引为7）
+        if not pod_col and len(self.price_list.columns) > 7:
+            potential_pod = self.price_list.columns[7]
+            print(f"  ⚠ POD Code 列未找到，尝试使用第8列: {potential_pod}")
+            pod_col = potential_pod
+        
+        # 如果日期列未找到，尝试查找包含 "date" 的列
+        if not effective_date_col:
+            for col in self.price_list.columns:
+                if 'date' in str(col).lower() and 'expir' not in str(col).lower():
+                    effective_date_col = col
+                    print(f"  ⚠ Effective Date 列未找到，尝试使用: {col}")
+                    break
+        
+        if not expiry_date_col:
+            for col in self.price_list.columns:
+                if 'date' in str(col).lower() and col != effective_date_col:
+                    expiry_date_col = col
+                    print(f"  ⚠ Expiry Date 列未找到，尝试使用: {col}")
+                    break
+        
+        if not carrier_col or not pol_col or not pod_col:
+            error_msg = f"Price List 中缺少必要的列:\n"
+            error_msg += f"  - Carrier: {carrier_col or '未找到'}\n"
+            error_msg += f"  - POL Code: {pol_col or '未找到'}\n"
+            error_msg += f"  - POD Code: {pod_col or '未找到'}\n"
+            error_msg += f"\n请检查 Price List 文件，确保包含以下列：\n"
+            error_msg += f"  - Carrier (或 船公司)\n"
+            error_msg += f"  - POL Code (或 Origin Port Code)\n"
+            error_msg += f"  - POD Code (或 Destination Port Code)"
+            raise ValueError(error_msg)
+        
+        if not effective_date_col or not expiry_date_col:
+            error_msg = f"Price List 中缺少日期列:\n"
+            error_msg += f"  - Effective Date: {effective_date_col or '未找到'}\n"
+            error_msg += f"  - Expiry Date: {expiry_date_col or '未找到'}\n"
+            error_msg += f"\n请检查 Price List 文件，确保包含日期列。"
+            raise ValueError(error_msg)
+        
+        print(f"  ✓ 最终匹配列: Carrier={carrier_col}, POL Code={pol_col}, POD Code={pod_col}")
+        print(f"  ✓ 最终日期列: Effective Date={effective_date_col}, Expiry Date={expiry_date_col}")
+        
+        price_columns = {}
+        for container_type in container_normalizer.CONTAINER_TYPES:
+            price_col = self._find_price_column(container_type)
+            if price_col is not None:
+                price_columns[container_type] = price_col
+        print(f"  ✓ 价格列: {', '.join(f'{k}={v}' for k, v in price_columns.items()) or '未找到'}")
+        
+        return PriceListSchema(carrier_col, pol_col, pod_col, effective_date_col, expiry_date_col,
+                               MappingProxyType(price_columns))
+    
+    def _prepare_match_columns(self):
+        """
+        按列角色预处理匹配用的列（每个 Price List 只处理一次）：
+        日期列只保留日期部分，Carrier 列标准化为船公司代码，POL Code / POD Code 列转为字符串
+        """
+        schema = self.schema
+        effective_date_col = schema.effective_date
+        expiry_date_col = schema.expiry_date
+        
+        # 确保 Price List 的日期列是 datetime 格式
+        if self.price_list[effective_date_col].dtype != 'datetime64[ns]':
+            self.price_list[effective_date_col] = pd.to_datetime(self.price_list[effective_date_col], errors='coerce')
+        if self.price_list[expiry_date_col].dtype != 'datetime64[ns]':
+            self.price_list[expiry_date_col] = pd.to_datetime(self.price_list[expiry_date_col], errors='coerce')
+        
+        # 将日期标准化为只有日期部分（去除时间），但仍保持为 datetime 类型以便比较
+        self.price_list[effective_date_col] = pd.to_datetime(self.price_list[effective_date_col]).dt.normalize()
+        self.price_list[expiry_date_col] = pd.to_datetime(self.price_list[expiry_date_col]).dt.normalize()
+        
+        self._price_carriers = carrier_normalizer.normalize_series(self.price_list[schema.carrier])
+        self._price_pols = self.price_list[schema.pol].astype(str).str.strip().str.upper()
+        self._price_pods = self.price_list[schema.pod].astype(str)
+    
     def _clean_column_names(self):
         """
         表头清洗：去除列名中的空格，特别是 20GP, 40GP, 40HQ 等列名
@@ -192,56 +389,23 @@ class FreightMatcher:
     
     def _normalize_container_type(self, raw_type):
         """
-        标准化集装箱类型
-        
-        规则：
-        1. 输入转大写
-        2. 若包含 "40" 且包含 ("HQ" 或 "HIGH" 或 "CUBE") -> 返回 "40HQ"
-        3. 若包含 "20" -> 返回 "20GP"
-        4. 若包含 "40" 且不含 HQ 特征 -> 返回 "40GP"
-        5. 其他情况返回 "Unknown"
+        标准化集装箱类型（规则见 container_normalizer，与报表生成共用）
         
         参数:
             raw_type: 原始集装箱类型字符串
         
         返回:
-            str: 标准化后的集装箱类型 ("40HQ", "20GP", "40GP", "Unknown")
+            str: 标准化后的集装箱类型 ("20GP", "40GP", "40HQ", "45HC", "20RF", "40RF", "40NOR", "Unknown")
         """
-        if not raw_type or pd.isna(raw_type):
-            return "Unknown"
-        
-        # 转大写
-        normalized = str(raw_type).upper()
-        
-        # 规则1: 若包含 "40" 且包含 ("HQ" 或 "HIGH" 或 "CUBE") -> 返回 "40HQ"
-        if "40" in normalized:
-            if "HQ" in normalized or "HIGH" in normalized or "CUBE" in normalized:
-                return "40HQ"
-            # 规则4: 若包含 "40" 且不含 HQ 特征 -> 返回 "40GP"
-            return "40GP"
-        
-        # 规则3: 若包含 "20" -> 返回 "20GP"
-        if "20" in normalized:
-            return "20GP"
-        
-        # 规则5: 其他情况返回 "Unknown"
-        return "Unknown"
+        return container_normalizer.normalize(raw_type)
     
     def _standardize_carrier_name(self, carrier_name):
         """
         标准化船公司名称，将可能出现的船公司全称映射为标准的简写代码（SCAC Code）
         
-        规则（关键词包含匹配）：
-        - 若包含 "YANG MING" 或 "YANGMING" -> 返回 "YML"
-        - 若包含 "HYUNDAI" 或 "HMM" -> 返回 "HMM"
-        - 若包含 "EVERGREEN" -> 返回 "EMC"
-        - 若包含 "MAERSK" 或 "MSK" -> 返回 "MSK"
-        - 若包含 "COSCO" -> 返回 "COSCO"
-        - 若包含 "ONE" -> 返回 "ONE"
-        - 若包含 "CMA" -> 返回 "CMA"
-        - 若包含 "MSC" -> 返回 "MSC"
-        - 若包含 "OOCL" -> 返回 "OOCL"
-        - 如果都不匹配，返回原始的大写字符串（strip后）
+        规则见 carrier_normalizer（别名表精确匹配 + 按完整单词匹配，可用 carrier_aliases.json 补充）：
+        - "YANG MING MARINE" -> "YML"，"Hyundai" -> "HMM"，"MAERSK LINE" -> "MSK"，"Ocean Network Express" -> "ONE"
+        - 不在别名表中时返回原始的大写字符串（strip后）
         
         参数:
             carrier_name: 原始船公司名称字符串
@@ -249,34 +413,7 @@ class FreightMatcher:
         返回:
             str: 标准化后的船公司代码
         """
-        if not carrier_name or pd.isna(carrier_name):
-            return ""
-        
-        # 转大写并去除首尾空格
-        normalized = str(carrier_name).strip().upper()
-        
-        # 关键词映射规则（按顺序检查）
-        if "YANG MING" in normalized or "YANGMING" in normalized:
-            return "YML"
-        elif "HYUNDAI" in normalized or "HMM" in normalized:
-            return "HMM"
-        elif "EVERGREEN" in normalized:
-            return "EMC"
-        elif "MAERSK" in normalized or "MSK" in normalized:
-            return "MSK"
-        elif "COSCO" in normalized:
-            return "COSCO"
-        elif "ONE" in normalized:
-            return "ONE"
-        elif "CMA" in normalized:
-            return "CMA"
-        elif "MSC" in normalized:
-            return "MSC"
-        elif "OOCL" in normalized:
-            return "OOCL"
-        else:
-            # 如果都不匹配，返回原始的大写字符串（strip后）
-            return normalized
+        return carrier_normalizer.normalize(carrier_name)
     
     def _convert_etd_to_month(self, etd_value):
         """
@@ -323,7 +460,7 @@ class FreightMatcher:
             
             return None
         except Exception as e:
-            print(f"警告: ETD 转换失败: {etd_value}, 错误: {e}")
+            logger.warning("警告: ETD 转换失败: %s, 错误: %s", etd_value, e)
             return None
     
     def _find_price_column(self, container_type):
@@ -333,10 +470,10 @@ class FreightMatcher:
         支持模糊匹配逻辑：
         1. 优先匹配完全相同的列（忽略大小写和空格）
         2. 如果找不到，尝试别名映射
-        3. 如果还找不到，尝试模糊匹配（包含关系）
+        3. 如果还找不到，尝试模糊匹配（包含关系）；EXACT_PRICE_COLUMN_TYPES 中的柜型不做包含匹配
         
         参数:
-            container_type: 标准化后的柜型 ("20GP", "40GP", "40HQ")
+            container_type: 标准化后的柜型 ("20GP", "40GP", "40HQ", "45HC", "20RF", "40RF", "40NOR")
         
         返回:
             str: 价格列名，如果找不到则返回 None
@@ -347,8 +484,13 @@ class FreightMatcher:
         # 定义别名映射
         alias_map = {
             "40HQ": ["40HC", "40 HC", "40High", "40 HIGH", "40HC", "40 HC"],
-            "20GP": ["20 GP", "20FT", "20 FT", "20GP", "20 GP"]
+            "20GP": ["20 GP", "20FT", "20 FT", "20GP", "20 GP"],
+            "45HC": ["45HQ", "45 HQ", "45 HC", "45FT", "45 FT"],
+            "20RF": ["20RH", "20 RF", "20REEFER", "20 REEFER"],
+            "40RF": ["40RH", "40 RH", "40RQ", "40 RF", "40REEFER", "40 REEFER"],
+            "40NOR": ["40 NOR", "40NOR", "40NONOPERATING"]
         }
+        exact_only = container_type in EXACT_PRICE_COLUMN_TYPES
         
         # 获取目标柜型的大写形式（去除空格）
         target_upper = container_type.upper().replace(" ", "")
@@ -369,9 +511,12 @@ class FreightMatcher:
                     if col_normalized == alias_normalized:
                         return col
                     # 也尝试包含匹配
-                    if alias_normalized in col_normalized or col_normalized in alias_normalized:
+                    if not exact_only and (alias_normalized in col_normalized or col_normalized in alias_normalized):
                         return col
         
+        if exact_only:
+            return None
+        
         # 第三步：如果还找不到，尝试模糊匹配（包含关系）
         for col in self.price_list.columns:
             col_normalized = str(col).upper().replace(" ", "").replace("　", "")
@@ -390,6 +535,7 @@ class FreightMatcher:
         
         return None
     
+    @metrics.timed("price_matching")
     def run_matching(self, info_excel_path):
         """
         执行价格匹配逻辑
@@ -407,7 +553,7 @@ class FreightMatcher:
         返回:
             pandas.DataFrame: 更新后的 info.xlsx 数据
         """
-        if self.price_list is None or self.price_list.empty:
+        if self.price_list is None or self.price_list.empty or self.schema is None:
             raise ValueError("请先调用 load_price_list() 加载价格列表")
         
         if not os.path.exists(info_excel_path):
@@ -426,6 +572,18 @@ class FreightMatcher:
         if missing_cols:
             raise ValueError(f"info.xlsx 缺少必要的列: {', '.join(missing_cols)}")
         
+        # 补全缺失的港口代码（例如手工添加的行），每个不重复的港口名称只解析一次
+        for name_col, code_col in (('Loading Port', 'Loading Port Code'), ('Destination', 'Destination Code')):
+            if name_col not in df_info.columns:
+                continue
+            missing = df_info[code_col].isna() | (df_info[code_col].astype(str).str.strip() == '')
+            missing &= df_info[name_col].notna()
+            if missing.any():
+                codes = port_resolver.resolve_many(df_info.loc[missing, name_col])
+                df_info[code_col] = df_info[code_col].astype(object)
+                df_info.loc[missing, code_col] = codes.replace('', pd.NA)
+                print(f"  ✓ 已补全 {int((codes != '').sum())}/{int(missing.sum())} 个缺失的 {code_col}")
+        
         # 1. 将 ETD 列转换为 datetime（只保留日期部分，去除时间）
         print("正在转换 ETD 列为 datetime 格式...")
         df_info['ETD'] = pd.to_datetime(df_info['ETD'], errors='coerce')
@@ -433,143 +591,24 @@ class FreightMatcher:
         df_info['ETD'] = df_info['ETD'].dt.normalize()
         print(f"  ✓ ETD 列已转换为日期格式（去除时间部分）")
         
-        # 初始化价格列
-        df_info['Standard Freight Price'] = "N/A"
-        
-        # 打印所有列名用于调试
-        print(f"  Price List 所有列名: {list(self.price_list.columns)}")
-        
-        # 查找 Price List 中的必要列
-        carrier_col = None
-        pol_col = None
-        pod_col = None
-        effective_date_col = None
-        expiry_date_col = None
-        
-        for col in self.price_list.columns:
-            col_str = str(col)
-            col_lower = col_str.lower().strip()
-            
-            # Carrier 列匹配（更灵活）
-            if not carrier_col:
-                if ('carrier' in col_lower or 
-                    '船公司' in col_str or 
-                    'shipping line' in col_lower or
-                    'line' in col_lower and 'carrier' not in col_lower or
-                    col_lower in ['carrier', 'carrier name', 'carrier_name', '船公司名称']):
-                    carrier_col = col
-                    print(f"  ✓ 找到 Carrier 列: {col}")
-            
-            # POL Code 列匹配（更灵活）
-            if not pol_col:
-                if (('pol' in col_lower and 'code' in col_lower) or
-                    ('pol' in col_lower and 'port' in col_lower) or
-                    ('origin' in col_lower and 'code' in col_lower) or
-                    ('origin' in col_lower and 'port' in col_lower and 'code' in col_lower) or
-                    col_lower in ['pol code', 'pol_code', 'pol', 'origin port code', 'origin_port_code']):
-                    pol_col = col
-                    print(f"  ✓ 找到 POL Code 列: {col}")
-            
-            # POD Code 列匹配（更灵活）
-            if not pod_col:
-                if (('pod' in col_lower and 'code' in col_lower) or
-                    ('pod' in col_lower and 'port' in col_lower) or
-                    ('destination' in col_lower and 'code' in col_lower) or
-                    ('discharge' in col_lower and 'code' in col_lower) or
-                    col_lower in ['pod code', 'pod_code', 'pod', 'destination port code', 'destination_port_code']):
-                    pod_col = col
-                    print(f"  ✓ 找到 POD Code 列: {col}")
-            
-            # Effective Date 列匹配
-            if not effective_date_col:
-                if ('effective date' in col_lower or 
-                    'effective_date' in col_lower or 
-                    '生效日期' in col_str or
-                    'effective' in col_lower and 'date' in col_lower):
-                    effective_date_col = col
-                    print(f"  ✓ 找到 Effective Date 列: {col}")
-            
-            # Expiry Date 列匹配
-            if not expiry_date_col:
-                if ('expiry date' in col_lower or 
-                    'expiry_date' in col_lower or 
-                    '到期日期' in col_str or 
-                    'expire' in col_lower and 'date' in col_lower or
-                    'valid until' in col_lower or
-                    'valid_until' in col_lower):
-                    expiry_date_col = col
-                    print(f"  ✓ 找到 Expiry Date 列: {col}")
-        
-        # 如果还没找到，尝试按常见列位置查找（备用方案）
-        # 通常 Carrier 在第2列（索引1），POL Code 在第3列（索引2），POD Code 在第8列（索引7）
-        if not carrier_col and len(self.price_list.columns) > 1:
-            # 尝试第2列（索引1）
-            potential_carrier = self.price_list.columns[1]
-            print(f"  ⚠ Carrier 列未找到，尝试使用第2列: {potential_carrier}")
-            carrier_col = potential_carrier
-        
-        if not pol_col and len(self.price_list.columns) > 2:
-            # 尝试第3列（索引2）
-            potential_pol = self.price_list.columns[2]
-            print(f"  ⚠ POL Code 列未找到，尝试使用第3列: {potential_pol}")
-            pol_col = potential_pol
-        
-        # 如果没有找到 POD Code 列，尝试使用第8列（H列，索引为7）
-        if not pod_col and len(self.price_list.columns) > 7:
-            potential_pod = self.price_list.columns[7]
-            print(f"  ⚠ POD Code 列未找到，尝试使用第8列: {potential_pod}")
-            pod_col = potential_pod
-        
-        # 如果日期列未找到，尝试查找包含 "date" 的列
-        if not effective_date_col:
-            for col in self.price_list.columns:
-                if 'date' in str(col).lower() and 'expir' not in str(col).lower():
-                    effective_date_col = col
-                    print(f"  ⚠ Effective Date 列未找到，尝试使用: {col}")
-                    break
-        
-        if not expiry_date_col:
-            for col in self.price_list.columns:
-                if 'date' in str(col).lower() and col != effective_date_col:
-                    expiry_date_col = col
-                    print(f"  ⚠ Expiry Date 列未找到，尝试使用: {col}")
-                    break
-        
-        if not carrier_col or not pol_col or not pod_col:
-            error_msg = f"Price List 中缺少必要的列:\n"
-            error_msg += f"  - Carrier: {carrier_col or '未找到'}\n"
-            error_msg += f"  - POL Code: {pol_col or '未找到'}\n"
-            error_msg += f"  - POD Code: {pod_col or '未找到'}\n"
-            error_msg += f"\n请检查 Price List 文件，确保包含以下列：\n"
-            error_msg += f"  - Carrier (或 船公司)\n"
-            error_msg += f"  - POL Code (或 Origin Port Code)\n"
-            error_msg += f"  - POD Code (或 Destination Port Code)"
-            raise ValueError(error_msg)
-        
-        if not effective_date_col or not expiry_date_col:
-            error_msg = f"Price List 中缺少日期列:\n"
-            error_msg += f"  - Effective Date: {effective_date_col or '未找到'}\n"
-            error_msg += f"  - Expiry Date: {expiry_date_col or '未找到'}\n"
-            error_msg += f"\n请检查 Price List 文件，确保包含日期列。"
-            raise ValueError(error_msg)
-        
-        print(f"  ✓ 最终匹配列: Carrier={carrier_col}, POL Code={pol_col}, POD Code={pod_col}")
-        print(f"  ✓ 最终日期列: Effective Date={effective_date_col}, Expiry Date={expiry_date_col}")
-        
-        # 确保 Price List 的日期列是 datetime 格式
-        if self.price_list[effective_date_col].dtype != 'datetime64[ns]':
-            self.price_list[effective_date_col] = pd.to_datetime(self.price_list[effective_date_col], errors='coerce')
-        if self.price_list[expiry_date_col].dtype != 'datetime64[ns]':
-            self.price_list[expiry_date_col] = pd.to_datetime(self.price_list[expiry_date_col], errors='coerce')
-        
-        # 将日期标准化为只有日期部分（去除时间），但仍保持为 datetime 类型以便比较
-        self.price_list[effective_date_col] = pd.to_datetime(self.price_list[effective_date_col]).dt.normalize()
-        self.price_list[expiry_date_col] = pd.to_datetime(self.price_list[expiry_date_col]).dt.normalize()
+        # 初始化价格列（object 类型：同一列既有数字价格也有 "N/A"，pandas 3 默认的字符串列不能写入数字）
+        df_info['Standard Freight Price'] = pd.Series("N/A", index=df_info.index, dtype=object)
         
         # 统计信息
         matched_count = 0
         unmatched_count = 0
         
+        # Price List 的列角色和匹配用的列已在 load_price_list 时确定
+        schema = self.schema
+        price_carriers = self._price_carriers
+        price_pols = self._price_pols
+        price_pods = self._price_pods
+        
+        # 船公司名称标准化：info.xlsx 标准化一次（每个不重复的名称只处理一次），费率表已在加载时标准化
+        info_carriers = carrier_normalizer.normalize_series(df_info['Carrier'])
+        # 柜型标准化：每个不重复的柜型写法只处理一次
+        info_containers = container_normalizer.normalize_series(df_info['Container Type'])
+        
         # 遍历 info.xlsx 的每一行
         for idx, row in df_info.iterrows():
             # 获取当前行的数据
@@ -577,7 +616,6 @@ class FreightMatcher:
             carrier = row['Carrier']
             loading_port_code = row['Loading Port Code']
             destination_code = row['Destination Code']
-            container_type = row['Container Type']
             
             # 跳过空值行
             if pd.isna(etd) or pd.isna(carrier) or pd.isna(loading_port_code) or pd.isna(destination_code):
@@ -586,12 +624,12 @@ class FreightMatcher:
                 continue
             
             # 标准化 Carrier 和港口代码（转大写并去除首尾空格）
-            carrier_normalized = self._standardize_carrier_name(carrier)
+            carrier_normalized = info_carriers.at[idx]
             loading_port_code_normalized = str(loading_port_code).strip().upper()
             destination_code_normalized = str(destination_code).strip().upper()
             
             # 标准化集装箱类型
-            normalized_container = self._normalize_container_type(container_type)
+            normalized_container = info_containers.at[idx]
             
             if normalized_container == "Unknown":
                 df_info.at[idx, 'Standard Freight Price'] = "N/A"
@@ -606,10 +644,10 @@ class FreightMatcher:
             # 4. 日期有效期匹配：Effective Date <= ETD <= Expiry Date
             
             # 创建匹配条件
-            # 对费率表的 Carrier 也应用同样的标准化函数，确保双方一致
-            carrier_match = (self.price_list[carrier_col].apply(self._standardize_carrier_name) == carrier_normalized)
-            pol_match = (self.price_list[pol_col].astype(str).str.strip().str.upper() == loading_port_code_normalized)
-            pod_match = (self.price_list[pod_col].astype(str).str.contains(destination_code_normalized, case=False, na=False))
+            # 费率表的 Carrier 已在加载时用同样的规则标准化，确保双方一致
+            carrier_match = (price_carriers == carrier_normalized)
+            pol_match = (price_pols == loading_port_code_normalized)
+            pod_match = (price_pods.str.contains(destination_code_normalized, case=False, na=False, regex=False))
             
             # 日期有效期匹配：ETD 已经是 datetime 类型（在前面已转换）
             # 确保它是 datetime 类型（去除时间部分）
@@ -636,8 +674,8 @@ class FreightMatcher:
             
             # 日期匹配：Effective Date <= ETD <= Expiry Date
             date_match = (
-                (self.price_list[effective_date_col] <= etd_datetime) & 
-                (self.price_list[expiry_date_col] >= etd_datetime)
+                (self.price_list[schema.effective_date] <= etd_datetime) & 
+                (self.price_list[schema.expiry_date] >= etd_datetime)
             )
             
             # 组合所有匹配条件
@@ -647,28 +685,30 @@ class FreightMatcher:
                 # 找到匹配，取第一条（如果有重叠时间段，取第一条）
                 match_row = matches.iloc[0]
                 
-                # 根据标准化后的柜型查找价格列
-                price_col = self._find_price_column(normalized_container)
+                # 根据标准化后的柜型取价格列（加载时已确定）
+                price_col = schema.price_columns.get(normalized_container)
                 
                 if price_col and price_col in match_row.index:
                     price_value = match_row[price_col]
                     if not pd.isna(price_value):
                         df_info.at[idx, 'Standard Freight Price'] = price_value
                         matched_count += 1
-                        print(f"  ✓ 行 {idx + 2}: 匹配成功，价格={price_value} ({normalized_container})")
+                        logger.debug("  ✓ 行 %d: 匹配成功，价格=%s (%s)", idx + 2, price_value, normalized_container)
                     else:
                         df_info.at[idx, 'Standard Freight Price'] = "N/A"
                         unmatched_count += 1
-                        print(f"  ✗ 行 {idx + 2}: 匹配成功但价格为空 ({normalized_container})")
+                        logger.debug("  ✗ 行 %d: 匹配成功但价格为空 (%s)", idx + 2, normalized_container)
                 else:
                     df_info.at[idx, 'Standard Freight Price'] = "N/A"
                     unmatched_count += 1
-                    print(f"  ✗ 行 {idx + 2}: 匹配成功但找不到价格列 ({normalized_container})")
+                    logger.debug("  ✗ 行 %d: 匹配成功但找不到价格列 (%s)", idx + 2, normalized_container)
             else:
                 df_info.at[idx, 'Standard Freight Price'] = "N/A"
                 unmatched_count += 1
-                etd_display = etd_datetime.strftime("%Y-%m-%d") if not pd.isna(etd_datetime) else str(etd)
-                print(f"  ✗ 行 {idx + 2}: 未找到匹配 (ETD={etd_display}, Carrier={carrier_normalized}, POL={loading_port_code_normalized}, POD={destination_code_normalized})")
+                if logger.isEnabledFor(logging.DEBUG):
+                    etd_display = etd_datetime.strftime("%Y-%m-%d") if not pd.isna(etd_datetime) else str(etd)
+                    logger.debug("  ✗ 行 %d: 未找到匹配 (ETD=%s, Carrier=%s, POL=%s, POD=%s)", idx + 2, etd_display,
+                                 carrier_normalized, loading_port_code_normalized, destination_code_normalized)
         
         # 保存更新后的文件
         print(f"\n匹配完成: 成功 {matched_count} 条，失败 {unmatched_count} 条")
@@ -688,6 +728,15 @@ class FreightMatcher:
             pandas.DataFrame: 价格列表数据，如果未加载则返回 None
         """
         return self.price_list
+    
+    def get_schema(self):
+        """
+        获取当前 Price List 的列角色
+        
+        返回:
+            PriceListSchema: Carrier / POL / POD / 日期列名和柜型 -> 价格列名，如果未加载则返回 None
+        """
+        return self.schema
 
 
 if __name__ == "__main__":
@@ -0,0 +1,221 @@
+"""
+性能分析模块
+开启后为每个处理阶段生成 cProfile 数据（.prof）和 tracemalloc 内存分配快照，
+并汇总每个阶段最耗时的函数，全部写入 <运行目录>/profile/
+
+用法:
+    profiling.start_session(run_dir, top_n=25)
+    with profiling.stage("extract"):       # 在任意线程中调用，未开启时不做任何事
+        ...
+    profiling.snapshot("extract")          # 阶段结束时记录内存分配
+    profiling.finish_session()             # 写入 .prof 和汇总文件
+
+.prof 文件可用 python -m pstats 或 snakeviz 等工具查看
+"""
+
+import io
+import os
+import sys
+import pstats
+import cProfile
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+# ================= 配置常量 =================
+PROFILE_DIRNAME = "profile"
+SUMMARY_FILENAME = "profile_summary_{:%H%M%S}.txt"    # 按会话开始时间命名，多次运行不互相覆盖
+DEFAULT_TOP_N = 25
+TRACEMALLOC_FRAMES = 1        # 内存分配记录的调用栈深度（按代码行统计只需 1 层，层数越多开销越大）
+# ===========================================
+
+# 当前会话（None 表示未开启）
+_SESSION = None
+_SESSION_LOCK = threading.Lock()
+# 同一线程内嵌套的阶段只由最外层的阶段计时
+_local = threading.local()
+
+
+class ProfileSession:
+    """
+    一次运行的性能分析会话
+
+    参数:
+        run_dir (str): 运行目录（输出写入 run_dir/profile）
+        top_n (int): 汇总中每个阶段列出的函数 / 内存分配行数
+    """
+
+    def __init__(self, run_dir, top_n=DEFAULT_TOP_N):
+        self.output_dir = os.path.join(run_dir, PROFILE_DIRNAME)
+        self.top_n = top_n
+        self.profiles = {}          # 阶段名 -> [cProfile.Profile, ...]
+        self.memory = {}            # 阶段名 -> 内存分配统计文本
+        self.skipped = {}           # 阶段名 -> 因其他分析器占用而未分析的调用次数
+        self._lock = threading.Lock()
+        self._started_tracemalloc = False
+        self._last_snapshot = None
+        self.started_at = datetime.now()
+
+    def start(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            self._started_tracemalloc = True
+        self._last_snapshot = tracemalloc.take_snapshot()
+
+    @contextmanager
+    def stage(self, name):
+        if getattr(_local, 'active', False):
+            yield
+            return
+
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12 起同一进程只能有一个分析器处于活动状态，并发阶段只分析先开始的调用
+            with self._lock:
+                self.skipped[name] = self.skipped.get(name, 0) + 1
+            yield
+            return
+
+        _local.active = True
+        try:
+            yield
+        finally:
+            profile.disable()
+            _local.active = False
+            with self._lock:
+                self.profiles.setdefault(name, []).append(profile)
+
+    def snapshot(self, name):
+        """记录从上一次快照到现在新增的内存分配（按代码行统计）"""
+        current = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+        ])
+        with self._lock:
+            previous = self._last_snapshot
+            self._last_snapshot = current
+        stats = current.compare_to(previous, 'lineno') if previous is not None else current.statistics('lineno')
+        lines = [f"[{name}] 新增内存分配 Top {self.top_n}（快照时间 {datetime.now():%H:%M:%S}）"]
+        for stat in stats[:self.top_n]:
+            lines.append(f"  {stat}")
+        current_size, peak_size = tracemalloc.get_traced_memory()
+        lines.append(f"  当前占用 {current_size / 1024 / 1024:.1f} MB，峰值 {peak_size / 1024 / 1024:.1f} MB")
+        with self._lock:
+            self.memory[name] = "\n".join(lines)
+
+    def finish(self):
+        """
+        写入各阶段的 .prof、内存分配文件和汇总
+
+        返回:
+            str: 汇总文件路径
+        """
+        summary = [
+            f"性能分析汇总（开始于 {self.started_at:%Y-%m-%d %H:%M:%S}）",
+            f"Python {sys.version.split()[0]}",
+            "",
+        ]
+        with self._lock:
+            profiles = dict(self.profiles)
+            memory = dict(self.memory)
+            skipped = dict(self.skipped)
+
+        for name, stage_profiles in profiles.items():
+            stats = pstats.Stats(*stage_profiles)
+            prof_path = os.path.join(self.output_dir, f"{name}.prof")
+            stats.dump_stats(prof_path)
+
+            stream = io.StringIO()
+            pstats.Stats(*stage_profiles, stream=stream).strip_dirs().sort_stats('tottime').print_stats(self.top_n)
+            summary.append("=" * 70)
+            summary.append(f"阶段: {name}（{len(stage_profiles)} 次调用，{os.path.basename(prof_path)}）")
+            if skipped.get(name):
+                summary.append(f"⚠ {skipped[name]} 次调用因其他分析器正在运行而未分析")
+            summary.append("=" * 70)
+            summary.append(_trim_pstats_output(stream.getvalue()))
+
+        for name, count in skipped.items():
+            if name not in profiles:
+                summary.append(f"⚠ 阶段 {name}：{count} 次调用因其他分析器正在运行而未分析")
+
+        if memory:
+            summary.append("=" * 70)
+            summary.append("内存分配（tracemalloc）")
+            summary.append("=" * 70)
+            for name, text in memory.items():
+                with open(os.path.join(self.output_dir, f"{name}_memory.txt"), 'w', encoding='utf-8') as f:
+                    f.write(text + "\n")
+                summary.append(text)
+                summary.append("")
+
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+
+        summary_path = os.path.join(self.output_dir, SUMMARY_FILENAME.format(self.started_at))
+        with open(summary_path, 'w', encoding='utf-8') as f:
+            f.write("\n".join(summary) + "\n")
+        return summary_path
+
+
+def _trim_pstats_output(text):
+    """去掉 pstats 输出开头的空行和排序说明，只保留统计表"""
+    lines = text.strip("\n").splitlines()
+    for index, line in enumerate(lines):
+        if line.strip().startswith("ncalls"):
+            return "\n".join(lines[max(0, index - 2):])
+    return "\n".join(lines)
+
+
+def start_session(run_dir, top_n=DEFAULT_TOP_N):
+    """开启性能分析（已开启时先结束上一个会话）"""
+    global _SESSION
+    finish_session()
+    session = ProfileSession(run_dir, top_n)
+    session.start()
+    with _SESSION_LOCK:
+        _SESSION = session
+    print(f"● 性能分析已开启，结果将保存到 {session.output_dir}")
+
+
+def is_active():
+    return _SESSION is not None
+
+
+@contextmanager
+def stage(name):
+    """分析一个阶段的代码块（未开启性能分析时不做任何事）"""
+    session = _SESSION
+    if session is None:
+        yield
+        return
+    with session.stage(name):
+        yield
+
+
+def snapshot(name):
+    """阶段结束时记录内存分配（未开启性能分析时不做任何事）"""
+    session = _SESSION
+    if session is not None:
+        session.snapshot(name)
+
+
+def finish_session():
+    """
+    结束性能分析并写入结果
+
+    返回:
+        str|None: 汇总文件路径（未开启时返回 None）
+    """
+    global _SESSION
+    with _SESSION_LOCK:
+        session = _SESSION
+        _SESSION = None
+    if session is None:
+        return None
+    summary_path = session.finish()
+    print(f"✓ 已生成性能分析报告: {summary_path}")
+    return summary_path
@@ -0,0 +1,299 @@
+"""
+录制 / 回放模块
+录制模式：把真实运行时从邮箱下载的原始邮件、调用 AI 接口的请求和响应保存到本地数据目录
+回放模式：不连接邮箱、不调用 AI，按录制时的耗时（可加速）返回保存的数据，
+用于在本地用一整天的真实数据反复测试性能
+
+数据目录结构:
+    <fixture_dir>/imap/index.jsonl      每封邮件一行：{"uid", "file", "elapsed"}
+    <fixture_dir>/imap/<序号>.eml        原始邮件
+    <fixture_dir>/llm/index.jsonl       每次请求一行：{"key", "doc_key", "file", "status_code", "elapsed"}
+    <fixture_dir>/llm/<序号>.json        响应内容
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+
+from imap_tools import MailMessage
+
+# ================= 配置常量 =================
+MODE_OFF = "off"
+MODE_RECORD = "record"
+MODE_REPLAY = "replay"
+
+IMAP_DIR = "imap"
+LLM_DIR = "llm"
+INDEX_FILENAME = "index.jsonl"
+
+# 回放时找不到对应请求返回的状态码（调用方按 API 调用失败处理）
+REPLAY_MISS_STATUS = 599
+# ===========================================
+
+# 当前会话（None 表示未启用录制 / 回放）
+_SESSION = None
+_SESSION_LOCK = threading.Lock()
+
+
+def _read_index(path):
+    """读取 index.jsonl（忽略不完整的行）"""
+    entries = []
+    if not os.path.exists(path):
+        return entries
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return entries
+
+
+def _payload_keys(payload):
+    """
+    计算请求的匹配键
+
+    返回:
+        tuple: (key, doc_key)
+            - key: 完整请求（模型 + 消息 + 参数）的哈希，提示词和单据内容都相同时匹配
+            - doc_key: 最后一条消息的哈希，模型参数变化时作为后备匹配
+    """
+    canonical = json.dumps(payload, ensure_ascii=False, sort_keys=True)
+    key = hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+    messages = payload.get('messages') or [{}]
+    doc_key = hashlib.sha256(str(messages[-1].get('content', '')).encode('utf-8')).hexdigest()
+    return key, doc_key
+
+
+class ReplayResponse:
+    """回放的 HTTP 响应（提供 invoice_extractor 用到的 status_code / text / json()）"""
+
+    def __init__(self, status_code, text):
+        self.status_code = status_code
+        self.text = text
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class FixtureSession:
+    """
+    一次录制或回放会话
+
+    参数:
+        mode (str): MODE_RECORD 或 MODE_REPLAY
+        fixture_dir (str): 数据目录
+        speed (float): 回放速度倍数（1 = 按录制时的耗时，10 = 快 10 倍，0 = 不等待）
+    """
+
+    def __init__(self, mode, fixture_dir, speed=1.0):
+        self.mode = mode
+        self.fixture_dir = fixture_dir
+        self.speed = speed
+        self._lock = threading.Lock()
+        self.imap_dir = os.path.join(fixture_dir, IMAP_DIR)
+        self.llm_dir = os.path.join(fixture_dir, LLM_DIR)
+        if mode == MODE_RECORD:
+            os.makedirs(self.imap_dir, exist_ok=True)
+            os.makedirs(self.llm_dir, exist_ok=True)
+        elif not os.path.isdir(fixture_dir):
+            raise FileNotFoundError(f"回放数据目录不存在: {fixture_dir}")
+
+        self.imap_entries = _read_index(os.path.join(self.imap_dir, INDEX_FILENAME))
+        self.llm_entries = _read_index(os.path.join(self.llm_dir, INDEX_FILENAME))
+        self._llm_by_key = {}
+        self._llm_by_doc = {}
+        for entry in self.llm_entries:
+            self._llm_by_key.setdefault(entry['key'], entry)
+            self._llm_by_doc.setdefault(entry.get('doc_key'), entry)
+
+    # ---------- 公共 ----------
+    def wait(self, elapsed):
+        """回放时按录制耗时等待（speed 为 0 时不等待）"""
+        if self.speed > 0 and elapsed > 0:
+            time.sleep(elapsed / self.speed)
+
+    def _append_index(self, directory, entry):
+        with open(os.path.join(directory, INDEX_FILENAME), 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    # ---------- IMAP ----------
+    def record_message(self, message, elapsed):
+        """保存一封从邮箱下载的邮件"""
+        with self._lock:
+            filename = f"{len(self.imap_entries) + 1:06d}.eml"
+            with open(os.path.join(self.imap_dir, filename), 'wb') as f:
+                f.write(bytes(message.obj))
+            entry = {'uid': message.uid, 'file': filename, 'elapsed': round(elapsed, 4)}
+            self._append_index(self.imap_dir, entry)
+            self.imap_entries.append(entry)
+
+    def iter_messages(self):
+        """按录制顺序和耗时返回保存的邮件（MailMessage）"""
+        for index, entry in enumerate(self.imap_entries, 1):
+            self.wait(entry.get('elapsed', 0))
+            with open(os.path.join(self.imap_dir, entry['file']), 'rb') as f:
+                raw = f.read()
+            uid = entry.get('uid') or index
+            yield MailMessage([(f"{index} (UID {uid} FLAGS ())".encode(), raw)])
+
+    # ---------- AI 接口 ----------
+    def record_response(self, payload, response, elapsed):
+        """保存一次 AI 接口请求的响应"""
+        key, doc_key = _payload_keys(payload)
+        with self._lock:
+            filename = f"{len(self.llm_entries) + 1:06d}.json"
+            with open(os.path.join(self.llm_dir, filename), 'w', encoding='utf-8') as f:
+                f.write(response.text)
+            entry = {'key': key, 'doc_key': doc_key, 'file': filename,
+                     'status_code': response.status_code, 'elapsed': round(elapsed, 4)}
+            self._append_index(self.llm_dir, entry)
+            self.llm_entries.append(entry)
+            self._llm_by_key.setdefault(key, entry)
+            self._llm_by_doc.setdefault(doc_key, entry)
+
+    def replay_response(self, payload):
+        """返回与请求匹配的录制响应；找不到时返回 REPLAY_MISS_STATUS"""
+        key, doc_key = _payload_keys(payload)
+        entry = self._llm_by_key.get(key) or self._llm_by_doc.get(doc_key)
+        if entry is None:
+            return ReplayResponse(REPLAY_MISS_STATUS, "回放数据中没有与该请求匹配的响应")
+        self.wait(entry.get('elapsed', 0))
+        with open(os.path.join(self.llm_dir, entry['file']), 'r', encoding='utf-8') as f:
+            return ReplayResponse(entry.get('status_code', 200), f.read())
+
+
+class RecordingMailBox:
+    """
+    包装真实的 imap_tools 邮箱对象：fetch 得到的每封邮件同时保存到录制数据目录
+    其他属性和方法直接转发给真实邮箱
+    """
+
+    def __init__(self, mailbox, session):
+        self._mailbox = mailbox
+        self._session = session
+
+    def login(self, *args, **kwargs):
+        self._mailbox.login(*args, **kwargs)
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return self._mailbox.__exit__(*exc)
+
+    def fetch(self, *args, **kwargs):
+        messages = self._mailbox.fetch(*args, **kwargs)
+        while True:
+            start = time.perf_counter()
+            try:
+                message = next(messages)
+            except StopIteration:
+                return
+            self._session.record_message(message, time.perf_counter() - start)
+            yield message
+
+    def __getattr__(self, name):
+        return getattr(self._mailbox, name)
+
+
+class ReplayMailBox:
+    """回放用的邮箱对象：不联网，fetch 返回录制的邮件（忽略搜索条件）"""
+
+    def __init__(self, session):
+        self._session = session
+
+    def login(self, *args, **kwargs):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def fetch(self, *args, **kwargs):
+        return self._session.iter_messages()
+
+
+def activate(mode, fixture_dir=None, speed=1.0):
+    """
+    启用录制 / 回放（MODE_OFF 关闭）
+
+    参数:
+        mode (str): MODE_OFF / MODE_RECORD / MODE_REPLAY
+        fixture_dir (str): 数据目录（录制 / 回放时必填）
+        speed (float): 回放速度倍数
+
+    异常:
+        ValueError: 模式无效或缺少数据目录
+        FileNotFoundError: 回放数据目录不存在
+    """
+    global _SESSION
+    mode = (mode or MODE_OFF).lower()
+    if mode not in (MODE_OFF, MODE_RECORD, MODE_REPLAY):
+        raise ValueError(f"无效的录制/回放模式: {mode}（可选 off / record / replay）")
+    with _SESSION_LOCK:
+        if mode == MODE_OFF:
+            _SESSION = None
+            return
+        if not fixture_dir:
+            raise ValueError("录制/回放模式需要指定数据目录 fixture_dir")
+        _SESSION = FixtureSession(mode, fixture_dir, speed)
+        if mode == MODE_RECORD:
+            print(f"● 录制模式：邮件和 AI 响应将保存到 {fixture_dir}")
+        else:
+            print(f"▶ 回放模式：使用 {fixture_dir} 中的数据"
+                  f"（{len(_SESSION.imap_entries)} 封邮件，{len(_SESSION.llm_entries)} 个 AI 响应，速度 x{speed}）")
+
+
+def current_mode():
+    """返回当前模式"""
+    session = _SESSION
+    return session.mode if session is not None else MODE_OFF
+
+
+def wrap_mailbox(mailbox_factory):
+    """
+    按当前模式返回邮箱对象
+
+    参数:
+        mailbox_factory (callable): 创建真实邮箱对象的函数（回放模式下不会调用）
+
+    返回:
+        真实邮箱 / RecordingMailBox / ReplayMailBox
+    """
+    session = _SESSION
+    if session is None:
+        return mailbox_factory()
+    if session.mode == MODE_REPLAY:
+        return ReplayMailBox(session)
+    return RecordingMailBox(mailbox_factory(), session)
+
+
+def post_chat_completion(post, url, headers, payload, timeout):
+    """
+    按当前模式发送 AI 接口请求
+
+    参数:
+        post (callable): 实际发送请求的函数（通常是 requests.post）
+        url, headers, payload, timeout: 传给 post 的参数
+
+    返回:
+        requests.Response 或 ReplayResponse
+    """
+    session = _SESSION
+    if session is not None and session.mode == MODE_REPLAY:
+        return session.replay_response(payload)
+
+    start = time.perf_counter()
+    response = post(url, headers=headers, json=payload, timeout=timeout)
+    if session is not None:
+        session.record_response(payload, response, time.perf_counter() - start)
+    return response
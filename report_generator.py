@@ -8,22 +8,39 @@ import re
 import pandas as pd
 from datetime import datetime, timedelta
 
+import metrics
+import config_loader
+import container_normalizer
+import invoice_ledger
+
 # ================= 配置常量 =================
 # XERO Bill 相关配置
-XERO_DEFAULT_DUE_DAYS = 30  # 默认付款期限（天数），用于 invoice 没有 DueDate 时
+XERO_DEFAULT_DUE_DAYS = config_loader.DEFAULT_XERO_DUE_DAYS  # 默认付款期限（天数），用于 invoice 没有 DueDate 时（config.ini [REPORT] 可修改）
 XERO_ACCOUNT_CODE = "310"  # XERO 账户代码
 XERO_TAX_TYPE = "Tax on Purchases"  # XERO 税务类型
 XERO_CURRENCY = "USD"  # XERO 币种
 XERO_DATE_FORMAT = "%Y/%m/%d"  # XERO 日期格式
+XERO_DUPLICATES_SUFFIX = "_duplicates"  # 重复发票清单：XERO_Bill_YYYYMMDD_duplicates.csv（这些行不导入 XERO）
 
 # 供应商 DueDate 特殊配置
-# SRTS 供应商：DueDate = ETA + 7 天
-SRTS_DUE_DAYS_FROM_ETA = 7
+# SRTS 供应商：DueDate = ETA + 7 天（config.ini [REPORT] srts_due_days_from_eta 可修改）
+SRTS_DUE_DAYS_FROM_ETA = config_loader.DEFAULT_SRTS_DUE_DAYS_FROM_ETA
 
 # DueDate 计算规则说明：
 # 1. SRTS 供应商：DueDate = ETA + 7 天（使用 ETA，不是 ETD）
 # 2. 其他供应商：优先使用 invoice 表中的 Due Date 字段
 # 3. 如果 invoice 没有 Due Date，则使用 Invoice Date + 30 天
+
+# Internal Booking List 只有 20ft / 40ft / 40ft hq 三组数量和价格列：标准柜型 -> 所在列组
+BOOKING_LIST_CONTAINER_GROUPS = {
+    "20GP": "20ft",
+    "20RF": "20ft",
+    "40GP": "40ft",
+    "40RF": "40ft",
+    "40NOR": "40ft",
+    "40HQ": "40ft hq",
+    "45HC": "40ft hq",
+}
 # ===========================================
 
 # ================= 数据清洗工具函数 =================
@@ -96,69 +113,8 @@ def safe_str(value):
 # ===========================================
 
 # ================= 柜型标准化函数 =================
-
-def normalize_container_type(raw_type):
-    """
-    标准化柜型，将各种格式的柜型统一为标准格式
-    
-    采用灵活的模式匹配，支持各种常见的柜型表示方式。
-    
-    核心逻辑：
-    1. 先识别尺寸（20 或 40 或 45）
-    2. 如果是 40/45 尺，检查是否包含"高柜"关键词
-    3. 有高柜标识则为 40HQ，否则为 40GP
-    4. 20 尺统一为 20GP
-    
-    参数:
-        raw_type: 原始柜型字符串，支持各种格式如：
-            - 简写: "40HQ", "40'HC", "20GP", "40DC"
-            - 全称: "40FT High Cube", "20FT Standard Container"
-            - 带单位: "40 Feet", "20'"
-            - 其他变体: "High Cube 40", "HC40", "1x40HQ"
-    
-    返回:
-        str: 标准化后的柜型：
-            - "40HQ" - 40/45英尺高柜
-            - "40GP" - 40英尺普柜/干柜
-            - "20GP" - 20英尺柜
-            - "Unknown" - 无法识别的柜型
-    """
-    if pd.isna(raw_type) or not raw_type:
-        return "Unknown"
-    
-    # 统一转大写，便于匹配
-    text = str(raw_type).upper()
-    
-    # 高柜关键词（任意一个出现即视为高柜）
-    high_cube_keywords = ['HQ', 'HC', 'HIGH', 'CUBE', 'HI-CUBE', 'HICUBE']
-    
-    # 检查是否包含高柜关键词
-    is_high_cube = any(kw in text for kw in high_cube_keywords)
-    
-    # 使用正则提取尺寸数字（支持 20, 40, 45 等）
-    size_match = re.search(r'(20|40|45)', text)
-    
-    if size_match:
-        size = size_match.group(1)
-        if size in ['40', '45']:
-            return "40HQ" if is_high_cube else "40GP"
-        elif size == '20':
-            return "20GP"
-    
-    # 没有明确尺寸时，尝试通过关键词推断
-    # 如果只写了 "High Cube" 没写尺寸，默认 40HQ
-    if is_high_cube:
-        return "40HQ"
-    
-    # TEU 通常指 20 尺
-    if 'TEU' in text:
-        return "20GP"
-    
-    # FEU 通常指 40 尺
-    if 'FEU' in text:
-        return "40GP"
-    
-    return "Unknown"
+# 规则见 container_normalizer（与自动查价共用；保留 normalize_container_type 以兼容原有调用）
+normalize_container_type = container_normalizer.normalize
 
 # ===========================================
 
@@ -375,11 +331,16 @@ def generate_internal_booking_list(info_path, output_path):
             'Difference', 'JC check'
         ]
         
+        # 标准化柜型（每个不重复的柜型写法只处理一次）
+        if 'Container Type' in df_info.columns:
+            container_types = container_normalizer.normalize_series(df_info['Container Type'])
+        else:
+            container_types = pd.Series(container_normalizer.UNKNOWN_TYPE, index=df_info.index)
+        
         # 转换数据行
         rows = []
         for idx, row in df_info.iterrows():
-            # 标准化柜型
-            container_type = normalize_container_type(safe_str(row.get('Container Type', '')))
+            container_group = BOOKING_LIST_CONTAINER_GROUPS.get(container_types.at[idx])
             
             # 获取数量和单价
             quantity = safe_str(row.get('Quantity', ''))
@@ -399,13 +360,13 @@ def generate_internal_booking_list(info_path, output_path):
             price_40ft = ''
             price_40ft_hq = ''
             
-            if container_type == '20GP':
+            if container_group == '20ft':
                 qty_20ft = quantity
                 price_20ft = unit_price if unit_price > 0 else ''
-            elif container_type == '40GP':
+            elif container_group == '40ft':
                 qty_40ft = quantity
                 price_40ft = unit_price if unit_price > 0 else ''
-            elif container_type == '40HQ':
+            elif container_group == '40ft hq':
                 qty_40ft_hq = quantity
                 price_40ft_hq = unit_price if unit_price > 0 else ''
             
@@ -487,7 +448,7 @@ def generate_internal_booking_list(info_path, output_path):
 
 # ================= XERO Bill CSV 生成器 =================
 
-def generate_xero_bill(info_path, output_path, due_days=None):
+def generate_xero_bill(info_path, output_path, due_days=None, srts_due_days=None):
     """
     生成 XERO Bill CSV 文件
     
@@ -500,6 +461,7 @@ def generate_xero_bill(info_path, output_path, due_days=None):
         info_path: info.xlsx 文件路径
         output_path: 输出文件路径（XERO_Bill_YYYYMMDD.csv）
         due_days: 付款期限（天数），默认使用 XERO_DEFAULT_DUE_DAYS（仅用于兜底）
+        srts_due_days: SRTS 供应商 ETA 之后的天数，默认使用 SRTS_DUE_DAYS_FROM_ETA
     
     返回:
         bool: 成功返回 True，失败返回 False
@@ -507,6 +469,8 @@ def generate_xero_bill(info_path, output_path, due_days=None):
     try:
         if due_days is None:
             due_days = XERO_DEFAULT_DUE_DAYS
+        if srts_due_days is None:
+            srts_due_days = SRTS_DUE_DAYS_FROM_ETA
         
         print(f"正在读取 info.xlsx: {info_path}")
         
@@ -523,6 +487,9 @@ def generate_xero_bill(info_path, output_path, due_days=None):
         
         print(f"成功读取 {len(df_info)} 行数据")
         
+        # 导出前按发票台账检查重复发票（供应商 + 发票号已由另一个文件登记过）
+        df_info = exclude_duplicate_invoices(df_info, info_path, output_path)
+        
         # 定义 XERO CSV 表头
         headers = [
             '*ContactName', 'EmailAddress', 'POAddressLine1', 'POAddressLine2', 
@@ -562,10 +529,10 @@ def generate_xero_bill(info_path, output_path, due_days=None):
             if 'SRTS' in supplier_name_raw:
                 # SRTS 供应商：使用 ETA + 7 天
                 eta_value = row.get('ETA', '')
-                due_date = calculate_due_date(eta_value, SRTS_DUE_DAYS_FROM_ETA)
+                due_date = calculate_due_date(eta_value, srts_due_days)
                 if not due_date:
                     # 如果 ETA 为空，尝试使用 Invoice Date + 30 作为兜底
-                    due_date = calculate_due_date(date_value, XERO_DEFAULT_DUE_DAYS)
+                    due_date = calculate_due_date(date_value, due_days)
             else:
                 # 其他供应商：优先使用 invoice 提取的 Due Date
                 invoice_due_date = row.get('Due Date', '')
@@ -575,7 +542,7 @@ def generate_xero_bill(info_path, output_path, due_days=None):
                     due_date = format_date(invoice_due_date, XERO_DATE_FORMAT)
                 else:
                     # 如果没有 Due Date，使用 Invoice Date + 30 天
-                    due_date = calculate_due_date(date_value, XERO_DEFAULT_DUE_DAYS)
+                    due_date = calculate_due_date(date_value, due_days)
             
             # 清洗单价和数量
             unit_amount = clean_price(row.get('Unit Price', 0))
@@ -641,10 +608,53 @@ def generate_xero_bill(info_path, output_path, due_days=None):
         traceback.print_exc()
         return False
 
+
+def exclude_duplicate_invoices(df_info, info_path, output_path):
+    """
+    按发票台账标记重复发票：供应商 + 发票号已由另一个文件（其他日期或同一天的另一封邮件）登记过的行
+    不写入 XERO Bill，而是连同原发票信息写入 XERO_Bill_YYYYMMDD_duplicates.csv，由人工确认
+    
+    台账位于 info.xlsx 所在运行目录的上一级（Download/invoice_ledger.db），不存在时不做检查
+    
+    参数:
+        df_info: info.xlsx 数据
+        info_path: info.xlsx 文件路径
+        output_path: XERO Bill 输出路径（重复清单保存在同一目录）
+    
+    返回:
+        DataFrame: 去掉重复发票后的数据
+    """
+    run_dir = os.path.dirname(os.path.abspath(info_path))
+    ledger_path = invoice_ledger.ledger_path_for_run_dir(run_dir)
+    if not os.path.exists(ledger_path):
+        print("  未找到发票台账，跳过重复发票检查")
+        return df_info
+    
+    with invoice_ledger.InvoiceLedger(ledger_path, run_dir=run_dir) as ledger:
+        duplicates = ledger.find_duplicate_rows(df_info)
+    if not duplicates:
+        print("  ✓ 发票台账检查：没有重复发票")
+        return df_info
+    
+    df_duplicates = df_info.loc[list(duplicates)].copy()
+    df_duplicates['Duplicate Of'] = [invoice_ledger.describe_entry(entry) for entry in duplicates.values()]
+    name, ext = os.path.splitext(output_path)
+    duplicates_path = f"{name}{XERO_DUPLICATES_SUFFIX}{ext}"
+    df_duplicates.to_csv(duplicates_path, index=False, encoding='utf-8-sig')
+    
+    flagged = df_duplicates.drop_duplicates(subset=[invoice_ledger.SUPPLIER_COLUMN, invoice_ledger.INVOICE_NO_COLUMN])
+    for _, row in flagged.iterrows():
+        print(f"  ⚠ 重复发票: {safe_str(row.get(invoice_ledger.SUPPLIER_COLUMN, ''))} "
+              f"{safe_str(row.get(invoice_ledger.INVOICE_NO_COLUMN, ''))}（已登记: {row['Duplicate Of']}）")
+    print(f"  ⚠ {len(df_duplicates)} 行重复发票数据未写入 XERO Bill，已保存到: {duplicates_path}")
+    metrics.inc("xero_duplicate_rows", len(df_duplicates))
+    return df_info.drop(index=list(duplicates))
+
 # ===========================================
 
 # ================= 统一入口函数 =================
 
+@metrics.timed("generate_reports")
 def generate_all_reports(info_path):
     """
     一键生成所有报表（Internal Booking List 和 XERO Bill）
@@ -719,7 +729,10 @@ def generate_all_reports(info_path):
         
         # 生成 XERO Bill CSV
         print("【步骤 2】生成 XERO Bill CSV...")
-        success_xero = generate_xero_bill(info_path, xero_bill_path, XERO_DEFAULT_DUE_DAYS)
+        # 付款期限每次生成时读取 config.ini [REPORT]（修改后无需重启）
+        report_config = config_loader.get_report_config()
+        success_xero = generate_xero_bill(info_path, xero_bill_path, report_config['xero_default_due_days'],
+                                          report_config['srts_due_days_from_eta'])
         
         if success_xero:
             result['files'].append(xero_bill_path)
@@ -0,0 +1,228 @@
+"""
+运行日志模块（断点续跑）
+在 Download/<日期>/run_journal.jsonl 中逐行记录每个附件完成的处理阶段：
+    downloaded -> classified -> extracted -> archived -> reported
+程序中途出错（例如 DeepSeek API 失败）后重新运行时，每个附件从最后完成的阶段继续，
+不会重复下载邮件，也不会重复调用 AI 提取
+"""
+
+import os
+import json
+import threading
+from datetime import datetime
+
+JOURNAL_FILENAME = "run_journal.jsonl"
+
+# ================= 处理阶段 =================
+STAGE_DOWNLOADED = "downloaded"    # 附件已保存到 Temp
+STAGE_CLASSIFIED = "classified"    # 已识别文件类型
+STAGE_EXTRACTED = "extracted"      # AI 已提取发票数据（数据保存在日志中）
+STAGE_ARCHIVED = "archived"        # 已重命名并移动到 Invoice附件 / BL附件
+STAGE_REPORTED = "reported"        # 数据已写入 info.xlsx，处理完毕
+STAGE_DISCARDED = "discarded"      # 不再处理（垃圾文件、没有发票的邮件、多次提取失败）
+
+STAGE_ORDER = [STAGE_DOWNLOADED, STAGE_CLASSIFIED, STAGE_EXTRACTED, STAGE_ARCHIVED, STAGE_REPORTED]
+
+# 同一张发票 AI 提取失败达到此次数后不再自动重试
+MAX_EXTRACT_ATTEMPTS = 3
+# ===========================================
+
+
+def stage_reached(attachment, stage):
+    """
+    判断附件是否已完成指定阶段
+
+    参数:
+        attachment (dict): 附件记录（包含 "stage"）
+        stage (str): 要检查的阶段
+
+    返回:
+        bool: 已完成返回 True
+    """
+    current = attachment.get('stage')
+    if current not in STAGE_ORDER:
+        return False
+    return STAGE_ORDER.index(current) >= STAGE_ORDER.index(stage)
+
+
+def is_finished(attachment):
+    """
+    判断附件是否已处理完毕（续跑时不再处理）
+
+    - 发票：数据写入 info.xlsx 后完成
+    - 提单：归档后完成（提单没有数据行）
+    - 丢弃的文件：直接视为完成
+    """
+    stage = attachment.get('stage')
+    if stage in (STAGE_REPORTED, STAGE_DISCARDED):
+        return True
+    return attachment.get('type') == 'BL' and stage == STAGE_ARCHIVED
+
+
+class RunJournal:
+    """
+    单次运行目录的处理日志（JSON Lines 格式，只追加写入，线程安全）
+
+    每行是一条记录：
+        {"kind": "email", "email_id": ..., "subject": ..., "booking_no": ..., "supplier_type": ...,
+         "imap": {"mailbox": ..., "folder": ..., "uid": ...}}
+        {"kind": "attachment", "att_id": ..., "email_id": ..., "stage": ..., 其他字段...}
+    同一个附件的多条记录按顺序合并，最后一条的阶段即为当前阶段
+    """
+
+    def __init__(self, run_dir):
+        """
+        打开（或创建）运行目录中的处理日志
+
+        参数:
+            run_dir (str): 当日运行目录（Download/<日期>）
+        """
+        self.path = os.path.join(run_dir, JOURNAL_FILENAME)
+        self.emails = {}
+        self.attachments = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        """读取已有的日志记录（忽略写入中断导致的不完整行）"""
+        if not os.path.exists(self.path):
+            return
+
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                self._apply(record)
+
+    def _apply(self, record):
+        """将一条记录合并到内存状态"""
+        kind = record.pop('kind', None)
+        record.pop('ts', None)
+        if kind == 'email':
+            self.emails.setdefault(record['email_id'], {}).update(record)
+        elif kind == 'attachment':
+            self.attachments.setdefault(record['att_id'], {}).update(record)
+
+    def _append(self, record):
+        """追加一条记录到日志文件并更新内存状态"""
+        record['ts'] = datetime.now().isoformat(timespec='seconds')
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._apply(record)
+
+    def record_email(self, email_id, subject, booking_no, supplier_type, imap=None):
+        """
+        记录邮件信息（续跑时用于还原邮件分组）
+
+        参数:
+            imap (dict, optional): 邮件在邮箱中的位置 {"mailbox", "folder", "uid"}（续跑后回写处理结果时使用）
+        """
+        record = {
+            'kind': 'email',
+            'email_id': email_id,
+            'subject': subject,
+            'booking_no': booking_no,
+            'supplier_type': supplier_type,
+        }
+        if imap:
+            record['imap'] = imap
+        self._append(record)
+
+    def record_attachment(self, att_id, stage, **fields):
+        """
+        记录附件完成的阶段
+
+        参数:
+            att_id (str): 附件标识
+            stage (str): 完成的阶段
+            **fields: 其他需要保存的字段（例如 path、type、data、invoice_no、hbl）
+        """
+        record = {'kind': 'attachment', 'att_id': att_id, 'stage': stage}
+        record.update(fields)
+        self._append(record)
+
+    def record_extract_failure(self, att_id):
+        """
+        记录一次 AI 提取失败，达到 MAX_EXTRACT_ATTEMPTS 次后标记为丢弃
+
+        返回:
+            bool: 是否还会在下次运行时重试
+        """
+        attempts = self.attachments.get(att_id, {}).get('extract_attempts', 0) + 1
+        if attempts >= MAX_EXTRACT_ATTEMPTS:
+            self.record_attachment(att_id, STAGE_DISCARDED, extract_attempts=attempts,
+                                   reason="extract_failed")
+            return False
+        self.record_attachment(att_id, STAGE_CLASSIFIED, extract_attempts=attempts)
+        return True
+
+    def get_attachment(self, att_id):
+        """获取附件的当前记录（不存在时返回空字典）"""
+        return self.attachments.get(att_id, {})
+
+    def has_email(self, email_id):
+        """邮件是否已记录在日志中（已下载过）"""
+        return email_id in self.emails
+
+    def email_attachments(self, email_id):
+        """获取一封邮件的全部附件记录"""
+        with self._lock:
+            return [dict(att) for att in self.attachments.values() if att.get('email_id') == email_id]
+
+    def finished_attachments(self):
+        """
+        已处理完、可以登记到附件索引的附件（有内容哈希；因提取失败、没有发票等原因丢弃的附件除外，
+        它们再次收到时仍需处理）
+
+        返回:
+            list: 附件记录的副本
+        """
+        with self._lock:
+            return [dict(att) for att in self.attachments.values()
+                    if att.get('content_hash') and is_finished(att)
+                    and (att.get('stage') != STAGE_DISCARDED or att.get('reason') is None)]
+
+    def pending_emails(self):
+        """
+        还原上次运行未处理完的邮件
+
+        返回:
+            list: 与 EmailHandler.download_and_process_attachments 返回格式相同的邮件列表，
+                  每个附件额外包含 "att_id"；只返回至少有一个未完成附件的邮件
+        """
+        grouped = {}
+        for att_id, att in self.attachments.items():
+            if att.get('stage') == STAGE_DISCARDED:
+                continue
+            grouped.setdefault(att.get('email_id'), []).append(att)
+
+        email_list = []
+        for email_id, attachments in grouped.items():
+            if all(is_finished(att) for att in attachments):
+                continue
+            email_record = self.emails.get(email_id, {})
+            email_list.append({
+                "email_id": email_id,
+                "subject": email_record.get('subject', ''),
+                "body": "",
+                "booking_no": email_record.get('booking_no', ''),
+                "supplier_type": email_record.get('supplier_type', 'OTHER'),
+                # 只完成下载、尚未分类的附件 type 为 None，由调用方重新分类
+                "attachments": [
+                    {"att_id": att['att_id'], "type": att.get('type'), "path": att.get('path', ''),
+                     "content_hash": att.get('content_hash')}
+                    for att in attachments
+                ],
+                "imap": email_record.get('imap'),
+                "resumed": True,
+            })
+        return email_list